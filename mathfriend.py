@@ -8,6 +8,16 @@ import hashlib
 import math
 import base64
 import os
+import bisect
+import struct
+import zlib
+import types
+import threading
+import functools
+import copy
+import collections
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from streamlit.components.v1 import html
 from fractions import Fraction
@@ -120,6 +130,81 @@ def get_supabase_client():
 
 supabase_client = get_supabase_client()
 
+# --- NAMESPACED APP CACHE ---
+# Cached reads are grouped into namespaces such as ("leaderboard", topic) or ("user_stats", username).
+# Each write drops only the namespaces it changes, so entries can live for hours without going stale.
+# The store lives in this server process and so does invalidation: the long default TTL assumes the app runs
+# as a single Streamlit process. Deployments with several processes should set APP_CACHE_TTL_SECONDS in the
+# secrets to the staleness they can accept, because writes in one process do not reach the others' caches.
+APP_CACHE_TTL_SECONDS = int(st.secrets.get("APP_CACHE_TTL_SECONDS", 6 * 3600))
+APP_CACHE_MAX_ENTRIES = 5000 # Least recently used entries are evicted beyond this, across all namespaces
+
+@st.cache_resource
+def _get_app_cache():
+    """
+    Process-wide cache store: {namespace: {call_key: (stored_at, value)}}, plus "lru", an ordered
+    {(namespace, call_key): None} with the most recently used entry last.
+    """
+    return {"lock": threading.Lock(), "namespaces": {}, "lru": collections.OrderedDict()}
+
+def app_cached(namespace_for, ttl=APP_CACHE_TTL_SECONDS):
+    """
+    Caches a function's results in the namespace returned by namespace_for(*args, **kwargs).
+    Results stay until the TTL passes, invalidate_app_cache() drops their namespace or they are evicted.
+    Callers get their own deep copy, so mutating a result never changes what other sessions see.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            namespace = namespace_for(*args, **kwargs)
+            call_key = (func.__name__, args, tuple(sorted(kwargs.items())))
+            cache = _get_app_cache()
+            with cache["lock"]:
+                entries = cache["namespaces"].setdefault(namespace, {})
+                hit = entries.get(call_key)
+                if hit is not None:
+                    cache["lru"].move_to_end((namespace, call_key))
+            if hit is not None and time.time() - hit[0] < ttl:
+                return copy.deepcopy(hit[1])
+            try:
+                value = func(*args, **kwargs)
+            except Exception:
+                with cache["lock"]:
+                    if not entries and cache["namespaces"].get(namespace) is entries:
+                        del cache["namespaces"][namespace]
+                raise
+            stored = copy.deepcopy(value)
+            with cache["lock"]:
+                # If the namespace was invalidated while we were querying, this value may already be stale.
+                if cache["namespaces"].get(namespace) is entries:
+                    entries[call_key] = (time.time(), stored)
+                    cache["lru"][(namespace, call_key)] = None
+                    cache["lru"].move_to_end((namespace, call_key))
+                    while len(cache["lru"]) > APP_CACHE_MAX_ENTRIES:
+                        _evict_app_cache_entry(cache, *cache["lru"].popitem(last=False)[0])
+            return value
+        return wrapper
+    return decorator
+
+def _evict_app_cache_entry(cache, namespace, call_key):
+    """Removes one entry (caller holds the lock), dropping its namespace once it is empty."""
+    entries = cache["namespaces"].get(namespace)
+    if entries is not None:
+        entries.pop(call_key, None)
+        if not entries:
+            del cache["namespaces"][namespace]
+
+def invalidate_app_cache(*namespace, cache=None):
+    """
+    Drops every namespace that starts with the given parts, e.g. ("leaderboard",) or ("leaderboard", topic).
+    Background threads have no script run context, so they pass the store fetched by _get_app_cache() as `cache`.
+    """
+    cache = cache or _get_app_cache()
+    with cache["lock"]:
+        for key in [key for key in cache["namespaces"] if key[:len(namespace)] == namespace]:
+            for call_key in cache["namespaces"].pop(key):
+                cache["lru"].pop((key, call_key), None)
+
 def create_and_verify_tables():
     """Creates, verifies, and populates necessary database tables."""
     try:
@@ -156,6 +241,20 @@ def create_and_verify_tables():
                                 topic TEXT NOT NULL, 
                                 target_count INTEGER NOT NULL
                             )'''))
+            # A challenge's q_type (optional) makes its quiz serve exactly that kind of question until it is met.
+            # The built-in challenges that name one sub-type get theirs once, when the column is first added.
+            targeted_challenges = [
+                ("Find the coefficient in 2 binomial expansions.", "find_coefficient"), ("Use the Remainder Theorem twice.", "remainder_theorem"),
+                ("Solve 3 trigonometric equations.", "solve_equation"), ("Calculate the magnitude of 4 vectors.", "magnitude"),
+                ("Find the distance between two points 3 times.", "distance"), ("Find the derivative of 3 functions.", "diff_power_rule"),
+            ]
+            has_q_type = conn.execute(text(
+                "SELECT 1 FROM information_schema.columns WHERE table_name = 'daily_challenges' AND column_name = 'q_type'"
+            )).first()
+            if not has_q_type:
+                conn.execute(text('''ALTER TABLE daily_challenges ADD COLUMN q_type TEXT'''))
+                conn.execute(text("UPDATE daily_challenges SET q_type = :q_type WHERE description = :description"),
+                             [{"description": d, "q_type": q} for d, q in targeted_challenges])
             conn.execute(text('''CREATE TABLE IF NOT EXISTS user_daily_progress (
                                 username TEXT NOT NULL,
                                 challenge_date DATE NOT NULL,
@@ -171,6 +270,26 @@ def create_and_verify_tables():
                                 seen_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
                                 UNIQUE (username, question_id)
                             )'''))
+            # Seen questions are now keyed by the 64-bit parameter fingerprint from get_question_id;
+            # question_id only holds the old text hashes.
+            conn.execute(text('''ALTER TABLE seen_questions ADD COLUMN IF NOT EXISTS question_fingerprint BIGINT'''))
+            conn.execute(text('''ALTER TABLE seen_questions ALTER COLUMN question_id DROP NOT NULL'''))
+            conn.execute(text('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_seen_questions_fingerprint
+                ON seen_questions (username, question_fingerprint)
+            '''))
+            # Pre-generated questions; slots are numbered 0..n-1 within each (topic, difficulty) cell.
+            conn.execute(text('''
+                CREATE TABLE IF NOT EXISTS question_bank (
+                    topic TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    slot INTEGER NOT NULL,
+                    question_fingerprint BIGINT NOT NULL,
+                    question_ref TEXT NOT NULL,
+                    PRIMARY KEY (topic, difficulty, slot),
+                    UNIQUE (topic, difficulty, question_fingerprint)
+                )
+            '''))
             conn.execute(text('''CREATE TABLE IF NOT EXISTS user_achievements (
                                 id SERIAL PRIMARY KEY,
                                 username TEXT NOT NULL,
@@ -178,6 +297,17 @@ def create_and_verify_tables():
                                 badge_icon TEXT,
                                 unlocked_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
                             )'''))
+            # One row per badge per user, so awards can be plain INSERT ... ON CONFLICT DO NOTHING.
+            # Duplicates left by older concurrent awards are dropped once, before the index is built.
+            has_achievement_index = conn.execute(text(
+                "SELECT 1 FROM pg_indexes WHERE indexname = 'idx_user_achievements_user_badge'"
+            )).first()
+            if not has_achievement_index:
+                conn.execute(text('''
+                    DELETE FROM user_achievements a USING user_achievements b
+                    WHERE a.username = b.username AND a.achievement_name = b.achievement_name AND a.id > b.id
+                '''))
+                conn.execute(text('''CREATE UNIQUE INDEX idx_user_achievements_user_badge ON user_achievements (username, achievement_name)'''))
             conn.execute(text('''CREATE TABLE IF NOT EXISTS app_config (
                                 config_key TEXT PRIMARY KEY,
                                 config_value TEXT
@@ -203,17 +333,119 @@ def create_and_verify_tables():
                     finished_at TIMESTAMP WITH TIME ZONE
                 )
             '''))
+            # One row per (day, player) with that day's duel results, maintained by submit_duel_answer.
+            conn.execute(text('''
+                CREATE TABLE IF NOT EXISTS duel_player_stats (
+                    stat_date DATE NOT NULL,
+                    username TEXT NOT NULL,
+                    wins INTEGER NOT NULL DEFAULT 0,
+                    losses INTEGER NOT NULL DEFAULT 0,
+                    draws INTEGER NOT NULL DEFAULT 0,
+                    last_played TIMESTAMP WITH TIME ZONE,
+                    PRIMARY KEY (stat_date, username)
+                )
+            '''))
             conn.execute(text('''
                 CREATE TABLE IF NOT EXISTS duel_questions (
                     id SERIAL PRIMARY KEY,
                     duel_id INTEGER REFERENCES duels(id) ON DELETE CASCADE,
                     question_index INTEGER NOT NULL,
-                    question_data_json TEXT NOT NULL,
+                    question_data_json TEXT,
                     answered_by TEXT,
                     is_correct BOOLEAN,
                     UNIQUE(duel_id, question_index)
                 )
             '''))
+            conn.execute(text('''ALTER TABLE duel_questions ADD COLUMN IF NOT EXISTS question_fingerprint BIGINT'''))
+            # question_ref is the question's seeded reference, kept alongside the full JSON. Rows written while
+            # duels stored only the reference have a NULL question_data_json.
+            conn.execute(text('''ALTER TABLE duel_questions ADD COLUMN IF NOT EXISTS question_ref TEXT'''))
+            conn.execute(text('''ALTER TABLE duel_questions ALTER COLUMN question_data_json DROP NOT NULL'''))
+            # --- Materialized Leaderboard Tables ---
+            # One row per (topic, time window, user) holding that user's best quiz, maintained by record_quiz_completion.
+            # Only the 'all' window is stored here; week/month boards are read from quiz_daily_aggregates.
+            conn.execute(text('''
+                CREATE TABLE IF NOT EXISTS leaderboard_best_scores (
+                    topic TEXT NOT NULL,
+                    time_window TEXT NOT NULL,
+                    username TEXT NOT NULL,
+                    score INTEGER NOT NULL,
+                    questions_answered INTEGER NOT NULL,
+                    accuracy DOUBLE PRECISION NOT NULL,
+                    achieved_at TIMESTAMP WITH TIME ZONE,
+                    PRIMARY KEY (topic, time_window, username)
+                )
+            '''))
+            conn.execute(text('''
+                CREATE INDEX IF NOT EXISTS idx_leaderboard_best_scores_rank
+                ON leaderboard_best_scores (topic, time_window, accuracy DESC, questions_answered DESC, achieved_at ASC)
+            '''))
+            # One row per (day, user, topic) summing that day's quizzes, plus the day's single best quiz.
+            # "This Week" and "This Month" are sums over the last 7 or 30 buckets instead of scans of quiz_results.
+            conn.execute(text('''
+                CREATE TABLE IF NOT EXISTS quiz_daily_aggregates (
+                    bucket_date DATE NOT NULL,
+                    username TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    quizzes_taken INTEGER NOT NULL DEFAULT 0,
+                    correct_answers INTEGER NOT NULL DEFAULT 0,
+                    questions_answered INTEGER NOT NULL DEFAULT 0,
+                    accuracy_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+                    best_accuracy DOUBLE PRECISION,
+                    best_score INTEGER,
+                    best_questions_answered INTEGER,
+                    best_at TIMESTAMP WITH TIME ZONE,
+                    PRIMARY KEY (bucket_date, username, topic)
+                )
+            '''))
+            conn.execute(text('''
+                CREATE INDEX IF NOT EXISTS idx_quiz_daily_aggregates_topic
+                ON quiz_daily_aggregates (topic, bucket_date)
+            '''))
+            # Quiz sessions are an append-only event log plus a periodic snapshot in quiz_sessions.
+            # snapshot_seq is the last event folded into the snapshot (see QUIZ SESSION EVENT LOG).
+            conn.execute(text('''ALTER TABLE quiz_sessions ADD COLUMN IF NOT EXISTS snapshot_seq INTEGER DEFAULT 0'''))
+            # Snapshots are written to session_blob by the session codec; session_data only holds older JSON rows.
+            conn.execute(text('''ALTER TABLE quiz_sessions ADD COLUMN IF NOT EXISTS session_blob BYTEA'''))
+            conn.execute(text('''ALTER TABLE quiz_sessions ALTER COLUMN session_data DROP NOT NULL'''))
+            conn.execute(text('''
+                CREATE TABLE IF NOT EXISTS quiz_session_events (
+                    username TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    event TEXT NOT NULL,
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (username, seq)
+                )
+            '''))
+            # Running correct-answer, quiz and perfect-quiz counts per user, per topic and overall (see USER SCORE
+            # TOTALS). Filled from quiz_results once, when the table (or the perfect_quizzes column) is first created.
+            has_score_totals = conn.execute(text(
+                "SELECT 1 FROM information_schema.tables WHERE table_name = 'user_score_totals'"
+            )).first()
+            conn.execute(text('''
+                CREATE TABLE IF NOT EXISTS user_score_totals (
+                    username TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    correct_answers INTEGER NOT NULL DEFAULT 0,
+                    quizzes_taken INTEGER NOT NULL DEFAULT 0,
+                    perfect_quizzes INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (username, topic)
+                )
+            '''))
+            has_perfect_quizzes = conn.execute(text(
+                "SELECT 1 FROM information_schema.columns WHERE table_name = 'user_score_totals' AND column_name = 'perfect_quizzes'"
+            )).first()
+            if not has_perfect_quizzes:
+                conn.execute(text('''ALTER TABLE user_score_totals ADD COLUMN perfect_quizzes INTEGER NOT NULL DEFAULT 0'''))
+            if not has_score_totals:
+                conn.execute(text(f"INSERT INTO user_score_totals (username, topic, correct_answers, quizzes_taken, perfect_quizzes) {_USER_SCORE_TOTALS_FROM_RESULTS}"),
+                             {"all_topics": SCORE_TOTALS_ALL_TOPICS})
+            elif not has_perfect_quizzes:
+                conn.execute(text(f"""
+                    UPDATE user_score_totals t SET perfect_quizzes = e.perfect_quizzes
+                    FROM ({_USER_SCORE_TOTALS_FROM_RESULTS}) e
+                    WHERE e.username = t.username AND e.topic = t.topic
+                """), {"all_topics": SCORE_TOTALS_ALL_TOPICS})
             result = conn.execute(text("SELECT COUNT(*) FROM daily_challenges")).scalar_one()
             if result == 0:
                 print("Populating daily_challenges table for the first time.")
@@ -234,6 +466,8 @@ def create_and_verify_tables():
                 ]
                 conn.execute(text("INSERT INTO daily_challenges (description, topic, target_count) VALUES (:description, :topic, :target_count)"), 
                              [{"description": d, "topic": t, "target_count": c} for d, t, c in challenges])
+                conn.execute(text("UPDATE daily_challenges SET q_type = :q_type WHERE description = :description"),
+                             [{"description": d, "q_type": q} for d, q in targeted_challenges])
             conn.commit()
         print("Database tables created or verified successfully, including corrected Duel tables.")
     except Exception as e:
@@ -250,73 +484,256 @@ def hash_password(password):
 def check_password(hashed_password, user_password):
     return hashed_password == hash_password(user_password)
 
+# --- SESSION STATE CODEC ---
+# Quiz snapshots are stored in quiz_sessions.session_blob as one version byte followed by that codec's payload,
+# so the encoding can change without stranding sessions saved by an older release: every codec stays in
+# SESSION_CODECS for decoding and SESSION_CODEC_VERSION picks the one used for new saves. Rows saved before the
+# blob column existed still have JSON in session_data; they are read from there and move to the blob on their
+# next save.
+SessionCodec = collections.namedtuple("SessionCodec", ["name", "encode", "decode"])
+SESSION_ZLIB_LEVEL = 6
+
+def _encode_json_session(state):
+    return json.dumps(state, separators=(",", ":"), default=str).encode("utf-8")
+
+def _decode_json_session(payload):
+    return json.loads(payload.decode("utf-8"))
+
+def _encode_zlib_session(state):
+    return zlib.compress(_encode_json_session(state), SESSION_ZLIB_LEVEL)
+
+def _decode_zlib_session(payload):
+    return _decode_json_session(zlib.decompress(payload))
+
+SESSION_CODECS = {
+    1: SessionCodec("json", _encode_json_session, _decode_json_session),
+    2: SessionCodec("json+zlib", _encode_zlib_session, _decode_zlib_session),
+}
+SESSION_CODEC_VERSION = 2
+
+def encode_session_state(state, version=SESSION_CODEC_VERSION):
+    """Encodes a quiz state for session_blob: the codec's version byte, then its payload."""
+    return bytes([version]) + SESSION_CODECS[version].encode(state)
+
+def decode_session_state(blob):
+    """Decodes a session_blob written by any known codec version. Raises ValueError for an unknown version."""
+    blob = bytes(blob)
+    codec = SESSION_CODECS.get(blob[0]) if blob else None
+    if codec is None:
+        raise ValueError("unknown session codec version")
+    return codec.decode(blob[1:])
+
+# --- QUIZ SESSION EVENT LOG ---
+# A quiz in progress is persisted as an append-only log of small events (quiz started, question served,
+# answer submitted, lifeline used, question advanced) instead of rewriting the whole session on every question.
+# Every QUIZ_EVENT_COMPACT_EVERY events save_quiz_state folds the log into a snapshot in quiz_sessions and drops
+# the events it covers; load_quiz_state restores a session by replaying the events after the snapshot.
+# _apply_quiz_event is the only code that changes the persisted quiz state, both live and on replay.
+QUIZ_EVENT_COMPACT_EVERY = 20
+QUIZ_QUESTION_STATE_KEYS = ['hint_revealed', 'fifty_fifty_used', 'current_q_data', 'user_choice', 'answer_submitted', 'current_part_index', 'multi_part_correct']
+QUIZ_PART_STATE_KEYS = ['hint_revealed', 'fifty_fifty_used', 'user_choice', 'answer_submitted']
+
+def _apply_quiz_event(state, event):
+    """Applies one quiz event to a quiz state: st.session_state live, or a plain dict while replaying."""
+    kind = event["type"]
+    if kind == "quiz_started":
+        for key in QUIZ_QUESTION_STATE_KEYS:
+            state.pop(key, None)
+        state.update({
+            "quiz_active": True, "quiz_topic": event["quiz_topic"], "is_wassce_mode": event["is_wassce_mode"],
+            "on_summary_page": False, "quiz_score": 0, "questions_answered": 0, "questions_attempted": 0,
+            "current_streak": 0, "incorrect_questions": [], "all_wassce_questions": [],
+            "wassce_paper": list(event.get("wassce_paper", [])),
+        })
+    elif kind == "question_served":
+        state["current_q_data"] = event["question"]
+        state["current_part_index"] = 0
+        state["multi_part_correct"] = True
+        if state.get("is_wassce_mode"):
+            if event.get("from_paper"):
+                state["wassce_paper"].pop(0)
+            state.setdefault("all_wassce_questions", []).append(event["question"])
+    elif kind == "answer_submitted":
+        state["user_choice"] = event["choice"]
+        state["answer_submitted"] = True
+        if not event["correct"]:
+            state["multi_part_correct"] = False
+        if event["final"]:
+            state["questions_attempted"] += 1
+            if state.get("multi_part_correct", True):
+                state["quiz_score"] += 1
+                state["current_streak"] += 1
+            else:
+                state["current_streak"] = 0
+                state["incorrect_questions"].append(state["current_q_data"])
+    elif kind == "lifeline_used":
+        lifeline = event["lifeline"]
+        if lifeline == "hint":
+            state["hint_revealed"] = True
+        elif lifeline == "fifty_fifty":
+            state["fifty_fifty_used"] = True
+            question = state["current_q_data"]
+            target = question["parts"][state.get("current_part_index", 0)] if question.get("is_multipart") else question
+            target["options"] = event["options"]
+        elif lifeline == "skip":
+            state["questions_answered"] += 1
+            for key in QUIZ_QUESTION_STATE_KEYS:
+                state.pop(key, None)
+    elif kind == "part_advanced":
+        state["current_part_index"] = state.get("current_part_index", 0) + 1
+        for key in QUIZ_PART_STATE_KEYS:
+            state.pop(key, None)
+    elif kind == "question_advanced":
+        state["questions_answered"] += 1
+        for key in QUIZ_QUESTION_STATE_KEYS:
+            state.pop(key, None)
+
+def _expand_quiz_event(stored):
+    """
+    A stored event with any question saved as a bare reference (see _expand_question) rebuilt.
+    Raises ValueError if one can no longer be rebuilt, so the session is not restored with questions missing.
+    """
+    event = dict(stored)
+    if "question" in event:
+        event["question"] = _expand_question(event["question"])
+    if "wassce_paper" in event:
+        event["wassce_paper"] = [_expand_question(q) for q in event["wassce_paper"]]
+    if event.get("question", {}) is None or None in event.get("wassce_paper", []):
+        raise ValueError("question reference from another generator version")
+    return event
+
+def record_quiz_event(username, kind, **data):
+    """Applies a quiz event to the session and appends it to the user's event log, compacting the log when due."""
+    event = {"type": kind, **data}
+    if kind == "quiz_started":
+        st.session_state.quiz_event_seq = 0
+        st.session_state.quiz_snapshot_seq = 0
+    _apply_quiz_event(st.session_state, event)
+    seq = st.session_state.get("quiz_event_seq", 0) + 1
+    st.session_state.quiz_event_seq = seq
+    try:
+        with engine.connect() as conn:
+            if kind == "quiz_started":
+                # A new quiz replaces whatever was saved for the last one.
+                conn.execute(text("DELETE FROM public.quiz_session_events WHERE username = :username"), {"username": username})
+                conn.execute(text("DELETE FROM public.quiz_sessions WHERE username = :username"), {"username": username})
+            conn.execute(text("""
+                INSERT INTO public.quiz_session_events (username, seq, event)
+                VALUES (:username, :seq, :event)
+            """), {"username": username, "seq": seq, "event": json.dumps(event, default=str)})
+            conn.commit()
+        if seq - st.session_state.get("quiz_snapshot_seq", 0) >= QUIZ_EVENT_COMPACT_EVERY:
+            save_quiz_state(username)
+    except Exception as e:
+        # The session still works in memory; it just may not be restorable after a disconnect.
+        print(f"Error recording quiz event for {username}: {e}")
+
 # --- START: ADD THIS NEW FUNCTION ---
 def load_quiz_state(username):
-    """Loads an active quiz session from the database if it's less than 8 hours old."""
+    """Loads an active quiz session (snapshot plus later events) if it was touched in the last 8 hours."""
     with engine.connect() as conn:
-        # This query fetches the session data only if it was updated in the last 8 hours.
-        query = text("""
-            SELECT session_data FROM public.quiz_sessions
-            WHERE username = :username AND last_updated > NOW() - INTERVAL '8 hours'
-        """)
-        result = conn.execute(query, {"username": username}).scalar_one_or_none()
-
-        if result:
-            try:
-                # The data from the database is loaded into the session state.
-                # The .update() method adds all key-value pairs from the loaded data.
+        snapshot = conn.execute(text("""
+            SELECT session_data, session_blob, COALESCE(snapshot_seq, 0) AS snapshot_seq,
+                   last_updated > NOW() - INTERVAL '8 hours' AS is_recent
+            FROM public.quiz_sessions WHERE username = :username
+        """), {"username": username}).mappings().first()
+        snapshot_seq = snapshot["snapshot_seq"] if snapshot else 0
+        events = conn.execute(text("""
+            SELECT seq, event, created_at > NOW() - INTERVAL '8 hours' AS is_recent
+            FROM public.quiz_session_events
+            WHERE username = :username AND seq > :snapshot_seq
+            ORDER BY seq
+        """), {"username": username, "snapshot_seq": snapshot_seq}).mappings().fetchall()
+
+    if not ((snapshot and snapshot["is_recent"]) or any(e["is_recent"] for e in events)):
+        return False # No recent session was found.
+    try:
+        loaded_data = {}
+        if snapshot:
+            if snapshot["session_blob"] is not None:
+                loaded_data = decode_session_state(snapshot["session_blob"])
+            else:
+                # A row saved before the session codec: plain JSON in session_data.
+                result = snapshot["session_data"]
                 loaded_data = json.loads(result) if isinstance(result, str) else result
-                st.session_state.update(loaded_data)
-                return True  # Indicates a session was successfully loaded.
-            except (json.JSONDecodeError, TypeError):
-                # If data is corrupted for any reason, we should not load it.
-                return False
-    return False # No recent session was found.
+            # Older snapshots saved seeded questions as bare references; rebuild them (see _expand_question).
+            for key in ("incorrect_questions", "all_wassce_questions", "wassce_paper"):
+                if key in loaded_data:
+                    loaded_data[key] = [_expand_question(q) for q in loaded_data[key]]
+                    if None in loaded_data[key]:
+                        raise ValueError("question reference from another generator version")
+            if loaded_data.get("current_q_data") is not None:
+                loaded_data["current_q_data"] = _expand_question(loaded_data["current_q_data"])
+                if loaded_data["current_q_data"] is None:
+                    del loaded_data["current_q_data"] # The quiz page serves a fresh question instead
+        for row in events:
+            _apply_quiz_event(loaded_data, _expand_quiz_event(json.loads(row["event"])))
+        if not loaded_data.get("quiz_active"):
+            return False
+        st.session_state.update(loaded_data)
+        st.session_state.quiz_event_seq = events[-1]["seq"] if events else snapshot_seq
+        st.session_state.quiz_snapshot_seq = snapshot_seq
+        return True  # Indicates a session was successfully loaded.
+    except (json.JSONDecodeError, TypeError, KeyError, IndexError, ValueError, zlib.error) as e:
+        # If the snapshot or log is corrupted for any reason, we should not load it.
+        print(f"Could not restore the quiz session for {username}: {type(e).__name__} {e}")
+        return False
 # --- END: ADD THIS NEW FUNCTION ---
 
-# Replace your previous save_quiz_state function with this corrected version
-def save_quiz_state(username):
-    """Gathers the current quiz state and saves it to the database as a JSON object."""
-    state_to_save = {
-        "quiz_active": st.session_state.get("quiz_active", False),
-        "quiz_topic": st.session_state.get("quiz_topic"),
-        "quiz_score": st.session_state.get("quiz_score", 0),
-        "questions_answered": st.session_state.get("questions_answered", 0),
-        "questions_attempted": st.session_state.get("questions_attempted", 0),
-        "current_streak": st.session_state.get("current_streak", 0),
-        "incorrect_questions": st.session_state.get("incorrect_questions", []),
-        "is_wassce_mode": st.session_state.get("is_wassce_mode", False),
-        "current_q_data": st.session_state.get("current_q_data"),
-        "all_wassce_questions": st.session_state.get("all_wassce_questions", []),
-        "hint_revealed": st.session_state.get("hint_revealed", False),
-        "fifty_fifty_used": st.session_state.get("fifty_fifty_used", False),
-        "answer_submitted": st.session_state.get("answer_submitted", False),
-        "user_choice": st.session_state.get("user_choice")
+def _quiz_state_snapshot(state):
+    """The persisted part of a quiz state (st.session_state or a dict)."""
+    snapshot = {
+        "quiz_active": state.get("quiz_active", False),
+        "quiz_topic": state.get("quiz_topic"),
+        "quiz_score": state.get("quiz_score", 0),
+        "questions_answered": state.get("questions_answered", 0),
+        "questions_attempted": state.get("questions_attempted", 0),
+        "current_streak": state.get("current_streak", 0),
+        "incorrect_questions": list(state.get("incorrect_questions", [])),
+        "is_wassce_mode": state.get("is_wassce_mode", False),
+        "current_q_data": state.get("current_q_data"),
+        "all_wassce_questions": list(state.get("all_wassce_questions", [])),
+        "wassce_paper": list(state.get("wassce_paper", [])),
+        "hint_revealed": state.get("hint_revealed", False),
+        "fifty_fifty_used": state.get("fifty_fifty_used", False),
+        "answer_submitted": state.get("answer_submitted", False),
+        "user_choice": state.get("user_choice"),
+        "current_part_index": state.get("current_part_index", 0),
+        "multi_part_correct": state.get("multi_part_correct", True)
     }
+    if snapshot["current_q_data"] is None:
+        del snapshot["current_q_data"]
+    return snapshot
 
-    # This makes the JSON conversion more robust by turning any non-standard objects into strings.
-    session_data_json = json.dumps(state_to_save, default=str)
+def save_quiz_state(username):
+    """Compacts the quiz event log: saves a snapshot of the current quiz state and drops the events it covers."""
+    session_blob = encode_session_state(_quiz_state_snapshot(st.session_state))
+    snapshot_seq = st.session_state.get("quiz_event_seq", 0)
 
     with engine.connect() as conn:
-        # --- THIS QUERY HAS BEEN CORRECTED ---
-        # The '::jsonb' cast has been removed to let SQLAlchemy handle the type conversion,
-        # which is more reliable across different database drivers.
-        query = text("""
-            INSERT INTO public.quiz_sessions (username, session_data, last_updated)
-            VALUES (:username, :session_data, NOW())
+        # session_data is cleared so a row never carries two versions of the session.
+        conn.execute(text("""
+            INSERT INTO public.quiz_sessions (username, session_data, session_blob, snapshot_seq, last_updated)
+            VALUES (:username, NULL, :session_blob, :snapshot_seq, NOW())
             ON CONFLICT (username) DO UPDATE SET
-                session_data = EXCLUDED.session_data,
+                session_data = NULL,
+                session_blob = EXCLUDED.session_blob,
+                snapshot_seq = EXCLUDED.snapshot_seq,
                 last_updated = NOW();
-        """)
-        conn.execute(query, {"username": username, "session_data": session_data_json})
+        """), {"username": username, "session_blob": session_blob, "snapshot_seq": snapshot_seq})
+        conn.execute(text("""
+            DELETE FROM public.quiz_session_events WHERE username = :username AND seq <= :snapshot_seq
+        """), {"username": username, "snapshot_seq": snapshot_seq})
         conn.commit()
+    st.session_state.quiz_snapshot_seq = snapshot_seq
+
 # --- START: ADD THIS NEW FUNCTION ---
 def clear_quiz_state(username):
-    """Deletes a user's saved quiz session from the database upon completion."""
+    """Deletes a user's saved quiz session and its event log from the database upon completion."""
     try:
         with engine.connect() as conn:
-            query = text("DELETE FROM public.quiz_sessions WHERE username = :username")
-            conn.execute(query, {"username": username})
+            conn.execute(text("DELETE FROM public.quiz_session_events WHERE username = :username"), {"username": username})
+            conn.execute(text("DELETE FROM public.quiz_sessions WHERE username = :username"), {"username": username})
             conn.commit()
     except Exception as e:
         # Log the error but don't crash the app if the clear fails.
@@ -342,6 +759,7 @@ def login_user(username, password):
             if load_quiz_state(username):
                 st.toast("🚀 Your previous quiz session has been restored!", icon="✅")
             # --- END: NEW CODE BLOCK TO ADD INSIDE THE FUNCTION ---
+            load_skill_vector(username)
             profile = get_user_profile(username)
             display_name = profile.get('full_name') if profile and profile.get('full_name') else username
             chat_client.upsert_user({"id": username, "name": display_name})
@@ -412,11 +830,11 @@ def get_digest_data(for_date):
         digest['top_scorer'] = conn.execute(top_scorer_query, params).mappings().first()
 
         duel_winner_query = text("""
-            SELECT CASE WHEN status = 'player1_win' THEN player1_username ELSE player2_username END as winner, COUNT(*) as wins
-            FROM duels WHERE finished_at >= :start AND finished_at < :end AND status IN ('player1_win', 'player2_win')
-            GROUP BY winner ORDER BY wins DESC LIMIT 1
+            SELECT username as winner, wins FROM duel_player_stats
+            WHERE stat_date = :day AND wins > 0
+            ORDER BY wins DESC LIMIT 1
         """)
-        digest['duel_champion'] = conn.execute(duel_winner_query, params).mappings().first()
+        digest['duel_champion'] = conn.execute(duel_winner_query, {"day": for_date}).mappings().first()
         
         # --- Economy Pulse ---
         digest['coins_earned'] = conn.execute(text("SELECT SUM(amount) FROM coin_transactions WHERE timestamp >= :start AND timestamp < :end AND amount > 0"), params).scalar_one() or 0
@@ -627,6 +1045,7 @@ def get_user_role(username):
 # --- START: NEW FUNCTIONS for Content Management ---
 # Reason for change: To add backend logic for reading and updating the learning resources from the database.
 
+@app_cached(lambda topic: ("learning_content", topic))
 def get_learning_content(topic):
     """Fetches the learning content for a specific topic from the database."""
     with engine.connect() as conn:
@@ -645,7 +1064,7 @@ def update_learning_content(topic, new_content):
         """)
         conn.execute(query, {"topic": topic, "content": new_content})
         conn.commit()
-    st.cache_data.clear() # Clear the cache to ensure users see the new content
+    invalidate_app_cache("learning_content", topic) # Only this topic's cached content is now out of date
 
 # --- END: NEW FUNCTIONS for Content Management ---
 # --- START: REVISED FUNCTION get_all_users_summary ---
@@ -685,44 +1104,25 @@ def get_all_users_summary():
 # --- END: REVISED FUNCTION get_all_users_summary ---
 
 def get_all_achievements():
-    """Returns a list of all possible achievement names."""
-    # In a more advanced system, this could come from a database table.
-    # For now, we can hard-code them based on the check_and_award_achievements function.
-    
-    # --- NOTE: This list must be manually kept in sync with your achievement logic ---
-    base_achievements = ["First Step", "Century Scorer"]
-    topic_masters = [f"{topic} Master" for topic in [
-        "Sets", "Percentages", "Fractions", "Indices", "Surds", "Binary Operations",
-        "Relations and Functions", "Sequence and Series", "Word Problems", "Shapes (Geometry)",
-        "Algebra Basics", "Linear Algebra", "Logarithms", "Probability", "Binomial Theorem",
-        "Polynomial Functions", "Trigonometry", "Vectors", "Statistics", "Coordinate Geometry",
-        "Introduction to Calculus", "Number Bases", "Modulo Arithmetic"
-    ]]
-    return sorted(base_achievements + topic_masters)
+    """Returns a list of all possible achievement names (every rule in ACHIEVEMENT_RULES)."""
+    return sorted(rule.name for rule in ACHIEVEMENT_RULES)
 
 def award_achievement_to_user(username, achievement_name, badge_icon):
     """Manually inserts an achievement for a user, avoiding duplicates."""
     with engine.connect() as conn:
-        # First, check if the user already has this achievement
-        check_query = text("""
-            SELECT 1 FROM user_achievements 
-            WHERE username = :username AND achievement_name = :achievement_name
+        insert_query = text("""
+            INSERT INTO user_achievements (username, achievement_name, badge_icon)
+            VALUES (:username, :achievement_name, :badge_icon)
+            ON CONFLICT (username, achievement_name) DO NOTHING
+            RETURNING 1
         """)
-        exists = conn.execute(check_query, {"username": username, "achievement_name": achievement_name}).first()
-        
-        if not exists:
-            insert_query = text("""
-                INSERT INTO user_achievements (username, achievement_name, badge_icon)
-                VALUES (:username, :achievement_name, :badge_icon)
-            """)
-            conn.execute(insert_query, {
-                "username": username,
-                "achievement_name": achievement_name,
-                "badge_icon": badge_icon
-            })
-            conn.commit()
-            return True # Indicates success
-        return False # Indicates user already had it
+        inserted = conn.execute(insert_query, {
+            "username": username,
+            "achievement_name": achievement_name,
+            "badge_icon": badge_icon
+        }).first()
+        conn.commit()
+        return inserted is not None # False if the user already had it
 
 # --- NEW ADMIN BACKEND FUNCTIONS FOR GAME MANAGEMENT ---
 
@@ -756,35 +1156,38 @@ def force_end_duel_admin(duel_id):
 def get_all_challenges_admin():
     """Fetches all daily challenges from the database for the admin panel."""
     with engine.connect() as conn:
-        query = text("SELECT id, description, topic, target_count FROM daily_challenges ORDER BY id ASC")
+        query = text("SELECT id, description, topic, target_count, q_type FROM daily_challenges ORDER BY id ASC")
         result = conn.execute(query).mappings().fetchall()
         return [dict(row) for row in result]
 
-def add_new_challenge(description, topic, target_count):
+def add_new_challenge(description, topic, target_count, q_type=None):
     """Adds a new daily challenge to the database."""
     with engine.connect() as conn:
         query = text("""
-            INSERT INTO daily_challenges (description, topic, target_count)
-            VALUES (:desc, :topic, :target)
+            INSERT INTO daily_challenges (description, topic, target_count, q_type)
+            VALUES (:desc, :topic, :target, :q_type)
         """)
-        conn.execute(query, {"desc": description, "topic": topic, "target": target_count})
+        conn.execute(query, {"desc": description, "topic": topic, "target": target_count, "q_type": q_type})
         conn.commit()
+    invalidate_app_cache("daily_challenges")
 
-def update_challenge(challenge_id, description, topic, target_count):
+def update_challenge(challenge_id, description, topic, target_count, q_type=None):
     """Updates an existing daily challenge."""
     with engine.connect() as conn:
         query = text("""
             UPDATE daily_challenges
-            SET description = :desc, topic = :topic, target_count = :target
+            SET description = :desc, topic = :topic, target_count = :target, q_type = :q_type
             WHERE id = :id
         """)
         conn.execute(query, {
             "id": challenge_id,
             "desc": description,
             "topic": topic,
-            "target": target_count
+            "target": target_count,
+            "q_type": q_type
         })
         conn.commit()
+    invalidate_app_cache("daily_challenges")
 
 def delete_challenge(challenge_id):
     """Deletes a daily challenge from the database."""
@@ -792,6 +1195,7 @@ def delete_challenge(challenge_id):
         query = text("DELETE FROM daily_challenges WHERE id = :id")
         conn.execute(query, {"id": challenge_id})
         conn.commit()
+    invalidate_app_cache("daily_challenges")
 
 # --- NEW ADMIN BACKEND FUNCTIONS FOR ANALYTICS ---
 
@@ -824,10 +1228,10 @@ def get_performance_over_time():
     with engine.connect() as conn:
         query = text("""
             SELECT 
-                DATE_TRUNC('day', timestamp) as date,
-                AVG(CASE WHEN questions_answered > 0 THEN (score * 100.0 / questions_answered) ELSE 0 END) as average_accuracy
-            FROM quiz_results
-            GROUP BY DATE_TRUNC('day', timestamp)
+                bucket_date as date,
+                SUM(accuracy_sum) / SUM(quizzes_taken) as average_accuracy
+            FROM quiz_daily_aggregates
+            GROUP BY bucket_date
             ORDER BY date ASC;
         """)
         result = conn.execute(query).mappings().fetchall()
@@ -910,12 +1314,17 @@ def delete_user_and_all_data(username):
             # Delete from all other tables
             tables_to_delete_from = [
                 "user_achievements", "seen_questions", "user_daily_progress",
-                "user_status", "user_profiles", "quiz_results", "public.users"
+                "user_status", "user_profiles", "quiz_results", "leaderboard_best_scores", "quiz_daily_aggregates", "user_score_totals",
+                "duel_player_stats", "public.users"
             ]
             for table in tables_to_delete_from:
                 # Note: We use public.users to be specific
                 conn.execute(text(f"DELETE FROM {table} WHERE username = :username"), {"username": username})
         # The transaction is automatically committed here if no errors occurred
+    _remove_user_from_rank_indexes(username)
+    invalidate_app_cache("leaderboard")
+    invalidate_app_cache("duel_leaderboard")
+    invalidate_app_cache("user_stats", username)
     return True
 
 # --- END OF USER DELETION FUNCTION ---
@@ -956,10 +1365,10 @@ def get_daily_activity():
     with engine.connect() as conn:
         query = text("""
             SELECT 
-                DATE_TRUNC('day', timestamp)::date as date, 
-                COUNT(*) as quiz_count
-            FROM quiz_results
-            GROUP BY DATE_TRUNC('day', timestamp)
+                bucket_date as date, 
+                SUM(quizzes_taken) as quiz_count
+            FROM quiz_daily_aggregates
+            GROUP BY bucket_date
             ORDER BY date ASC;
         """)
         result = conn.execute(query).mappings().fetchall()
@@ -1789,11 +2198,13 @@ def set_active_cosmetic(username, cosmetic_id, cosmetic_type):
                     return False # Invalid type
 
                 conn.execute(update_query, {"username": username, "cosmetic_id": cosmetic_id})
-                st.toast(f"Set active {cosmetic_type} to {cosmetic_id.replace('_', ' ').title()}!")
-                return True
             else:
                 st.error("You do not own this item.")
                 return False
+    # Cosmetics are joined into every cached top-10 list, so drop those once the change is committed.
+    invalidate_app_cache("leaderboard")
+    st.toast(f"Set active {cosmetic_type} to {cosmetic_id.replace('_', ' ').title()}!")
+    return True
 
 def change_password(username, current_password, new_password):
     if not login_user(username, current_password):
@@ -1815,83 +2226,432 @@ def update_user_status(username, is_online):
         conn.execute(query, {"username": username, "is_online": is_online})
         conn.commit()
 
-# Replace your function with this NEW version
-def save_quiz_result(username, topic, score, questions_answered, coins_earned, description):
-    # This function now acts as a coordinator for all post-quiz updates.
+# --- MATERIALIZED LEADERBOARD HELPERS ---
+# Each leaderboard time filter maps to the number of days it covers (None means all time).
+LEADERBOARD_WINDOWS = {"all": None, "week": 7, "month": 30}
+
+def _bucket_window_clause(time_filter):
+    """Returns the SQL filter that keeps only the daily buckets inside the given time window (today included)."""
+    days = LEADERBOARD_WINDOWS.get(time_filter)
+    return f"AND bucket_date > CURRENT_DATE - {days}" if days else ""
+
+def _topic_board_query(time_filter):
+    """
+    SQL for one topic's leaderboard rows (username, score, questions_answered, accuracy, achieved_at), bound to :topic.
+    All-time bests come from leaderboard_best_scores; week/month bests are picked from the daily buckets.
+    """
+    days = LEADERBOARD_WINDOWS.get(time_filter)
+    if not days:
+        return """
+            SELECT username, score, questions_answered, accuracy, achieved_at FROM leaderboard_best_scores
+            WHERE topic = :topic AND time_window = 'all'
+        """
+    return f"""
+            SELECT DISTINCT ON (username)
+                username, best_score AS score, best_questions_answered AS questions_answered,
+                best_accuracy AS accuracy, best_at AS achieved_at
+            FROM quiz_daily_aggregates
+            WHERE topic = :topic AND best_accuracy IS NOT NULL {_bucket_window_clause(time_filter)}
+            ORDER BY username, best_accuracy DESC, best_questions_answered DESC, best_at ASC
+        """
+
+def _upsert_leaderboard_best_scores(conn, username, topic, score, questions_answered, achieved_at):
+    """
+    Folds a freshly inserted quiz result into leaderboard_best_scores using the caller's connection,
+    so it commits (or rolls back) together with the quiz_results insert.
+    """
+    query = text("""
+        INSERT INTO leaderboard_best_scores AS lb (topic, time_window, username, score, questions_answered, accuracy, achieved_at)
+        VALUES (:topic, 'all', :username, :score, :qa, CAST(:score AS DOUBLE PRECISION) / :qa, :achieved_at)
+        ON CONFLICT (topic, time_window, username) DO UPDATE SET
+            score = EXCLUDED.score,
+            questions_answered = EXCLUDED.questions_answered,
+            accuracy = EXCLUDED.accuracy,
+            achieved_at = EXCLUDED.achieved_at
+        WHERE EXCLUDED.accuracy > lb.accuracy
+           OR (EXCLUDED.accuracy = lb.accuracy AND EXCLUDED.questions_answered > lb.questions_answered)
+    """)
+    conn.execute(query, {"topic": topic, "username": username, "score": score, "qa": questions_answered, "achieved_at": achieved_at})
+
+def _upsert_quiz_daily_aggregate(conn, username, topic, score, questions_answered, achieved_at):
+    """
+    Adds a freshly inserted quiz result to its (day, user, topic) bucket using the caller's connection.
+    The bucket's best quiz is only replaced when the new result ranks ahead of it.
+    """
+    improves = """(b.best_accuracy IS NULL
+                OR EXCLUDED.best_accuracy > b.best_accuracy
+                OR (EXCLUDED.best_accuracy = b.best_accuracy AND EXCLUDED.best_questions_answered > b.best_questions_answered))"""
+    query = text(f"""
+        INSERT INTO quiz_daily_aggregates AS b (bucket_date, username, topic, quizzes_taken, correct_answers, questions_answered,
+                                                accuracy_sum, best_accuracy, best_score, best_questions_answered, best_at)
+        VALUES (CAST(:achieved_at AS DATE), :username, :topic, 1, :score, :qa, :accuracy_pct, :best_accuracy, :best_score, :best_qa, :best_at)
+        ON CONFLICT (bucket_date, username, topic) DO UPDATE SET
+            quizzes_taken = b.quizzes_taken + 1,
+            correct_answers = b.correct_answers + EXCLUDED.correct_answers,
+            questions_answered = b.questions_answered + EXCLUDED.questions_answered,
+            accuracy_sum = b.accuracy_sum + EXCLUDED.accuracy_sum,
+            best_accuracy = CASE WHEN {improves} THEN EXCLUDED.best_accuracy ELSE b.best_accuracy END,
+            best_score = CASE WHEN {improves} THEN EXCLUDED.best_score ELSE b.best_score END,
+            best_questions_answered = CASE WHEN {improves} THEN EXCLUDED.best_questions_answered ELSE b.best_questions_answered END,
+            best_at = CASE WHEN {improves} THEN EXCLUDED.best_at ELSE b.best_at END
+    """)
+    # A quiz with no answered questions still counts as taken, but can never be the day's best.
+    has_answers = questions_answered > 0
+    conn.execute(query, {
+        "achieved_at": achieved_at, "username": username, "topic": topic, "score": score, "qa": questions_answered,
+        "accuracy_pct": score * 100.0 / questions_answered if has_answers else 0,
+        "best_accuracy": score / questions_answered if has_answers else None,
+        "best_score": score if has_answers else None,
+        "best_qa": questions_answered if has_answers else None,
+        "best_at": achieved_at if has_answers else None,
+    })
+
+def rebuild_leaderboard_best_scores():
+    """
+    Rebuilds leaderboard_best_scores from the full quiz_results history.
+    Used to backfill the table once (week/month boards are served by quiz_daily_aggregates).
+    Returns the number of leaderboard rows written.
+    """
     with engine.connect() as conn:
-        conn.execute(text("INSERT INTO quiz_results (username, topic, score, questions_answered) VALUES (:u, :t, :s, :qa)"),
-                     {"u": username, "t": topic, "s": score, "qa": questions_answered})
-        conn.commit()
-    
-    # --- START: THIS IS THE MODIFIED LOGIC ---
-    # We only update the specific topic skill score if the quiz was NOT a WASSCE Prep session.
-    # This keeps the adaptive learning pure to each topic.
+        with conn.begin():
+            conn.execute(text("DELETE FROM leaderboard_best_scores"))
+            result = conn.execute(text("""
+                INSERT INTO leaderboard_best_scores (topic, time_window, username, score, questions_answered, accuracy, achieved_at)
+                SELECT DISTINCT ON (topic, username)
+                    topic, 'all', username, score, questions_answered,
+                    CAST(score AS DOUBLE PRECISION) / questions_answered, timestamp
+                FROM quiz_results
+                WHERE questions_answered > 0
+                ORDER BY topic, username, CAST(score AS DOUBLE PRECISION) / questions_answered DESC, questions_answered DESC, timestamp ASC
+            """))
+            return result.rowcount
+
+def rebuild_quiz_daily_aggregates():
+    """
+    Rebuilds quiz_daily_aggregates from the full quiz_results history.
+    Returns the number of daily buckets written.
+    """
+    with engine.connect() as conn:
+        with conn.begin():
+            conn.execute(text("DELETE FROM quiz_daily_aggregates"))
+            result = conn.execute(text("""
+                INSERT INTO quiz_daily_aggregates (bucket_date, username, topic, quizzes_taken, correct_answers, questions_answered,
+                                                   accuracy_sum, best_accuracy, best_score, best_questions_answered, best_at)
+                SELECT totals.bucket_date, totals.username, totals.topic, totals.quizzes_taken, totals.correct_answers,
+                       totals.questions_answered, totals.accuracy_sum, best.accuracy, best.score, best.questions_answered, best.timestamp
+                FROM (
+                    SELECT CAST(timestamp AS DATE) AS bucket_date, username, topic, COUNT(*) AS quizzes_taken,
+                           COALESCE(SUM(score), 0) AS correct_answers, COALESCE(SUM(questions_answered), 0) AS questions_answered,
+                           SUM(CASE WHEN questions_answered > 0 THEN score * 100.0 / questions_answered ELSE 0 END) AS accuracy_sum
+                    FROM quiz_results
+                    WHERE timestamp IS NOT NULL AND username IS NOT NULL AND topic IS NOT NULL
+                    GROUP BY CAST(timestamp AS DATE), username, topic
+                ) totals
+                LEFT JOIN (
+                    SELECT DISTINCT ON (CAST(timestamp AS DATE), username, topic)
+                        CAST(timestamp AS DATE) AS bucket_date, username, topic, score, questions_answered,
+                        CAST(score AS DOUBLE PRECISION) / questions_answered AS accuracy, timestamp
+                    FROM quiz_results
+                    WHERE timestamp IS NOT NULL AND questions_answered > 0
+                    ORDER BY CAST(timestamp AS DATE), username, topic,
+                             CAST(score AS DOUBLE PRECISION) / questions_answered DESC, questions_answered DESC, timestamp ASC
+                ) best USING (bucket_date, username, topic)
+            """))
+            return result.rowcount
+
+# --- USER SCORE TOTALS ---
+# user_score_totals holds each user's running correct answers, quiz count and perfect-quiz count per topic, plus an
+# overall row under SCORE_TOTALS_ALL_TOPICS. They are incremented in the same transaction as each quiz_results insert,
+# so achievement rules read counters instead of summing the user's whole history. check_user_score_totals recomputes them.
+SCORE_TOTALS_ALL_TOPICS = "__all__"
+
+# The totals as recomputed from quiz_results; bind :all_topics to SCORE_TOTALS_ALL_TOPICS.
+_USER_SCORE_TOTALS_FROM_RESULTS = """
+    SELECT username, topic, COALESCE(SUM(score), 0) AS correct_answers, COUNT(*) AS quizzes_taken,
+           COUNT(*) FILTER (WHERE questions_answered > 0 AND score = questions_answered) AS perfect_quizzes
+    FROM quiz_results WHERE username IS NOT NULL AND topic IS NOT NULL
+    GROUP BY username, topic
+    UNION ALL
+    SELECT username, :all_topics, COALESCE(SUM(score), 0), COUNT(*),
+           COUNT(*) FILTER (WHERE questions_answered > 0 AND score = questions_answered)
+    FROM quiz_results WHERE username IS NOT NULL
+    GROUP BY username
+"""
+
+def _increment_user_score_totals(conn, username, topic, score, questions_answered):
+    """Adds one quiz to the user's topic and overall totals on the caller's connection."""
+    conn.execute(text("""
+        INSERT INTO user_score_totals AS t (username, topic, correct_answers, quizzes_taken, perfect_quizzes)
+        VALUES (:username, :topic, :score, 1, :perfect), (:username, :all_topics, :score, 1, :perfect)
+        ON CONFLICT (username, topic) DO UPDATE SET
+            correct_answers = t.correct_answers + EXCLUDED.correct_answers,
+            quizzes_taken = t.quizzes_taken + 1,
+            perfect_quizzes = t.perfect_quizzes + EXCLUDED.perfect_quizzes
+    """), {"username": username, "topic": topic, "score": score, "all_topics": SCORE_TOTALS_ALL_TOPICS,
+           "perfect": int(questions_answered > 0 and score == questions_answered)})
+
+def check_user_score_totals(repair=False):
+    """
+    Recomputes user_score_totals from quiz_results and returns the rows that disagree, as dicts with the stored
+    and expected counts (None where a row is missing). With repair=True those rows are rewritten or deleted.
+    """
+    with engine.connect() as conn:
+        with conn.begin():
+            if repair:
+                # Holds back counter increments until the repair commits. Quizzes still in flight are not in the
+                # recomputed totals and add their own increment on top once it has.
+                conn.execute(text("LOCK TABLE user_score_totals IN SHARE ROW EXCLUSIVE MODE"))
+            mismatches = conn.execute(text(f"""
+                SELECT COALESCE(e.username, s.username) AS username, COALESCE(e.topic, s.topic) AS topic,
+                       s.correct_answers AS stored_correct, e.correct_answers AS expected_correct,
+                       s.quizzes_taken AS stored_quizzes, e.quizzes_taken AS expected_quizzes,
+                       s.perfect_quizzes AS stored_perfect, e.perfect_quizzes AS expected_perfect
+                FROM ({_USER_SCORE_TOTALS_FROM_RESULTS}) e
+                FULL OUTER JOIN user_score_totals s ON s.username = e.username AND s.topic = e.topic
+                WHERE s.correct_answers IS DISTINCT FROM e.correct_answers OR s.quizzes_taken IS DISTINCT FROM e.quizzes_taken
+                   OR s.perfect_quizzes IS DISTINCT FROM e.perfect_quizzes
+                ORDER BY 1, 2
+            """), {"all_topics": SCORE_TOTALS_ALL_TOPICS}).mappings().fetchall()
+            if repair and mismatches:
+                conn.execute(text(f"""
+                    INSERT INTO user_score_totals AS t (username, topic, correct_answers, quizzes_taken, perfect_quizzes)
+                    SELECT * FROM ({_USER_SCORE_TOTALS_FROM_RESULTS}) expected
+                    ON CONFLICT (username, topic) DO UPDATE SET
+                        correct_answers = EXCLUDED.correct_answers,
+                        quizzes_taken = EXCLUDED.quizzes_taken,
+                        perfect_quizzes = EXCLUDED.perfect_quizzes
+                    WHERE t.correct_answers <> EXCLUDED.correct_answers OR t.quizzes_taken <> EXCLUDED.quizzes_taken
+                       OR t.perfect_quizzes <> EXCLUDED.perfect_quizzes
+                """), {"all_topics": SCORE_TOTALS_ALL_TOPICS})
+                conn.execute(text("""
+                    DELETE FROM user_score_totals s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM quiz_results r
+                        WHERE r.username = s.username AND (s.topic = :all_topics OR r.topic = s.topic)
+                    )
+                """), {"all_topics": SCORE_TOTALS_ALL_TOPICS})
+    return [dict(row) for row in mismatches]
+
+# --- QUIZ COMPLETION PIPELINE ---
+# Everything a finished quiz writes (the result row, leaderboard tables, pending skill scores, daily challenge
+# progress, achievements and every coin award) runs on one connection in one transaction, so a quiz is recorded
+# completely or not at all. In-memory state (rank indexes, caches, toasts) is only touched once it has committed.
+DAILY_CHALLENGE_COINS = 50
+
+def _write_quiz_completion(conn, username, topic, score, questions_answered, coins_earned, description, skill_vector, seen_question_ids=()):
+    """
+    Runs every database write for a finished quiz on the caller's connection.
+    Returns {"achieved_at", "challenge_completed", "achievements", "skill_scores"} for the post-commit steps.
+    """
+    achieved_at = conn.execute(
+        text("INSERT INTO quiz_results (username, topic, score, questions_answered) VALUES (:u, :t, :s, :qa) RETURNING timestamp"),
+        {"u": username, "t": topic, "s": score, "qa": questions_answered}
+    ).scalar_one()
+    _increment_user_score_totals(conn, username, topic, score, questions_answered)
+    if questions_answered > 0:
+        _upsert_leaderboard_best_scores(conn, username, topic, score, questions_answered, achieved_at)
+    _upsert_quiz_daily_aggregate(conn, username, topic, score, questions_answered, achieved_at)
+    skill_scores = _save_skill_results(conn, username, skill_vector.pending) if skill_vector.pending else {}
+    if seen_question_ids:
+        _save_seen_questions(conn, username, seen_question_ids)
+
+    coin_changes = [(coins_earned, description)] if coins_earned > 0 else []
+    challenge_completed = _advance_daily_challenge(conn, username, topic, score)
+    if challenge_completed:
+        coin_changes.append((DAILY_CHALLENGE_COINS, "Daily Challenge Completed!"))
+    achievements = _award_quiz_achievements(conn, username)
+    coin_changes += [(rule.coins, f"Achievement Unlocked: {rule.name}") for rule in achievements]
+    if coin_changes:
+        _apply_coin_changes(conn, username, coin_changes)
+    return {"achieved_at": achieved_at, "challenge_completed": challenge_completed, "achievements": achievements, "skill_scores": skill_scores}
+
+def record_quiz_completion(username, topic, score, questions_answered, coins_earned, description):
+    """Records a finished quiz and all of its rewards in a single transaction."""
+    skill_vector = get_skill_vector(username)
+    # Adaptive learning stays pure to each topic, so WASSCE Prep sessions don't move any skill score.
     if topic != "WASSCE Prep":
         update_skill_score(username, topic, score, questions_answered)
-    # --- END: MODIFIED LOGIC ---
-    
-    # Update the student's coin balance
+
+    # The seen questions still buffered from this round are written with the result too.
+    seen_filter = st.session_state.get("seen_question_filter")
+    seen_question_ids = list(seen_filter.pending) if seen_filter is not None and seen_filter.username == username else []
+
+    with engine.connect() as conn:
+        with conn.begin():
+            outcome = _write_quiz_completion(conn, username, topic, score, questions_answered, coins_earned, description, skill_vector, seen_question_ids)
+
+    # The pending skill results and seen questions were written with the result.
+    skill_vector.saved(outcome["skill_scores"])
+    if seen_question_ids:
+        seen_filter.pending = seen_filter.pending[len(seen_question_ids):]
+    # Once committed, fold the result into any in-memory rank indexes so rival cards update immediately.
+    _apply_quiz_result_to_rank_indexes(username, topic, score, questions_answered, outcome["achieved_at"])
+    invalidate_app_cache("leaderboard", topic)
+    invalidate_app_cache("leaderboard", OVERALL_LEADERBOARD)
+    invalidate_app_cache("user_stats", username)
+    if outcome["challenge_completed"]:
+        st.session_state.challenge_completed_toast = True
+    if outcome["achievements"]:
+        st.session_state.achievement_unlocked_toast = outcome["achievements"][-1].name
+
+def _replay_legacy_quiz_completion(conn, username, topic, score, questions_answered, coins_earned, description):
+    """
+    Sends the statements the per-call save_quiz_result sequence used to send, in order, on the caller's connection.
+    Returns {"connections", "transactions"}, counting the engine.connect() blocks and commits that sequence opened.
+    """
+    tally = {"connections": 0, "transactions": 0}
+    def open_block(commits=1):
+        tally["connections"] += 1
+        tally["transactions"] += commits
+
+    def coin_update(amount, coin_description):
+        # update_coin_balance(): its own connection and transaction per call
+        open_block()
+        conn.execute(text("""
+            INSERT INTO user_profiles (username, coins) VALUES (:username, :initial_coins)
+            ON CONFLICT (username) DO UPDATE SET coins = COALESCE(user_profiles.coins, 0) + :amount
+        """), {"username": username, "initial_coins": 100 + amount, "amount": amount})
+        conn.execute(text("INSERT INTO coin_transactions (username, amount, description) VALUES (:username, :amount, :description)"),
+                     {"username": username, "amount": amount, "description": coin_description})
+
+    # save_quiz_result(): the result and leaderboard rows
+    open_block()
+    achieved_at = conn.execute(
+        text("INSERT INTO quiz_results (username, topic, score, questions_answered) VALUES (:u, :t, :s, :qa) RETURNING timestamp"),
+        {"u": username, "t": topic, "s": score, "qa": questions_answered}
+    ).scalar_one()
+    if questions_answered > 0:
+        _upsert_leaderboard_best_scores(conn, username, topic, score, questions_answered, achieved_at)
+    _upsert_quiz_daily_aggregate(conn, username, topic, score, questions_answered, achieved_at)
+
+    # update_skill_score() + flush_skill_vector(): the absolute score from the session's in-memory vector
+    if topic != "WASSCE Prep" and questions_answered > 0:
+        open_block()
+        new_skill = _next_skill_score(50, score / questions_answered * 100)
+        conn.execute(text("""
+            INSERT INTO user_skill_levels (username, topic, skill_score)
+            SELECT :username, topic, skill_score
+            FROM unnest(CAST(:topics AS TEXT[]), CAST(:scores AS INTEGER[])) AS changed(topic, skill_score)
+            ON CONFLICT (username, topic) DO UPDATE SET skill_score = EXCLUDED.skill_score
+        """), {"username": username, "topics": [topic], "scores": [new_skill]})
+
     if coins_earned > 0:
-        update_coin_balance(username, coins_earned, description)
+        coin_update(coins_earned, description)
 
-    # Update other gamification systems (challenges and achievements)
-    update_gamification_progress(username, topic, score)
-@st.cache_data(ttl=300) # Cache for 300 seconds (5 minutes)
-def get_top_scores(topic, time_filter="all"):
+    # update_daily_challenge_progress(): get_or_create_daily_challenge() then the progress updates
+    today = datetime.now().date()
+    progress_query = text("""
+        SELECT p.progress_count, p.is_completed, c.topic, c.target_count
+        FROM user_daily_progress p JOIN daily_challenges c ON p.challenge_id = c.id
+        WHERE p.username = :username AND p.challenge_date = :today
+    """)
+    open_block(commits=0)
+    challenge = conn.execute(progress_query, {"username": username, "today": today}).mappings().first()
+    if challenge is None:
+        challenge_ids = [row[0] for row in conn.execute(text("SELECT id FROM daily_challenges")).fetchall()]
+        if challenge_ids:
+            conn.execute(text("INSERT INTO user_daily_progress (username, challenge_date, challenge_id) VALUES (:username, :today, :challenge_id)"),
+                         {"username": username, "today": today, "challenge_id": random.choice(challenge_ids)})
+            tally["transactions"] += 1
+            open_block(commits=0) # The recursive re-query
+            challenge = conn.execute(progress_query, {"username": username, "today": today}).mappings().first()
+    if challenge and not challenge["is_completed"]:
+        open_block(commits=0)
+        if challenge["topic"] == "Any" or challenge["topic"] == topic:
+            tally["transactions"] += 1
+            new_progress = (challenge["progress_count"] or 0) + score
+            conn.execute(text("UPDATE user_daily_progress SET progress_count = :new_progress WHERE username = :username AND challenge_date = :today"),
+                         {"new_progress": new_progress, "username": username, "today": today})
+            if new_progress >= challenge["target_count"]:
+                conn.execute(text("UPDATE user_daily_progress SET is_completed = TRUE WHERE username = :username AND challenge_date = :today"),
+                             {"username": username, "today": today})
+                coin_update(DAILY_CHALLENGE_COINS, "Daily Challenge Completed!")
+
+    # check_and_award_achievements(): the three original checks, each re-summing quiz_results
+    open_block()
+    existing_set = {row[0] for row in conn.execute(text("SELECT achievement_name FROM user_achievements WHERE username = :username"), {"username": username}).fetchall()}
+    awards = []
+    if "First Step" not in existing_set:
+        awards.append(("First Step", "👟"))
+    if "Century Scorer" not in existing_set:
+        total_score = conn.execute(text("SELECT SUM(score) FROM quiz_results WHERE username = :u"), {"u": username}).scalar_one() or 0
+        if total_score >= 100:
+            awards.append(("Century Scorer", "💯"))
+    achievement_name = f"{topic} Master"
+    if achievement_name not in existing_set:
+        topic_score = conn.execute(text("SELECT SUM(score) FROM quiz_results WHERE username = :u AND topic = :t"), {"u": username, "t": topic}).scalar_one() or 0
+        if topic_score >= 25:
+            awards.append((achievement_name, "🎓"))
+    for name, badge_icon in awards:
+        conn.execute(text("INSERT INTO user_achievements (username, achievement_name, badge_icon) VALUES (:u, :n, :b) ON CONFLICT DO NOTHING"),
+                     {"u": username, "n": name, "b": badge_icon})
+        coin_update(100, f"Achievement Unlocked: {name}")
+    return tally
+
+def run_quiz_completion_benchmark(username, runs=20):
+    """
+    Replays the database side of a finished quiz for `username` twice per run, once as the old per-call
+    sequence and once through _write_quiz_completion, each inside a transaction that is rolled back.
+    Statements are counted with the same cursor listener. Returns a JSON-serialisable report.
+    """
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    skill_vector = SkillVector(username, {})
+    skill_vector.record("Sets", 80.0) # One pending skill result, as after a topic quiz
+    quiz = ("Sets", 4, 5, 20, "Quiz completion benchmark")
+    def replay_pipeline(conn):
+        _write_quiz_completion(conn, username, *quiz, skill_vector)
+        return {"connections": 1, "transactions": 1}
+
+    pipelines = {
+        "legacy per-call": lambda conn: _replay_legacy_quiz_completion(conn, username, *quiz),
+        "single transaction": replay_pipeline,
+    }
+    samples = {name: {"timings_ms": [], "statements": [], "tally": None} for name in pipelines}
     with engine.connect() as conn:
-        time_clause = ""
-        if time_filter == "week": time_clause = "AND timestamp >= NOW() - INTERVAL '7 days'"
-        elif time_filter == "month": time_clause = "AND timestamp >= NOW() - INTERVAL '30 days'"
-        query = text(f"""
-            WITH UserBestScores AS (
-                SELECT username, score, questions_answered, timestamp,
-                       ROW_NUMBER() OVER(PARTITION BY username ORDER BY (CAST(score AS REAL) / questions_answered) DESC, questions_answered DESC, timestamp ASC) as rn
-                FROM quiz_results WHERE topic = :topic AND questions_answered > 0 {time_clause}
-            )
-            SELECT username, score, questions_answered FROM UserBestScores WHERE rn = 1
-            ORDER BY (CAST(score AS REAL) / questions_answered) DESC, questions_answered DESC, timestamp ASC LIMIT 10;
-        """)
-        result = conn.execute(query, {"topic": topic})
-        return result.fetchall()
+        sqlalchemy.event.listen(conn, "before_cursor_execute", count_statement)
+        try:
+            for _ in range(runs):
+                for name, replay in pipelines.items():
+                    statements.clear()
+                    transaction = conn.begin()
+                    started = time.perf_counter()
+                    try:
+                        samples[name]["tally"] = replay(conn)
+                        samples[name]["timings_ms"].append((time.perf_counter() - started) * 1000)
+                    finally:
+                        transaction.rollback()
+                    samples[name]["statements"].append(len(statements))
+        finally:
+            sqlalchemy.event.remove(conn, "before_cursor_execute", count_statement)
+
+    results = []
+    for name, sample in samples.items():
+        timings_ms = sorted(sample["timings_ms"])
+        results.append({
+            "pipeline": name, "connections": sample["tally"]["connections"], "transactions": sample["tally"]["transactions"],
+            "statements": max(sample["statements"]),
+            "p50_ms": round(timings_ms[len(timings_ms) // 2], 2), "max_ms": round(timings_ms[-1], 2),
+        })
+    return {"generated_at": datetime.now().isoformat(timespec="seconds"), "username": username, "runs": runs, "results": results}
 
-@st.cache_data(ttl=300) # Cache for 5 minutes
+@app_cached(lambda: ("duel_leaderboard",))
 def get_top_duel_players():
     """Fetches the top 5 players based on their total duel wins."""
     with engine.connect() as conn:
         query = text("""
-            WITH wins AS (
-                SELECT player1_username AS username, 1 AS win FROM duels WHERE status = 'player1_win'
-                UNION ALL
-                SELECT player2_username AS username, 1 AS win FROM duels WHERE status = 'player2_win'
-            )
-            SELECT username, SUM(win) as total_wins
-            FROM wins
+            SELECT username, SUM(wins) as total_wins
+            FROM duel_player_stats
             GROUP BY username
+            HAVING SUM(wins) > 0
             ORDER BY total_wins DESC
             LIMIT 5;
         """)
         result = conn.execute(query).mappings().fetchall()
         return [dict(row) for row in result]
-@st.cache_data(ttl=300) # Cache for 5 minutes
-def get_overall_top_scores(time_filter="all"):
-    """Fetches the top 10 users based on the sum of all their correct answers."""
-    with engine.connect() as conn:
-        time_clause = ""
-        if time_filter == "week": time_clause = "WHERE timestamp >= NOW() - INTERVAL '7 days'"
-        elif time_filter == "month": time_clause = "WHERE timestamp >= NOW() - INTERVAL '30 days'"
-        
-        query = text(f"""
-            SELECT username, SUM(score) as total_score
-            FROM quiz_results
-            {time_clause}
-            GROUP BY username
-            ORDER BY total_score DESC
-            LIMIT 10;
-        """)
-        result = conn.execute(query)
-        return result.fetchall()
-
-@st.cache_data(ttl=60) # Cache for 60 seconds
+@app_cached(lambda username: ("user_stats", username))
 def get_user_stats(username):
     with engine.connect() as conn:
         total_quizzes = conn.execute(text("SELECT COUNT(*) FROM quiz_results WHERE username = :username"), {"username": username}).scalar_one()
@@ -1901,75 +2661,133 @@ def get_user_stats(username):
         top_score_str = f"{top_result[0]}/{top_result[1]}" if top_result and top_result[1] > 0 else "N/A"
         return total_quizzes, last_score_str, top_score_str
 
-@st.cache_data(ttl=60)
+@app_cached(lambda username: ("user_stats", username))
 def get_user_quiz_history(username):
     try:
         with engine.connect() as conn:
             result = conn.execute(text("SELECT topic, score, questions_answered, timestamp FROM quiz_results WHERE username = :username ORDER BY timestamp DESC"), {"username": username})
-            return result.mappings().fetchall()
+            return [dict(row) for row in result.mappings().fetchall()]
     except Exception as e:
         st.error(f"Error fetching quiz history: {e}")
         return []
 
+# --- DAILY CHALLENGE ASSIGNMENT ---
+# Each day's challenges are assigned to every recently active user in bulk when the day rolls over, so the
+# dashboard and the quiz pipeline only ever read one user_daily_progress row by its primary key. The catalogue
+# of challenges is small and rarely changes, so it is cached process-wide and joined in Python.
+DAILY_CHALLENGE_ACTIVE_DAYS = 30
+
+@app_cached(lambda: ("daily_challenges",))
+def get_daily_challenge_catalogue():
+    """Every daily challenge as {id: {"description", "topic", "target_count", "q_type"}}."""
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, description, topic, target_count, q_type FROM daily_challenges")).mappings().fetchall()
+        return {row['id']: {key: row[key] for key in ("description", "topic", "target_count", "q_type")} for row in rows}
+
+def assign_daily_challenges(for_date):
+    """
+    Assigns a random challenge for `for_date` to every active user seen in the last DAILY_CHALLENGE_ACTIVE_DAYS
+    days who has none yet, in one statement. Safe to run repeatedly; returns how many users were assigned.
+    """
+    with engine.connect() as conn:
+        assigned = conn.execute(text("""
+            INSERT INTO user_daily_progress (username, challenge_date, challenge_id)
+            SELECT u.username, :for_date, c.ids[1 + floor(random() * cardinality(c.ids))::int]
+            FROM public.users u
+            JOIN user_status s ON s.username = u.username
+            CROSS JOIN (SELECT array_agg(id) AS ids FROM daily_challenges) c
+            WHERE u.is_active IS NOT FALSE AND cardinality(c.ids) > 0
+              AND s.last_seen > NOW() - make_interval(days => :active_days)
+            ON CONFLICT (username, challenge_date) DO NOTHING
+        """), {"for_date": for_date, "active_days": DAILY_CHALLENGE_ACTIVE_DAYS}).rowcount
+        conn.commit()
+    return assigned
+
+def run_daily_challenge_rollover(force=False):
+    """
+    Assigns today's and tomorrow's challenges once per day (or again when forced), so users arriving after
+    midnight already have a row. Tomorrow's pass also covers anyone who joined since the last rollover.
+    Returns how many users were assigned.
+    """
+    today = date.today()
+    if not force and get_config_value("last_challenge_rollover_date") == today.isoformat():
+        return 0
+    assigned = sum(assign_daily_challenges(day) for day in (today, today + timedelta(days=1)))
+    set_config_value("last_challenge_rollover_date", today.isoformat())
+    return assigned
+
 def get_or_create_daily_challenge(username):
-    """Fetches or assigns a daily challenge for a user."""
+    """
+    Today's challenge for a user, or None if there are no challenges. Users the rollover missed (new or
+    returning after a long break) are assigned one here.
+    """
+    catalogue = get_daily_challenge_catalogue()
+    if not catalogue: return None
     today = datetime.now().date()
     with engine.connect() as conn:
-        progress_query = text("""
-            SELECT p.progress_count, p.is_completed, c.description, c.topic, c.target_count 
-            FROM user_daily_progress p JOIN daily_challenges c ON p.challenge_id = c.id
-            WHERE p.username = :username AND p.challenge_date = :today
-        """)
-        result = conn.execute(progress_query, {"username": username, "today": today}).mappings().first()
-        
-        if result:
-            return dict(result)
-        else:
-            challenge_ids_query = text("SELECT id FROM daily_challenges")
-            challenge_ids = [row[0] for row in conn.execute(challenge_ids_query).fetchall()]
-            if not challenge_ids: return None
-            
-            new_challenge_id = random.choice(challenge_ids)
-            
-            insert_query = text("""
+        progress = conn.execute(text("""
+            SELECT challenge_id, progress_count, is_completed FROM user_daily_progress
+            WHERE username = :username AND challenge_date = :today
+        """), {"username": username, "today": today}).mappings().first()
+        if progress is None:
+            # The no-op update makes RETURNING give back the row another session may have just inserted.
+            progress = conn.execute(text("""
                 INSERT INTO user_daily_progress (username, challenge_date, challenge_id)
                 VALUES (:username, :today, :challenge_id)
-            """)
-            conn.execute(insert_query, {"username": username, "today": today, "challenge_id": new_challenge_id})
+                ON CONFLICT (username, challenge_date) DO UPDATE SET challenge_id = user_daily_progress.challenge_id
+                RETURNING challenge_id, progress_count, is_completed
+            """), {"username": username, "today": today, "challenge_id": random.choice(list(catalogue))}).mappings().one()
             conn.commit()
-            
-            return get_or_create_daily_challenge(username)
-
-def update_daily_challenge_progress(username, topic, score):
-    """Updates daily challenge progress after a quiz."""
-    today = datetime.now().date()
+    if progress['challenge_id'] not in catalogue:
+        invalidate_app_cache("daily_challenges") # Added since the catalogue was cached
+        catalogue = get_daily_challenge_catalogue()
+    challenge = catalogue.get(progress['challenge_id'])
+    if challenge is None: return None
+    return {**challenge, "progress_count": progress['progress_count'] or 0, "is_completed": bool(progress['is_completed'])}
+
+def get_challenge_cell(username, topic):
+    """
+    The question cell today's challenge targets in a quiz on `topic`: {"topic", "q_type", "remaining"}, where
+    remaining is how many more correct answers the challenge needs. None if the challenge does not target one.
+    """
     challenge = get_or_create_daily_challenge(username)
-    
-    if not challenge or challenge['is_completed']:
-        return
-
-    with engine.connect() as conn:
-        if challenge['topic'] == 'Any' or challenge['topic'] == topic:
-            new_progress = challenge['progress_count'] + score
-            
-            conn.execute(text("""
-                UPDATE user_daily_progress SET progress_count = :new_progress 
-                WHERE username = :username AND challenge_date = :today
-            """), {"new_progress": new_progress, "username": username, "today": today})
+    if not challenge or challenge['is_completed'] or challenge['topic'] != topic or (topic, challenge['q_type']) not in QUESTION_TYPE_DIFFICULTY:
+        return None
+    return {"topic": topic, "q_type": challenge['q_type'], "remaining": challenge['target_count'] - challenge['progress_count']}
 
-            if new_progress >= challenge['target_count']:
-                conn.execute(text("""
-                    UPDATE user_daily_progress SET is_completed = TRUE 
-                    WHERE username = :username AND challenge_date = :today
-                """), {"username": username, "today": today})
-                
-                # --- NEW COIN REWARD LOGIC ---
-                update_coin_balance(username, 50, "Daily Challenge Completed!")
-                # --- END OF NEW LOGIC ---
+def get_challenge_q_type(topic):
+    """The q_type to serve next in this session's quiz on `topic` while its daily challenge still needs correct answers."""
+    cell = st.session_state.get("challenge_cell")
+    if cell and cell["topic"] == topic and st.session_state.get("quiz_score", 0) < cell["remaining"]:
+        return cell["q_type"]
+    return None
 
-                st.session_state.challenge_completed_toast = True
-            
-            conn.commit()
+def _advance_daily_challenge(conn, username, topic, score):
+    """
+    Adds a quiz's correct answers to today's challenge on the caller's connection. The row is usually assigned
+    by the rollover or by get_challenge_cell() when a Solo Quiz starts, but not for WASSCE Prep and Advanced
+    Combo starts, quizzes finishing after midnight or sessions resumed from an earlier day, so a missing row
+    is assigned here first. Returns True if this quiz completed it.
+    """
+    today = datetime.now().date()
+    # The NOT EXISTS check is a primary-key probe, so the random pick only runs when the row is missing.
+    conn.execute(text("""
+        INSERT INTO user_daily_progress (username, challenge_date, challenge_id)
+        SELECT :username, :today, id FROM daily_challenges
+        WHERE NOT EXISTS (SELECT 1 FROM user_daily_progress WHERE username = :username AND challenge_date = :today)
+        ORDER BY random() LIMIT 1
+        ON CONFLICT (username, challenge_date) DO NOTHING
+    """), {"username": username, "today": today})
+    completed = conn.execute(text("""
+        UPDATE user_daily_progress p
+        SET progress_count = COALESCE(p.progress_count, 0) + :score,
+            is_completed = COALESCE(p.progress_count, 0) + :score >= c.target_count
+        FROM daily_challenges c
+        WHERE p.challenge_id = c.id AND p.username = :username AND p.challenge_date = :today
+          AND NOT COALESCE(p.is_completed, FALSE) AND (c.topic = 'Any' OR c.topic = :topic)
+        RETURNING p.is_completed
+    """), {"username": username, "today": today, "topic": topic, "score": score}).scalar_one_or_none()
+    return bool(completed)
 
 def get_topic_performance(username):
     history = get_user_quiz_history(username)
@@ -1979,144 +2797,221 @@ def get_topic_performance(username):
     performance['Accuracy'] = (performance['Score'] / performance['Total'] * 100).fillna(0)
     return performance.sort_values(by="Accuracy", ascending=False)
 
-@st.cache_data(ttl=300)
-def get_user_rank(username, topic, time_filter="all"):
-    with engine.connect() as conn:
-        time_clause = ""
-        if time_filter == "week": time_clause = "AND timestamp >= NOW() - INTERVAL '7 days'"
-        elif time_filter == "month": time_clause = "AND timestamp >= NOW() - INTERVAL '30 days'"
-        query = text(f"""
-            WITH UserBestScores AS (
-                SELECT username, score, questions_answered, timestamp,
-                       ROW_NUMBER() OVER(PARTITION BY username ORDER BY (CAST(score AS REAL) / questions_answered) DESC, questions_answered DESC, timestamp ASC) as rn
-                FROM quiz_results WHERE topic = :topic AND questions_answered > 0 {time_clause}
-            ), RankedScores AS (
-                SELECT username, RANK() OVER (ORDER BY (CAST(score AS REAL) / questions_answered) DESC, questions_answered DESC, timestamp ASC) as rank
-                FROM UserBestScores WHERE rn = 1
-            )
-            SELECT rank FROM RankedScores WHERE username = :username;
-        """)
-        result = conn.execute(query, {"topic": topic, "username": username}).scalar_one_or_none()
-        return result if result else "N/A"
+# --- IN-PROCESS LEADERBOARD RANK INDEX ---
+# The rival card only needs the user's rank, their two neighbours and the player count, so each
+# leaderboard is kept in memory as a sorted key list and answered with binary search.
+OVERALL_LEADERBOARD = "__overall__"
+RANK_INDEX_REFRESH_SECONDS = 3600 # Reload from the database hourly so expired week/month entries drop out
+
+def _topic_rank_key(accuracy, questions_answered, achieved_at):
+    """Sort key for a topic board: best accuracy first, then more questions, then earliest time."""
+    return (-accuracy, -questions_answered, achieved_at.timestamp() if achieved_at else float("inf"))
 
-# --- NEW FUNCTIONS FOR RIVAL SNAPSHOT FEATURE ---
+def _overall_rank_key(username, total_score):
+    """Sort key for the overall board: most correct answers first, ties broken by username."""
+    return (-(total_score or 0), username)
 
-def get_rival_snapshot(username, topic, time_filter="all"):
+class LeaderboardRankIndex:
     """
-    Fetches the user's rank, total players, and their immediate rivals (above and below) for a specific topic.
+    A sorted list of (sort_key, username) pairs for one leaderboard.
+    Lower keys rank higher, so position 0 is first place and rank lookups are a bisect.
     """
-    with engine.connect() as conn:
-        time_clause = ""
-        if time_filter == "week":
-            time_clause = "AND timestamp >= NOW() - INTERVAL '7 days'"
-        elif time_filter == "month":
-            time_clause = "AND timestamp >= NOW() - INTERVAL '30 days'"
-
-        # THIS SQL QUERY HAS BEEN CORRECTED FOR RELIABILITY
-        query = text(f"""
-            WITH UserBestScores AS (
-                SELECT
-                    username, score, questions_answered, timestamp,
-                    ROW_NUMBER() OVER(PARTITION BY username ORDER BY (CAST(score AS REAL) / questions_answered) DESC, questions_answered DESC, timestamp ASC) as rn
-                FROM quiz_results
-                WHERE topic = :topic AND questions_answered > 0 {time_clause}
-            ),
-            RankedScores AS (
-                SELECT
-                    username,
-                    RANK() OVER (ORDER BY (CAST(score AS REAL) / questions_answered) DESC, questions_answered DESC, timestamp ASC) as rank
-                FROM UserBestScores
-                WHERE rn = 1
-            ),
-            CurrentUser AS (
-                SELECT rank FROM RankedScores WHERE username = :username
-            )
-            SELECT username, rank
-            FROM RankedScores
-            WHERE rank IN ((SELECT rank FROM CurrentUser) - 1, (SELECT rank FROM CurrentUser), (SELECT rank FROM CurrentUser) + 1)
-            ORDER BY rank;
-        """)
+    def __init__(self, entries):
+        self._lock = threading.Lock()
+        self._key_by_user = dict(entries)
+        self._keys = sorted((key, username) for username, key in self._key_by_user.items())
+        self.loaded_at = time.time()
 
-        result = conn.execute(query, {"topic": topic, "username": username}).mappings().fetchall()
-        
-        snapshot = {"user_rank": None, "rival_above": None, "rival_below": None}
-        if not result:
-            return None
+    def __len__(self):
+        return len(self._keys)
 
-        user_row = next((r for r in result if r['username'] == username), None)
-        if not user_row:
-            return None
-        snapshot['user_rank'] = user_row['rank']
+    def update(self, username, new_key_for):
+        """
+        Moves a user to new_key_for(old_key), where old_key is None if they are not on the board yet and a new
+        key of None takes them off it. The read and the move happen under one lock, so concurrent updates are not lost.
+        """
+        with self._lock:
+            old_key = self._key_by_user.get(username)
+            key = new_key_for(old_key)
+            if key == old_key:
+                return
+            if old_key is not None:
+                del self._keys[bisect.bisect_left(self._keys, (old_key, username))]
+                del self._key_by_user[username]
+            if key is not None:
+                bisect.insort(self._keys, (key, username))
+                self._key_by_user[username] = key
+
+    def remove(self, username):
+        self.update(username, lambda old_key: None)
+
+    def _rank_of(self, key):
+        # Players with identical keys share a rank, matching SQL's RANK().
+        return bisect.bisect_left(self._keys, (key,)) + 1
+
+    def snapshot(self, username):
+        """Returns {"user_rank", "rival_above", "rival_below"}; each rival is {"username", "rank"} or None."""
+        with self._lock:
+            key = self._key_by_user.get(username)
+            if key is None:
+                return None
+            position = bisect.bisect_left(self._keys, (key, username))
+            snapshot = {"user_rank": self._rank_of(key), "rival_above": None, "rival_below": None}
+            if position > 0:
+                above_key, above_user = self._keys[position - 1]
+                snapshot['rival_above'] = {'username': above_user, 'rank': self._rank_of(above_key)}
+            if position + 1 < len(self._keys):
+                below_key, below_user = self._keys[position + 1]
+                snapshot['rival_below'] = {'username': below_user, 'rank': self._rank_of(below_key)}
+            return snapshot
 
-        for row in result:
-            if row['rank'] < snapshot['user_rank']:
-                snapshot['rival_above'] = {'username': row['username'], 'rank': row['rank']}
-            elif row['rank'] > snapshot['user_rank']:
-                snapshot['rival_below'] = {'username': row['username'], 'rank': row['rank']}
-        
-        return snapshot
-def get_total_overall_players(time_filter="all"):
-    """Gets the total number of unique players on the overall leaderboard."""
-    with engine.connect() as conn:
-        time_clause = ""
-        if time_filter == "week": time_clause = "WHERE timestamp >= NOW() - INTERVAL '7 days'"
-        elif time_filter == "month": time_clause = "WHERE timestamp >= NOW() - INTERVAL '30 days'"
-        query = text(f"SELECT COUNT(DISTINCT username) FROM quiz_results {time_clause}")
-        return conn.execute(query).scalar_one() or 0
-
-def get_overall_rival_snapshot(username, time_filter="all"):
-    """Fetches the user's overall rank and their immediate rivals."""
+@st.cache_resource
+def _get_rank_index_registry():
+    """
+    Process-wide store of rank index slots, keyed by (board, time_filter). Each slot holds the loaded index, its own
+    build lock, and the users updated while a build is running ("touched" is None when no build is running).
+    """
+    return {"lock": threading.Lock(), "slots": {}}
+
+def _load_rank_index_entries(board, time_filter, usernames=None):
+    """Reads every player's sort key for one leaderboard (or just those of `usernames`) from the database."""
+    user_filter = "" if usernames is None else "AND username = ANY(:usernames)"
+    params = {"topic": board, "usernames": list(usernames or [])}
     with engine.connect() as conn:
-        time_clause = ""
-        if time_filter == "week": time_clause = "WHERE timestamp >= NOW() - INTERVAL '7 days'"
-        elif time_filter == "month": time_clause = "WHERE timestamp >= NOW() - INTERVAL '30 days'"
-        
-        # THIS SQL QUERY HAS BEEN CORRECTED TO USE THE RELIABLE SUBQUERY SYNTAX
-        query = text(f"""
-            WITH PlayerTotals AS (
-                SELECT username, SUM(score) as total_score
-                FROM quiz_results {time_clause}
+        if board == OVERALL_LEADERBOARD:
+            query = text(f"""
+                SELECT username, SUM(correct_answers) AS total_score FROM quiz_daily_aggregates
+                WHERE TRUE {_bucket_window_clause(time_filter)} {user_filter}
                 GROUP BY username
-            ),
-            RankedScores AS (
-                SELECT username, RANK() OVER (ORDER BY total_score DESC, username ASC) as rank
-                FROM PlayerTotals
-            ),
-            CurrentUser AS (
-                SELECT rank FROM RankedScores WHERE username = :username
-            )
-            SELECT username, rank
-            FROM RankedScores
-            WHERE rank IN ((SELECT rank FROM CurrentUser) - 1, (SELECT rank FROM CurrentUser), (SELECT rank FROM CurrentUser) + 1)
-            ORDER BY rank;
-        """)
-        result = conn.execute(query, {"username": username}).mappings().fetchall()
-        
-        snapshot = {"user_rank": None, "rival_above": None, "rival_below": None}
-        if not result: return None
+            """)
+            rows = conn.execute(query, params).mappings().fetchall()
+            return {row['username']: _overall_rank_key(row['username'], row['total_score']) for row in rows}
 
-        user_row = next((r for r in result if r['username'] == username), None)
-        if not user_row: return None
-        snapshot['user_rank'] = user_row['rank']
+        query = text(f"SELECT * FROM ({_topic_board_query(time_filter)}) board WHERE TRUE {user_filter}")
+        rows = conn.execute(query, params).mappings().fetchall()
+        return {row['username']: _topic_rank_key(row['accuracy'], row['questions_answered'], row['achieved_at']) for row in rows}
 
-        for row in result:
-            if row['rank'] < snapshot['user_rank']:
-                snapshot['rival_above'] = {'username': row['username'], 'rank': row['rank']}
-            elif row['rank'] > snapshot['user_rank']:
-                snapshot['rival_below'] = {'username': row['username'], 'rank': row['rank']}
-        
-        return snapshot
-# --- END OF NEW FUNCTIONS ---
+def _get_rank_index_slot(board, time_filter):
+    registry = _get_rank_index_registry()
+    with registry["lock"]:
+        return registry["slots"].setdefault((board, time_filter), {"lock": threading.Lock(), "index": None, "touched": None})
 
-@st.cache_data(ttl=300)
-def get_total_players(topic, time_filter="all"):
+def _build_rank_index(board, time_filter, slot):
+    """
+    Loads a fresh index for one slot (the caller holds the slot's lock). Users whose results are saved, or who are
+    deleted, while it loads are re-read once it has loaded, so the new index goes live without missing an update.
+    """
+    registry = _get_rank_index_registry()
+    with registry["lock"]:
+        slot["touched"] = set()
+    index = LeaderboardRankIndex(_load_rank_index_entries(board, time_filter))
+    while True:
+        with registry["lock"]:
+            touched, slot["touched"] = slot["touched"], set()
+            if not touched:
+                slot["touched"] = None
+                slot["index"] = index
+                return index
+        entries = _load_rank_index_entries(board, time_filter, touched)
+        for username in touched:
+            index.update(username, lambda old_key: entries.get(username))
+
+def get_rank_index(board, time_filter="all"):
+    """
+    Returns the rank index for a topic (or OVERALL_LEADERBOARD), loading it on first use
+    and reloading it once it is older than RANK_INDEX_REFRESH_SECONDS.
+    Boards load under their own locks; while one reloads, other sessions keep reading the previous index.
+    """
+    slot = _get_rank_index_slot(board, time_filter)
+    index = slot["index"]
+    if index is not None and time.time() - index.loaded_at <= RANK_INDEX_REFRESH_SECONDS:
+        return index
+    if not slot["lock"].acquire(blocking=index is None):
+        return index # Another session is already reloading this board
+    try:
+        index = slot["index"]
+        if index is None or time.time() - index.loaded_at > RANK_INDEX_REFRESH_SECONDS:
+            index = _build_rank_index(board, time_filter, slot)
+        return index
+    finally:
+        slot["lock"].release()
+
+def _rank_indexes_to_update(username, boards=None):
+    """
+    The loaded indexes of `boards` (default: all) that a change to `username` must be applied to, keyed by
+    (board, time_filter). Boards that are mid-build also note the user, so the build re-reads them.
+    """
+    registry = _get_rank_index_registry()
+    indexes = {}
+    with registry["lock"]:
+        for (board, time_filter), slot in registry["slots"].items():
+            if boards is not None and board not in boards:
+                continue
+            if slot["touched"] is not None:
+                slot["touched"].add(username)
+            if slot["index"] is not None:
+                indexes[(board, time_filter)] = slot["index"]
+    return indexes
+
+def _apply_quiz_result_to_rank_indexes(username, topic, score, questions_answered, achieved_at):
+    """Applies a saved quiz result to every rank index this process already has loaded."""
+    new_key = _topic_rank_key(score / questions_answered, questions_answered, achieved_at) if questions_answered > 0 else None
+    for (board, time_filter), index in _rank_indexes_to_update(username, (OVERALL_LEADERBOARD, topic)).items():
+        if board == OVERALL_LEADERBOARD:
+            index.update(username, lambda old_key: _overall_rank_key(username, (-old_key[0] if old_key else 0) + score))
+        elif new_key is not None:
+            days = LEADERBOARD_WINDOWS[time_filter]
+            def best_key(old_key):
+                # A new best replaces the old one; so does any result once the old best has left the window.
+                old_expired = old_key is not None and days is not None and old_key[2] < time.time() - days * 86400
+                return new_key if old_key is None or new_key < old_key or old_expired else old_key
+            index.update(username, best_key)
+
+def _remove_user_from_rank_indexes(username):
+    """Takes a deleted user off every rank index this process has loaded."""
+    for index in _rank_indexes_to_update(username).values():
+        index.remove(username)
+
+# --- LEADERBOARD VIEW ---
+@app_cached(lambda board, time_filter: ("leaderboard", board))
+def _get_leaderboard_top_rows(board, time_filter):
+    """Fetches the top 10 rows of a leaderboard with each player's cosmetics already joined in."""
     with engine.connect() as conn:
-        time_clause = ""
-        if time_filter == "week": time_clause = "AND timestamp >= NOW() - INTERVAL '7 days'"
-        elif time_filter == "month": time_clause = "AND timestamp >= NOW() - INTERVAL '30 days'"
-        query = text(f"SELECT COUNT(DISTINCT username) FROM quiz_results WHERE topic = :topic AND questions_answered > 0 {time_clause}")
-        result = conn.execute(query, {"topic": topic}).scalar_one()
-        return result if result else 0
+        if board == OVERALL_LEADERBOARD:
+            query = text(f"""
+                WITH board AS (
+                    SELECT username, SUM(correct_answers) AS total_score FROM quiz_daily_aggregates
+                    WHERE TRUE {_bucket_window_clause(time_filter)}
+                    GROUP BY username
+                )
+                SELECT b.username, b.total_score, up.user_flair AS flair, up.active_border AS border, up.active_name_effect AS effect
+                FROM board b LEFT JOIN user_profiles up ON up.username = b.username
+                ORDER BY b.total_score DESC
+                LIMIT 10;
+            """)
+            result = conn.execute(query).mappings().fetchall()
+        else:
+            query = text(f"""
+                WITH board AS ({_topic_board_query(time_filter)})
+                SELECT b.username, b.score, b.questions_answered, up.user_flair AS flair, up.active_border AS border, up.active_name_effect AS effect
+                FROM board b LEFT JOIN user_profiles up ON up.username = b.username
+                ORDER BY b.accuracy DESC, b.questions_answered DESC, b.achieved_at ASC
+                LIMIT 10;
+            """)
+            result = conn.execute(query, {"topic": board}).mappings().fetchall()
+        return [dict(row) for row in result]
+
+def get_leaderboard_view(topic, time_filter, username):
+    """
+    Everything one leaderboard render needs: the top 10 rows (with cosmetics), plus the user's rank,
+    rivals and the total player count. `topic` may be OVERALL_LEADERBOARD.
+    The top rows are one cached query; rank, rivals and total come from the in-process rank index.
+    """
+    rank_index = get_rank_index(topic, time_filter)
+    view = rank_index.snapshot(username) or {"user_rank": None, "rival_above": None, "rival_below": None}
+    view["total_players"] = len(rank_index)
+    view["top_rows"] = _get_leaderboard_top_rows(topic, time_filter)
+    return view
 
 def get_user_stats_for_topic(username, topic):
     with engine.connect() as conn:
@@ -2211,6 +3106,8 @@ def get_active_duel_for_player(username):
         row = conn.execute(query, {"username": username}).mappings().first()
         return dict(row) if row else None
 
+DUEL_QUESTION_UNAVAILABLE = "_This question was saved by an older version of the app and can no longer be shown._"
+
 def get_duel_summary(duel_id):
     """Fetches all data needed for the duel summary page."""
     with engine.connect() as conn:
@@ -2224,7 +3121,7 @@ def get_duel_summary(duel_id):
 
         # Next, get all the questions and answers for that duel
         duel_questions_query = text("""
-            SELECT question_index, question_data_json, answered_by, is_correct 
+            SELECT question_index, question_ref, question_data_json, answered_by, is_correct 
             FROM duel_questions 
             WHERE duel_id = :d 
             ORDER BY question_index ASC
@@ -2235,7 +3132,7 @@ def get_duel_summary(duel_id):
         summary['questions'] = [
             {
                 'index': q['question_index'],
-                'data': json.loads(q['question_data_json']),
+                'data': _duel_question_data(q),
                 'answered_by': q['answered_by'],
                 'is_correct': q['is_correct']
             } for q in questions
@@ -2270,17 +3167,13 @@ def accept_duel(duel_id, topic):
 
             if challenger_username:
                 # Next, get the questions that were just created for this duel
-                questions = conn.execute(
-                    text("SELECT question_data_json FROM duel_questions WHERE duel_id = :duel_id"),
+                q_ids = conn.execute(
+                    text("SELECT question_fingerprint FROM duel_questions WHERE duel_id = :duel_id AND question_fingerprint IS NOT NULL"),
                     {"duel_id": duel_id}
-                ).mappings().fetchall()
-
-                # Loop through the questions and save them to the challenger's seen list
-                for q_row in questions:
-                    q_data = json.loads(q_row["question_data_json"])
-                    question_text = q_data.get("stem", q_data.get("question", ""))
-                    q_id = get_question_id(question_text)
-                    save_seen_question(challenger_username, q_id)
+                ).scalars().all()
+
+                # Save all of them to the challenger's seen list in one batch
+                save_seen_questions(challenger_username, q_ids)
     except Exception as e:
         # If this fails for any reason, we don't want to crash the app.
         # We can log this error for debugging if needed.
@@ -2302,14 +3195,45 @@ def generate_and_store_duel_questions(duel_id, topic):
         rows = []
         for i in range(10):
             q_data = generate_question(topic)
-            rows.append({"duel_id": duel_id, "question_index": i, "question_data_json": json.dumps(q_data)})
+            if q_data is None:
+                continue # Left for the next call to fill (see the "Preparing the duel" safety net)
+            rows.append({"duel_id": duel_id, "question_index": i, "question_ref": q_data.get("ref"),
+                         "question_data_json": json.dumps(q_data), "question_fingerprint": get_question_id(q_data, topic)})
 
+        if not rows:
+            return
         conn.execute(text("""
-            INSERT INTO duel_questions (duel_id, question_index, question_data_json)
-            VALUES (:duel_id, :question_index, :question_data_json)
+            INSERT INTO duel_questions (duel_id, question_index, question_ref, question_data_json, question_fingerprint)
+            VALUES (:duel_id, :question_index, :question_ref, :question_data_json, :question_fingerprint)
             ON CONFLICT (duel_id, question_index) DO NOTHING
         """), rows)
 
+def _duel_question_data(row):
+    """
+    The question dict for a duel_questions row. Rows saved with only a reference are rebuilt from it,
+    which gives None once the generators have moved to another QUESTION_REF_VERSION.
+    """
+    if row["question_data_json"] is not None:
+        return json.loads(row["question_data_json"])
+    return question_from_ref(row["question_ref"]) if row["question_ref"] else None
+
+def _replace_duel_question(conn, duel_id, question_index, topic):
+    """
+    Swaps an unanswered duel question that can no longer be rebuilt for a fresh one. Returns the new question,
+    or None (leaving the row as it is) if no question could be generated.
+    """
+    q_data = generate_question(topic)
+    if q_data is None:
+        return None
+    conn.execute(text("""
+        UPDATE duel_questions
+        SET question_ref = :question_ref, question_data_json = :question_data_json, question_fingerprint = :question_fingerprint
+        WHERE duel_id = :duel_id AND question_index = :question_index AND answered_by IS NULL
+    """), {"duel_id": duel_id, "question_index": question_index, "question_ref": q_data.get("ref"),
+           "question_data_json": json.dumps(q_data), "question_fingerprint": get_question_id(q_data, topic)})
+    conn.commit()
+    return q_data
+
 def get_duel_state(duel_id):
     """Fetches the complete current state of a duel from the database."""
     with engine.connect() as conn:
@@ -2323,22 +3247,72 @@ def get_duel_state(duel_id):
             return duel
 
         qrow = conn.execute(
-            text("""SELECT question_data_json, answered_by, is_correct
+            text("""SELECT question_ref, question_data_json, answered_by, is_correct
                     FROM duel_questions
                     WHERE duel_id = :d AND question_index = :i"""),
             {"d": duel_id, "i": duel.get("current_question_index", 0)}
         ).mappings().first()
 
         if qrow:
-            duel["question"] = json.loads(qrow["question_data_json"])
+            question = _duel_question_data(qrow)
+            if question is None and qrow["answered_by"] is None:
+                question = _replace_duel_question(conn, duel_id, duel.get("current_question_index", 0), duel["topic"])
+            duel["question"] = question or {"question": DUEL_QUESTION_UNAVAILABLE, "options": [], "answer": None}
             duel["question_answered_by"] = qrow["answered_by"]
             duel["question_is_correct"] = qrow["is_correct"]
 
         return duel
 # Replace your existing submit_duel_answer function with this one.
 
+# --- DUEL PLAYER STATS ---
+def _record_duel_result(conn, player1, player2, final_status):
+    """Adds a finished duel to both players' duel_player_stats rows for today, on the caller's connection."""
+    query = text("""
+        INSERT INTO duel_player_stats AS s (stat_date, username, wins, losses, draws, last_played)
+        VALUES (CURRENT_DATE, :username, :win, :loss, :draw, CURRENT_TIMESTAMP)
+        ON CONFLICT (stat_date, username) DO UPDATE SET
+            wins = s.wins + EXCLUDED.wins,
+            losses = s.losses + EXCLUDED.losses,
+            draws = s.draws + EXCLUDED.draws,
+            last_played = EXCLUDED.last_played
+    """)
+    is_draw = int(final_status == "draw")
+    conn.execute(query, [
+        {"username": player1, "win": int(final_status == "player1_win"), "loss": int(final_status == "player2_win"), "draw": is_draw},
+        {"username": player2, "win": int(final_status == "player2_win"), "loss": int(final_status == "player1_win"), "draw": is_draw},
+    ])
+
+def rebuild_duel_player_stats():
+    """
+    Rebuilds duel_player_stats from every finished duel in the duels table.
+    Returns the number of rows written.
+    """
+    with engine.connect() as conn:
+        with conn.begin():
+            conn.execute(text("DELETE FROM duel_player_stats"))
+            result = conn.execute(text("""
+                INSERT INTO duel_player_stats (stat_date, username, wins, losses, draws, last_played)
+                SELECT CAST(finished_at AS DATE), username, SUM(win), SUM(loss), SUM(draw), MAX(finished_at)
+                FROM (
+                    SELECT finished_at, player1_username AS username,
+                           CASE WHEN status = 'player1_win' THEN 1 ELSE 0 END AS win,
+                           CASE WHEN status = 'player2_win' THEN 1 ELSE 0 END AS loss,
+                           CASE WHEN status = 'draw' THEN 1 ELSE 0 END AS draw
+                    FROM duels WHERE status IN ('player1_win', 'player2_win', 'draw') AND finished_at IS NOT NULL
+                    UNION ALL
+                    SELECT finished_at, player2_username AS username,
+                           CASE WHEN status = 'player2_win' THEN 1 ELSE 0 END AS win,
+                           CASE WHEN status = 'player1_win' THEN 1 ELSE 0 END AS loss,
+                           CASE WHEN status = 'draw' THEN 1 ELSE 0 END AS draw
+                    FROM duels WHERE status IN ('player1_win', 'player2_win', 'draw') AND finished_at IS NOT NULL
+                ) results
+                GROUP BY CAST(finished_at AS DATE), username
+            """))
+            return result.rowcount
+
 def submit_duel_answer(duel_id, username, is_correct):
     """Records a player's answer and updates the duel state using more robust, atomic updates."""
+    duel_finished = False
     with engine.connect() as conn, conn.begin():
         # This logic fetches player usernames, which we need for awarding coins
         duel_info = conn.execute(
@@ -2395,6 +3369,8 @@ def submit_duel_answer(duel_id, username, is_correct):
                     last_action_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
                 WHERE id = :d
             """), {"final": final_status, "d": duel_id})
+            _record_duel_result(conn, player1, player2, final_status)
+            duel_finished = True
         else:
             conn.execute(text("""
                 UPDATE duels
@@ -2403,7 +3379,10 @@ def submit_duel_answer(duel_id, username, is_correct):
                 WHERE id = :d
             """), {"d": duel_id})
 
-        return True
+    # A finished duel changes the win counts, so the cached duel leaderboard is dropped after commit.
+    if duel_finished:
+        invalidate_app_cache("duel_leaderboard")
+    return True
 
 def display_duel_summary_page(duel_summary):
     """Renders the detailed post-duel summary screen."""
@@ -2441,8 +3420,11 @@ def display_duel_summary_page(duel_summary):
     for q in duel_summary.get('questions', []):
         q_data = q['data']
         with st.expander(f"**Question {q['index'] + 1}**"):
-            st.markdown(q_data.get("question", ""), unsafe_allow_html=True)
-            st.write(f"**Correct Answer:** {q_data.get('answer')}")
+            if q_data is None:
+                st.markdown(DUEL_QUESTION_UNAVAILABLE)
+            else:
+                st.markdown(q_data.get("question", ""), unsafe_allow_html=True)
+                st.write(f"**Correct Answer:** {q_data.get('answer')}")
 
             if q['answered_by']:
                 if q['is_correct']:
@@ -2554,7 +3536,7 @@ def display_duel_page():
         if is_correct:
             st.success(f"✅ {answered_by} answered correctly!")
         else:
-            st.error(f"❌ {answered_by} answered incorrectly. The answer was {q.get('answer')}.")
+            st.error(f"❌ {answered_by} answered incorrectly." + (f" The answer was {q['answer']}." if q.get('answer') is not None else ""))
         st.info("Waiting for the next question...")
         # FIX: Increased refresh interval for better responsiveness
         st_autorefresh(interval=2000, key="duel_answered_refresh")
@@ -2572,47 +3554,110 @@ def display_duel_page():
 # ADD THESE TWO NEW FUNCTIONS
 
 def get_seen_questions(username):
-    """Fetches the set of all question IDs a user has already seen."""
+    """Fetches the set of all question fingerprints a user has already seen."""
     with engine.connect() as conn:
-        query = text("SELECT question_id FROM seen_questions WHERE username = :username")
+        query = text("SELECT question_fingerprint FROM seen_questions WHERE username = :username AND question_fingerprint IS NOT NULL")
         result = conn.execute(query, {"username": username}).fetchall()
         return {row[0] for row in result}
 
-def save_seen_question(username, question_id):
-    """Saves a question ID to a user's seen list."""
+def _save_seen_questions(conn, username, question_ids):
+    """Saves a batch of question IDs to a user's seen list on the caller's connection."""
+    query = text("INSERT INTO seen_questions (username, question_fingerprint) VALUES (:username, :question_id) ON CONFLICT DO NOTHING")
+    conn.execute(query, [{"username": username, "question_id": question_id} for question_id in question_ids])
+
+def save_seen_questions(username, question_ids):
+    """Saves a batch of question IDs to a user's seen list in one round trip."""
+    if not question_ids:
+        return
     with engine.connect() as conn:
-        query = text("INSERT INTO seen_questions (username, question_id) VALUES (:username, :question_id) ON CONFLICT DO NOTHING")
-        conn.execute(query, {"username": username, "question_id": question_id})
+        _save_seen_questions(conn, username, question_ids)
         conn.commit()
 
-# --- NEW BACKEND FUNCTIONS FOR ADAPTIVE LEARNING ---
+# --- SEEN QUESTION FILTER ---
+# Each session keeps a Bloom filter of the user's seen question fingerprints, built once at quiz start,
+# so serving a question no longer re-reads every seen_questions row. New IDs are written in batches.
+SEEN_FILTER_FALSE_POSITIVE_RATE = 0.01
+SEEN_FILTER_MIN_CAPACITY = 2000
+SEEN_QUESTION_FLUSH_BATCH = 10
 
-def get_skill_score(username, topic):
-    """Fetches a user's skill score for a specific topic, creating it if it doesn't exist."""
-    with engine.connect() as conn:
-        query = text("SELECT skill_score FROM user_skill_levels WHERE username = :username AND topic = :topic")
-        result = conn.execute(query, {"username": username, "topic": topic}).scalar_one_or_none()
-        
-        if result is None:
-            # If the user has never played this topic, create a default entry
-            insert_query = text("""
-                INSERT INTO user_skill_levels (username, topic, skill_score)
-                VALUES (:username, :topic, 50)
-                ON CONFLICT (username, topic) DO NOTHING;
-            """)
-            conn.execute(insert_query, {"username": username, "topic": topic})
-            conn.commit()
-            return 50 # Return the default starting score
-        return result
-
-def update_skill_score(username, topic, score, questions_answered):
-    """Updates a user's skill score based on their latest quiz performance."""
-    if questions_answered == 0:
-        return # Cannot update score with no questions answered
+class SeenQuestionFilter:
+    """
+    Bloom filter over the question fingerprints one user has seen.
+    It can rarely report an unseen question as seen (that question is just regenerated), never the reverse.
+    """
+    def __init__(self, username, question_ids):
+        self.username = username
+        # Sized with headroom so the false-positive rate holds until the next reload at quiz start.
+        capacity = max(SEEN_FILTER_MIN_CAPACITY, 2 * len(question_ids))
+        self.num_bits = int(-capacity * math.log(SEEN_FILTER_FALSE_POSITIVE_RATE) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.pending = []
+        for question_id in question_ids:
+            self._set(question_id)
+
+    def _positions(self, question_id):
+        # Double hashing: the two 32-bit halves of the 64-bit question ID generate every probe position.
+        h1, h2 = question_id & 0xFFFFFFFF, ((question_id >> 32) & 0xFFFFFFFF) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def _set(self, question_id):
+        for position in self._positions(question_id):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, question_id):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(question_id))
+
+    def add(self, question_id):
+        """Marks a question as seen; it is saved to the database on the next flush."""
+        self._set(question_id)
+        self.pending.append(question_id)
+
+    def snapshot(self):
+        """A copy of the bits for worker threads, unaffected by later add() calls."""
+        snapshot = copy.copy(self)
+        snapshot.bits = bytearray(self.bits)
+        snapshot.pending = []
+        return snapshot
 
-    accuracy = (score / questions_answered) * 100
-    current_skill = get_skill_score(username, topic)
+def flush_seen_questions():
+    """Writes the session's buffered seen-question IDs to the database."""
+    seen_filter = st.session_state.get("seen_question_filter")
+    if seen_filter is not None and seen_filter.pending:
+        save_seen_questions(seen_filter.username, seen_filter.pending)
+        seen_filter.pending = []
+
+def load_seen_question_filter(username):
+    """(Re)builds the user's seen-question filter from the database and caches it in the session."""
+    flush_seen_questions()
+    st.session_state.seen_question_filter = SeenQuestionFilter(username, get_seen_questions(username))
+    return st.session_state.seen_question_filter
+
+def get_seen_question_filter(username):
+    """Returns this session's seen-question filter for the user, loading it on first use."""
+    seen_filter = st.session_state.get("seen_question_filter")
+    if seen_filter is None or seen_filter.username != username:
+        seen_filter = load_seen_question_filter(username)
+    return seen_filter
+
+def mark_question_seen(username, question_id):
+    """Adds a question to the user's seen filter, flushing to the database once a batch has built up."""
+    seen_filter = get_seen_question_filter(username)
+    seen_filter.add(question_id)
+    if len(seen_filter.pending) >= SEEN_QUESTION_FLUSH_BATCH:
+        flush_seen_questions()
 
+# --- NEW BACKEND FUNCTIONS FOR ADAPTIVE LEARNING ---
+# Each session keeps the user's skill scores in memory (a SkillVector) loaded once at login, so picking a
+# difficulty never touches the database. Quiz results update the vector in place and are kept as pending
+# accuracies. When the quiz ends they are replayed against the stored scores with the rows locked, so two
+# sessions of the same user never overwrite each other's updates. A write that fails is retried on the first
+# read after SKILL_FLUSH_INTERVAL_SECONDS.
+SKILL_DEFAULT_SCORE = 50 # Same as the user_skill_levels column default
+SKILL_FLUSH_INTERVAL_SECONDS = 60
+
+def _next_skill_score(current_skill, accuracy):
+    """A topic's skill score after a quiz answered with the given accuracy (0-100)."""
     # --- The Learning Algorithm ---
     # A simple algorithm: high accuracy pushes the score towards 100, low accuracy pushes it towards 0.
     # The 'learning_rate' determines how quickly the score changes.
@@ -2622,19 +3667,142 @@ def update_skill_score(username, topic, score, questions_answered):
     new_skill = current_skill * (1 - learning_rate) + accuracy * learning_rate
     
     # Clamp the score between 1 and 100 to prevent it from going out of bounds
-    new_skill = max(1, min(100, int(new_skill)))
+    return max(1, min(100, int(new_skill)))
+
+class SkillVector:
+    """One user's topic skill scores, plus the quiz accuracies per topic not yet written."""
+    def __init__(self, username, scores):
+        self.username = username
+        self.scores = dict(scores)
+        self.pending = {}
+        self.dirty_since = None
+
+    def get(self, topic):
+        """The topic's skill score; topics the user has never played start at SKILL_DEFAULT_SCORE."""
+        return self.scores.get(topic, SKILL_DEFAULT_SCORE)
+
+    def record(self, topic, accuracy):
+        """Applies a quiz result to the topic's score; the accuracy is replayed on the stored score at the next flush."""
+        self.scores[topic] = _next_skill_score(self.get(topic), accuracy)
+        self.pending.setdefault(topic, []).append(accuracy)
+        if self.dirty_since is None:
+            self.dirty_since = time.monotonic()
+
+    def saved(self, scores):
+        """Clears the pending results once written, taking the stored scores (which include other sessions' quizzes)."""
+        self.scores.update(scores)
+        self.pending.clear()
+        self.dirty_since = None
+
+def get_skill_scores(username):
+    """Fetches all of a user's topic skill scores in one query as {topic: score}."""
+    with engine.connect() as conn:
+        query = text("SELECT topic, skill_score FROM user_skill_levels WHERE username = :username")
+        return {row[0]: row[1] for row in conn.execute(query, {"username": username}).fetchall()}
 
+def _save_skill_results(conn, username, pending):
+    """
+    Applies {topic: [accuracy, ...]} to a user's stored skill scores on the caller's connection and returns the
+    new {topic: score}. The rows stay locked until the caller commits, so concurrent writers queue behind it.
+    """
+    # Creates missing rows at the default and locks every row, returning the scores as currently stored.
+    lock_query = text("""
+        INSERT INTO user_skill_levels (username, topic, skill_score)
+        SELECT :username, topic, :default_score FROM unnest(CAST(:topics AS TEXT[])) AS changed(topic)
+        ON CONFLICT (username, topic) DO UPDATE SET skill_score = user_skill_levels.skill_score
+        RETURNING topic, skill_score
+    """)
+    stored = dict(conn.execute(lock_query, {"username": username, "topics": list(pending), "default_score": SKILL_DEFAULT_SCORE}).fetchall())
+    scores = {}
+    for topic, accuracies in pending.items():
+        scores[topic] = functools.reduce(_next_skill_score, accuracies, stored[topic])
+    update_query = text("""
+        UPDATE user_skill_levels s SET skill_score = changed.skill_score
+        FROM unnest(CAST(:topics AS TEXT[]), CAST(:scores AS INTEGER[])) AS changed(topic, skill_score)
+        WHERE s.username = :username AND s.topic = changed.topic
+    """)
+    conn.execute(update_query, {"username": username, "topics": list(scores), "scores": list(scores.values())})
+    return scores
+
+def save_skill_results(username, pending):
+    """Applies {topic: [accuracy, ...]} to a user's stored skill scores in one transaction. Returns {topic: score}."""
+    if not pending:
+        return {}
     with engine.connect() as conn:
-        query = text("""
-            UPDATE user_skill_levels 
-            SET skill_score = :new_score 
-            WHERE username = :username AND topic = :topic
-        """)
-        conn.execute(query, {"new_score": new_skill, "username": username, "topic": topic})
-        conn.commit()
+        with conn.begin():
+            return _save_skill_results(conn, username, pending)
+
+def flush_skill_vector():
+    """Writes the session's changed skill scores to the database. If the write fails they stay pending."""
+    skill_vector = st.session_state.get("skill_vector")
+    if skill_vector is None or not skill_vector.pending:
+        return
+    try:
+        scores = save_skill_results(skill_vector.username, skill_vector.pending)
+    except Exception as e:
+        print(f"Error saving skill scores for {skill_vector.username}: {e}")
+        skill_vector.dirty_since = time.monotonic() # Try again after another interval
+        return
+    skill_vector.saved(scores)
+
+def load_skill_vector(username):
+    """(Re)loads the user's skill scores from the database into the session."""
+    flush_skill_vector()
+    st.session_state.skill_vector = SkillVector(username, get_skill_scores(username))
+    return st.session_state.skill_vector
+
+def get_skill_vector(username):
+    """Returns this session's skill vector for the user, loading it on first use and flushing an overdue write."""
+    skill_vector = st.session_state.get("skill_vector")
+    if skill_vector is None or skill_vector.username != username:
+        skill_vector = load_skill_vector(username)
+    elif skill_vector.dirty_since is not None and time.monotonic() - skill_vector.dirty_since >= SKILL_FLUSH_INTERVAL_SECONDS:
+        flush_skill_vector()
+    return skill_vector
+
+def get_skill_score(username, topic):
+    """A user's skill score for a topic, read from the session's skill vector."""
+    return get_skill_vector(username).get(topic)
+
+def update_skill_score(username, topic, score, questions_answered):
+    """Updates a user's skill score based on their latest quiz performance."""
+    if questions_answered == 0:
+        return # Cannot update score with no questions answered
+
+    accuracy = (score / questions_answered) * 100
+    skill_vector = get_skill_vector(username)
+    current_skill = skill_vector.get(topic)
+
+    # Applied in memory; record_quiz_completion replays it on the stored score with the quiz result.
+    skill_vector.record(topic, accuracy)
+    new_skill = skill_vector.get(topic)
+
+    # Questions queued at the old difficulty are no longer right once the user crosses a threshold.
+    if _difficulty_for_skill(new_skill) != _difficulty_for_skill(current_skill):
+        invalidate_question_prefetch(topic)
 
 # --- NEW BACKEND FUNCTION FOR COIN ECONOMY ---
 
+def _apply_coin_changes(conn, username, changes):
+    """
+    Applies [(amount, description), ...] to a user's coin balance and logs each change, in one statement on the
+    caller's connection. A missing profile is created with the starting 100 coins plus the changes.
+    """
+    conn.execute(text("""
+        WITH balance AS (
+            INSERT INTO user_profiles (username, coins)
+            VALUES (:username, 100 + :total)
+            ON CONFLICT (username) DO UPDATE
+            SET coins = COALESCE(user_profiles.coins, 0) + :total
+        )
+        INSERT INTO coin_transactions (username, amount, description)
+        SELECT :username, amount, description
+        FROM unnest(CAST(:amounts AS INTEGER[]), CAST(:descriptions AS TEXT[])) AS change(amount, description)
+    """), {
+        "username": username, "total": sum(amount for amount, _ in changes),
+        "amounts": [amount for amount, _ in changes], "descriptions": [description for _, description in changes],
+    })
+
 def update_coin_balance(username, amount, description):
     """
     Updates a user's coin balance and logs the transaction.
@@ -2643,28 +3811,8 @@ def update_coin_balance(username, amount, description):
     with engine.connect() as conn:
         with conn.begin(): # Start a database transaction
             try:
-                # --- THIS IS THE FINAL, ROBUST FIX ---
-                # This command will CREATE a profile if it doesn't exist,
-                # or UPDATE the existing one. It solves the NULL issue permanently.
-                update_query = text("""
-                    INSERT INTO user_profiles (username, coins)
-                    VALUES (:username, :initial_coins)
-                    ON CONFLICT (username) DO UPDATE
-                    SET coins = COALESCE(user_profiles.coins, 0) + :amount;
-                """)
-                conn.execute(update_query, {
-                    "username": username, 
-                    "initial_coins": 100 + amount, # For new profiles, start at 100 + this amount
-                    "amount": amount               # For existing profiles, just add the amount
-                })
-
-                # Log the transaction
-                log_query = text("""
-                    INSERT INTO coin_transactions (username, amount, description)
-                    VALUES (:username, :amount, :description)
-                """)
-                conn.execute(log_query, {"username": username, "amount": amount, "description": description})
-                
+                # Creates the profile if it doesn't exist (solves the NULL issue) and logs the transaction.
+                _apply_coin_changes(conn, username, [(amount, description)])
                 return True
             except Exception as e:
                 print(f"Coin transaction failed for {username}: {e}")
@@ -3011,41 +4159,147 @@ def is_double_coins_active(username):
 
 # ADD THESE THREE NEW FUNCTIONS
 
-def check_and_award_achievements(username, topic):
-    """Checks all achievement conditions for a user and awards them if met."""
+# --- ACHIEVEMENT RULES ---
+# Every automatic achievement is one declarative rule: it is earned once the user's `counter` in user_score_totals
+# for `topic` (SCORE_TOTALS_ALL_TOPICS for overall) reaches `threshold`. The just-finished quiz is already in those
+# counters when the rules run, so one snapshot of the user's counters and unlocked badges is all they need.
+AchievementRule = collections.namedtuple("AchievementRule", ["name", "badge_icon", "coins", "counter", "topic", "threshold"])
+AchievementSnapshot = collections.namedtuple("AchievementSnapshot", ["counters", "unlocked"])
+ACHIEVEMENT_COUNTERS = ("correct_answers", "quizzes_taken", "perfect_quizzes")
+ACHIEVEMENT_TOPICS = [
+    "Sets", "Percentages", "Fractions", "Indices", "Surds", "Binary Operations",
+    "Relations and Functions", "Sequence and Series", "Word Problems", "Shapes (Geometry)",
+    "Algebra Basics", "Linear Algebra", "Logarithms", "Probability", "Binomial Theorem",
+    "Polynomial Functions", "Rational Functions", "Trigonometry", "Vectors", "Statistics",
+    "Coordinate Geometry", "Introduction to Calculus", "Number Bases", "Modulo Arithmetic", "Advanced Combo"
+]
+ACHIEVEMENT_RULES = [
+    AchievementRule("First Step", "👟", 100, "quizzes_taken", SCORE_TOTALS_ALL_TOPICS, 1),
+    AchievementRule("Century Scorer", "💯", 100, "correct_answers", SCORE_TOTALS_ALL_TOPICS, 100),
+] + [
+    AchievementRule(f"{topic} Master", "🎓", 100, "correct_answers", topic, 25)
+    for topic in ACHIEVEMENT_TOPICS + ["WASSCE Prep"]
+] + [
+    AchievementRule(f"Perfect Score: {topic}", "🎯", 25, "perfect_quizzes", topic, 1)
+    for topic in ACHIEVEMENT_TOPICS
+]
+
+def _load_achievement_snapshot(conn, username):
+    """The user's score totals and unlocked achievement names, read in one query on the caller's connection."""
+    rows = conn.execute(text("""
+        SELECT topic, correct_answers, quizzes_taken, perfect_quizzes, NULL AS achievement_name
+        FROM user_score_totals WHERE username = :u
+        UNION ALL
+        SELECT NULL, NULL, NULL, NULL, achievement_name
+        FROM user_achievements WHERE username = :u
+    """), {"u": username}).mappings().fetchall()
+    counters, unlocked = {}, set()
+    for row in rows:
+        if row["achievement_name"] is not None:
+            unlocked.add(row["achievement_name"])
+        else:
+            for counter in ACHIEVEMENT_COUNTERS:
+                counters[(counter, row["topic"])] = row[counter]
+    return AchievementSnapshot(counters, unlocked)
+
+def newly_earned_achievements(snapshot):
+    """The rules a snapshot satisfies that it has not unlocked yet, in registry order."""
+    return [
+        rule for rule in ACHIEVEMENT_RULES
+        if rule.name not in snapshot.unlocked and snapshot.counters.get((rule.counter, rule.topic), 0) >= rule.threshold
+    ]
+
+def _award_quiz_achievements(conn, username):
+    """
+    Evaluates every achievement rule against the user's current counters and awards the new ones with a single
+    insert, on the caller's connection. Returns the rules actually awarded (a concurrent award is skipped).
+    """
+    earned = newly_earned_achievements(_load_achievement_snapshot(conn, username))
+    if not earned:
+        return []
+    inserted = conn.execute(text("""
+        INSERT INTO user_achievements (username, achievement_name, badge_icon)
+        SELECT :u, name, icon FROM unnest(CAST(:names AS TEXT[]), CAST(:icons AS TEXT[])) AS a(name, icon)
+        ON CONFLICT (username, achievement_name) DO NOTHING
+        RETURNING achievement_name
+    """), {"u": username, "names": [rule.name for rule in earned], "icons": [rule.badge_icon for rule in earned]}).fetchall()
+    inserted_names = {row[0] for row in inserted}
+    return [rule for rule in earned if rule.name in inserted_names]
+
+ACHIEVEMENT_BACKFILL_CHUNK_USERS = 5000
+
+def backfill_achievements(rule_names=None, chunk_users=ACHIEVEMENT_BACKFILL_CHUNK_USERS, on_progress=None):
+    """
+    Awards achievement rules (all of them, or just `rule_names`) to every user who already meets them, e.g. after a
+    rule is added or its threshold lowered. Users are processed in username-ordered chunks; each chunk is a single
+    set-based statement that inserts the missing badges, logs their coin rewards and credits the balances, and
+    commits on its own. on_progress(chunks_done, chunks_total, awarded_so_far) is called after every chunk.
+    Returns {"awarded", "coins", "chunks"}.
+    """
+    rules = [rule for rule in ACHIEVEMENT_RULES if rule_names is None or rule.name in rule_names]
+    rule_params = {
+        "names": [rule.name for rule in rules], "icons": [rule.badge_icon for rule in rules],
+        "coins": [rule.coins for rule in rules], "counters": [rule.counter for rule in rules],
+        "topics": [rule.topic for rule in rules], "thresholds": [rule.threshold for rule in rules],
+    }
+    query = text("""
+        WITH rules AS (
+            SELECT * FROM unnest(CAST(:names AS TEXT[]), CAST(:icons AS TEXT[]), CAST(:coins AS INTEGER[]),
+                                 CAST(:counters AS TEXT[]), CAST(:topics AS TEXT[]), CAST(:thresholds AS INTEGER[]))
+                AS r(name, icon, coins, counter, topic, threshold)
+        ), awarded AS (
+            INSERT INTO user_achievements (username, achievement_name, badge_icon)
+            SELECT t.username, r.name, r.icon
+            FROM rules r JOIN user_score_totals t ON t.topic = r.topic
+            WHERE t.username >= :first_user AND (CAST(:next_user AS TEXT) IS NULL OR t.username < :next_user)
+              AND CASE r.counter
+                      WHEN 'correct_answers' THEN t.correct_answers
+                      WHEN 'quizzes_taken' THEN t.quizzes_taken
+                      WHEN 'perfect_quizzes' THEN t.perfect_quizzes
+                  END >= r.threshold
+            ON CONFLICT (username, achievement_name) DO NOTHING
+            RETURNING username, achievement_name
+        ), rewards AS (
+            SELECT a.username, a.achievement_name, r.coins
+            FROM awarded a JOIN rules r ON r.name = a.achievement_name
+            WHERE r.coins > 0
+        ), ledger AS (
+            INSERT INTO coin_transactions (username, amount, description)
+            SELECT username, coins, 'Achievement Unlocked: ' || achievement_name FROM rewards
+        ), balances AS (
+            -- Same rule as _apply_coin_changes: a missing profile starts at 100 coins plus the rewards.
+            INSERT INTO user_profiles (username, coins)
+            SELECT username, 100 + SUM(coins) FROM rewards GROUP BY username
+            ON CONFLICT (username) DO UPDATE
+            SET coins = COALESCE(user_profiles.coins, 0) + EXCLUDED.coins - 100
+        )
+        SELECT (SELECT COUNT(*) FROM awarded) AS awarded, COALESCE((SELECT SUM(coins) FROM rewards), 0) AS coins
+    """)
+
     with engine.connect() as conn:
-        existing_achievements_query = text("SELECT achievement_name FROM user_achievements WHERE username = :username")
-        existing_set = {row[0] for row in conn.execute(existing_achievements_query, {"username": username}).fetchall()}
-        
-        # --- Achievement 1: "First Step" (Take 1 quiz) ---
-        if "First Step" not in existing_set:
-            conn.execute(text("INSERT INTO user_achievements (username, achievement_name, badge_icon) VALUES (:u, 'First Step', '👟')"), {"u": username})
-            st.session_state.achievement_unlocked_toast = "First Step"
-            existing_set.add("First Step")
-            # --- NEW COIN REWARD LOGIC ---
-            update_coin_balance(username, 100, "Achievement Unlocked: First Step")
-
-        # --- Achievement 2: "Century Scorer" (Get 100 total correct answers) ---
-        if "Century Scorer" not in existing_set:
-            total_score = conn.execute(text("SELECT SUM(score) FROM quiz_results WHERE username = :u"), {"u": username}).scalar_one() or 0
-            if total_score >= 100:
-                conn.execute(text("INSERT INTO user_achievements (username, achievement_name, badge_icon) VALUES (:u, 'Century Scorer', '💯')"), {"u": username})
-                st.session_state.achievement_unlocked_toast = "Century Scorer"
-                existing_set.add("Century Scorer")
-                # --- NEW COIN REWARD LOGIC ---
-                update_coin_balance(username, 100, "Achievement Unlocked: Century Scorer")
-
-        # --- Achievement 3: "Topic Master" (Get 25 correct answers in a specific topic) ---
-        achievement_name = f"{topic} Master"
-        if achievement_name not in existing_set:
-            topic_score = conn.execute(text("SELECT SUM(score) FROM quiz_results WHERE username = :u AND topic = :t"), {"u": username, "t": topic}).scalar_one() or 0
-            if topic_score >= 25:
-                conn.execute(text("INSERT INTO user_achievements (username, achievement_name, badge_icon) VALUES (:u, :n, '🎓')"), {"u": username, "n": achievement_name})
-                st.session_state.achievement_unlocked_toast = achievement_name
-                # --- NEW COIN REWARD LOGIC ---
-                update_coin_balance(username, 100, f"Achievement Unlocked: {achievement_name}")
+        # Every user with a quiz result has an overall totals row; every chunk_users-th one starts a chunk.
+        boundaries = [row[0] for row in conn.execute(text("""
+            SELECT username FROM (
+                SELECT username, ROW_NUMBER() OVER (ORDER BY username) AS position
+                FROM user_score_totals WHERE topic = :all_topics
+            ) users
+            WHERE position % :chunk_users = 1
+            ORDER BY username
+        """), {"all_topics": SCORE_TOTALS_ALL_TOPICS, "chunk_users": chunk_users}).fetchall()]
+        conn.commit() # End the read so each chunk runs in its own transaction
+        totals = {"awarded": 0, "coins": 0, "chunks": len(boundaries)}
+        if not rules:
+            return totals
+        for index, first_user in enumerate(boundaries):
+            next_user = boundaries[index + 1] if index + 1 < len(boundaries) else None
+            with conn.begin():
+                awarded, coins = conn.execute(query, {**rule_params, "first_user": first_user, "next_user": next_user}).one()
+            totals["awarded"] += awarded
+            totals["coins"] += coins
+            if on_progress:
+                on_progress(index + 1, len(boundaries), totals["awarded"])
+    return totals
 
-        conn.commit()
 def get_user_achievements(username):
     """Fetches all achievements unlocked by a user."""
     with engine.connect() as conn:
@@ -3053,37 +4307,6 @@ def get_user_achievements(username):
         result = conn.execute(query, {"username": username}).mappings().fetchall()
         return [dict(row) for row in result]
 
-def _check_and_award_perfect_score_bonus(username, topic):
-    """
-    Checks if a user has the 'Perfect Score' achievement for a topic.
-    If not, it awards the achievement and returns True (eligible for bonus).
-    If they do, it returns False (not eligible for bonus).
-    """
-    achievement_name = f"Perfect Score: {topic}"
-    badge_icon = "🎯"
-
-    # First, check if the user already has this specific achievement
-    with engine.connect() as conn:
-        check_query = text("""
-            SELECT 1 FROM user_achievements 
-            WHERE username = :username AND achievement_name = :achievement_name
-        """)
-        exists = conn.execute(check_query, {"username": username, "achievement_name": achievement_name}).first()
-
-    if not exists:
-        # If the achievement does not exist, award it.
-        award_achievement_to_user(username, achievement_name, badge_icon)
-        # Return True because this is the first time, and they should get the bonus.
-        return True
-    else:
-        # If they already have the achievement, they are not eligible for the bonus.
-        return False
-
-def update_gamification_progress(username, topic, score):
-    """Umbrella function to update all gamification systems."""
-    update_daily_challenge_progress(username, topic, score)
-    check_and_award_achievements(username, topic)
-
 # --- UTILITY FUNCTIONS FOR QUESTION GENERATION ---
 def _get_fraction_latex_code(f: Fraction):
     if f.denominator == 1: return str(f.numerator)
@@ -3093,50 +4316,129 @@ def _format_fraction_text(f: Fraction):
     if f.denominator == 1: return str(f.numerator)
     return f"{f.numerator}/{f.denominator}"
 
-def _finalize_options(options_set, default_type="int"):
-    """Ensures 4 unique options and shuffles them."""
+def _finalize_options(options_set, default_type="int", rng=random):
+    """Ensures 4 unique options and shuffles them with the generator's rng."""
     # Ensure options are strings before adding
     options_set = {str(o) for o in options_set}
     while len(options_set) < 4:
         if default_type == "fraction":
-            options_set.add(_format_fraction_text(Fraction(random.randint(1,20), random.randint(2,20))))
+            options_set.add(_format_fraction_text(Fraction(rng.randint(1,20), rng.randint(2,20))))
         elif default_type == "set_str":
-            options_set.add(str(set(random.sample(range(1,20), k=3))))
+            options_set.add(str(set(rng.sample(range(1,20), k=3))))
         else: # int
-            options_set.add(str(random.randint(1, 100)))
-    final_options = list(options_set)
-    random.shuffle(final_options)
+            options_set.add(str(rng.randint(1, 100)))
+    # Sorted first: set order of strings changes between processes, which would break seeded rebuilds.
+    final_options = sorted(options_set)
+    rng.shuffle(final_options)
     return final_options
 
 # ADD THIS NEW FUNCTION
-def get_question_id(question_text):
-    """Creates a unique and consistent ID for a question based on its text."""
-    return hashlib.md5(question_text.encode()).hexdigest()
+def _canonical_params(value):
+    """Turns a generator's params into plain JSON values: tuples become lists, sets sorted lists and Fractions strings."""
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_canonical_params(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((_canonical_params(item) for item in value), key=lambda item: json.dumps(item, sort_keys=True))
+    if isinstance(value, dict):
+        return {str(key): _canonical_params(item) for key, item in value.items()}
+    if isinstance(value, Fraction):
+        return str(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def get_question_id(question_data, topic):
+    """
+    Creates a canonical 64-bit ID for a question from (topic, q_type, params), the values its generator drew.
+    The wording is left out, so every phrasing of the same underlying problem gets the same ID.
+    """
+    q_type = question_data.get("q_type")
+    params = question_data.get("params")
+    canonical = [topic or "", q_type or ""]
+    if q_type is not None and params is not None:
+        canonical.append(json.dumps(_canonical_params(params), sort_keys=True, separators=(",", ":")))
+    else:
+        # Untyped questions (placeholders, or ones saved before q_type and params existed) keep their full wording.
+        parts = question_data.get("parts") or [question_data]
+        canonical += [question_data.get("stem", "")] + [part.get("question", "") for part in parts]
+        canonical += [str(part.get("answer", "")) for part in parts]
+    digest = hashlib.blake2b("\x1f".join(canonical).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True) # Signed so it fits a Postgres BIGINT
+
+# --- SHARED MATH LOOKUP TABLES ---
+# Small artifacts the generators used to recompute on every question: Pascal's triangle and its display,
+# exact roots, base-n digit strings, primes and modular inverses. They are built once per process on first
+# use and are read-only afterwards, so every session and generator thread shares one copy.
+MATH_TABLE_PASCAL_ROWS = 10 # Pascal's triangle is shown up to row 10 at most, to keep the display clean
+MATH_TABLE_BASE_LIMIT = 256 # Numbers below this have precomputed digit strings in bases 2 to 16
+MATH_TABLE_PRIME_LIMIT = 100
+
+_MathTables = collections.namedtuple("_MathTables", [
+    "pascal_rows", # pascal_rows[n][k] is C(n, k)
+    "pascal_displays", # pascal_displays[n] is rows 0 to n as a centered Markdown code block
+    "integer_roots", # integer_roots[(value, root)] is the exact square or cube root of value, for roots 1 to 20
+    "base_digits", # base_digits[base][n] is np.base_repr(n, base)
+    "primes", # every prime below MATH_TABLE_PRIME_LIMIT
+    "mod_inverses", # mod_inverses[p][a] is the inverse of a modulo p, for each prime p (None for a = 0)
+])
+
+def _pascal_rows(n):
+    """Rows 0 to n of Pascal's triangle, as tuples."""
+    rows, row = [], [1]
+    for _ in range(n + 1):
+        rows.append(tuple(row))
+        row = [x + y for x, y in zip([0] + row, row + [0])]
+    return rows
+
+def _format_pascal_triangle(rows):
+    """Formats Pascal's triangle rows as a centered, monospaced Markdown code block."""
+    max_len = len(" ".join(map(str, rows[-1])))
+    triangle_str = "```\n"
+    for row in rows:
+        triangle_str += " ".join(map(str, row)).center(max_len) + "\n"
+    return triangle_str + "```"
+
+@st.cache_resource
+def _build_math_tables():
+    """Builds the shared lookup tables (see above). Cached for the life of the process."""
+    pascal_rows = _pascal_rows(MATH_TABLE_PASCAL_ROWS)
+    is_prime = [True] * MATH_TABLE_PRIME_LIMIT
+    is_prime[0] = is_prime[1] = False
+    for p in range(2, math.isqrt(MATH_TABLE_PRIME_LIMIT - 1) + 1):
+        if is_prime[p]:
+            for multiple in range(p * p, MATH_TABLE_PRIME_LIMIT, p):
+                is_prime[multiple] = False
+    primes = tuple(p for p in range(MATH_TABLE_PRIME_LIMIT) if is_prime[p])
+    return _MathTables(
+        pascal_rows=tuple(pascal_rows),
+        pascal_displays=tuple(_format_pascal_triangle(pascal_rows[:n + 1]) for n in range(MATH_TABLE_PASCAL_ROWS + 1)),
+        integer_roots=types.MappingProxyType({(base ** root, root): base for root in (2, 3) for base in range(1, 21)}),
+        base_digits=types.MappingProxyType({base: tuple(np.base_repr(n, base) for n in range(MATH_TABLE_BASE_LIMIT)) for base in range(2, 17)}),
+        primes=primes,
+        mod_inverses=types.MappingProxyType({p: (None,) + tuple(pow(a, -1, p) for a in range(1, p)) for p in primes}),
+    )
+
+@functools.cache
+def _math_tables():
+    """The shared lookup tables. Memoized per script run, so generators skip the st.cache_resource lookup."""
+    return _build_math_tables()
+
+def _to_base(n, base):
+    """n written in the given base (as np.base_repr), read from the shared tables when it is in range."""
+    if 0 <= n < MATH_TABLE_BASE_LIMIT and 2 <= base <= 16:
+        return _math_tables().base_digits[base][n]
+    return np.base_repr(n, base)
 
 def _generate_pascal_data(n):
     """
-    Generates Pascal's triangle up to row n.
+    Pascal's triangle up to row n (capped at MATH_TABLE_PASCAL_ROWS), from the shared tables.
     Returns a formatted string for display and the last row as a list for calculations.
     """
-    if n > 10: n = 10  # Cap at row 10 to keep the display clean
-    
-    triangle = []
-    row = [1]
-    for _ in range(n + 1):
-        triangle.append(row)
-        row = [x + y for x, y in zip([0] + row, row + [0])]
-    
-    last_row = triangle[-1]
-    
-    # Format the triangle into a centered, monospaced string
-    max_len = len(" ".join(map(str, last_row)))
-    triangle_str = "```\n"  # Start of a Markdown code block for monospacing
-    for r in triangle:
-        row_str = " ".join(map(str, r))
-        triangle_str += row_str.center(max_len) + "\n"
-    triangle_str += "```"  # End of the code block
-    
-    return triangle_str, last_row
+    n = min(n, MATH_TABLE_PASCAL_ROWS)
+    tables = _math_tables()
+    return tables.pascal_displays[n], list(tables.pascal_rows[n])
 
 
 def _generate_user_pill_html(username):
@@ -3177,6 +4479,9 @@ def _generate_user_pill_html(username):
 
 # Paste this new function after _generate_user_pill_html
 
+# Every non-zero vector with components in -5..5, for generators that need a direction (no zero-vector retries)
+_NONZERO_VECTORS = [(x, y) for x in range(-5, 6) for y in range(-5, 6) if (x, y) != (0, 0)]
+
 def _poly_to_str(coeffs):
     """Converts a list of polynomial coefficients into a LaTeX string."""
     poly_parts = []
@@ -3202,16 +4507,147 @@ def _poly_to_str(coeffs):
         
     return " ".join(poly_parts).lstrip('+ ').replace("+ -", "- ")
 # --- FULLY IMPLEMENTED QUESTION GENERATION ENGINE (12 TOPICS) ---
+# Every generator's sub-types (q_types) per difficulty. Generators pick from here unless the caller asks for an
+# exact q_type, so this table is the one list of what each topic can produce.
+QUESTION_TYPES = {
+    "Sets": {
+        "Easy": ['notation_cardinality', 'basic_ops', 'total_subsets'],
+        "Medium": ['complement_difference', 'proper_subsets', 'venn_two', 'symmetric_difference'],
+        "Hard": ['set_laws', 'venn_three', 'power_sets', 'sets_probability'],
+    },
+    "Percentages": {
+        "Easy": ['conversion', 'percent_of'],
+        "Medium": ['express_as_percent', 'percent_change', 'profit_loss'],
+        "Hard": ['reverse_percent', 'successive_change', 'percent_error'],
+    },
+    "Fractions": {
+        "Easy": ['operation_simple', 'equivalent'], # Simple operations and direct equivalency
+        "Medium": ['operation_complex', 'bodmas', 'word_problem'], # Multi-step problems and more complex operations
+        "Hard": ['convert_mixed', 'compare', 'complex_fraction'], # Higher-level concepts like conversion, comparison, and complex structures
+    },
+    "Indices": {
+        "Easy": ['laws', 'standard_form'], # Basic laws and standard form conversion
+        "Medium": ['fractional', 'solve_same_base'], # Multi-step evaluation and solving with a common base
+        "Hard": ['solve_different_base'], # Requires finding a common base before solving
+    },
+    "Surds": {
+        "Easy": ['identify', 'simplify_single', 'ops_like_surds'],
+        "Medium": ['ops_unlike_surds', 'expand_single_bracket', 'rationalize_monomial', 'geometry_context'],
+        "Hard": ['rationalize_complex', 'nested_square_root', 'equality_of_surds', 'quadratic_roots', 'geometry_hard'],
+    },
+    "Binary Operations": {
+        "Easy": ['evaluate', 'table_read'], # Level 1: Foundations & Direct Computation
+        "Medium": ['identity', 'inverse', 'commutative', 'solve_simple'], # Level 2: Core Properties & Simple Equations
+        "Hard": ['associative', 'closure', 'modular_wassce', 'distributive'], # Level 3: Advanced & Abstract Properties
+    },
+    "Relations and Functions": {
+        "Easy": ['is_function', 'domain_range_pairs', 'evaluate_simple', 'properties_of_relations'], # Level 1: Foundations & Definitions
+        "Medium": ['types_of_mappings', 'domain_from_equation', 'composite_evaluation', 'algebra_of_functions'], # Level 2: Core Properties & Algebra
+        "Hard": ['composite_algebraic', 'inverse_function', 'properties_of_inverse', 'even_odd_functions', 'graph_transformations'], # Level 3: Advanced Functions & Their Properties
+    },
+    "Sequence and Series": {
+        "Easy": ['ap_term', 'gp_term'], # Fundamental calculations for AP and GP terms.
+        "Medium": ['ap_sum', 'word_problem'], # Multi-step calculations and application problems.
+        "Hard": ['gp_sum_inf'], # More advanced concepts like sum to infinity.
+    },
+    "Word Problems": {
+        "Easy": ['linear_number', 'ratio'], # Direct translation from words to a simple equation.
+        "Medium": ['age', 'consecutive_integers'], # Requires setting up a more complex equation with the variable on both sides.
+        "Hard": ['work_rate'], # Involves reciprocal rates, a classic challenging problem type.
+    },
+    "Shapes (Geometry)": {
+        "Easy": ['angles_lines', 'triangles_pythagoras'], # Foundational rules for angles and triangles.
+        "Medium": ['area_perimeter'], # Standard calculations for 2D shapes.
+        "Hard": ['volume_surface_area', 'circle_theorems'], # More complex 3D calculations and abstract theorems.
+    },
+    "Algebra Basics": {
+        "Easy": ['simplify_expression', 'solve_linear'], # Foundational skills: simplifying and solving basic linear equations.
+        "Medium": ['factorization', 'solve_inequality', 'algebraic_fractions'], # Core algebraic techniques: factoring, inequalities, and fractions.
+        "Hard": ['solve_simultaneous', 'solve_quadratic'], # Multi-step, complex problems: simultaneous and quadratic equations.
+    },
+    "Linear Algebra": {
+        "Easy": ['add_sub', 'determinant'], # Foundational 2x2 matrix operations.
+        "Medium": ['multiply'], # More complex row-by-column multiplication.
+        "Hard": ['inverse'], # Multi-step process of finding the inverse.
+    },
+    "Logarithms": {
+        "Easy": ['conversion', 'solve_simple_base', 'evaluate_power'], # CONSOLIDATED EASY: Now includes simple Power/Change of Base and uses variable bases
+        "Medium": ['variable_laws', 'evaluate_combined'], # CONSOLIDATED MEDIUM: Now uses variable expressions
+        "Hard": ['solve_combine', 'log_quadratic', 'log_simultaneous'], # HARD: Algebraic manipulation types remain expanded
+    },
+    "Probability": {
+        "Easy": ['simple'], # The most fundamental probability calculation.
+        "Medium": ['combined'], # Involves the union of two events.
+        "Hard": ['conditional'], # Involves dependent, conditional events.
+    },
+    "Binomial Theorem": {
+        "Easy": ['pascal_read'], # A new, foundational question type to test direct reading of Pascal's Triangle.
+        "Medium": ['find_coefficient'], # Your original 'find_coefficient' question.
+        "Hard": ['find_term'], # Your original 'find_term' question.
+    },
+    "Polynomial Functions": {
+        "Easy": ['remainder_theorem'], # Direct application of the Remainder Theorem.
+        "Medium": ['factor_theorem'], # Using the Factor Theorem to find an unknown.
+        "Hard": ['find_all_roots'], # A multi-step problem combining the Factor Theorem with solving a quadratic.
+    },
+    "Rational Functions": {
+        "Easy": ['simplify_expression', 'solve_equation'], # Foundational skills: simplifying and solving simple rational equations.
+        "Medium": ['domain', 'vertical_asymptotes', 'horizontal_asymptotes'], # Core concepts of identifying key features from the equation.
+        "Hard": ['find_holes', 'slant_asymptotes'], # More complex analysis requiring multiple steps (factoring, division).
+    },
+    "Trigonometry": {
+        "Easy": ['identity'],
+        "Medium": ['solve_equation'],
+        "Hard": ['cosine_rule'],
+    },
+    "Vectors": {
+        "Easy": ['algebra'], # Basic scalar multiplication and vector addition/subtraction.
+        "Medium": ['magnitude'], # Calculating the length/magnitude of a vector.
+        "Hard": ['dot_product'], # Multi-step problem to find the angle between vectors using the dot product.
+    },
+    "Statistics": {
+        "Easy": ['mode', 'range'], # The most basic measures of data.
+        "Medium": ['mean', 'median'], # Core measures of central tendency.
+        "Hard": ['frequency_tables', 'std_dev'], # More complex calculations involving grouped data or measures of spread.
+    },
+    "Coordinate Geometry": {
+        "Easy": ['midpoint', 'gradient'], # Foundational formulas for midpoint and gradient.
+        "Medium": ['distance', 'equation_point_slope'], # More complex formulas and initial equation-finding.
+        "Hard": ['equation_two_points', 'parallel_perpendicular'], # Multi-step problems combining formulas or analyzing relationships.
+    },
+    "Introduction to Calculus": {
+        "Easy": ['limits_substitution', 'diff_power_rule'], # Foundational concepts of limits and the power rule for differentiation.
+        "Medium": ['gradient_of_curve', 'indefinite_integration'], # Applying differentiation and introducing basic integration.
+        "Hard": ['find_constant_c', 'definite_integration'], # Multi-step integration problems.
+    },
+    "Number Bases": {
+        "Easy": ['to_base_10', 'from_base_10'], # Foundational conversion skills.
+        "Medium": ['addition', 'subtraction'], # Basic arithmetic in other bases.
+        "Hard": ['multiplication'], # More complex arithmetic.
+    },
+    "Modulo Arithmetic": {
+        "Easy": ['find_remainder', 'clock_arithmetic'], # Direct calculation and simple application.
+        "Medium": ['congruence', 'day_of_week'], # Understanding the concept of congruence and another application.
+        "Hard": ['solve_linear'], # Solving a linear congruence, which requires algebraic thinking.
+    },
+    "Advanced Combo": {
+        # Combos have no difficulty levels; listed in ADVANCED_COMBO_GENERATORS order.
+        None: ['geometry_algebra', 'surds_geometry', 'trig_vectors', 'prob_binomial', 'polynomial_functions',
+               'stats_probability', 'calculus_coord_geometry', 'number_bases_modulo', 'coord_geometry_algebra'],
+    },
+}
 
-def _generate_sets_question(difficulty="Medium"):
+def _pick_q_type(topic, difficulty, rng):
+    """Picks the sub-type for a generator call. Any difficulty other than Easy or Medium counts as Hard."""
+    q_types = QUESTION_TYPES[topic].get(difficulty) or QUESTION_TYPES[topic]["Hard"]
+    return q_types[0] if len(q_types) == 1 else rng.choice(q_types)
+
+
+def _generate_sets_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Sets question based on the detailed, multi-level syllabus."""
 
-    if difficulty == "Easy":
-        q_type = random.choice(['notation_cardinality', 'basic_ops', 'total_subsets'])
-    elif difficulty == "Medium":
-        q_type = random.choice(['complement_difference', 'proper_subsets', 'venn_two', 'symmetric_difference'])
-    else: # Hard
-        q_type = random.choice(['set_laws', 'venn_three', 'power_sets', 'sets_probability'])
+    if q_type is None:
+        q_type = _pick_q_type("Sets", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
@@ -3219,8 +4655,9 @@ def _generate_sets_question(difficulty="Medium"):
 
     # (The code for Easy questions and other question types remains unchanged)
     if q_type == 'notation_cardinality':
-        set_a = set(random.sample(range(1, 30), k=random.randint(4, 7)))
-        phrasing = random.choice([
+        set_a = set(rng.sample(range(1, 30), k=rng.randint(4, 7)))
+        params = (set_a,)
+        phrasing = rng.choice([
             f"What is the cardinality of the set $A = {set_a}$?",
             f"For the set $A = {set_a}$, find $n(A)$.",
             f"How many distinct elements are in the set $A = {set_a}$?"
@@ -3232,9 +4669,10 @@ def _generate_sets_question(difficulty="Medium"):
         options = {answer, str(len(set_a) + 1), str(len(set_a) - 1), str(sum(set_a))}
 
     elif q_type == 'basic_ops':
-        set_a = set(random.sample(range(1, 15), k=random.randint(3, 5)))
-        set_b = set(random.sample(range(1, 15), k=random.randint(3, 5)))
-        op, sym = random.choice([('union', '\\cup'), ('intersection', '\\cap')])
+        set_a = set(rng.sample(range(1, 15), k=rng.randint(3, 5)))
+        set_b = set(rng.sample(range(1, 15), k=rng.randint(3, 5)))
+        op, sym = rng.choice([('union', '\\cup'), ('intersection', '\\cap')])
+        params = (set_a, set_b, op)
         question = f"Given $A = {set_a}$ and $B = {set_b}$, find $A {sym} B$."
         res = set_a.union(set_b) if op == 'union' else set_a.intersection(set_b)
         answer = str(res) if res else "$\\emptyset$"
@@ -3243,8 +4681,9 @@ def _generate_sets_question(difficulty="Medium"):
         options = {answer, str(set_a.difference(set_b)), str(set_b.difference(set_a))}
 
     elif q_type == 'total_subsets':
-        num_elements = random.randint(3, 6)
-        s = set(random.sample(range(1, 100), k=num_elements))
+        num_elements = rng.randint(3, 6)
+        s = set(rng.sample(range(1, 100), k=num_elements))
+        params = (s,)
         question = f"How many subsets can be formed from the set $S = {s}$?"
         answer = str(2**num_elements)
         hint = "The formula for the total number of subsets of a set with 'n' elements is $2^n$."
@@ -3254,9 +4693,10 @@ def _generate_sets_question(difficulty="Medium"):
         options = {answer, distractor1, distractor2}
 
     elif q_type == 'complement_difference':
-        set_a = set(random.sample(range(1, 20), k=random.randint(5, 8)))
-        set_b = set(random.sample(range(1, 20), k=random.randint(5, 8)))
-        op = random.choice(['complement', 'difference'])
+        set_a = set(rng.sample(range(1, 20), k=rng.randint(5, 8)))
+        set_b = set(rng.sample(range(1, 20), k=rng.randint(5, 8)))
+        op = rng.choice(['complement', 'difference'])
+        params = (op, set_a) if op == 'complement' else (op, set_a, set_b)
         if op == 'complement':
             question = f"Given the universal set $\mathcal{{U}} = \\{{1, 2, ..., 20\\}}$ and $A = {set_a}$, find the complement, $A'$."
             res = universal_set - set_a
@@ -3273,8 +4713,9 @@ def _generate_sets_question(difficulty="Medium"):
             options = {answer, str(set_b.difference(set_a)), str(set_a.intersection(set_b))}
 
     elif q_type == 'proper_subsets':
-        num_elements = random.randint(3, 6)
-        s = set(random.sample(range(1, 100), k=num_elements))
+        num_elements = rng.randint(3, 6)
+        s = set(rng.sample(range(1, 100), k=num_elements))
+        params = (s,)
         question = f"How many **proper** subsets does the set $S = {s}$ have?"
         answer = str(2**num_elements - 1)
         hint = "The number of proper subsets is one less than the total number of subsets ($2^n - 1$)."
@@ -3283,16 +4724,17 @@ def _generate_sets_question(difficulty="Medium"):
 
     # --- 2.3: 2-Set Venn Diagram Problems (Medium) ---
     elif q_type == 'venn_two':
-        total, a_val, b_val, both = random.randint(80, 120), random.randint(30, 50), random.randint(30, 50), random.randint(10, 25)
+        a_val, b_val, both = rng.randint(30, 50), rng.randint(30, 50), rng.randint(10, 25)
         union = a_val + b_val - both
+        total = rng.randint(max(80, union), 120) # At least the union, so 'neither' is never negative
+        params = (a_val, b_val, both, total)
         neither = total - union
-        if neither < 0: return _generate_sets_question(difficulty=difficulty)
         
         # --- THIS IS THE NEW, MASSIVELY EXPANDED PHRASING BANK ---
         student_names = ["Joana","Happy","Doris","Gladys","Grace","Wassado","Jemima","Clementina","Bertha","Delight","Ampofo", "Julia", "Albert", "Confidence", "David", "Edmond", "Nuzrat", "Rawlings", "Georgina", "Isaac", "Korbey", "Wisdom", "Stephen", "Nnyibi", "Martin", "Yussif", "Awake", "Ferguson", "Grace", "Bernice", "Lazarus", "Agbey", "Emic", "Melody", "Christable", "Benedicta", "Irene"]
         local_schools = ["Ho Mawuli","Mawuko Girls","Prang SHS","Sunyani SHS","Keta SHTS","Jinijini SHS","Krachi SHS","Ola Girls","Kajaji SHS", "Bassa Community SHS", "Kwame Danso SHS", "Atebubu SHS"]
-        student_1, student_2 = random.sample(student_names, 2)
-        school_1, school_2 = random.sample(local_schools, 2)
+        student_1, student_2 = rng.sample(student_names, 2)
+        school_1, school_2 = rng.sample(local_schools, 2)
 
         contexts = [
             (f"like {student_1}'s favourite food, Waakye", f"like {student_2}'s favourite, Jollof rice", "customers", "at a chop bar in Kojokrom"),
@@ -3310,15 +4752,16 @@ def _generate_sets_question(difficulty="Medium"):
             ("shop at Melcom", "shop at Shoprite", "customers", "at the mall"),
             (f"support {student_1}'s team, Asante Kotoko", f"support {student_2}'s team, Hearts of Oak", "football fans", "in a survey")
         ]
-        item_a, item_b, group, context = random.choice(contexts)
+        item_a, item_b, group, context = rng.choice(contexts)
         
-        phrasing, unknown = random.choice([
+        phrasing, unknown = rng.choice([
             (f"Of {total} {group} {context}, {a_val} {item_a} and {b_val} {item_b}. If {both} do both, how many do neither?", "neither"),
             (f"Of {total} {group} {context}, {a_val} {item_a} and {b_val} {item_b}. If {neither} do neither, how many do both?", "both")
         ])
         # --- END OF THE PHRASING BANK ---
         
         question = phrasing
+        params += (unknown,)
         answer = str(neither) if unknown == "neither" else str(both)
         hint = "Use the formula $n(Total) = n(A) + n(B) - n(A \\cap B) + n(Neither)$ or draw a Venn diagram."
         explanation = f"We have $n(A) = {a_val}$, $n(B) = {b_val}$, and $n(A \\cap B) = {both}$.\nThe number who are in at least one set is $n(A \\cup B) = n(A) + n(B) - n(A \\cap B) = {a_val} + {b_val} - {both} = {union}$.\nThe number in neither set is $n(Total) - n(A \\cup B) = {total} - {union} = {neither}$."
@@ -3327,12 +4770,13 @@ def _generate_sets_question(difficulty="Medium"):
         b_only = b_val - both
         options = {str(neither), str(both), str(a_only), str(b_only)}
         
-        return {"question": question, "options": list(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+        return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
     # --- 3.1: Symmetric Difference (Hard) ---
     elif q_type == 'symmetric_difference':
-        set_a = set(random.sample(range(1, 20), k=random.randint(4, 6)))
-        set_b = set(random.sample(range(1, 20), k=random.randint(4, 6)))
+        set_a = set(rng.sample(range(1, 20), k=rng.randint(4, 6)))
+        set_b = set(rng.sample(range(1, 20), k=rng.randint(4, 6)))
+        params = (set_a, set_b)
         question = f"Given $A = {set_a}$ and $B = {set_b}$, find the symmetric difference $A \\Delta B$."
         res = set_a.symmetric_difference(set_b)
         answer = str(res) if res else "$\\emptyset$"
@@ -3342,12 +4786,13 @@ def _generate_sets_question(difficulty="Medium"):
 
     # --- 3.2: Laws of Algebra of Sets (Hard) ---
     elif q_type == 'set_laws':
-        law, answer = random.choice([
+        law, answer = rng.choice([
             ("De Morgan's Law states that $(A \\cup B)'$ is equivalent to:", "$A' \\cap B'$"),
             ("The Distributive Law states that $A \\cap (B \\cup C)$ is equivalent to:", "$(A \\cap B) \\cup (A \\cap C)$"),
             ("The Complement Law states that $A \\cup A'$ is equal to:", "$\\mathcal{U}$ (the universal set)"),
             ("The Associative Law states that $(A \\cup B) \\cup C$ is equivalent to:", "$A \\cup (B \\cup C)$")
         ])
+        params = (law,)
         question = law
         hint = "Recall the fundamental laws governing set operations."
         explanation = f"This is a direct application of the standard laws of the algebra of sets. The correct identity is **{answer}**."
@@ -3357,14 +4802,14 @@ def _generate_sets_question(difficulty="Medium"):
 
     # --- 3.3: 3-Set Venn Diagram Problems (Hard) ---
     elif q_type == 'venn_three':
-        regions = [random.randint(5, 15) for _ in range(7)]
+        regions = [rng.randint(5, 15) for _ in range(7)]
         r1, r2, r3, r12, r23, r13, r123 = regions
         
         # --- THIS IS THE NEW, MASSIVELY EXPANDED PHRASING BANK ---
         student_names = ["Joana","Happy","Doris","Gladys","Grace","Wassado","Jemima","Clementina","Bertha","Delight","Ampofo", "Julia", "Albert", "Confidence", "David", "Edmond", "Nuzrat", "Rawlings", "Georgina", "Isaac", "Korbey", "Wisdom", "Stephen", "Nnyibi", "Martin", "Yussif", "Awake", "Ferguson", "Grace", "Bernice", "Lazarus", "Agbey", "Emic", "Melody", "Christable", "Benedicta", "Irene"]
         local_schools = ["Ho Mawuli","Mawuko Girls","Prang SHS","Sunyani SHS","Keta SHTS","Jinijini SHS","Krachi SHS","Ola Girls","Kajaji SHS", "Bassa Community SHS", "Kwame Danso SHS", "Atebubu SHS"]
-        student_1, student_2, student_3 = random.sample(student_names, 3)
-        school_1 = random.choice(local_schools)
+        student_1, student_2, student_3 = rng.sample(student_names, 3)
+        school_1 = rng.choice(local_schools)
         
         contexts = [
             ("students", "Maths", "Science", "English", f"at {school_1}"),
@@ -3375,18 +4820,20 @@ def _generate_sets_question(difficulty="Medium"):
             ("commuters", "taking a Trotro", "riding an Okada", "taking a taxi", "in a busy city"),
             ("patients", "having a headache", "having a cough", "having a fever", "at a clinic in Kojokrom")
         ]
-        group, item_a, item_b, item_c, context = random.choice(contexts)
+        group, item_a, item_b, item_c, context = rng.choice(contexts)
         # --- END OF THE PHRASING BANK ---
         
         total_A = r1 + r12 + r13 + r123
         total_B = r2 + r12 + r23 + r123
         total_C = r3 + r13 + r23 + r123
         
-        asked_for, answer_val = random.choice([
+        asked_index = rng.choice(range(3)) # Which 'only' region is asked for (the same draw as choosing from the list)
+        asked_for, answer_val = [
             (f"liked **only** {item_a}", r1),
             (f"liked **only** {item_b}", r2),
             (f"liked **only** {item_c}", r3)
-        ])
+        ][asked_index]
+        params = (regions, asked_index)
 
         question = (f"A survey of {group} {context} found the following:\n"
                     f"- {total_A} liked {item_a}\n"
@@ -3406,12 +4853,13 @@ def _generate_sets_question(difficulty="Medium"):
         options = {str(r1), str(r2), str(r3), str(r12), str(r13), str(r23), str(r123)}
         options.add(answer) 
         
-        return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+        return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
     # --- 3.4: Power Sets (Hard) ---
     elif q_type == 'power_sets':
-        s_elements = sorted(random.sample(range(1, 10), 3))
+        s_elements = sorted(rng.sample(range(1, 10), 3))
         s = set(s_elements)
+        params = (s_elements,)
         answer = f"$\\{{\\emptyset, \\{{{s_elements[0]}\\}}, \\{{{s_elements[1]}\\}}, \\{{{s_elements[2]}\\}}, \\{{{s_elements[0]}, {s_elements[1]}\\}}, \\{{{s_elements[0]}, {s_elements[2]}\\}}, \\{{{s_elements[1]}, {s_elements[2]}\\}}, \\{{{s_elements[0]}, {s_elements[1]}, {s_elements[2]}\\}}\\}}"
         question = f"What is the Power Set, $\mathcal{{P}}(S)$, of the set $S = {s}$?"
         hint = "The Power Set is the set of all possible subsets of S, including the empty set and the set S itself."
@@ -3421,7 +4869,8 @@ def _generate_sets_question(difficulty="Medium"):
     # --- 3.5: Sets and Probability (Hard) ---
     elif q_type == 'sets_probability':
         total = 100
-        a, b, intersection = random.randint(30, 50), random.randint(20, 40), random.randint(10, 20)
+        a, b, intersection = rng.randint(30, 50), rng.randint(20, 40), rng.randint(10, 20)
+        params = (a, b, intersection)
         prob_a = Fraction(a, total); prob_b = Fraction(b, total); prob_intersect = Fraction(intersection, total)
         prob_union = prob_a + prob_b - prob_intersect
         question = f"In a group of students, the probability that a student speaks Twi is ${prob_a.numerator}/{prob_a.denominator}$ and the probability that a student speaks Ga is ${prob_b.numerator}/{prob_b.denominator}$. If the probability that a student speaks both is ${prob_intersect.numerator}/{prob_intersect.denominator}$, what is the probability that a student speaks either Twi or Ga?"
@@ -3430,33 +4879,30 @@ def _generate_sets_question(difficulty="Medium"):
         explanation = f"Let T be the event of speaking Twi and G be the event of speaking Ga.\n$P(T \\cup G) = P(T) + P(G) - P(T \\cap G)$\n$P(T \\cup G) = {_get_fraction_latex_code(prob_a)} + {_get_fraction_latex_code(prob_b)} - {_get_fraction_latex_code(prob_intersect)} = {_get_fraction_latex_code(prob_union)}$."
         options = {answer, f"${_get_fraction_latex_code(prob_a+prob_b)}$", f"${_get_fraction_latex_code(prob_intersect)}$"}
 
-    final_options = _finalize_options(options, default_type="set_str")
-    return {"question": question, "options": final_options, "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    final_options = _finalize_options(options, default_type="set_str", rng=rng)
+    return {"question": question, "options": final_options, "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
 # --- END: REVISED AND FINAL FUNCTION _generate_sets_question ---
-def _generate_percentages_question(difficulty="Medium"):
+def _generate_percentages_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Percentages question based on difficulty, preserving all original sub-types."""
     
-    if difficulty == "Easy":
-        q_type = random.choice(['conversion', 'percent_of'])
-    elif difficulty == "Medium":
-        q_type = random.choice(['express_as_percent', 'percent_change', 'profit_loss'])
-    else: # Hard
-        q_type = random.choice(['reverse_percent', 'successive_change', 'percent_error'])
+    if q_type is None:
+        q_type = _pick_q_type("Percentages", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- Easy Questions ---
     if q_type == 'conversion':
-        frac = Fraction(random.randint(1, 4), random.choice([5, 8, 10, 20, 25]))
+        frac = Fraction(rng.randint(1, 4), rng.choice([5, 8, 10, 20, 25]))
         percent = frac.numerator / frac.denominator * 100
         decimal = frac.numerator / frac.denominator
-        start_form, end_form, ans_val = random.choice([
+        start_form, end_form, ans_val = rng.choice([
             (f"${_get_fraction_latex_code(frac)}$", "a percentage", f"{percent:.0f}%"),
             (f"{decimal}", "a percentage", f"{percent:.0f}%"),
             (f"{percent:.0f}%", "a decimal", f"{decimal}")
         ])
+        params = (frac, start_form)
         question = f"Express {start_form} as {end_form}."
         answer = str(ans_val)
         hint = "To convert from a fraction/decimal to a percentage, multiply by 100. To convert from a percentage to a decimal, divide by 100."
@@ -3464,7 +4910,8 @@ def _generate_percentages_question(difficulty="Medium"):
         options = {answer, f"{decimal*10}%", f"{percent/10}"}
 
     elif q_type == 'percent_of':
-        percent, number = random.randint(1, 19)*5, random.randint(10, 50)*10
+        percent, number = rng.randint(1, 19)*5, rng.randint(10, 50)*10
+        params = (percent, number)
         question = f"Calculate {percent}% of GHS {number:.2f}."
         answer = f"GHS {(percent/100)*number:.2f}"
         hint = "Convert the percentage to a decimal (divide by 100) and then multiply."
@@ -3473,7 +4920,8 @@ def _generate_percentages_question(difficulty="Medium"):
 
     # --- Medium Questions ---
     elif q_type == 'express_as_percent':
-        part, whole = random.randint(10, 40), random.randint(50, 100)
+        part, whole = rng.randint(10, 40), rng.randint(50, 100)
+        params = (part, whole)
         question = f"In a school in Accra, {part} students out of {whole} are boys. What percentage of the students are boys?"
         answer = f"{(part/whole)*100:.1f}%"
         hint = "Use the formula: (Part / Whole) * 100%."
@@ -3481,7 +4929,8 @@ def _generate_percentages_question(difficulty="Medium"):
         options = {answer, f"{(whole/part)*100:.1f}%", f"{part*100/whole:.0f}%"}
 
     elif q_type == 'percent_change':
-        old, new = random.randint(50, 200), random.randint(201, 400)
+        old, new = rng.randint(50, 200), rng.randint(201, 400)
+        params = (old, new)
         question = f"The price of a textbook increased from GHS {old} to GHS {new}. Find the percentage increase."
         ans_val = ((new - old) / old) * 100
         answer = f"{ans_val:.1f}%"
@@ -3490,7 +4939,8 @@ def _generate_percentages_question(difficulty="Medium"):
         options = {answer, f"{((new-old)/new)*100:.1f}%", f"{ans_val:.0f}%"}
 
     elif q_type == 'profit_loss':
-        cost, selling = random.randint(100, 200), random.randint(201, 300)
+        cost, selling = rng.randint(100, 200), rng.randint(201, 300)
+        params = (cost, selling)
         question = f"A trader in Kumasi bought an item for GHS {cost} and sold it for GHS {selling}. Calculate the profit percent."
         profit = selling - cost
         ans_val = (profit / cost) * 100
@@ -3501,8 +4951,9 @@ def _generate_percentages_question(difficulty="Medium"):
 
     # --- Hard Questions ---
     elif q_type == 'reverse_percent':
-        original_price = random.randint(100, 400)
-        discount = random.randint(1, 8) * 5 # 5, 10, 15... 40
+        original_price = rng.randint(100, 400)
+        discount = rng.randint(1, 8) * 5 # 5, 10, 15... 40
+        params = (original_price, discount)
         final_price = original_price * (1 - discount/100)
         question = f"After a {discount}% discount, a shirt costs GHS {final_price:.2f}. What was the original price?"
         answer = f"GHS {original_price:.2f}"
@@ -3512,8 +4963,9 @@ def _generate_percentages_question(difficulty="Medium"):
 
     elif q_type == 'successive_change':
         initial_val = 1000
-        increase = random.randint(10, 20)
-        decrease = random.randint(5, 9)
+        increase = rng.randint(10, 20)
+        decrease = rng.randint(5, 9)
+        params = (increase, decrease)
         val_after_increase = initial_val * (1 + increase/100)
         final_val = val_after_increase * (1 - decrease/100)
         net_change = ((final_val - initial_val) / initial_val) * 100
@@ -3524,8 +4976,9 @@ def _generate_percentages_question(difficulty="Medium"):
         options = {answer, f"{increase-decrease}%", f"{increase-decrease:.2f}%"}
 
     elif q_type == 'percent_error':
-        actual = random.randint(50, 100)
-        error = random.randint(1, 5)
+        actual = rng.randint(50, 100)
+        error = rng.randint(1, 5)
+        params = (actual, error)
         measured = actual + error
         question = f"A length was measured as {measured} cm, but the actual length was {actual} cm. Calculate the percentage error."
         ans_val = (error / actual) * 100
@@ -3534,28 +4987,22 @@ def _generate_percentages_question(difficulty="Medium"):
         explanation = f"1. Error = Measured - Actual = {measured} - {actual} = {error}.\n2. Percentage Error = (\\frac{{{error}}}{{{actual}}}) \\times 100\\% = {answer}$."
         options = {answer, f"{(error/measured)*100:.2f}%", f"{ans_val:.1f}%"}
 
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
-def _generate_fractions_question(difficulty="Medium"):
+def _generate_fractions_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Fractions question based on difficulty, preserving all original sub-types."""
 
-    if difficulty == "Easy":
-        # Simple operations and direct equivalency
-        q_type = random.choice(['operation_simple', 'equivalent'])
-    elif difficulty == "Medium":
-        # Multi-step problems and more complex operations
-        q_type = random.choice(['operation_complex', 'bodmas', 'word_problem'])
-    else: # Hard
-        # Higher-level concepts like conversion, comparison, and complex structures
-        q_type = random.choice(['convert_mixed', 'compare', 'complex_fraction'])
+    if q_type is None:
+        q_type = _pick_q_type("Fractions", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- Easy Questions ---
     if q_type == 'operation_simple':
-        f1, f2 = Fraction(random.randint(1, 5), random.randint(2, 6)), Fraction(random.randint(1, 5), random.randint(2, 6))
-        op, sym = random.choice([('add', '+'), ('subtract', '-')])
+        f1, f2 = Fraction(rng.randint(1, 5), rng.randint(2, 6)), Fraction(rng.randint(1, 5), rng.randint(2, 6))
+        op, sym = rng.choice([('add', '+'), ('subtract', '-')])
+        params = (f1, f2, op)
         question = f"Calculate: ${_get_fraction_latex_code(f1)} {sym} ${_get_fraction_latex_code(f2)}$"
         res = f1 + f2 if op == 'add' else f1 - f2
         answer = _format_fraction_text(res)
@@ -3564,7 +5011,8 @@ def _generate_fractions_question(difficulty="Medium"):
         options = {answer, _format_fraction_text(f1*f2)}
 
     elif q_type == 'equivalent':
-        num, den, multiplier = random.randint(2, 5), random.randint(6, 11), random.randint(2, 5)
+        num, den, multiplier = rng.randint(2, 5), rng.randint(6, 11), rng.randint(2, 5)
+        params = (num, den, multiplier)
         question = f"Find the missing value: $\\frac{{{num}}}{{{den}}} = \\frac{{?}}{{{den*multiplier}}}$"
         answer = str(num * multiplier)
         hint = "To find an equivalent fraction, whatever you multiply the denominator by, you must also multiply the numerator by."
@@ -3573,9 +5021,10 @@ def _generate_fractions_question(difficulty="Medium"):
 
     # --- Medium Questions ---
     elif q_type == 'operation_complex':
-        f1, f2 = Fraction(random.randint(1, 10), random.randint(2, 10)), Fraction(random.randint(1, 10), random.randint(2, 10))
-        op, sym = random.choice([('multiply', '\\times'), ('divide', '\\div')])
+        f1, f2 = Fraction(rng.randint(1, 10), rng.randint(2, 10)), Fraction(rng.randint(1, 10), rng.randint(2, 10))
+        op, sym = rng.choice([('multiply', '\\times'), ('divide', '\\div')])
         if op == 'divide' and f2.numerator == 0: f2 = Fraction(1, f2.denominator) # Avoid division by zero
+        params = (f1, f2, op)
         question = f"Calculate: ${_get_fraction_latex_code(f1)} {sym} {_get_fraction_latex_code(f2)}$"
         res = f1 * f2 if op == 'multiply' else f1 / f2
         answer = _format_fraction_text(res)
@@ -3584,7 +5033,8 @@ def _generate_fractions_question(difficulty="Medium"):
         options = {answer, _format_fraction_text(f1+f2)}
 
     elif q_type == 'bodmas':
-        a, b, c = [random.randint(2, 6) for _ in range(3)]
+        a, b, c = [rng.randint(2, 6) for _ in range(3)]
+        params = (a, b, c)
         question = f"Evaluate the expression: $ (\\frac{{1}}{{{a}}} + \\frac{{1}}{{{b}}}) \\times {c} $"
         res = (Fraction(1, a) + Fraction(1, b)) * c
         answer = _format_fraction_text(res)
@@ -3594,7 +5044,8 @@ def _generate_fractions_question(difficulty="Medium"):
         options = {answer, distractor}
 
     elif q_type == 'word_problem':
-        den = random.choice([3, 4, 5, 8]); num = random.randint(1, den-1); quantity = random.randint(10, 20) * den
+        den = rng.choice([3, 4, 5, 8]); num = rng.randint(1, den-1); quantity = rng.randint(10, 20) * den
+        params = (num, den, quantity)
         question = f"A student in Accra had {quantity} oranges and gave away $\\frac{{{num}}}{{{den}}}$ of them. How many oranges did the student have left?"
         answer = str(int(quantity * (1-Fraction(num,den))))
         hint = "First, find the fraction of oranges remaining. Then, multiply that fraction by the total number of oranges."
@@ -3603,15 +5054,17 @@ def _generate_fractions_question(difficulty="Medium"):
 
     # --- Hard Questions ---
     elif q_type == 'convert_mixed':
-        whole, num, den = random.randint(1, 5), random.randint(1, 5), random.randint(6, 10)
+        whole, num, den = rng.randint(1, 5), rng.randint(1, 5), rng.randint(6, 10)
         improper_num = whole * den + num; improper_frac = Fraction(improper_num, den)
         mixed_num_latex = f"{whole}\\frac{{{num}}}{{{den}}}"
-        if random.random() > 0.5:
+        if rng.random() > 0.5:
+            params = (whole, num, den, 'to_improper')
             question = f"Convert the mixed number ${mixed_num_latex}$ to an improper fraction."
             answer = _format_fraction_text(improper_frac)
             hint = "Multiply the whole number by the denominator, then add the numerator. Keep the same denominator."
             explanation = f"Calculation: $({whole} \\times {den}) + {num} = {improper_num}$. The improper fraction is ${_get_fraction_latex_code(improper_frac)}$."
         else:
+            params = (whole, num, den, 'to_mixed')
             question = f"Convert the improper fraction ${_get_fraction_latex_code(improper_frac)}$ to a mixed number."
             answer = f"${mixed_num_latex}$"
             hint = "Divide the numerator by the denominator. The quotient is the whole number, and the remainder is the new numerator."
@@ -3619,8 +5072,9 @@ def _generate_fractions_question(difficulty="Medium"):
         options = {answer, f"{whole*num+den}/{den}", f"{improper_num}/{num}"}
 
     elif q_type == 'compare':
-        f1 = Fraction(random.randint(1, 4), random.randint(5, 10)); f2 = Fraction(random.randint(1, 4), random.randint(5, 10));
-        while f1 == f2: f2 = Fraction(random.randint(1, 4), random.randint(5, 10))
+        f1 = Fraction(rng.randint(1, 4), rng.randint(5, 10)); f2 = Fraction(rng.randint(1, 4), rng.randint(5, 10));
+        while f1 == f2: f2 = Fraction(rng.randint(1, 4), rng.randint(5, 10))
+        params = (f1, f2)
         question = f"Which of the following statements is true?"
         answer = f"${_get_fraction_latex_code(f1)} > {_get_fraction_latex_code(f2)}$" if f1 > f2 else f"${_get_fraction_latex_code(f1)} < {_get_fraction_latex_code(f2)}$"
         hint = "To compare fractions, you can find a common denominator or convert them to decimals."
@@ -3628,7 +5082,8 @@ def _generate_fractions_question(difficulty="Medium"):
         options = {answer, f"${_get_fraction_latex_code(f1)} = {_get_fraction_latex_code(f2)}$", f"${_get_fraction_latex_code(f1)} < {_get_fraction_latex_code(f2)}$" if f1 > f2 else f"${_get_fraction_latex_code(f1)} > {_get_fraction_latex_code(f2)}$"}
 
     elif q_type == 'complex_fraction':
-        f1, f2 = Fraction(random.randint(1, 5), random.randint(2, 6)), Fraction(random.randint(1, 5), random.randint(2, 6))
+        f1, f2 = Fraction(rng.randint(1, 5), rng.randint(2, 6)), Fraction(rng.randint(1, 5), rng.randint(2, 6))
+        params = (f1, f2)
         question = f"Simplify the complex fraction: $\\frac{{{_get_fraction_latex_code(f1)}}}{{{_get_fraction_latex_code(f2)}}}$"
         answer = _format_fraction_text(f1 / f2)
         hint = "This is simply a division problem. Rewrite the complex fraction as (top fraction) ÷ (bottom fraction)."
@@ -3636,33 +5091,27 @@ def _generate_fractions_question(difficulty="Medium"):
         explanation = f"This is equivalent to ${_get_fraction_latex_code(f1)} \\div {_get_fraction_latex_code(f2)}$, which becomes ${_get_fraction_latex_code(f1)} \\times {inverted_f2_latex} = {_get_fraction_latex_code(f1/f2)}$."
         options = {answer, _format_fraction_text(f1*f2), _format_fraction_text(f1+f2)}
 
-    return {"question": question, "options": _finalize_options(options, "fraction"), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
-def _generate_indices_question(difficulty="Medium"):
+    return {"question": question, "options": _finalize_options(options, "fraction", rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
+def _generate_indices_question(difficulty="Medium", rng=random, q_type=None):
     """Generates an Indices question based on difficulty, preserving all original sub-types."""
     
-    if difficulty == "Easy":
-        # Basic laws and standard form conversion
-        q_type = random.choice(['laws', 'standard_form'])
-    elif difficulty == "Medium":
-        # Multi-step evaluation and solving with a common base
-        q_type = random.choice(['fractional', 'solve_same_base'])
-    else: # Hard
-        # Requires finding a common base before solving
-        q_type = 'solve_different_base'
+    if q_type is None:
+        q_type = _pick_q_type("Indices", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- Easy Questions ---
     if q_type == 'laws':
-        base = random.randint(2, 7)
-        p1, p2 = random.randint(5, 10), random.randint(2, 4)
-        op, sym, res_p, rule = random.choice([
+        base = rng.randint(2, 7)
+        p1, p2 = rng.randint(5, 10), rng.randint(2, 4)
+        op, sym, res_p, rule = rng.choice([
             ('multiply', '\\times', p1+p2, 'a^m \\times a^n = a^{m+n}'), 
             ('divide', '\\div', p1-p2, 'a^m \\div a^n = a^{m-n}'),
             ('power', ')', p1*p2, '(a^m)^n = a^{mn}')
         ])
         
+        params = (base, p1, p2, op)
         if op == 'power':
             question = f"Simplify the expression: $({base}^{{{p1}}})^{{{p2}}}$"
             explanation = f"Using the power of a power rule, $(x^a)^b = x^{{ab}}$, we get $({base}^{{{p1}}})^{{{p2}}} = {base}^{{{p1*p2}}}$."
@@ -3675,8 +5124,9 @@ def _generate_indices_question(difficulty="Medium"):
         options = {answer, f"${base}^{{{p1+p2}}}$", f"${base}^{{{p1-p2 if p1 > p2 else p2-p1}}}$"}
 
     elif q_type == 'standard_form':
-        num = round(random.uniform(1.0, 9.9), random.randint(2, 4))
-        power = random.randint(3, 6)
+        num = round(rng.uniform(1.0, 9.9), rng.randint(2, 4))
+        power = rng.randint(3, 6)
+        params = (num, power)
         decimal_form = f"{num / (10**power):.{power+len(str(int(num)))}f}"
         answer = f"${num} \\times 10^{{-{power}}}$"
         distractors = {f"${num} \\times 10^{{{power}}}$", f"${round(num*10, 2)} \\times 10^{{-{power+1}}}$"}
@@ -3687,21 +5137,23 @@ def _generate_indices_question(difficulty="Medium"):
 
     # --- Medium Questions ---
     elif q_type == 'fractional':
-        base_num = random.choice([4, 8, 9, 16, 27, 64])
+        base_num = rng.choice([4, 8, 9, 16, 27, 64])
         root = 2 if base_num in [4, 9, 16] else 3
-        power = random.randint(2, 3)
+        power = rng.randint(2, 3)
+        params = (base_num, power)
         question = f"Evaluate: ${base_num}^{{\\frac{{{power}}}{{{root}}}}}$"
-        res = int(round((base_num**(1/root))**power))
+        root_value = _math_tables().integer_roots[(base_num, root)]
+        res = root_value ** power
         answer = str(res)
         hint = "First, find the root of the base number (denominator of the fraction), then apply the power (numerator of the fraction)."
-        explanation = f"The expression ${base_num}^{{\\frac{{{power}}}{{{root}}}}}$ means $(\\sqrt[{root}]{{{base_num}}})^{{{power}}}$.\n1. $\\sqrt[{root}]{{{base_num}}} = {int(base_num**(1/root))}$.\n2. $({int(base_num**(1/root))})^{{{power}}} = {res}$."
+        explanation = f"The expression ${base_num}^{{\\frac{{{power}}}{{{root}}}}}$ means $(\\sqrt[{root}]{{{base_num}}})^{{{power}}}$.\n1. $\\sqrt[{root}]{{{base_num}}} = {root_value}$.\n2. $({root_value})^{{{power}}} = {res}$."
         options = {answer, str(int(base_num*power/root)), str(int(base_num+power/root))}
 
     elif q_type == 'solve_same_base':
-        base = random.randint(2, 5)
-        power = random.randint(2, 4)
+        base = rng.randint(2, 5)
         a, b = 2, -1
-        while (power - b) % a != 0: power = random.randint(2, 5) # Ensure integer answer
+        power = rng.choice([3, 5]) # (power - b) must be divisible by a for an integer answer, so power is odd
+        params = (base, power)
         question = f"Solve for the variable $x$: ${base}^{{{a}x + ({b})}} = {base**power}$"
         answer = _format_fraction_text(Fraction(power - b, a))
         hint = "If the bases on both sides of an equation are the same, you can set the exponents equal to each other."
@@ -3711,13 +5163,14 @@ def _generate_indices_question(difficulty="Medium"):
     # --- Hard Question ---
     elif q_type == 'solve_different_base':
         problems = [(4, 2, 8, 3, 2), (9, 2, 27, 3, 3), (8, 3, 4, 2, 2)]
-        base1, p1, base2, p2, common_base = random.choice(problems)
-        k = random.randint(1, 4)
+        base1, p1, base2, p2, common_base = rng.choice(problems)
+        k = rng.randint(1, 4)
         # Equation: (cb^p1)^x = (cb^p2)^(x-k) => p1*x = p2*x - p2*k => (p1-p2)x = -p2*k
+        params = (base1, base2, k)
         x_val_frac = Fraction(-p2 * k, p1 - p2)
         # Ensure the problem gives a clean integer answer
         if x_val_frac.denominator != 1:
-            return _generate_indices_question(difficulty=difficulty) # Regenerate if not an integer
+            return _generate_indices_question(difficulty=difficulty, rng=rng, q_type=q_type) # Regenerate if not an integer
         x_val = x_val_frac.numerator
         
         question = f"Solve for x in the equation: ${base1}^x = {base2}^{{x-{k}}}$"
@@ -3730,27 +5183,24 @@ def _generate_indices_question(difficulty="Medium"):
                        f"5. Solve for x: $({p1-p2})x = {-p2*k} \\implies x = {x_val}$.")
         options = {answer, str(k), str(x_val + 1), str(x_val -1)}
 
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
 # --- START: REVISED FUNCTION _generate_surds_question (Corrected Indentation) ---
 # Reason for change: To fix an IndentationError caused by a copy-paste issue. This version has the correct spacing.
 
-def _generate_surds_question(difficulty="Medium"):
-    if difficulty == "Easy":
-        q_type = random.choice(['identify', 'simplify_single', 'ops_like_surds'])
-    elif difficulty == "Medium":
-        q_type = random.choice(['ops_unlike_surds', 'expand_single_bracket', 'rationalize_monomial', 'geometry_context'])
-    else: # Hard
-        q_type = random.choice(['rationalize_complex', 'nested_square_root', 'equality_of_surds', 'quadratic_roots', 'geometry_hard'])
+def _generate_surds_question(difficulty="Medium", rng=random, q_type=None):
+    if q_type is None:
+        q_type = _pick_q_type("Surds", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- 1.1: Identifying Surds (Easy) ---
     if q_type == 'identify':
-        perfect_square = random.randint(3, 12)**2
-        non_square_base = random.choice([2, 3, 5, 6, 7, 10, 11, 13, 14, 15])
-        phrasing = random.choice([
+        perfect_square = rng.randint(3, 12)**2
+        non_square_base = rng.choice([2, 3, 5, 6, 7, 10, 11, 13, 14, 15])
+        params = (perfect_square, non_square_base)
+        phrasing = rng.choice([
             "Which of the following numbers is a surd?",
             "Identify the irrational number in the form of a surd from the options below.",
             "Which of the following roots cannot be simplified to a rational number?"
@@ -3758,20 +5208,21 @@ def _generate_surds_question(difficulty="Medium"):
         question = phrasing
         answer = f"$\\sqrt{{{non_square_base}}}$"
         hint = "A surd is an irrational number. If a square root simplifies to a whole number, it is rational, not a surd."
-        explanation = f"$\\sqrt{{{perfect_square}}}$ simplifies to {int(math.sqrt(perfect_square))}, which is a rational number. However, $\\sqrt{{{non_square_base}}}$ is a surd."
-        options = {answer, f"$\\sqrt{{{perfect_square}}}$", str(random.randint(2,10)), f"$\\frac{{1}}{{2}}$"}
+        explanation = f"$\\sqrt{{{perfect_square}}}$ simplifies to {_math_tables().integer_roots[(perfect_square, 2)]}, which is a rational number. However, $\\sqrt{{{non_square_base}}}$ is a surd."
+        options = {answer, f"$\\sqrt{{{perfect_square}}}$", str(rng.randint(2,10)), f"$\\frac{{1}}{{2}}$"}
 
     # --- 1.2: Simplifying Single Surds (Easy) ---
     elif q_type == 'simplify_single':
-        p_sq, n = random.choice([(4, 3), (4, 5), (9, 2), (9, 3), (16, 2), (25, 3), (36, 2)])
+        p_sq, n = rng.choice([(4, 3), (4, 5), (9, 2), (9, 3), (16, 2), (25, 3), (36, 2)])
         num = p_sq * n
-        phrasing = random.choice([
+        params = (num,)
+        phrasing = rng.choice([
             f"Express $\\sqrt{{{num}}}$ in its simplest surd form.",
             f"What is the simplified form of $\\sqrt{{{num}}}$?",
             f"Simplify the expression $\\sqrt{{{num}}}$ completely."
         ])
         question = phrasing
-        answer = f"${int(math.sqrt(p_sq))}\\sqrt{{{n}}}$"
+        answer = f"${_math_tables().integer_roots[(p_sq, 2)]}\\sqrt{{{n}}}$"
         hint = f"Find the largest perfect square that is a factor of {num}."
         explanation = f"To simplify, we find the largest perfect square factor of {num}, which is {p_sq}.\n$\\sqrt{{{num}}} = \\sqrt{{{p_sq} \\times {n}}} = \\sqrt{{{p_sq}}} \\times \\sqrt{{{n}}} = {answer}$."
         distractor1 = f"${n}\\sqrt{{{p_sq}}}$"
@@ -3780,9 +5231,10 @@ def _generate_surds_question(difficulty="Medium"):
 
     # --- 1.3: Basic Operations on Like Surds (Easy) ---
     elif q_type == 'ops_like_surds':
-        base_surd = random.choice([2, 3, 5, 7])
-        c1, c2 = random.randint(2, 10), random.randint(2, 10)
-        op, sym, res = random.choice([('add', '+', c1+c2), ('subtract', '-', c1-c2)])
+        base_surd = rng.choice([2, 3, 5, 7])
+        c1, c2 = rng.randint(2, 10), rng.randint(2, 10)
+        op, sym, res = rng.choice([('add', '+', c1+c2), ('subtract', '-', c1-c2)])
+        params = (base_surd, c1, c2, op)
         question = f"Simplify: ${c1}\\sqrt{{{base_surd}}} {sym} {c2}\\sqrt{{{base_surd}}}$"
         answer = f"${res}\\sqrt{{{base_surd}}}$"
         hint = "You can add or subtract 'like surds' by adding or subtracting their coefficients."
@@ -3793,11 +5245,12 @@ def _generate_surds_question(difficulty="Medium"):
 
     # --- 2.1: Operations on Unlike Surds (Medium) ---
     elif q_type == 'ops_unlike_surds':
-        n = random.choice([2, 3, 5])
-        p1, p2 = random.choice([(4,9), (4,16), (9,25)])
-        s1, s2 = int(math.sqrt(p1)), int(math.sqrt(p2))
-        c1, c2 = random.randint(2, 5), random.randint(2, 5)
+        n = rng.choice([2, 3, 5])
+        p1, p2 = rng.choice([(4,9), (4,16), (9,25)])
+        s1, s2 = _math_tables().integer_roots[(p1, 2)], _math_tables().integer_roots[(p2, 2)]
+        c1, c2 = rng.randint(2, 5), rng.randint(2, 5)
         term1, term2 = c1 * s1, c2 * s2
+        params = (n, p1, p2, c1, c2)
         question = f"Simplify completely: ${c1}\\sqrt{{{p1*n}}} + {c2}\\sqrt{{{p2*n}}}$"
         answer = f"${term1 + term2}\\sqrt{{{n}}}$"
         hint = "First, simplify each surd term into its simplest form. Then, check if you have like surds to combine."
@@ -3808,7 +5261,8 @@ def _generate_surds_question(difficulty="Medium"):
 
     # --- 2.2: Expansion of Single Brackets (Medium) ---
     elif q_type == 'expand_single_bracket':
-        a, b, c = random.choice([2,3,5]), random.choice([2,3,5]), random.randint(2,6)
+        a, b, c = rng.choice([2,3,5]), rng.choice([2,3,5]), rng.randint(2,6)
+        params = (a, b, c)
         question = f"Expand and simplify the expression: $\\sqrt{{{a}}}({c} + \\sqrt{{{b}}})$"
         if a == b: answer = f"${c}\\sqrt{{{a}}} + {a}$"
         else: answer = f"${c}\\sqrt{{{a}}} + \\sqrt{{{a*b}}}$"
@@ -3820,8 +5274,9 @@ def _generate_surds_question(difficulty="Medium"):
 
     # --- 2.3: Rationalizing Monomial Denominators (Medium) ---
     elif q_type == 'rationalize_monomial':
-        n = random.choice([2,3,5,6,7])
-        a = random.randint(2,10) * n
+        n = rng.choice([2,3,5,6,7])
+        a = rng.randint(2,10) * n
+        params = (a, n)
         question = f"Express $\\frac{{{a}}}{{\\sqrt{{{n}}}}}$ with a rational denominator."
         answer = f"${a//n}\\sqrt{{{n}}}$"
         hint = "Multiply the numerator and the denominator by the surd in the denominator (in this case, by $\\sqrt{n}$)."
@@ -3833,13 +5288,14 @@ def _generate_surds_question(difficulty="Medium"):
     # --- 2.4 & 2.5: Geometry (Medium & Hard) ---
     elif q_type in ['geometry_context', 'geometry_hard']:
         if difficulty == "Medium":
-            problem_type = random.choice(['pythagoras', 'rectangle_area', 'rectangle_perimeter'])
+            problem_type = rng.choice(['pythagoras', 'rectangle_area', 'rectangle_perimeter'])
         else: # Hard
-            problem_type = random.choice(['cuboid_volume', 'trigonometry_sohcahtoa'])
+            problem_type = rng.choice(['cuboid_volume', 'trigonometry_sohcahtoa'])
 
         if problem_type == 'pythagoras':
-            a_val, b_val = random.choice([(2,3), (5,7), (6,3), (11,5)])
+            a_val, b_val = rng.choice([(2,3), (5,7), (6,3), (11,5)])
             c_sq = a_val + b_val
+            params = (problem_type, a_val, b_val)
             question = f"A right-angled triangle has shorter sides of length $\\sqrt{{{a_val}}}$ cm and $\\sqrt{{{b_val}}}$ cm. Find the exact length of the hypotenuse."
             answer = f"$\\sqrt{{{c_sq}}}$ cm"
             hint = "Use Pythagoras' theorem: $a^2 + b^2 = c^2$. Remember that $(\\sqrt{x})^2 = x$."
@@ -3849,9 +5305,10 @@ def _generate_surds_question(difficulty="Medium"):
             options = {answer, distractor1, distractor2}
 
         elif problem_type in ['rectangle_area', 'rectangle_perimeter']:
-            n = random.choice([2, 3, 5])
-            p1, p2 = random.choice([(4,9), (4,16), (9,25)])
-            l_simp, w_simp = int(math.sqrt(p1)), int(math.sqrt(p2))
+            n = rng.choice([2, 3, 5])
+            p1, p2 = rng.choice([(4,9), (4,16), (9,25)])
+            l_simp, w_simp = _math_tables().integer_roots[(p1, 2)], _math_tables().integer_roots[(p2, 2)]
+            params = (problem_type, n, p1, p2)
             l_unsimp, w_unsimp = p1*n, p2*n
             
             if problem_type == 'rectangle_area':
@@ -3873,7 +5330,8 @@ def _generate_surds_question(difficulty="Medium"):
 
         elif problem_type == 'cuboid_volume':
             l, w, h = 2, 3, 5
-            c1, c2, c3 = random.randint(2,4), random.randint(2,4), random.randint(2,4)
+            c1, c2, c3 = rng.randint(2,4), rng.randint(2,4), rng.randint(2,4)
+            params = (problem_type, c1, c2, c3)
             question = f"A cuboid has dimensions of ${c1}\\sqrt{{{l}}}$ cm, ${c2}\\sqrt{{{w}}}$ cm, and ${c3}\\sqrt{{{h}}}$ cm. Find its exact volume."
             answer = f"${c1*c2*c3}\\sqrt{{{l*w*h}}}$ cm³"
             hint = "Volume of a cuboid = length × width × height. Multiply the rational coefficients and the surds separately."
@@ -3883,9 +5341,10 @@ def _generate_surds_question(difficulty="Medium"):
             options = {answer, distractor1, f"{surface_area_approx:.0f} cm²"}
         
         elif problem_type == 'trigonometry_sohcahtoa':
-            opp, hyp = random.choice([(1,2), (math.sqrt(3), 2), (1, math.sqrt(2))])
+            opp, hyp = rng.choice([(1,2), (math.sqrt(3), 2), (1, math.sqrt(2))])
             adj_sq = hyp**2 - opp**2
             adj = math.sqrt(adj_sq)
+            params = (problem_type, round(opp**2), round(hyp))
             question = f"In a right-angled triangle, the side opposite angle $\\theta$ is $\\sqrt{{{int(opp**2)}}}$ cm and the hypotenuse is ${int(hyp)}$ cm. What is the exact length of the adjacent side?"
             answer = f"$\\sqrt{{{int(adj_sq)}}}$ cm" if adj != int(adj) else f"{int(adj)} cm"
             hint = "Use Pythagoras' theorem, $a^2 + b^2 = c^2$, to find the missing side."
@@ -3896,7 +5355,8 @@ def _generate_surds_question(difficulty="Medium"):
 
     # --- 3.1: Expansion of Double Brackets (Hard) ---
     elif q_type == 'expand_double_bracket':
-        a, b, c = random.randint(2, 5), random.choice([2, 3, 5]), random.randint(2, 5)
+        a, b, c = rng.randint(2, 5), rng.choice([2, 3, 5]), rng.randint(2, 5)
+        params = (a, b, c)
         question = f"Expand and simplify: $({a} + \\sqrt{{{b}}})({c} - \\sqrt{{{b}}})$"
         res_term1, res_term2 = a*c - b, c - a
         answer = f"${res_term1} + {res_term2}\\sqrt{{{b}}}$" if res_term2 >= 0 else f"${res_term1} - {abs(res_term2)}\\sqrt{{{b}}}$"
@@ -3905,9 +5365,10 @@ def _generate_surds_question(difficulty="Medium"):
         options = {answer, f"{a*c+b} + {c+a}\\sqrt{{{b}}}$"}
 
     # --- 3.2: Advanced Rationalization (Hard) ---
-    elif q_type == 'rationalize_binomial':
-        n = random.choice([2,3,5]); a,b,c,d = [random.randint(1,5) for _ in range(4)]
-        while c*c == d*d*n: c,d = random.randint(1,5), random.randint(1,5)
+    elif q_type == 'rationalize_complex':
+        n = rng.choice([2,3,5]); a,b,c,d = [rng.randint(1,5) for _ in range(4)]
+        while c*c == d*d*n: c,d = rng.randint(1,5), rng.randint(1,5)
+        params = (n, a, b, c, d)
         question = f"Express $\\frac{{{a} + {b}\\sqrt{{{n}}}}}{{{c} - {d}\\sqrt{{{n}}}}}$ in the form $p + q\\sqrt{{{n}}}$."
         den = c*c - d*d*n
         num_rat = a*c + b*d*n
@@ -3925,6 +5386,7 @@ def _generate_surds_question(difficulty="Medium"):
     # --- 3.3: Equality of Surds (Hard) ---
     elif q_type == 'equality_of_surds':
         x, y = 6, -8; base = 5
+        params = (x, y, base)
         question = f"Find the values of the rational numbers $x$ and $y$ that satisfy the equation: $$x(3 - \\sqrt{{{base}}}) = 8 + \\frac{{y\\sqrt{{{base}}}}}{{3 + \\sqrt{{{base}}}}}$$"
         answer = f"x = {x}, y = {y}"
         hint = "Simplify both sides to the form $A+B\\sqrt{5}$, then equate the rational and irrational parts to form simultaneous equations."
@@ -3933,8 +5395,9 @@ def _generate_surds_question(difficulty="Medium"):
 
     # --- 3.4: Nested Square Roots (Hard) ---
     elif q_type == 'nested_square_root':
-        a, b = random.choice([(6,5), (7,3), (11,5), (8,3)])
+        a, b = rng.choice([(6,5), (7,3), (11,5), (8,3)])
         A, C = a + b, 4 * a * b
+        params = (a, b)
         question = f"Simplify the expression completely: $\\sqrt{{{A} - \\sqrt{{{C}}}}}$"
         answer = f"$\\sqrt{{{a}}} - \\sqrt{{{b}}}$"
         hint = "The expression is not in the form $\\sqrt{A - 2\\sqrt{B}}$. You must first manipulate the inner surd, $\\sqrt{C}$, to pull out a '2'."
@@ -3945,38 +5408,32 @@ def _generate_surds_question(difficulty="Medium"):
 
     # --- 3.5: Crossover - Surds and Quadratic Equations (Hard) ---
     elif q_type == 'quadratic_roots':
-        r1_a, r1_b, n = random.randint(2,5), random.randint(1,3), random.choice([2,3,5])
+        r1_a, r1_b, n = rng.randint(2,5), rng.randint(1,3), rng.choice([2,3,5])
         sum_of_roots = 2*r1_a
         product_of_roots = r1_a*r1_a - r1_b*r1_b*n
+        params = (r1_a, r1_b, n)
         question = f"Find the quadratic equation in the form $x^2 + px + q = 0$ whose roots are $({r1_a} + {r1_b}\\sqrt{{{n}}})$ and $({r1_a} - {r1_b}\\sqrt{{{n}}})$."
         answer = f"$x^2 - {sum_of_roots}x + {product_of_roots} = 0$"
         hint = "A quadratic equation can be formed from its roots using $x^2 - (\\text{sum of roots})x + (\\text{product of roots}) = 0$."
         explanation = f"1. Sum of roots = $({r1_a} + {r1_b}\\sqrt{{{n}}}) + ({r1_a} - {r1_b}\\sqrt{{{n}}}) = {sum_of_roots}$.\n2. Product of roots = $({r1_a} + {r1_b}\\sqrt{{{n}}})({r1_a} - {r1_b}\\sqrt{{{n}}}) = {r1_a**2} - ({r1_b**2} \\times {n}) = {product_of_roots}$.\n3. The equation is $x^2 - ({sum_of_roots})x + ({product_of_roots}) = 0$."
         options = {answer, f"$x^2 + {sum_of_roots}x + {product_of_roots} = 0$", f"$x^2 - {sum_of_roots}x - {product_of_roots} = 0$"}
 
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
 # --- END: REVISED FUNCTION _generate_surds_question ---
-def _generate_binary_ops_question(difficulty="Medium"):
+def _generate_binary_ops_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Binary Operations question based on the detailed, multi-level curriculum."""
 
-    if difficulty == "Easy":
-        # Level 1: Foundations & Direct Computation
-        q_type = random.choice(['evaluate', 'table_read'])
-    elif difficulty == "Medium":
-        # Level 2: Core Properties & Simple Equations
-        q_type = random.choice(['identity', 'inverse', 'commutative', 'solve_simple'])
-    else: # Hard
-        # Level 3: Advanced & Abstract Properties
-        q_type = random.choice(['associative', 'closure', 'modular_wassce', 'distributive'])
+    if q_type is None:
+        q_type = _pick_q_type("Binary Operations", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- 1.1: Direct Evaluation (Easy) ---
     if q_type == 'evaluate':
-        a, b = random.randint(-5, 8), random.randint(-5, 8)
-        while a==0 or b==0: a, b = random.randint(-5, 8), random.randint(-5, 8)
+        a, b = rng.randint(-5, 8), rng.randint(-5, 8)
+        while a==0 or b==0: a, b = rng.randint(-5, 8), rng.randint(-5, 8)
         
         op_templates = [
             (f"p \\ast q = pq - p + 2q", lambda p,q: p*q - p + 2*q),
@@ -3984,10 +5441,11 @@ def _generate_binary_ops_question(difficulty="Medium"):
             (f"m \\nabla n = m + n - 5", lambda p,q: p + q - 5),
             (f"a \\Delta b = 3a - b^2", lambda p,q: 3*p - q**2)
         ]
-        op_def, op_func = random.choice(op_templates)
+        op_def, op_func = rng.choice(op_templates)
         op_sym = op_def.split(" ")[1]
         
-        phrasing = random.choice([
+        params = (op_def, a, b)
+        phrasing = rng.choice([
             f"A binary operation {op_sym} is defined by ${op_def}$. Evaluate $({a} {op_sym} {b})$.",
             f"Given the operation {op_sym} on the set of real numbers by ${op_def}$, find the value of $({a} {op_sym} {b})$.",
             f"If $p {op_sym} q = {op_def.split('=')[1].strip()}$, what is the value of $({a} {op_sym} {b})$?"
@@ -3998,23 +5456,24 @@ def _generate_binary_ops_question(difficulty="Medium"):
         explanation = f"1. The rule is ${op_def}$.\n2. Substitute the first value ({a}) and the second value ({b}).\n3. Calculation: ${op_func(a,b)}$."
         # Smart Distractors
         distractor1 = str(op_func(b, a)) # Swapped order
-        distractor2 = str(op_func(a, b) + random.choice([-1, 1])) # Off by one
+        distractor2 = str(op_func(a, b) + rng.choice([-1, 1])) # Off by one
         options = {answer, distractor1, distractor2}
 
     # --- 1.2: Reading Cayley Tables (Easy) ---
     elif q_type == 'table_read':
         s = ['a', 'b', 'c', 'd']
-        op_sym = random.choice(["$\\ast$", "$\\otimes$", "$\\circ$"])
+        op_sym = rng.choice(["$\\ast$", "$\\otimes$", "$\\circ$"])
         results = {}
         for row in s:
             for col in s:
-                results[(row, col)] = random.choice(s)
+                results[(row, col)] = rng.choice(s)
         table_md = f"| {op_sym} | a | b | c | d |\n|---|---|---|---|---|\n"
         for row in s:
             table_md += f"| **{row}** |";
             for col in s: table_md += f" {results.get((row, col))} |"
             table_md += "\n"
-        a, b = random.sample(s, 2)
+        a, b = rng.sample(s, 2)
+        params = ([results[(row, col)] for row in s for col in s], a, b)
         question = f"The operation {op_sym} on the set $\\{{a, b, c, d\\}}$ is defined by the Cayley table below. Find the value of $({a} {op_sym} {b})$.\n\n{table_md}"
         answer = str(results.get((a,b)))
         hint = "Find the row for the first element and the column for the second element. The answer is where they intersect."
@@ -4025,12 +5484,12 @@ def _generate_binary_ops_question(difficulty="Medium"):
     elif q_type in ['identity', 'inverse']:
         # Create a large pool of varied operation templates
         op_templates = [
-            (f"a \\ast b = a+b-{random.randint(2, 9)}", lambda k: k, lambda e, elem: 2*e - elem),
+            (f"a \\ast b = a+b-{rng.randint(2, 9)}", lambda k: k, lambda e, elem: 2*e - elem),
             (f"a \\ast b = a+b+\\frac{{ab}}{{2}}", lambda k: 0, lambda e, elem: Fraction(-2 * elem, 2 + elem)),
             (f"p \\circ q = pq", lambda k: 1, lambda e, elem: Fraction(1, elem)),
             (f"m \\nabla n = m+n-mn", lambda k: 0, lambda e, elem: Fraction(-elem, 1 - elem))
         ]
-        op_def, identity_func, inverse_func = random.choice(op_templates)
+        op_def, identity_func, inverse_func = rng.choice(op_templates)
         op_sym = op_def.split(" ")[1]
         
         # We need a dummy 'k' for the functions, though it's not always used
@@ -4038,15 +5497,17 @@ def _generate_binary_ops_question(difficulty="Medium"):
         identity_element = identity_func(dummy_k)
 
         if q_type == 'identity':
+            params = (op_def,)
             question = f"Find the identity element, $e$, for the binary operation ${op_def}$ on the set of real numbers."
             answer = str(identity_element)
             hint = "The identity element 'e' is the number that satisfies the equation $a \\ast e = a$ for any 'a'."
             explanation = f"We solve the equation $a \\ast e = a$. For the rule ${op_def}$, this becomes an equation we solve for $e$. The result is $e = {answer}$."
             options = {answer, "0", "1", "a"}
         else: # Inverse
-            element_to_invert = random.randint(identity_element + 2, identity_element + 10)
+            element_to_invert = rng.randint(identity_element + 2, identity_element + 10)
             inverse_val = inverse_func(identity_element, element_to_invert)
             
+            params = (op_def, element_to_invert)
             question = f"For the binary operation ${op_def}$, find the inverse of the element ${element_to_invert}$."
             answer = _format_fraction_text(inverse_val) if isinstance(inverse_val, Fraction) else str(inverse_val)
             hint = f"First, find the identity element 'e'. Then, find the inverse '$a^{{-1}}$' by solving ${element_to_invert} \\ast a^{{-1}} = e$."
@@ -4055,14 +5516,15 @@ def _generate_binary_ops_question(difficulty="Medium"):
 
     # --- 2.3: Commutativity (Medium) ---
     elif q_type == 'commutative':
-        op_sym = random.choice([r"\Delta", r"\circ", r"\star"])
+        op_sym = rng.choice([r"\Delta", r"\circ", r"\star"])
         templates = [
             (f"a {op_sym} b = a+b-ab", "Yes"),
             (f"a {op_sym} b = 2a+2b", "Yes"),
             (f"a {op_sym} b = a-b", "No"),
             (f"a {op_sym} b = a^2 - 2b", "No")
         ]
-        op_def, answer = random.choice(templates)
+        op_def, answer = rng.choice(templates)
+        params = (op_def.split('=')[1].strip(),) # The symbol is only wording
         question = f"The operation {op_sym} is defined by ${op_def}$ on the set of real numbers. Is this operation commutative?"
         hint = "An operation is commutative if $a \\ast b = b \\ast a$ for all values. Check if the formula is symmetric when you swap 'a' and 'b'."
         explanation = f"We must check if $a {op_sym} b = b {op_sym} a$.\n$a {op_sym} b = {op_def.split('=')[1].strip()}$.\n$b {op_sym} a$ would be `{op_def.split('=')[1].strip().replace('a', 'TEMP').replace('b', 'a').replace('TEMP', 'b')}`.\nComparing these two expressions, we see they are {'equal' if answer == 'Yes' else 'not equal'}. Therefore, the operation is **{answer.lower()}**."
@@ -4070,20 +5532,21 @@ def _generate_binary_ops_question(difficulty="Medium"):
 
     # --- 2.4: Simple Equations (Medium) ---
     elif q_type == 'solve_simple':
-        unknown_var = random.choice(['k', 'x', 'n', 'p'])
-        var_val = random.randint(2, 8)
-        b = random.randint(2, 8)
+        unknown_var = rng.choice(['k', 'x', 'n', 'p'])
+        var_val = rng.randint(2, 8)
+        b = rng.randint(2, 8)
         
         op_templates = [
             (f"a \\ast b = 2a + 3b", lambda var, const: 2*var + 3*const),
             (f"a \\ast b = ab - a", lambda var, const: var*const - var),
             (f"a \\ast b = a^2 + b", lambda var, const: var**2 + const)
         ]
-        op_def, op_func = random.choice(op_templates)
+        op_def, op_func = rng.choice(op_templates)
         op_sym = op_def.split(" ")[1]
         
         result = op_func(var_val, b)
         
+        params = (op_def, var_val, b)
         question = f"A binary operation is defined by ${op_def}$. Find the value of ${unknown_var}$ such that ${unknown_var} \\ast {b} = {result}$."
         answer = str(var_val)
         hint = f"Substitute the values into the given formula to form an equation, then solve for {unknown_var}."
@@ -4092,24 +5555,26 @@ def _generate_binary_ops_question(difficulty="Medium"):
 
     # --- 3.1 & 3.2: Associativity & Closure (Hard) ---
     elif q_type in ['associative', 'closure']:
-        op_sym = random.choice([r"\ast", r"\otimes"])
+        op_sym = rng.choice([r"\ast", r"\otimes"])
         if q_type == 'associative':
             templates = [
                 (f"a {op_sym} b = a + b + 2", "Yes"), (f"a {op_sym} b = ab", "Yes"),
                 (f"a {op_sym} b = 2a + b", "No"), (f"a {op_sym} b = a - b", "No")
             ]
-            op_def, answer = random.choice(templates)
+            op_def, answer = rng.choice(templates)
+            params = (op_def.split('=')[1].strip(),)
             question = f"Is the binary operation ${op_def}$ associative on the set of real numbers?"
             hint = "An operation is associative if $(a \\ast b) \\ast c = a \\ast (b \\ast c)$. You must expand both sides algebraically and compare them."
             explanation = f"To test for associativity, we check if $(a {op_sym} b) {op_sym} c = a {op_sym} (b {op_sym} c)$. For the operation ${op_def}$, this property is found to be **{answer.lower()}**."
             options = {"Yes", "No", "Commutative"} # Smart distractor: Commutative
         else: # Closure
-            set_name, set_desc, op_def, answer = random.choice([
+            set_name, set_desc, op_def, answer = rng.choice([
                 ("the set of Odd Integers", "\\{..., -3, -1, 1, 3, ...\\}", "a \\ast b = ab", "Yes"),
                 ("the set of Even Integers", "\\{..., -2, 0, 2, 4, ...\\}", "a \\ast b = a + b", "Yes"),
                 ("the set of Odd Integers", "\\{..., -3, -1, 1, 3, ...\\}", "a \\ast b = a + b", "No"),
                 ("the set $\\{ -1, 0, 1 \\}$", "", "a \\ast b = ab", "Yes")
             ])
+            params = (set_name, op_def)
             question = f"Consider the operation ${op_def}$ on {set_name}{'' if not set_desc else f', $S = {set_desc}$'}. Is the set S closed under this operation?"
             hint = "A set is closed under an operation if performing the operation on any two elements from the set always results in an answer that is also in the set."
             explanation = f"We must check if taking any two elements from {set_name} and applying the operation always produces a result that is also a member of that set. For this combination, the property is **{answer.lower()}**."
@@ -4122,7 +5587,8 @@ def _generate_binary_ops_question(difficulty="Medium"):
         op_def = f"p \\ast q = (p + {a_coeff}q) \\pmod{{{n}}}"
         identity = 0 # p + 2*0 = p
         inverse_of_3 = 1 # 3 + 2*1 = 5 = 0 mod 5
-        phrasing = random.choice([
+        params = (n, a_coeff)
+        phrasing = rng.choice([
             f"An operation $\\ast$ is defined on the set $S = {set_str}$ by the rule ${op_def}$. Find the inverse of the element 3.",
             f"On the set of integers modulo {n}, an operation is defined by ${op_def}$. What is the inverse of 3 under this operation?"
         ])
@@ -4136,35 +5602,31 @@ def _generate_binary_ops_question(difficulty="Medium"):
     elif q_type == 'distributive':
         op1_def = "a \\ast b = ab"
         op2_def = "p \\circ q = p+q"
+        params = (op1_def, op2_def)
         question = f"Two binary operations are defined on the set of real numbers as ${op1_def}$ and ${op2_def}$. Is the operation $\\ast$ (multiplication) distributive over $\\circ$ (addition)?"
         answer = "Yes"
         hint = "To check if $\\ast$ is distributive over $\\circ$, you must test if $a \\ast (p \\circ q) = (a \\ast p) \\circ (a \\ast q)$ holds true."
         explanation = f"We must check if $a \\times (p+q) = (a \\times p) + (a \\times q)$.\n- LHS: $a(p+q) = ap + aq$.\n- RHS: $ap + aq$.\nSince the Left Hand Side equals the Right Hand Side, the operation **is distributive**."
         options = {"Yes", "No", "Only for positive numbers"}
 
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
-def _generate_relations_functions_question(difficulty="Medium"):
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
+def _generate_relations_functions_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Relations and Functions question based on the detailed, multi-level syllabus."""
 
-    if difficulty == "Easy":
-        # Level 1: Foundations & Definitions
-        q_type = random.choice(['is_function', 'domain_range_pairs', 'evaluate_simple', 'properties_of_relations'])
-    elif difficulty == "Medium":
-        # Level 2: Core Properties & Algebra
-        q_type = random.choice(['types_of_mappings', 'domain_from_equation', 'composite_evaluation', 'algebra_of_functions'])
-    else: # Hard
-        # Level 3: Advanced Functions & Their Properties
-        q_type = random.choice(['composite_algebraic', 'inverse_function', 'properties_of_inverse', 'even_odd_functions', 'graph_transformations'])
+    if q_type is None:
+        q_type = _pick_q_type("Relations and Functions", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
+    params = None # graph_transformations has no branch yet, so it keeps the wording fingerprint
 
     # --- 1.1: Identifying Functions (Easy) ---
     if q_type == 'is_function':
-        d = sorted(random.sample(range(1, 20), 4))
-        r = random.sample(range(5, 30), 4)
+        d = sorted(rng.sample(range(1, 20), 4))
+        r = rng.sample(range(5, 30), 4)
         func_relation = str({(d[0], r[0]), (d[1], r[1]), (d[2], r[2])})
         not_func_relation = str({(d[0], r[0]), (d[0], r[1]), (d[1], r[2])})
+        params = (d[:3], r[:3])
         question = "Which of the following relations is also a function?"
         answer = func_relation
         hint = "A relation is a function if every input (first element) maps to exactly one output (second element)."
@@ -4173,12 +5635,13 @@ def _generate_relations_functions_question(difficulty="Medium"):
 
     # --- 1.2: Domain and Range from Ordered Pairs (Easy) ---
     elif q_type == 'domain_range_pairs':
-        domain_list = sorted(list(set(random.sample(range(-10, 10), k=random.randint(4, 5)))))
-        range_list = sorted(list(set(random.sample(range(-10, 10), k=random.randint(4, 5)))))
-        relation_pairs = list(zip(domain_list, random.sample(range_list, len(domain_list))))
+        domain_list = sorted(list(set(rng.sample(range(-10, 10), k=rng.randint(4, 5)))))
+        range_list = sorted(list(set(rng.sample(range(-10, 10), k=rng.randint(4, 5)))))
+        relation_pairs = list(zip(domain_list, rng.sample(range_list, len(domain_list))))
         relation_str = str(set(relation_pairs)).replace("'", "")
         actual_domain, actual_range = set(p[0] for p in relation_pairs), set(p[1] for p in relation_pairs)
-        d_or_r = random.choice(['domain', 'range'])
+        d_or_r = rng.choice(['domain', 'range'])
+        params = (sorted(relation_pairs), d_or_r)
         question = f"What is the {d_or_r} of the relation $R = {relation_str}$?"
         domain_set_str, range_set_str = str(actual_domain), str(actual_range)
         if d_or_r == 'domain':
@@ -4188,11 +5651,12 @@ def _generate_relations_functions_question(difficulty="Medium"):
         hint = "The domain is the set of all unique first elements (x-values). The range (or image) is the set of all unique second elements (y-values)."
         explanation = f"For the relation $R$, we collect all the first numbers to get the domain and all the second numbers to get the range.\n- Domain = ${domain_set_str}$.\n- Range = ${range_set_str}$."
         options = {answer, distractor, str(actual_domain.union(actual_range))}
-        return {"question": question, "options": _finalize_options(options, "set_str"), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+        return {"question": question, "options": _finalize_options(options, "set_str", rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
     # --- 1.3: Basic Function Evaluation (Easy) ---
     elif q_type == 'evaluate_simple':
-        a, b, x = random.randint(2, 8), random.randint(-10, 10), random.randint(1, 7)
+        a, b, x = rng.randint(2, 8), rng.randint(-10, 10), rng.randint(1, 7)
+        params = (a, b, x)
         question = f"If $f(x) = {a}x^2 + {b}$, find the value of $f({x})$."
         answer = str(a * (x**2) + b)
         hint = "Substitute the given value for 'x' into the function's definition and evaluate."
@@ -4202,12 +5666,13 @@ def _generate_relations_functions_question(difficulty="Medium"):
     # --- 1.4: Properties of Relations (Easy) ---
     elif q_type == 'properties_of_relations':
         s = {1, 2, 3}
-        prop, relation, ans = random.choice([
+        prop, relation, ans = rng.choice([
             ("Reflexive", "$\\{(1,1), (2,2), (3,3)\\}$", "Yes"),
             ("Symmetric", "$\\{(1,2), (2,1), (2,3), (3,2)\\}$", "Yes"),
             ("Transitive", "$\\{(1,2), (2,3), (1,3)\\}$", "Yes"),
             ("Symmetric", "$\\{(1,2), (2,3), (3,1)\\}$", "No")
         ])
+        params = (prop, relation)
         question = f"Is the relation $R = {relation}$ on the set $S = \\{{1,2,3\\}}$ **{prop}**?"
         answer = ans
         hint = f"A relation is {prop} if for its elements, a specific condition is met (e.g., for Symmetric, if (a,b) is in R, then (b,a) must also be in R)."
@@ -4219,17 +5684,19 @@ def _generate_relations_functions_question(difficulty="Medium"):
         domain = [1, 2, 3, 4]
         codomain = ['a', 'b', 'c', 'd', 'e']
         
-        # Create clear examples for each type
-        one_to_one = str({(domain[0], codomain[0]), (domain[1], codomain[1]), (domain[2], codomain[2])})
-        many_to_one = str({(domain[0], codomain[0]), (domain[1], codomain[0]), (domain[2], codomain[1])})
-        one_to_many = str({(domain[0], codomain[0]), (domain[0], codomain[1]), (domain[1], codomain[2])})
+        # Create clear examples for each type (pairs written in sorted order so seeded rebuilds match)
+        def set_str(pairs): return "{" + ", ".join(map(str, sorted(pairs))) + "}"
+        one_to_one = set_str({(domain[0], codomain[0]), (domain[1], codomain[1]), (domain[2], codomain[2])})
+        many_to_one = set_str({(domain[0], codomain[0]), (domain[1], codomain[0]), (domain[2], codomain[1])})
+        one_to_many = set_str({(domain[0], codomain[0]), (domain[0], codomain[1]), (domain[1], codomain[2])})
         
-        relation, correct_type = random.choice([
+        relation, correct_type = rng.choice([
             (one_to_one, "One-to-one (injective)"), 
             (many_to_one, "Many-to-one"), 
             (one_to_many, "One-to-many (not a function)")
         ])
         
+        params = (correct_type,)
         question = f"The relation $R = {relation}$. What type of mapping is this?"
         answer = correct_type
         hint = "Check if inputs (first elements) or outputs (second elements) are repeated in the ordered pairs."
@@ -4239,17 +5706,18 @@ def _generate_relations_functions_question(difficulty="Medium"):
         # We explicitly define the options and do not use the generic option filler.
         # This ensures no random numbers will ever be added.
         final_options = ["One-to-one (injective)", "Many-to-one", "One-to-many (not a function)"]
-        random.shuffle(final_options)
+        rng.shuffle(final_options)
         
-        return {"question": question, "options": final_options, "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+        return {"question": question, "options": final_options, "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
     # --- 2.2: Finding the Domain from an Equation (Medium) ---
     elif q_type == 'domain_from_equation':
-        a = random.randint(2, 9)
-        b = random.randint(1, 9)
-        func_type = random.choice(['rational', 'radical'])
+        a = rng.randint(2, 9)
+        b = rng.randint(1, 9)
+        func_type = rng.choice(['rational', 'radical'])
 
         if func_type == 'rational':
+            params = (func_type, a, b)
             question = f"Find the domain of the function $f(x) = \\frac{{x+{b}}}{{x-{a}}}$."
             answer = f"All real numbers except $x={a}$"
             hint = "The domain of a rational function includes all real numbers except for values of x that make the denominator equal to zero."
@@ -4260,6 +5728,7 @@ def _generate_relations_functions_question(difficulty="Medium"):
             distractor3 = f"x \ge {a}" # Error: Student confuses the rule with radical functions.
             options = {answer, distractor1, distractor2, distractor3}
         else: # radical
+            params = (func_type, a)
             question = f"Find the domain of the function $f(x) = \\sqrt{{x-{a}}}$."
             answer = f"$x \ge {a}$"
             hint = "The expression inside a square root cannot be negative. Set the expression to be greater than or equal to zero and solve."
@@ -4272,8 +5741,9 @@ def _generate_relations_functions_question(difficulty="Medium"):
 
     # --- 2.3: Composition of Functions (Evaluation) (Medium) ---
     elif q_type == 'composite_evaluation':
-        a, b, c, d, x_val = [random.randint(1, 5) for _ in range(5)]
+        a, b, c, d, x_val = [rng.randint(1, 5) for _ in range(5)]
         g_of_x = c*x_val + d
+        params = (a, b, c, d, x_val)
         question = f"Given $f(x) = {a}x + {b}$ and $g(x) = {c}x + {d}$, find the value of $(f \\circ g)({x_val})$."
         answer = str(a*g_of_x + b)
         hint = f"This means find $f(g({x_val}))$. You must calculate the inner function, $g({x_val})$, first, then use that result as the input for $f(x)$."
@@ -4284,12 +5754,13 @@ def _generate_relations_functions_question(difficulty="Medium"):
 
     # --- 2.4: Algebra of Functions (Medium) ---
     elif q_type == 'algebra_of_functions':
-        f_coeffs = [random.randint(1, 5), random.randint(-5, 5)] # e.g., [2, 3] -> 2x+3
-        g_coeffs = [random.randint(1, 5), random.randint(-5, 5)] # e.g., [1, 4] -> x+4
+        f_coeffs = [rng.randint(1, 5), rng.randint(-5, 5)] # e.g., [2, 3] -> 2x+3
+        g_coeffs = [rng.randint(1, 5), rng.randint(-5, 5)] # e.g., [1, 4] -> x+4
         f_str = _poly_to_str(f_coeffs)
         g_str = _poly_to_str(g_coeffs)
         
-        op, sym = random.choice([('sum', '+'), ('product', '*')])
+        op, sym = rng.choice([('sum', '+'), ('product', '*')])
+        params = (f_coeffs, g_coeffs, op)
         question = f"Given $f(x) = {f_str}$ and $g(x) = {g_str}$, find $({f_str}) {sym} ({g_str})$."
 
         # --- Generate ALL possible results from different operations ---
@@ -4325,9 +5796,10 @@ def _generate_relations_functions_question(difficulty="Medium"):
 
     # --- 3.1 & 3.2: Algebraic Composition & Inverse Functions (Hard) ---
     elif q_type in ['composite_algebraic', 'inverse_function']:
-        a, b = random.randint(2,7), random.randint(1,10)
+        a, b = rng.randint(2,7), rng.randint(1,10)
         if q_type == 'composite_algebraic':
-            c, d = random.randint(2,5), random.randint(1,5)
+            c, d = rng.randint(2,5), rng.randint(1,5)
+            params = (a, b, c, d)
             question = f"Given $f(x) = {a}x + {b}$ and $g(x) = {c}x - {d}$, find the function $(f \\circ g)(x)$."
             answer = f"${a*c}x + {b-a*d}$"
             hint = "To find $f(g(x))$, substitute the entire expression for $g(x)$ into every 'x' in the function $f(x)$."
@@ -4335,6 +5807,7 @@ def _generate_relations_functions_question(difficulty="Medium"):
             distractor1 = f"${a*c}x - {d}+{b}$"
             options = {answer, distractor1}
         else: # inverse_function
+            params = (a, b)
             question = f"Find the inverse function, $f^{{-1}}(x)$, of the function $f(x) = {a}x - {b}$."
             answer = f"$f^{{-1}}(x) = \\frac{{x + {b}}}{{{a}}}$"
             hint = "Let y = f(x), then swap the positions of x and y, and finally make y the subject of the formula."
@@ -4345,8 +5818,9 @@ def _generate_relations_functions_question(difficulty="Medium"):
 
     # --- 3.3: Properties of Inverse Functions (Hard) ---
     elif q_type == 'properties_of_inverse':
-        a, b = random.randint(2,7), random.randint(1,10)
-        k = random.randint(5, 20)
+        a, b = rng.randint(2,7), rng.randint(1,10)
+        k = rng.randint(5, 20)
+        params = (a, b, k)
         question = f"If $f(x) = {a}x + {b}$, what is the value of $f(f^{{-1}}({k}))$?"
         answer = str(k)
         hint = "The composition of a function and its inverse, $f(f^{-1}(x))$, always returns the original input, $x$."
@@ -4355,11 +5829,12 @@ def _generate_relations_functions_question(difficulty="Medium"):
 
     # --- 3.4: Even and Odd Functions (Hard) ---
     elif q_type == 'even_odd_functions':
-        func_str, ans = random.choice([
+        func_str, ans = rng.choice([
             ("x^4 + 2x^2", "Even"),
             ("x^3 - 5x", "Odd"),
             ("x^2 + 2x", "Neither")
         ])
+        params = (func_str,)
         question = f"Determine if the function $f(x) = {func_str}$ is even, odd, or neither."
         answer = ans
         hint = "To test, find the expression for $f(-x)$. If $f(-x) = f(x)$, the function is even. If $f(-x) = -f(x)$, the function is odd."
@@ -4368,34 +5843,28 @@ def _generate_relations_functions_question(difficulty="Medium"):
                     f"1. First, find $f(-x) = (-x)^2 + 2(-x) = x^2 - 2x$. This is not equal to $f(x)$ or $-f(x)$. Therefore, the function is **Neither** even nor odd."
         options = {"Even", "Odd", "Neither"}
         
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
 # --- END: REVISED AND FINAL FUNCTION _generate_relations_functions_question ---
 
-def _generate_sequence_series_question(difficulty="Medium"):
+def _generate_sequence_series_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Sequence and Series question based on difficulty, preserving all original sub-types."""
     
-    if difficulty == "Easy":
-        # Fundamental calculations for AP and GP terms.
-        q_type = random.choice(['ap_term', 'gp_term'])
-    elif difficulty == "Medium":
-        # Multi-step calculations and application problems.
-        q_type = random.choice(['ap_sum', 'word_problem'])
-    else: # Hard
-        # More advanced concepts like sum to infinity.
-        q_type = 'gp_sum_inf'
+    if q_type is None:
+        q_type = _pick_q_type("Sequence and Series", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
-    a = random.randint(-15, 25)
-    while a == 0: a = random.randint(-15, 25)
+    a = rng.randint(-15, 25)
+    while a == 0: a = rng.randint(-15, 25)
 
     # --- Easy Questions ---
     if q_type == 'ap_term':
-        d = random.randint(-8, 12)
-        n = random.randint(15, 40)
-        while d == 0: d = random.randint(-8, 12)
+        d = rng.randint(-8, 12)
+        n = rng.randint(15, 40)
+        while d == 0: d = rng.randint(-8, 12)
         sequence = ", ".join([str(a + i*d) for i in range(4)])
+        params = (a, d, n)
         question = f"Find the {n}th term of the arithmetic progression: {sequence}, ..."
         answer = str(a + (n - 1) * d)
         hint = r"Use the AP nth term formula: $a_n = a + (n-1)d$."
@@ -4403,8 +5872,9 @@ def _generate_sequence_series_question(difficulty="Medium"):
         options = {answer, str(a + n*d), str(a*d + n)}
     
     elif q_type == 'gp_term':
-        r, n = random.choice([-3, -2, 2, 3]), random.randint(5, 9)
+        r, n = rng.choice([-3, -2, 2, 3]), rng.randint(5, 9)
         sequence = ", ".join([str(a * r**i) for i in range(3)])
+        params = (a, r, n)
         question = f"What is the {n}th term of the geometric progression: {sequence}, ...?"
         answer = str(a * r**(n-1))
         hint = r"Use the GP nth term formula: $a_n = ar^{n-1}$."
@@ -4413,8 +5883,9 @@ def _generate_sequence_series_question(difficulty="Medium"):
 
     # --- Medium Questions ---
     elif q_type == 'ap_sum':
-        d, n = random.randint(-5, 8), random.randint(15, 30)
-        while d == 0: d = random.randint(-5, 8)
+        d, n = rng.randint(-5, 8), rng.randint(15, 30)
+        while d == 0: d = rng.randint(-5, 8)
+        params = (a, d, n)
         question = f"Find the sum of the first {n} terms of an Arithmetic Progression with first term {a} and common difference {d}."
         answer = str(int((n/2) * (2*a + (n-1)*d)))
         hint = r"Use the sum of an AP formula: $S_n = \frac{n}{2}(2a + (n-1)d)$."
@@ -4422,10 +5893,11 @@ def _generate_sequence_series_question(difficulty="Medium"):
         options = {answer, str(n*(a + (n-1)*d)), str(int((n/2)*(a + (a + n*d))))}
 
     elif q_type == 'word_problem':
-        initial_amount = random.randint(200, 500) * 100 # GHS 20,000 to 50,000
-        depreciation_rate = random.randint(8, 22)
+        initial_amount = rng.randint(200, 500) * 100 # GHS 20,000 to 50,000
+        depreciation_rate = rng.randint(8, 22)
         years = 4
         final_value = initial_amount * ((1 - depreciation_rate/100)**years)
+        params = (initial_amount, depreciation_rate, years)
         question = f"A new trotro purchased in Kumasi for GHS {initial_amount:,.2f} depreciates in value by {depreciation_rate}% each year. What is its approximate value after {years} years?"
         answer = f"GHS {final_value:,.2f}"
         hint = "This is a geometric progression problem. Use the formula: Final Value = $P(1 - r)^n$."
@@ -4434,39 +5906,34 @@ def _generate_sequence_series_question(difficulty="Medium"):
     
     # --- Hard Question ---
     elif q_type == 'gp_sum_inf':
-        r = Fraction(random.randint(-2,2), random.randint(3, 7))
-        while r == 0: r = Fraction(random.randint(-2,2), random.randint(3, 7))
+        r = Fraction(rng.randint(-2,2), rng.randint(3, 7))
+        while r == 0: r = Fraction(rng.randint(-2,2), rng.randint(3, 7))
+        params = (a, r)
         question = f"A geometric series has a first term of ${a}$ and a common ratio of ${_get_fraction_latex_code(r)}$. Calculate its sum to infinity."
         answer = _format_fraction_text(a / (1 - r))
         hint = r"Use the sum to infinity formula: $S_\infty = \frac{a}{1-r}$, which is valid only when $|r| < 1$."
         explanation = f"$S_\\infty = \\frac{{{a}}}{{1 - ({_get_fraction_latex_code(r)})}} = \\frac{{{a}}}{{{_get_fraction_latex_code(1-r)}}} = {_get_fraction_latex_code(a/(1-r))}$."
         options = {answer, _format_fraction_text(a/(1+r)), _format_fraction_text((a*r)/(1-r))}
     
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
-def _generate_word_problems_question(difficulty="Medium"):
+def _generate_word_problems_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Word Problems question based on difficulty, preserving all original sub-types."""
 
     gh_names = ["Yaw", "Adwoa", "Kofi", "Ama", "Kwame", "Abena"]
     gh_locations = ["Kejetia Market in Kumasi", "a shop in Osu, Accra", "a farm near Kajaji", "the Cape Coast Castle gift shop"]
     
-    if difficulty == "Easy":
-        # Direct translation from words to a simple equation.
-        q_type = random.choice(['linear_number', 'ratio'])
-    elif difficulty == "Medium":
-        # Requires setting up a more complex equation with the variable on both sides.
-        q_type = random.choice(['age', 'consecutive_integers'])
-    else: # Hard
-        # Involves reciprocal rates, a classic challenging problem type.
-        q_type = 'work_rate'
+    if q_type is None:
+        q_type = _pick_q_type("Word Problems", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- Easy Questions ---
     if q_type == 'linear_number':
-        x, k, m = random.randint(10, 50), random.randint(10, 50), random.randint(2, 7)
+        x, k, m = rng.randint(10, 50), rng.randint(10, 50), rng.randint(2, 7)
         result = m*x + k
+        params = (x, k, m)
         question = f"When {m} times a certain number is increased by {k}, the result is {result}. Find the number."
         answer = str(x)
         hint = "Let the number be 'n'. Translate the sentence into an equation like 'mn + k = result' and solve for n."
@@ -4474,13 +5941,14 @@ def _generate_word_problems_question(difficulty="Medium"):
         options = {answer, str(result-k), str(int(result/m))}
 
     elif q_type == 'ratio':
-        ratio1, ratio2 = random.randint(2, 9), random.randint(3, 10)
-        while ratio1 == ratio2: ratio2 = random.randint(3, 10)
-        total_amount = random.randint(20, 50) * (ratio1 + ratio2)
+        ratio1, ratio2 = rng.randint(2, 9), rng.randint(3, 10)
+        while ratio1 == ratio2: ratio2 = rng.randint(3, 10)
+        total_amount = rng.randint(20, 50) * (ratio1 + ratio2)
         share1 = int((ratio1 / (ratio1+ratio2)) * total_amount)
         share2 = total_amount - share1
-        name1, name2 = random.sample(gh_names, 2)
-        location = random.choice(gh_locations)
+        name1, name2 = rng.sample(gh_names, 2)
+        location = rng.choice(gh_locations)
+        params = (ratio1, ratio2, total_amount)
         question = f"At {location}, {name1} and {name2} share a profit of GHS {total_amount} in the ratio {ratio1}:{ratio2}. How much does {name1} receive?"
         answer = f"GHS {share1}"
         hint = "First, find the total number of parts in the ratio. Then, find the value of one part by dividing the total amount by the total parts."
@@ -4489,12 +5957,13 @@ def _generate_word_problems_question(difficulty="Medium"):
 
     # --- Medium Questions ---
     elif q_type == 'age':
-        child_age, parent_age = random.randint(8, 20), random.randint(40, 65)
-        while parent_age - child_age < 20: parent_age = random.randint(40, 65)
+        # The parent is at least 20 years older and more than twice the child's age, so the problem is solvable
+        child_age = rng.randint(8, 20)
+        parent_age = rng.randint(max(40, child_age + 20, 2*child_age + 1), 65)
         # Equation: parent + x = 2 * (child + x) => x = parent - 2*child
         ans_val = parent_age - 2*child_age
-        if ans_val <= 0: return _generate_word_problems_question(difficulty=difficulty) # Regenerate if unsolvable
-        child_name, parent_name = random.sample(gh_names, 2)
+        child_name, parent_name = rng.sample(gh_names, 2)
+        params = (parent_age, child_age)
         question = f"{parent_name} is {parent_age} years old and their child {child_name} is {child_age} years old. In how many years will {parent_name} be exactly twice as old as {child_name}?"
         answer = str(ans_val)
         hint = "Let 'x' be the number of years. Set up the equation: Parent's Future Age = 2 * Child's Future Age."
@@ -4502,16 +5971,17 @@ def _generate_word_problems_question(difficulty="Medium"):
         options = {answer, str(parent_age - child_age), str(ans_val + 2)}
 
     elif q_type == 'consecutive_integers':
-        start, num = random.randint(20, 100), random.choice([3, 5])
-        num_type = random.choice(['integers', 'even integers', 'odd integers'])
+        start, num = rng.randint(20, 100), rng.choice([3, 5])
+        num_type = rng.choice(['integers', 'even integers', 'odd integers'])
         if num_type == 'integers': integers = [start+i for i in range(num)]
         elif num_type == 'even integers': integers = [start*2 + 2*i for i in range(num)]
         else: integers = [start*2+1 + 2*i for i in range(num)]
         total = sum(integers)
-        asked_for = random.choice(['smallest', 'largest', 'middle'])
+        asked_for = rng.choice(['smallest', 'largest', 'middle'])
         if asked_for == 'smallest': answer = str(integers[0])
         elif asked_for == 'largest': answer = str(integers[-1])
         else: answer = str(integers[num//2])
+        params = (start, num, num_type, asked_for)
         question = f"The sum of {num} consecutive {num_type} is {total}. What is the **{asked_for}** of these integers?"
         hint = f"Represent the integers algebraically (e.g., n, n+1, n+2... or n, n+2, n+4...). Set their sum equal to {total} and solve for the first integer, n."
         explanation = f"Let the first integer be n. The sum can be written as an equation. Solving for n gives {integers[0]}. The full list of integers is {integers}. The {asked_for} integer is {answer}."
@@ -4519,49 +5989,45 @@ def _generate_word_problems_question(difficulty="Medium"):
 
     # --- Hard Question ---
     elif q_type == 'work_rate':
-        time_a = random.randint(4, 10); time_b = random.randint(4, 10)
-        while time_a == time_b: time_b = random.randint(4, 10)
+        time_a = rng.randint(4, 10); time_b = rng.randint(4, 10)
+        while time_a == time_b: time_b = rng.randint(4, 10)
         time_together = (time_a * time_b) / (time_a + time_b)
-        name1, name2 = random.sample(gh_names, 2)
+        name1, name2 = rng.sample(gh_names, 2)
+        params = (time_a, time_b)
         question = f"If {name1} can weed a farm in {time_a} hours and {name2} can weed the same farm in {time_b} hours, how long would it take them to finish the job if they work together?"
         answer = f"{time_together:.2f} hours"
         hint = "Add their individual rates of work. The rate is (1 / time). So, (1/A) + (1/B) = 1/Total_Time."
         explanation = f"1. {name1}'s Rate = $\\frac{{1}}{{{time_a}}}$ farms/hr.\n2. {name2}'s Rate = $\\frac{{1}}{{{time_b}}}$ farms/hr.\n3. Combined Rate = $\\frac{{1}}{{{time_a}}} + \\frac{{1}}{{{time_b}}} = \\frac{{{time_b+time_a}}}{{{time_a*time_b}}}$ farms/hr.\n4. Time Together = $\\frac{{1}}{{\\text{{Combined Rate}}}} = \\frac{{{time_a*time_b}}}{{{time_a+time_b}}} \\approx {time_together:.2f}$ hours."
         options = {answer, f"{ (time_a+time_b)/2 :.2f} hours", f"{ abs(time_a-time_b) :.2f} hours"}
 
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
 
-def _generate_shapes_question(difficulty="Medium"):
+def _generate_shapes_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Shapes/Geometry question based on difficulty, preserving all original sub-types."""
     
-    if difficulty == "Easy":
-        # Foundational rules for angles and triangles.
-        q_type = random.choice(['angles_lines', 'triangles_pythagoras'])
-    elif difficulty == "Medium":
-        # Standard calculations for 2D shapes.
-        q_type = 'area_perimeter'
-    else: # Hard
-        # More complex 3D calculations and abstract theorems.
-        q_type = random.choice(['volume_surface_area', 'circle_theorems'])
+    if q_type is None:
+        q_type = _pick_q_type("Shapes (Geometry)", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- Easy Questions ---
     if q_type == 'angles_lines':
-        angle_type = random.choice(['point', 'straight_line', 'parallel'])
+        angle_type = rng.choice(['point', 'straight_line', 'parallel'])
         if angle_type == 'point':
-            a1, a2 = random.randint(100, 150), random.randint(80, 120)
+            a1, a2 = rng.randint(100, 150), rng.randint(80, 120)
             a3 = 360 - (a1 + a2)
+            params = (angle_type, a1, a2)
             question = f"Three angles meet at a point. Two of the angles are {a1}° and {a2}°. What is the size of the third angle?"
             answer = f"{a3}°"
             hint = "The sum of angles at a point is always 360°."
             explanation = f"Angles at a point add up to 360°. So, the third angle is $360° - ({a1}° + {a2}°) = 360° - {a1+a2}° = {a3}°$."
             options = {answer, f"{180 - a1}°", f"{180 - a2}°"}
         else: # parallel lines (original logic kept)
-            angle1 = random.randint(50, 120)
-            prop, angle2 = random.choice([("alternate", angle1), ("corresponding", angle1), ("co-interior", 180 - angle1)])
+            angle1 = rng.randint(50, 120)
+            prop, angle2 = rng.choice([("alternate", angle1), ("corresponding", angle1), ("co-interior", 180 - angle1)])
+            params = (prop, angle1)
             question = f"In a diagram with two parallel lines cut by a transversal, one angle is {angle1}°. What is the size of its {prop} angle?"
             answer = f"{angle2}°"
             hint = f"Recall the relationship between {prop} angles."
@@ -4569,8 +6035,9 @@ def _generate_shapes_question(difficulty="Medium"):
             options = {answer, f"{180-angle1}°", f"{90}°"}
 
     elif q_type == 'triangles_pythagoras':
-        a, b = random.choice([(3,4), (5,12), (8,15), (7,24), (9,40)])
+        a, b = rng.choice([(3,4), (5,12), (8,15), (7,24), (9,40)])
         c = int(math.sqrt(a**2 + b**2))
+        params = (a, b)
         question = f"A right-angled triangle has shorter sides of length ${a}$ cm and ${b}$ cm. Find the length of its hypotenuse."
         answer = f"{c}"
         hint = "Use Pythagoras' theorem: $a^2 + b^2 = c^2$."
@@ -4579,10 +6046,11 @@ def _generate_shapes_question(difficulty="Medium"):
 
     # --- Medium Question ---
     elif q_type == 'area_perimeter':
-        shape = random.choice(['rectangle', 'circle', 'trapezium']) # Original internal randomness preserved
+        shape = rng.choice(['rectangle', 'circle', 'trapezium']) # Original internal randomness preserved
         if shape == 'rectangle':
-            l, w = random.randint(10, 30), random.randint(5, 20)
-            calc = random.choice(['area', 'perimeter'])
+            l, w = rng.randint(10, 30), rng.randint(5, 20)
+            calc = rng.choice(['area', 'perimeter'])
+            params = (shape, l, w, calc)
             question = f"A football field in Accra measures {l}m by {w}m. Calculate its {calc}."
             answer = str(l*w) if calc == 'area' else str(2*(l+w))
             hint = "Area of a rectangle is length × width. Perimeter is 2 × (length + width)."
@@ -4590,13 +6058,15 @@ def _generate_shapes_question(difficulty="Medium"):
             options = {str(l*w), str(2*(l+w)), str(l+w)}
         elif shape == 'circle':
             r = 7 # Use r=7 for nice pi calculations
+            params = (shape, r)
             question = f"Find the area of a circular garden with a radius of {r}m. (Use $\\pi \\approx 22/7$)"
             answer = str(int(Fraction(22,7) * r**2))
             hint = "Area of a circle = $\pi r^2$."
             explanation = f"Area = $\\pi r^2 = \\frac{{22}}{{7}} \\times {r}^2 = {answer} m^2$."
             options = {answer, str(int(2*Fraction(22,7)*r))}
         else: # trapezium
-            a, b, h = random.randint(5, 10), random.randint(11, 20), random.randint(6, 12)
+            a, b, h = rng.randint(5, 10), rng.randint(11, 20), rng.randint(6, 12)
+            params = (shape, a, b, h)
             question = f"A trapezium has parallel sides of length {a} cm and {b} cm, and a height of {h} cm. Find its area."
             answer = str(int(0.5 * (a+b) * h))
             hint = "Area of a trapezium = $\\frac{1}{2}(a+b)h$, where a and b are the parallel sides."
@@ -4605,17 +6075,19 @@ def _generate_shapes_question(difficulty="Medium"):
 
     # --- Hard Questions ---
     elif q_type == 'volume_surface_area':
-        shape = random.choice(['cuboid', 'cylinder']) # Original internal randomness preserved
+        shape = rng.choice(['cuboid', 'cylinder']) # Original internal randomness preserved
         if shape == 'cuboid':
-            l, w, h = random.randint(5,12), random.randint(5,12), random.randint(5,12)
-            calc = random.choice(['volume', 'surface area'])
+            l, w, h = rng.randint(5,12), rng.randint(5,12), rng.randint(5,12)
+            calc = rng.choice(['volume', 'surface area'])
+            params = (shape, l, w, h, calc)
             question = f"A box has dimensions {l}cm by {w}cm by {h}cm. Find its total {calc}."
             answer = str(l*w*h) if calc == 'volume' else str(2*(l*w+w*h+l*h))
             hint = "Volume = l×w×h. Surface Area = 2(lw + wh + lh)."
             explanation = f"For the cuboid:\n- Volume = ${l} \\times {w} \\times {h} = {l*w*h} cm^3$.\n- Surface Area = $2({l*w} + {w*h} + {l*h}) = {2*(l*w+w*h+l*h)} cm^2$."
             options = {str(l*w*h), str(2*(l*w+w*h+l*h))}
         else: # cylinder
-            r, h = 7, random.randint(10, 20)
+            r, h = 7, rng.randint(10, 20)
+            params = (shape, r, h)
             question = f"A cylindrical tin of Milo has a radius of {r}cm and a height of {h}cm. Find its volume. (Use $\\pi \\approx 22/7$)"
             answer = str(int(Fraction(22,7) * r**2 * h))
             hint = "Volume of a cylinder = $\pi r^2 h$."
@@ -4623,34 +6095,29 @@ def _generate_shapes_question(difficulty="Medium"):
             options = {answer, str(int(2*Fraction(22,7)*r*h)), str(int(Fraction(22,7) * r**2))}
 
     elif q_type == 'circle_theorems':
-        angle_at_center = random.randint(40, 120) * 2
+        angle_at_center = rng.randint(40, 120) * 2
         angle_at_circumference = angle_at_center // 2
+        params = (angle_at_center,)
         question = f"In a circle, an arc subtends an angle of {angle_at_center}° at the center. What angle does it subtend at any point on the remaining part of the circumference?"
         answer = f"{angle_at_circumference}°"
         hint = "Recall the circle theorem: The angle at the center is twice the angle at the circumference."
         explanation = f"The angle at the circumference is half the angle at the center.\nAngle = $\\frac{{{angle_at_center}°}}{{2}} = {angle_at_circumference}°$."
         options = {answer, f"{angle_at_center}°", f"{180-angle_at_center}°"}
         
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
-def _generate_algebra_basics_question(difficulty="Medium"):
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
+def _generate_algebra_basics_question(difficulty="Medium", rng=random, q_type=None):
     """Generates an Algebra Basics question based on difficulty, preserving all original sub-types."""
     
-    if difficulty == "Easy":
-        # Foundational skills: simplifying and solving basic linear equations.
-        q_type = random.choice(['simplify_expression', 'solve_linear'])
-    elif difficulty == "Medium":
-        # Core algebraic techniques: factoring, inequalities, and fractions.
-        q_type = random.choice(['factorization', 'solve_inequality', 'algebraic_fractions'])
-    else: # Hard
-        # Multi-step, complex problems: simultaneous and quadratic equations.
-        q_type = random.choice(['solve_simultaneous', 'solve_quadratic'])
+    if q_type is None:
+        q_type = _pick_q_type("Algebra Basics", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- Easy Questions ---
     if q_type == 'simplify_expression':
-        a, b, c, d = [random.randint(2, 8) for _ in range(4)]
+        a, b, c, d = [rng.randint(2, 8) for _ in range(4)]
+        params = (a, b, c, d)
         question = f"Expand and simplify the expression: ${a}(x + {b}) - {c}(x - {d})$"
         x_coeff = a - c
         const = a * b + c * d
@@ -4666,8 +6133,9 @@ def _generate_algebra_basics_question(difficulty="Medium"):
         options = {answer, f"${a+c}x + {a*b-c*d}$"}
 
     elif q_type == 'solve_linear':
-        a, b, x = random.randint(2, 8), random.randint(5, 20), random.randint(2, 10)
+        a, b, x = rng.randint(2, 8), rng.randint(5, 20), rng.randint(2, 10)
         c = a * x + b
+        params = (a, b, x)
         question = f"Solve for x in the equation: ${a}x + {b} = {c}$"
         answer = str(x)
         hint = "Isolate the term with 'x' on one side of the equation, then divide to find x."
@@ -4676,19 +6144,21 @@ def _generate_algebra_basics_question(difficulty="Medium"):
         
     # --- Medium Questions ---
     elif q_type == 'factorization':
-        factor_type = random.choice(['diff_squares', 'trinomial']) # Original internal randomness preserved
+        factor_type = rng.choice(['diff_squares', 'trinomial']) # Original internal randomness preserved
         if factor_type == 'diff_squares':
-            a, b_val = random.randint(2, 10), random.randint(2, 5)
+            a, b_val = rng.randint(2, 10), rng.randint(2, 5)
             b = f"{b_val}y"
+            params = (factor_type, a, b_val)
             question = f"Factorize completely: ${a**2}x^2 - {b_val**2}y^2$"
             answer = f"$({a}x - {b})({a}x + {b})$"
             hint = "Recognize this as a difference of two squares: $A^2 - B^2 = (A-B)(A+B)$."
             explanation = f"Here, $A^2 = {a**2}x^2$ so $A={a}x$, and $B^2 = {b_val**2}y^2$ so $B={b}$.\nThe factorization is $(A-B)(A+B)$, which gives ${answer}$."
             options = {answer, f"$({a}x - {b})^2$", f"({a}x - {b_val})({a}x + {b_val})"}
         else: # trinomial
-            r1, r2 = random.randint(-7, 7), random.randint(-7, 7)
-            while r1 == 0 or r2 == 0 or r1==r2: r1, r2 = random.randint(-7, 7), random.randint(-7, 7)
+            r1, r2 = rng.randint(-7, 7), rng.randint(-7, 7)
+            while r1 == 0 or r2 == 0 or r1==r2: r1, r2 = rng.randint(-7, 7), rng.randint(-7, 7)
             b, c = r1 + r2, r1 * r2
+            params = (factor_type, b, c)
             question = f"Factorize the trinomial: $x^2 + ({b})x + ({c})$"
             answer = f"$(x {'+' if r1 > 0 else '-'} {abs(r1)})(x {'+' if r2 > 0 else '-'} {abs(r2)})$"
             hint = f"Look for two numbers that multiply to give the constant term ({c}) and add to give the x-coefficient ({b})."
@@ -4696,8 +6166,9 @@ def _generate_algebra_basics_question(difficulty="Medium"):
             options = {answer, f"$(x - {r1})(x - {r2})$", f"$(x + {b})(x + {c})$"}
 
     elif q_type == 'solve_inequality':
-        a, b, x = random.randint(2, 5), random.randint(10, 20), random.randint(3, 8)
+        a, b, x = rng.randint(2, 5), rng.randint(10, 20), rng.randint(3, 8)
         c = a*x - b
+        params = (a, b, x)
         question = f"Find the solution to the inequality: ${a}x - {b} > {c}$"
         answer = f"$x > {x}$"
         hint = "Solve this just like a linear equation. Only flip the inequality sign if you multiply or divide by a negative number."
@@ -4705,8 +6176,9 @@ def _generate_algebra_basics_question(difficulty="Medium"):
         options = {answer, f"$x < {x}$", f"$x > {c-b}"}
         
     elif q_type == 'algebraic_fractions':
-        a, b = random.randint(2, 5), random.randint(3, 6)
-        while a==b: b = random.randint(3,6)
+        a, b = rng.randint(2, 5), rng.randint(3, 6)
+        while a==b: b = rng.randint(3,6)
+        params = (a, b)
         question = f"Simplify the algebraic fraction: $\\frac{{x}}{{{a}}} + \\frac{{x}}{{{b}}}$"
         num = a + b; den = a * b; common = math.gcd(num, den); num //= common; den //= common
         answer = f"$\\frac{{{num}x}}{{{den}}}$"
@@ -4716,11 +6188,12 @@ def _generate_algebra_basics_question(difficulty="Medium"):
 
     # --- Hard Questions ---
     elif q_type == 'solve_simultaneous':
-        x, y = random.randint(1, 8), random.randint(1, 8)
-        a1, b1, a2, b2 = [random.randint(1, 4) for _ in range(4)]
-        while a1*b2 - a2*b1 == 0: a2, b2 = random.randint(1, 4), random.randint(1, 4) # Ensure unique solution
+        x, y = rng.randint(1, 8), rng.randint(1, 8)
+        a1, b1, a2, b2 = [rng.randint(1, 4) for _ in range(4)]
+        while a1*b2 - a2*b1 == 0: a2, b2 = rng.randint(1, 4), rng.randint(1, 4) # Ensure unique solution
         c1 = a1*x + b1*y
         c2 = a2*x + b2*y
+        params = (a1, b1, a2, b2, x, y)
         question = f"Solve the following system of linear equations:\n\n$ {a1}x + {b1}y = {c1} $\n\n$ {a2}x + {b2}y = {c2} $"
         answer = f"x = {x}, y = {y}"
         hint = "Use either the substitution or elimination method to solve for one variable first."
@@ -4728,112 +6201,45 @@ def _generate_algebra_basics_question(difficulty="Medium"):
         options = {answer, f"x = {y}, y = {x}", f"x = {c1-c2}, y = {c1+c2}"}
         
     elif q_type == 'solve_quadratic':
-        r1, r2 = random.randint(-6, 6), random.randint(-6, 6)
-        while r1 == 0 or r2 == 0 or r1 == r2: r1, r2 = random.randint(-6, 6), random.randint(-6, 6)
+        r1, r2 = rng.randint(-6, 6), rng.randint(-6, 6)
+        while r1 == 0 or r2 == 0 or r1 == r2: r1, r2 = rng.randint(-6, 6), rng.randint(-6, 6)
         b = -(r1 + r2)
         c = r1 * r2
+        params = (b, c)
         question = f"Find the roots of the quadratic equation: $x^2 + {b}x + {c} = 0$"
         answer = f"x = {r1} or x = {r2}"
         hint = "Solve by factorizing the quadratic expression or using the quadratic formula: $x = \\frac{{-b \\pm \\sqrt{{b^2-4ac}}}}{{2a}}$."
         explanation = f"This equation can be factorized by finding two numbers that multiply to {c} and add to {-b}. These numbers are {r1} and {r2}.\nSo, the equation becomes $(x - {r1})(x - {r2}) = 0$.\nThe solutions are therefore $x = {r1}$ and $x = {r2}$."
         options = {answer, f"x = {-r1} or x = {-r2}", f"x = {b} or x = {c}"}
 
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
-
-
-def _generate_linear_algebra_question(difficulty="Medium"):
-    """Generates a Linear Algebra question based on difficulty, preserving all original sub-types."""
-
-    if difficulty == "Easy":
-        # Foundational 2x2 matrix operations.
-        q_type = random.choice(['add_sub', 'determinant'])
-    elif difficulty == "Medium":
-        # More complex row-by-column multiplication.
-        q_type = 'multiply'
-    else: # Hard
-        # Multi-step process of finding the inverse.
-        q_type = 'inverse'
-
-    # Helper function to format a numpy matrix into LaTeX
-    def mat_to_latex(m):
-        return f"\\begin{{pmatrix}} {m[0,0]} & {m[0,1]} \\\\ {m[1,0]} & {m[1,1]} \\end{{pmatrix}}"
-
-    question, answer, hint, explanation = "", "", "", ""
-    options = set()
-    mat_a = np.random.randint(-5, 10, size=(2, 2))
-    mat_b = np.random.randint(-5, 10, size=(2, 2))
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
-    # --- Easy Questions ---
-    if q_type == 'add_sub':
-        op, sym, res_mat = random.choice([('add', '+', mat_a + mat_b), ('subtract', '-', mat_a - mat_b)])
-        question = f"Given matrices $A = {mat_to_latex(mat_a)}$ and $B = {mat_to_latex(mat_b)}$, find $A {sym} B$."
-        answer = f"${mat_to_latex(res_mat)}$"
-        hint = f"To {op} matrices, simply {op} their corresponding elements in each position."
-        explanation = f"You perform the operation on the element in each position. For example, the top-left element is calculated as: ${mat_a[0,0]} {sym} {mat_b[0,0]} = {res_mat[0,0]}$."
-        options = {answer, f"${mat_to_latex(np.dot(mat_a, mat_b))}$", f"${mat_to_latex(mat_a * mat_b)}$"}
-    
-    elif q_type == 'determinant':
-        question = f"Find the determinant of matrix $A = {mat_to_latex(mat_a)}$."
-        answer = str(int(np.linalg.det(mat_a)))
-        hint = r"For a 2x2 matrix $\begin{pmatrix} a & b \\ c & d \end{pmatrix}$, the determinant is calculated as $ad - bc$."
-        explanation = f"Determinant = $(a \\times d) - (b \\times c) = ({mat_a[0,0]} \\times {mat_a[1,1]}) - ({mat_a[0,1]} \\times {mat_a[1,0]}) = {answer}$."
-        options = {answer, str(mat_a[0,0]+mat_a[1,1]), str(mat_a[0,0]*mat_a[0,1] - mat_a[1,0]*mat_a[1,1])}
 
-    # --- Medium Question ---
-    elif q_type == 'multiply':
-        question = f"Find the product $AB$ for the matrices $A = {mat_to_latex(mat_a)}$ and $B = {mat_to_latex(mat_b)}$."
-        res_mat = np.dot(mat_a, mat_b)
-        answer = f"${mat_to_latex(res_mat)}$"
-        hint = "Matrix multiplication is 'row-by-column'. Multiply the elements of each row of the first matrix by the elements of each column of the second matrix and sum the results."
-        explanation = f"The top-left element of the result is (row 1 of A) ⋅ (col 1 of B) = $({mat_a[0,0]} \\times {mat_b[0,0]}) + ({mat_a[0,1]} \\times {mat_b[1,0]}) = {res_mat[0,0]}$."
-        options = {answer, f"${mat_to_latex(mat_a+mat_b)}$", f"${mat_to_latex(mat_b @ mat_a)}$"}
-        
-    # --- Hard Question ---
-    elif q_type == 'inverse':
-        det = int(np.linalg.det(mat_a))
-        while det == 0: # Ensure the matrix is invertible
-            mat_a = np.random.randint(-5, 10, size=(2, 2))
-            det = int(np.linalg.det(mat_a))
-        question = f"Find the inverse of the matrix $A = {mat_to_latex(mat_a)}$."
-        adj_mat = np.array([[mat_a[1,1], -mat_a[0,1]], [-mat_a[1,0], mat_a[0,0]]])
-        answer = f"$\\frac{{1}}{{{det}}}{mat_to_latex(adj_mat)}$"
-        hint = r"The inverse is $\frac{1}{\det(A)} \times \text{adj}(A)$, where the adjugate matrix is found by swapping a and d, and negating b and c."
-        explanation = f"1. First, find the determinant: $\det(A) = {det}$.\n\n2. Next, find the adjugate matrix: swap the main diagonal elements and negate the others to get ${mat_to_latex(adj_mat)}$.\n\n3. The inverse is $\\frac{{1}}{{\\text{{determinant}}}} \\times \\text{{adjugate}}$, which is ${answer}$."
-        options = {answer, f"${mat_to_latex(adj_mat)}$", f"$\\frac{{1}}{{{-det}}}{mat_to_latex(adj_mat)}$"}
-
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
-
-def _generate_logarithms_question(difficulty="Medium"):
-    if difficulty == "Easy":
-        # CONSOLIDATED EASY: Now includes simple Power/Change of Base and uses variable bases
-        q_type = random.choice(['conversion', 'solve_simple_base', 'evaluate_power'])
-    elif difficulty == "Medium":
-        # CONSOLIDATED MEDIUM: Now uses variable expressions
-        q_type = random.choice(['variable_laws', 'evaluate_combined'])
-    else: # Hard
-        # HARD: Algebraic manipulation types remain expanded
-        q_type = random.choice(['solve_combine', 'log_quadratic', 'log_simultaneous'])
+def _generate_logarithms_question(difficulty="Medium", rng=random, q_type=None):
+    if q_type is None:
+        q_type = _pick_q_type("Logarithms", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- EASY QUESTIONS (Updated for Variety & Variables) ---
     if q_type == 'conversion':
-        base = random.choice([3, 4, 5, 'b', 'x']) # Dynamic base
-        exponent = random.randint(2, 4)
-        result_num = random.randint(20, 100) if base in ['b', 'x'] else base ** exponent
+        base = rng.choice([3, 4, 5, 'b', 'x']) # Dynamic base
+        exponent = rng.randint(2, 4)
+        result_num = rng.randint(20, 100) if base in ['b', 'x'] else base ** exponent
 
         if base in ['b', 'x']:
             # Example: b^n = R or log_x R = n
             var_base = base
-            result_sym = 'R' if random.random() > 0.5 else str(random.randint(10, 50))
+            result_sym = 'R' if rng.random() > 0.5 else str(rng.randint(10, 50))
             
             form_a = f"${var_base}^{{{exponent}}} = {result_sym}$"
             form_b = f"$\\log_{{{var_base}}}({result_sym}) = {exponent}$"
             
-            question_type = random.choice(["logarithmic", "exponential"])
+            question_type = rng.choice(["logarithmic", "exponential"])
             question = f"Express the equation {form_a} in {question_type} form." if question_type == "logarithmic" else f"Express the equation {form_b} in {question_type} form."
             answer = form_b if question_type == "logarithmic" else form_a
+            params = (base, exponent, result_sym, question_type)
 
         else:
             # Original numeric conversion, but with more variety in base
@@ -4841,9 +6247,10 @@ def _generate_logarithms_question(difficulty="Medium"):
             form_a = f"${base}^{{{exponent}}} = {result}$"
             form_b = f"$\\log_{{{base}}}({result}) = {exponent}$"
             
-            question_type = random.choice(["logarithmic", "exponential"])
+            question_type = rng.choice(["logarithmic", "exponential"])
             question = f"Express the equation {form_a} in {question_type} form." if question_type == "logarithmic" else f"Express the equation {form_b} in {question_type} form."
             answer = form_b if question_type == "logarithmic" else form_a
+            params = (base, exponent, question_type)
         
         hint = "Remember the relationship: $\\log_b N = x \\iff b^x = N$."
         explanation = "The base of the logarithm becomes the base of the power, and the result of the power becomes the argument of the log."
@@ -4852,11 +6259,13 @@ def _generate_logarithms_question(difficulty="Medium"):
 
     elif q_type == 'solve_simple_base':
         # NEW: Solve for the base or a simple value, using a variable base
-        base = random.randint(2, 4)
-        exponent = random.randint(2, 4)
+        base = rng.randint(2, 4)
+        exponent = rng.randint(2, 4)
         result = base ** exponent
         
-        solve_for = random.choice(['x', 'Base'])
+        params = (base, exponent)
+        solve_for = rng.choice(['x', 'Base'])
+        params += (solve_for,)
         if solve_for == 'x':
             # Solve for x: log_b(x) = n
             question = f"Solve for x: $\\log_{{{base}}}(x) = {exponent}$"
@@ -4873,11 +6282,12 @@ def _generate_logarithms_question(difficulty="Medium"):
 
     elif q_type == 'evaluate_power':
         # NEW: Simple evaluation using the power law before calculation
-        base = random.choice([2, 3])
-        power = random.randint(2, 4)
-        n = random.randint(2, 4)
+        base = rng.choice([2, 3])
+        power = rng.randint(2, 4)
+        n = rng.randint(2, 4)
         arg = base**n
         
+        params = (base, power, n)
         question = f"Evaluate: $\\log_{{{base}}}({arg}^{{{power}}})$"
         answer = str(n * power)
         
@@ -4887,11 +6297,12 @@ def _generate_logarithms_question(difficulty="Medium"):
 
     # --- MEDIUM QUESTIONS (Updated to use Variables) ---
     elif q_type == 'variable_laws':
-        op, sym, res_arg, rule_name = random.choice([
+        op, sym, res_arg, rule_name = rng.choice([
             ('add', '+', "xy", "Product Rule"),
             ('subtract', '-', "\\frac{x}{y}", "Quotient Rule")
         ])
         
+        params = (op,)
         question = f"Use the laws of logarithms to simplify the expression: $\\log_b x {sym} \\log_b y$"
         answer = f"$\\log_b({res_arg})$"
         
@@ -4902,10 +6313,11 @@ def _generate_logarithms_question(difficulty="Medium"):
 
     elif q_type == 'evaluate_combined':
         # Change of Base / Evaluation logic preserved
-        base1 = random.choice([2, 3, 5])
-        base2_exp = random.randint(2, 4)
+        base1 = rng.choice([2, 3, 5])
+        base2_exp = rng.randint(2, 4)
         base2 = base1**base2_exp
         
+        params = (base1, base2_exp)
         question = f"Evaluate the expression: $\\frac{{\\log_{{10}}({base2})}}{{\\log_{{10}}({base1})}}$"
         answer = str(base2_exp)
         
@@ -4917,9 +6329,10 @@ def _generate_logarithms_question(difficulty="Medium"):
     # --- HARD QUESTIONS (Preserved and Expanded Logic) ---
     elif q_type == 'solve_combine':
         # Original Hard Logic preserved
-        x_val = random.randint(3, 8)
-        b = random.randint(1, x_val - 1)
+        x_val = rng.randint(3, 8)
+        b = rng.randint(1, x_val - 1)
         result = x_val * (x_val - b)
+        params = (x_val, b)
         question = f"Solve for x: $\\log(x) + \\log(x - {b}) = \\log({result})$"
         answer = str(x_val)
         hint = "First, use the product rule to combine the logarithms on the left side into a single logarithm."
@@ -4932,14 +6345,15 @@ def _generate_logarithms_question(difficulty="Medium"):
         
     elif q_type == 'log_quadratic':
         # NEW Log-Quadratic Logic preserved
-        base = random.choice([2, 3, 5])
-        y1_val = random.randint(1, 3)
-        y2_val = random.randint(1, 3)
-        while y1_val == y2_val: y2_val = random.randint(1, 3)
+        base = rng.choice([2, 3, 5])
+        y1_val = rng.randint(1, 3)
+        y2_val = rng.randint(1, 3)
+        while y1_val == y2_val: y2_val = rng.randint(1, 3)
         B = y1_val + y2_val
         C = y1_val * y2_val
         x1_val = base**y1_val
         x2_val = base**y2_val
+        params = (base, B, C)
         question = f"Solve for x: $(\\log_{{{base}}}x)^2 - {B}(\\log_{{{base}}}x) + {C} = 0$"
         answer = f"x = {x1_val} or x = {x2_val}"
         hint = f"Let $y = \\log_{{{base}}}x$. The equation becomes a quadratic: $y^2 - {B}y + {C} = 0$. Solve for $y$ first."
@@ -4952,8 +6366,8 @@ def _generate_logarithms_question(difficulty="Medium"):
         
     elif q_type == 'log_simultaneous':
         # NEW Log-Simultaneous Logic preserved
-        x_exp, y_exp = random.randint(2, 4), random.randint(1, 3)
-        base = random.choice([2, 3])
+        x_exp, y_exp = rng.randint(2, 4), rng.randint(1, 3)
+        base = rng.choice([2, 3])
 
         sum_log_result_exp = x_exp + y_exp
         diff_log_result_exp = x_exp - y_exp
@@ -4964,6 +6378,7 @@ def _generate_logarithms_question(difficulty="Medium"):
         final_x = base**x_exp
         final_y = base**y_exp
 
+        params = (base, x_exp, y_exp)
         question = f"Solve for $x$ and $y$ that satisfy the system of equations (all to base {base}):\n\n**(1)** $\\log x + \\log y = \\log ({sum_log_val})$\n\n**(2)** $\\log x - \\log y = \\log ({diff_log_val})$"
         answer = f"x = {final_x}, y = {final_y}"
         hint = "Use the laws of logarithms (Product and Quotient rules) to convert the equations into a system of linear simultaneous equations for $\\log x$ and $\\log y$. Then solve."
@@ -4973,31 +6388,25 @@ def _generate_logarithms_question(difficulty="Medium"):
                       )
         options = {answer, f"x = {final_y}, y = {final_x}", f"x = {sum_log_val}, y = {diff_log_val}"}
         
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
-def _generate_probability_question(difficulty="Medium"):
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
+def _generate_probability_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Probability question based on difficulty, preserving all original sub-types."""
 
-    if difficulty == "Easy":
-        # The most fundamental probability calculation.
-        q_type = 'simple'
-    elif difficulty == "Medium":
-        # Involves the union of two events.
-        q_type = 'combined'
-    else: # Hard
-        # Involves dependent, conditional events.
-        q_type = 'conditional'
+    if q_type is None:
+        q_type = _pick_q_type("Probability", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
     
     # --- Easy Question ---
     if q_type == 'simple':
-        red = random.randint(3, 8)
-        blue = random.randint(3, 8)
+        red = rng.randint(3, 8)
+        blue = rng.randint(3, 8)
         total = red + blue
-        chosen_color = "red" if random.random() > 0.5 else "blue"
+        chosen_color = "red" if rng.random() > 0.5 else "blue"
         num_chosen = red if chosen_color == "red" else blue
         
+        params = (red, blue, chosen_color)
         question = f"A bag contains {red} red balls and {blue} blue balls. If one ball is picked at random, what is the probability that it is {chosen_color}?"
         answer_frac = Fraction(num_chosen, total)
         answer = _format_fraction_text(answer_frac)
@@ -5013,6 +6422,7 @@ def _generate_probability_question(difficulty="Medium"):
         # The union of these two sets are the favorable outcomes
         union = evens.union(greater_than_4)
         
+        params = () # A fixed question
         question = "A fair six-sided die is rolled once. What is the probability of rolling an even number or a number greater than 4?"
         answer_frac = Fraction(len(union), 6)
         answer = _format_fraction_text(answer_frac)
@@ -5022,9 +6432,10 @@ def _generate_probability_question(difficulty="Medium"):
 
     # --- Hard Question ---
     elif q_type == 'conditional':
-        black = random.randint(3, 6)
-        white = random.randint(3, 6)
+        black = rng.randint(3, 6)
+        white = rng.randint(3, 6)
         total = black + white
+        params = (black, white)
         question = f"A box in a shop in Kumasi contains {black} black pens and {white} white pens. Two pens are drawn one after the other **without replacement**. What is the probability that both are white?"
         prob_frac = Fraction(white, total) * Fraction(white - 1, total - 1)
         answer = _format_fraction_text(prob_frac)
@@ -5033,30 +6444,24 @@ def _generate_probability_question(difficulty="Medium"):
         # Distractor represents the case 'with replacement'
         options = {answer, _format_fraction_text(Fraction(white,total) * Fraction(white, total)), _format_fraction_text(Fraction(white-1, total-1))}
 
-    return {"question": question, "options": _finalize_options(options, "fraction"), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, "fraction", rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
-def _generate_binomial_theorem_question(difficulty="Medium"):
+def _generate_binomial_theorem_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Binomial Theorem question based on difficulty, preserving all original sub-types."""
 
-    if difficulty == "Easy":
-        # A new, foundational question type to test direct reading of Pascal's Triangle.
-        q_type = 'pascal_read'
-    elif difficulty == "Medium":
-        # Your original 'find_coefficient' question.
-        q_type = 'find_coefficient'
-    else: # Hard
-        # Your original 'find_term' question.
-        q_type = 'find_term'
+    if q_type is None:
+        q_type = _pick_q_type("Binomial Theorem", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
     
     # --- Easy Question ---
     if q_type == 'pascal_read':
-        n = random.randint(3, 5)
+        n = rng.randint(3, 5)
         pascal_str, pascal_row = _generate_pascal_data(n)
-        k = random.randint(1, n-1) # Ask for the 2nd, 3rd, or 4th coefficient etc.
+        k = rng.randint(1, n-1) # Ask for the 2nd, 3rd, or 4th coefficient etc.
         term_ord = {1: "2nd", 2: "3rd", 3: "4th", 4: "5th"}.get(k, f"{k+1}th")
+        params = (n, k)
         question = f"Using Pascal's Triangle, what is the **{term_ord}** coefficient in the expansion of $(a+b)^{n}$?"
         answer = str(pascal_row[k])
         hint = "The coefficients for the expansion of $(a+b)^n$ are found in the row of Pascal's Triangle that starts with 1, n, ..."
@@ -5066,9 +6471,10 @@ def _generate_binomial_theorem_question(difficulty="Medium"):
 
     # --- Medium Question ---
     elif q_type == 'find_coefficient':
-        n = random.randint(4, 7)
-        a, b = random.randint(1, 4), random.randint(1, 4)
-        k = random.randint(2, n - 2)
+        n = rng.randint(4, 7)
+        a, b = rng.randint(1, 4), rng.randint(1, 4)
+        k = rng.randint(2, n - 2)
+        params = (n, a, b, k)
         question = f"Find the coefficient of the $x^{{{k}}}$ term in the expansion of $({a}x + {b})^{{{n}}}$."
         coefficient = math.comb(n, k) * (a**k) * (b**(n-k))
         answer = str(coefficient)
@@ -5083,10 +6489,11 @@ def _generate_binomial_theorem_question(difficulty="Medium"):
 
     # --- Hard Question ---
     elif q_type == 'find_term':
-        n = random.randint(5, 8)
-        a, b = random.randint(1, 4), random.randint(1, 4)
-        r = random.randint(2, n - 1)
+        n = rng.randint(5, 8)
+        a, b = rng.randint(1, 4), rng.randint(1, 4)
+        r = rng.randint(2, n - 1)
         k = r - 1
+        params = (n, a, b, r)
         question = f"Find the **{r}th term** in the expansion of $({a}x + {b})^{{{n}}}$."
         term_coeff = math.comb(n, k) * (a**k) * (b**(n-k))
         answer = f"${term_coeff}x^{{{k}}}$"
@@ -5101,28 +6508,22 @@ def _generate_binomial_theorem_question(difficulty="Medium"):
         distractor = f"${distractor_coeff}x^{{{r}}}$"
         options = {answer, distractor, f"${term_coeff}x^{{{r}}}$"}
 
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
-def _generate_polynomial_functions_question(difficulty="Medium"):
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
+def _generate_polynomial_functions_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Polynomial Functions question based on difficulty, preserving all original sub-types."""
 
-    if difficulty == "Easy":
-        # Direct application of the Remainder Theorem.
-        q_type = 'remainder_theorem'
-    elif difficulty == "Medium":
-        # Using the Factor Theorem to find an unknown.
-        q_type = 'factor_theorem'
-    else: # Hard
-        # A multi-step problem combining the Factor Theorem with solving a quadratic.
-        q_type = 'find_all_roots'
+    if q_type is None:
+        q_type = _pick_q_type("Polynomial Functions", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- Easy Question ---
     if q_type == 'remainder_theorem':
-        a, b, c, d = [random.randint(-5, 5) for _ in range(4)]
-        while a == 0: a = random.randint(-5, 5) # Ensure it's a cubic
-        divisor_root = random.randint(-3, 3)
+        a, b, c, d = [rng.randint(-5, 5) for _ in range(4)]
+        while a == 0: a = rng.randint(-5, 5) # Ensure it's a cubic
+        divisor_root = rng.randint(-3, 3)
+        params = (a, b, c, d, divisor_root)
         question = f"Find the remainder when the polynomial $P(x) = {a}x^3 + {b}x^2 + {c}x + {d}$ is divided by $(x - {divisor_root})$."
         # Remainder is P(divisor_root)
         remainder = a*(divisor_root**3) + b*(divisor_root**2) + c*divisor_root + d
@@ -5133,15 +6534,15 @@ def _generate_polynomial_functions_question(difficulty="Medium"):
 
     # --- Medium Question ---
     elif q_type == 'factor_theorem':
-        root = random.randint(1, 3)
-        a, c, d = random.randint(1, 3), random.randint(1, 5), random.randint(1, 10)
+        root = rng.randint(1, 3)
+        a, c = rng.randint(1, 3), rng.randint(1, 5)
         # We set P(root) = 0 and solve for k: k = -(a*root^3 + c*root + d) / root^2
-        # We need the numerator to be divisible by root^2 for a clean integer k
-        while (a*(root**3) + c*root + d) % (root**2) != 0:
-            a, c, d = random.randint(1, 3), random.randint(1, 5), random.randint(1, 10)
+        # We need the numerator to be divisible by root^2 for a clean integer k, so d is picked from the values
+        # in 1..10 that make it so (root^2 <= 9, so there is always one). k is then always negative, never 0.
+        d = rng.choice([d for d in range(1, 11) if (a*(root**3) + c*root + d) % (root**2) == 0])
         k = - (a*(root**3) + c*root + d) // (root**2)
-        if k == 0: return _generate_polynomial_functions_question(difficulty=difficulty) # Regenerate for non-trivial k
         
+        params = (root, a, c, d)
         question = f"Given that $(x - {root})$ is a factor of the polynomial $P(x) = {a}x^3 + kx^2 + {c}x + {d}$, find the value of the constant $k$."
         answer = str(k)
         hint = f"By the Factor Theorem, if $(x-a)$ is a factor of $P(x)$, then $P(a) = 0$. Set $P({root}) = 0$ and solve for $k$."
@@ -5150,8 +6551,8 @@ def _generate_polynomial_functions_question(difficulty="Medium"):
         
     # --- Hard Question ---
     elif q_type == 'find_all_roots':
-        r1, r2, r3 = random.sample(range(-4, 5), 3)
-        while 0 in [r1, r2, r3]: r1, r2, r3 = random.sample(range(-4, 5), 3) # Avoid zero roots for simplicity
+        r1, r2, r3 = rng.sample(range(-4, 5), 3)
+        while 0 in [r1, r2, r3]: r1, r2, r3 = rng.sample(range(-4, 5), 3) # Avoid zero roots for simplicity
         # P(x) = (x-r1)(x-r2)(x-r3) = x^3 - (r1+r2+r3)x^2 + (r1r2+r1r3+r2r3)x - r1r2r3
         b = -(r1 + r2 + r3)
         c = (r1*r2 + r1*r3 + r2*r3)
@@ -5159,6 +6560,7 @@ def _generate_polynomial_functions_question(difficulty="Medium"):
         poly_str = f"x^3 {'+' if b >= 0 else ''} {b}x^2 {'+' if c >= 0 else ''} {c}x {'+' if d >= 0 else ''} {d}"
         given_factor_root = r1
         
+        params = (given_factor_root, sorted([r1, r2, r3]))
         question = f"Given that $(x - {given_factor_root})$ is a factor of the polynomial $P(x) = {poly_str}$, find all the roots of the equation $P(x) = 0$."
         all_roots = sorted([r1, r2, r3])
         answer = f"x = {all_roots[0]}, {all_roots[1]}, {all_roots[2]}"
@@ -5169,33 +6571,27 @@ def _generate_polynomial_functions_question(difficulty="Medium"):
                        f"4. The complete set of roots is ${answer}$.")
         options = {answer, f"x = {r1}, {-r2}, {-r3}", f"x = {b}, {c}, {d}"}
 
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
-def _generate_rational_functions_question(difficulty="Medium"):
+def _generate_rational_functions_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Rational Functions question based on difficulty, preserving all original sub-types."""
 
-    if difficulty == "Easy":
-        # Foundational skills: simplifying and solving simple rational equations.
-        q_type = random.choice(['simplify_expression', 'solve_equation'])
-    elif difficulty == "Medium":
-        # Core concepts of identifying key features from the equation.
-        q_type = random.choice(['domain', 'vertical_asymptotes', 'horizontal_asymptotes'])
-    else: # Hard
-        # More complex analysis requiring multiple steps (factoring, division).
-        q_type = random.choice(['find_holes', 'slant_asymptotes'])
+    if q_type is None:
+        q_type = _pick_q_type("Rational Functions", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- Easy Questions ---
     if q_type == 'simplify_expression':
-        hole_root, num_root, den_root = random.sample(range(-5, 6), 3)
-        while hole_root == 0 or num_root == 0 or den_root == 0: hole_root, num_root, den_root = random.sample(range(-5, 6), 3)
+        hole_root, num_root, den_root = rng.sample(range(-5, 6), 3)
+        while hole_root == 0 or num_root == 0 or den_root == 0: hole_root, num_root, den_root = rng.sample(range(-5, 6), 3)
         # Numerator: (x - hole_root)(x - num_root)
         num_poly = [1, -(hole_root + num_root), hole_root * num_root]
         # Denominator: (x - hole_root)(x - den_root)
         den_poly = [1, -(hole_root + den_root), hole_root * den_root]
         func_str = f"f(x) = \\frac{{{_poly_to_str(num_poly)}}}{{{_poly_to_str(den_poly)}}}"
+        params = (hole_root, num_root, den_root)
         question = f"Simplify the rational expression completely: ${func_str}$"
         answer = f"$\\frac{{x {'-' if num_root > 0 else '+'} {abs(num_root)}}}{{x {'-' if den_root > 0 else '+'} {abs(den_root)}}}$"
         hint = "Factor both the numerator and the denominator, then cancel any common factors."
@@ -5203,10 +6599,10 @@ def _generate_rational_functions_question(difficulty="Medium"):
         options = {answer, f"$\\frac{{x - {hole_root}}}{{x - {den_root}}}$"}
 
     elif q_type == 'solve_equation':
-        b, c, x_sol = random.sample(range(-5, 6), 3)
-        while x_sol == b: x_sol = random.randint(-5, 6) # Ensure solution is not extraneous
+        b, x_sol = rng.sample(range(-5, 6), 2) # Distinct, so the solution is not extraneous
+        c = rng.choice([v for v in range(-5, 6) if v not in (0, b, x_sol)]) # Non-zero, so a is non-zero too
         a = c * (x_sol - b)
-        if a==0 or c==0: return _generate_rational_functions_question(difficulty=difficulty)
+        params = (a, b, c)
         question = f"Solve for x: $\\frac{{{a}}}{{x - {b}}} = {c}$"
         answer = str(x_sol)
         hint = "Multiply both sides by the denominator to eliminate the fraction, then solve the resulting linear equation."
@@ -5215,10 +6611,11 @@ def _generate_rational_functions_question(difficulty="Medium"):
 
     # --- Medium Questions ---
     elif q_type in ['domain', 'vertical_asymptotes']:
-        r1, r2 = random.sample(range(-5, 6), 2)
+        r1, r2 = rng.sample(range(-5, 6), 2)
         n_r = r1 + 1 if r1 != r2 -1 else r1 + 2
         num_poly = [1, -n_r]; den_poly = [1, -(r1+r2), r1*r2]
         func_str = f"f(x) = \\frac{{{_poly_to_str(num_poly)}}}{{{_poly_to_str(den_poly)}}}"
+        params = (n_r, sorted([r1, r2]))
         if q_type == 'domain':
             question = f"Find the domain of the function: ${func_str}$"
             answer = f"All real numbers except $x={r1}$ and $x={r2}$"
@@ -5233,30 +6630,32 @@ def _generate_rational_functions_question(difficulty="Medium"):
             options = {answer, f"$y={r1}, y={r2}$", f"$x={n_r}$"}
 
     elif q_type == 'horizontal_asymptotes':
-        case = random.choice(['top_less', 'equal', 'top_greater'])
+        case = rng.choice(['top_less', 'equal', 'top_greater'])
         if case == 'top_less': # Degree of Numerator < Degree of Denominator
-            num_poly, den_poly = [random.randint(1, 5)], [random.randint(1, 3), random.randint(1, 5), random.randint(1, 5)]
+            num_poly, den_poly = [rng.randint(1, 5)], [rng.randint(1, 3), rng.randint(1, 5), rng.randint(1, 5)]
             answer, hint = "$y=0$", "If the denominator's degree is greater, the horizontal asymptote is y=0."
         elif case == 'equal': # Degrees are equal
-            c1, c2 = random.randint(1, 6), random.randint(1, 6)
-            num_poly, den_poly = [c1, random.randint(1, 5)], [c2, random.randint(1, 5)]
+            c1, c2 = rng.randint(1, 6), rng.randint(1, 6)
+            num_poly, den_poly = [c1, rng.randint(1, 5)], [c2, rng.randint(1, 5)]
             ha = Fraction(c1, c2)
             answer, hint = f"$y = {_get_fraction_latex_code(ha)}$", "If degrees are equal, the asymptote is the ratio of the leading coefficients."
         else: # top_greater
-            num_poly, den_poly = [random.randint(1, 3), random.randint(1, 5), random.randint(1, 5)], [random.randint(1, 5), random.randint(1, 5)]
+            num_poly, den_poly = [rng.randint(1, 3), rng.randint(1, 5), rng.randint(1, 5)], [rng.randint(1, 5), rng.randint(1, 5)]
             answer, hint = "None", "If the numerator's degree is greater, there is no horizontal asymptote (but there may be a slant one)."
         func_str = f"f(x) = \\frac{{{_poly_to_str(num_poly)}}}{{{_poly_to_str(den_poly)}}}"
+        params = (num_poly, den_poly)
         question = f"Find the equation of the horizontal asymptote for the function: ${func_str}$"
         explanation = f"We compare the degree of the numerator and the denominator. {hint} Therefore, the horizontal asymptote is **{answer}**."
         options = {"$y=0$", "$y=1$", "None", answer}
 
     # --- Hard Questions ---
     elif q_type == 'find_holes':
-        hole_root, num_root, den_root = random.sample(range(-5, 6), 3)
+        hole_root, num_root, den_root = rng.sample(range(-5, 6), 3)
         num_poly = [1, -(hole_root + num_root), hole_root * num_root]
         den_poly = [1, -(hole_root + den_root), hole_root * den_root]
         func_str = f"f(x) = \\frac{{{_poly_to_str(num_poly)}}}{{{_poly_to_str(den_poly)}}}"
         y_hole = Fraction(hole_root - num_root, hole_root - den_root)
+        params = (hole_root, num_root, den_root)
         question = f"Find the coordinates of the hole (removable discontinuity) in the graph of: ${func_str}$"
         answer = f"$({hole_root}, {_get_fraction_latex_code(y_hole)})$"
         hint = "Factor the numerator and denominator. The cancelled factor gives the x-coordinate of the hole. Plug this x-value into the simplified function to find the y-coordinate."
@@ -5264,36 +6663,34 @@ def _generate_rational_functions_question(difficulty="Medium"):
         options = {answer, f"$x = {hole_root}$", f"$x = {den_root}$"}
 
     elif q_type == 'slant_asymptotes':
-        r1 = random.randint(-4, 4)
-        a, b = random.randint(1, 3), random.randint(-3, 3)
-        k = random.randint(1, 5) # Remainder
+        r1 = rng.randint(-4, 4)
+        a, b = rng.randint(1, 3), rng.randint(-3, 3)
+        k = rng.randint(1, 5) # Remainder
         den_poly = [1, -r1] # (x - r1)
         quotient_poly = [a, b] # ax + b
         num_poly = [a, b - a*r1, -b*r1 + k]
         func_str = f"f(x) = \\frac{{{_poly_to_str(num_poly)}}}{{{_poly_to_str(den_poly)}}}"
+        params = (num_poly, den_poly)
         question = f"Find the equation of the slant (oblique) asymptote for the function: ${func_str}$"
         answer = f"$y = {_poly_to_str(quotient_poly)}$"
         hint = "A slant asymptote exists when the degree of the numerator is exactly one greater than the denominator. Use polynomial long division to find it."
         explanation = f"To find the slant asymptote, we divide the numerator by the denominator.\n\n$({_poly_to_str(num_poly)}) \\div ({_poly_to_str(den_poly)})$ gives a quotient of $({_poly_to_str(quotient_poly)})$ and a remainder of ${k}$.\n\nThe slant asymptote is the quotient part: **{answer}**."
         options = {answer, f"$y = {_poly_to_str([a,b+1])}$", f"y = {a}x"}
 
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
-def _generate_trigonometry_question(difficulty="Medium"):
+def _generate_trigonometry_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Trigonometry question based on difficulty, preserving all original sub-types."""
     
-    if difficulty == "Easy":
-        q_type = 'identity'
-    elif difficulty == "Medium":
-        q_type = 'solve_equation'
-    else: # Hard
-        q_type = 'cosine_rule'
+    if q_type is None:
+        q_type = _pick_q_type("Trigonometry", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- Easy Question ---
     if q_type == 'identity':
+        params = () # A fixed question
         question = r"Simplify the expression $\frac{{\sin^2\theta}}{{1 - \cos\theta}}$."
         answer = r"$1 + \cos\theta$"
         hint = "Use the fundamental Pythagorean identity $\sin^2\theta + \cos^2\theta = 1$ and then factorize the numerator as a difference of two squares."
@@ -5313,13 +6710,14 @@ def _generate_trigonometry_question(difficulty="Medium"):
             "cos": {"1/2": 60, "√3/2": 30, "1/√2": 45},
             "tan": {"1": 45, "√3": 60, "1/√3": 30}
         }
-        func_name = random.choice(["sin", "cos", "tan"])
-        val_str, principal_val = random.choice(list(trig_values[func_name].items()))
+        func_name = rng.choice(["sin", "cos", "tan"])
+        val_str, principal_val = rng.choice(list(trig_values[func_name].items()))
         
         if func_name == "sin": quadrants, sol2 = [1, 2], 180 - principal_val
         elif func_name == "cos": quadrants, sol2 = [1, 4], 360 - principal_val
         else: quadrants, sol2 = [1, 3], 180 + principal_val
         
+        params = (func_name, val_str)
         question = f"Solve the equation ${func_name}(\\theta) = {val_str}$ for $0^\\circ \le \\theta \le 360^\\circ$."
         answer = f"{principal_val}°, {sol2}°"
         hint = f"Find the principal value (the acute angle). Then use the CAST rule to find the second solution in the range. {func_name} is positive in Quadrants {quadrants[0]} and {quadrants[1]}."
@@ -5334,9 +6732,10 @@ def _generate_trigonometry_question(difficulty="Medium"):
 
     # --- Hard Question ---
     elif q_type == 'cosine_rule':
-        a, b, C_deg = random.randint(5, 25), random.randint(5, 25), random.choice([30, 45, 60, 120])
+        a, b, C_deg = rng.randint(5, 25), rng.randint(5, 25), rng.choice([30, 45, 60, 120])
         c_sq = a**2 + b**2 - 2*a*b*math.cos(math.radians(C_deg))
         c = round(math.sqrt(c_sq), 2)
+        params = (a, b, C_deg)
         question = f"In triangle ABC, side $a = {a}$ m, side $b = {b}$ m, and the included angle $C = {C_deg}^\\circ$. Find the length of the third side, $c$, to two decimal places."
         answer = f"{c} m"
         hint = "When you have two sides and the angle between them (SAS), use the Cosine Rule: $c^2 = a^2 + b^2 - 2ab\\cos(C)$."
@@ -5347,290 +6746,26 @@ def _generate_trigonometry_question(difficulty="Medium"):
         )
         options = {answer, f"{round(math.sqrt(a**2 + b**2), 2)} m", f"{round(a+b - C_deg, 2)} m"}
 
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
-def _generate_vectors_question(difficulty="Medium"):
-    """Generates a Vectors question based on difficulty, preserving all original sub-types."""
-
-    if difficulty == "Easy":
-        # Basic scalar multiplication and vector addition/subtraction.
-        q_type = 'algebra'
-    elif difficulty == "Medium":
-        # Calculating the length/magnitude of a vector.
-        q_type = 'magnitude'
-    else: # Hard
-        # Multi-step problem to find the angle between vectors using the dot product.
-        q_type = 'dot_product'
-
-    question, answer, hint, explanation = "", "", "", ""
-    options = set()
-    
-    # --- Easy Question ---
-    if q_type == 'algebra':
-        a = np.array([random.randint(-5, 5), random.randint(-5, 5)])
-        b = np.array([random.randint(-5, 5), random.randint(-5, 5)])
-        s1, s2 = random.randint(2, 4), random.randint(2, 4)
-        question = f"Given vectors $\\mathbf{{a}} = \\binom{{{a[0]}}}{{{a[1]}}}$ and $\\mathbf{{b}} = \\binom{{{b[0]}}}{{{b[1]}}}$, find the resulting vector from the operation ${s1}\\mathbf{{a}} - {s2}\\mathbf{{b}}$."
-        result_vec = s1*a - s2*b
-        answer = f"$\\binom{{{result_vec[0]}}}{{{result_vec[1]}}}$"
-        hint = "First, multiply each vector by its scalar. Then, subtract the corresponding components of the resulting vectors."
-        explanation = (f"1. ${s1}\\mathbf{{a}} = {s1}\\binom{{{a[0]}}}{{{a[1]}}} = \\binom{{{s1*a[0]}}}{{{s1*a[1]}}}$.\n"
-                       f"2. ${s2}\\mathbf{{b}} = {s2}\\binom{{{b[0]}}}{{{b[1]}}} = \\binom{{{s2*b[0]}}}{{{s2*b[1]}}}$.\n"
-                       f"3. Subtract the results: $\\binom{{{s1*a[0]}}}{{{s1*a[1]}}} - \\binom{{{s2*b[0]}}}{{{s2*b[1]}}} = \\binom{{{s1*a[0] - s2*b[0]}}}{{{s1*a[1] - s2*b[1]}}} = {answer}$."
-                      )
-        options = {answer, f"$\\binom{{{a[0]-b[0]}}}{{{a[1]-b[1]}}}$", f"$\\binom{{{s1*a[0] + s2*b[0]}}}{{{s1*a[1] + s2*b[1]}}}$"}
-
-    # --- Medium Question ---
-    elif q_type == 'magnitude':
-        v = np.array([random.randint(2, 12), random.randint(2, 12)])
-        question = f"Find the magnitude (or length) of the vector $\\mathbf{{v}} = {v[0]}\\mathbf{{i}} + {v[1]}\\mathbf{{j}}$."
-        magnitude = round(np.linalg.norm(v), 2)
-        answer = str(magnitude)
-        hint = "The magnitude of a vector $x\\mathbf{i} + y\\mathbf{j}$ is found using the formula $|\\mathbf{{v}}| = \\sqrt{x^2 + y^2}$."
-        explanation = f"Magnitude $|\mathbf{{v}}| = \sqrt{{({v[0]})^2 + ({v[1]})^2}} = \sqrt{{{v[0]**2} + {v[1]**2}}} = \sqrt{{{v[0]**2+v[1]**2}}} \\approx {answer}$."
-        options = {answer, str(v[0]+v[1]), str(v[0]**2+v[1]**2)}
-
-    # --- Hard Question ---
-    elif q_type == 'dot_product':
-        a = np.array([random.randint(-5, 5), random.randint(-5, 5)])
-        b = np.array([random.randint(-5, 5), random.randint(-5, 5)])
-        while np.linalg.norm(a) == 0 or np.linalg.norm(b) == 0: # Avoid zero vectors to prevent division by zero
-             a = np.array([random.randint(-5, 5), random.randint(-5, 5)])
-             b = np.array([random.randint(-5, 5), random.randint(-5, 5)])
-        
-        question = f"Find the angle between the vectors $\\mathbf{{a}} = \\binom{{{a[0]}}}{{{a[1]}}}$ and $\\mathbf{{b}} = \\binom{{{b[0]}}}{{{b[1]}}}$ to the nearest degree."
-        dot_product = np.dot(a, b)
-        mag_a, mag_b = np.linalg.norm(a), np.linalg.norm(b)
-        cos_theta = dot_product / (mag_a * mag_b)
-        angle_rad = np.arccos(np.clip(cos_theta, -1.0, 1.0))
-        angle_deg = round(np.degrees(angle_rad))
-        answer = f"{angle_deg}°"
-        hint = "Use the dot product formula: $\\cos\\theta = \\frac{{\\mathbf{a} \\cdot \\mathbf{b}}}{{|\mathbf{a}| |\\mathbf{b}|}}$."
-        explanation = (f"1. Dot Product: $\\mathbf{{a}} \\cdot \\mathbf{{b}} = ({a[0]})({b[0]}) + ({a[1]})({b[1]}) = {dot_product}$.\n"
-                       f"2. Magnitudes: $|\mathbf{{a}}| \\approx {round(mag_a, 2)}$, $|\mathbf{{b}}| \\approx {round(mag_b, 2)}$.\n"
-                       f"3. $\\cos\\theta = \\frac{{{dot_product}}}{{{round(mag_a,2)} \\times {round(mag_b,2)}}} \\approx {round(cos_theta, 3)}$.\n"
-                       f"4. $\\theta = \\arccos({round(cos_theta, 3)}) \\approx {answer}$."
-                      )
-        options = {answer, f"{round(dot_product)}°", f"{90}°"}
-
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
 # --- PASTE THE 5 NEW TOPIC GENERATORS HERE ---
 
-def _generate_statistics_question(difficulty="Medium"):
-    """Generates a Statistics question based on difficulty, preserving all original sub-types."""
-    
-    if difficulty == "Easy":
-        # The most basic measures of data.
-        q_type = random.choice(['mode', 'range'])
-    elif difficulty == "Medium":
-        # Core measures of central tendency.
-        q_type = random.choice(['mean', 'median'])
-    else: # Hard
-        # More complex calculations involving grouped data or measures of spread.
-        q_type = random.choice(['frequency_tables', 'std_dev'])
-
-    question, answer, hint, explanation = "", "", "", ""
-    options = set()
-    
-    # --- Easy Questions ---
-    if q_type == 'mode':
-        k = random.randint(4, 5)
-        base_data = random.sample(range(10, 50), k=k)
-        mode_val = random.choice(base_data)
-        data = base_data + [mode_val, mode_val] # Ensure a clear mode
-        random.shuffle(data)
-        question = f"What is the mode of the following set of numbers representing daily sales at a stall in Kejetia Market? `{data}`"
-        answer = str(mode_val)
-        hint = "The mode is the number that appears most frequently in a data set."
-        explanation = f"By counting the occurrences of each number in the sorted list `{sorted(data)}`, we can see that **{answer}** appears most often (3 times)."
-        options = {answer, str(int(np.mean(data))), str(np.median(data))}
-
-    elif q_type == 'range':
-        k = random.randint(5, 7)
-        data = random.sample(range(10, 150), k=k)
-        range_val = max(data) - min(data)
-        question = f"Calculate the range of the following daily temperatures recorded in Kumasi: `{data}`"
-        answer = str(range_val)
-        hint = "The range is the difference between the highest and lowest values in the dataset."
-        explanation = f"1. The highest value (Maximum) is `{max(data)}`.\n\n2. The lowest value (Minimum) is `{min(data)}`.\n\n3. Range = Maximum - Minimum = `{max(data)} - {min(data)} = {answer}`."
-        options = {answer, str(max(data) + min(data)), str(max(data))}
-
-    # --- Medium Questions ---
-    elif q_type == 'mean':
-        k = random.randint(5, 7)
-        data = sorted(random.sample(range(5, 100), k=k))
-        mean_val = sum(data) / len(data)
-        question = f"A student in Accra recorded the following scores on their quizzes: `{data}`. What is the mean score, rounded to one decimal place?"
-        answer = f"{mean_val:.1f}"
-        hint = "The mean is the sum of all values divided by the number of values."
-        explanation = f"1. Sum of values: `{'+'.join(map(str, data))} = {sum(data)}`\n\n2. Number of values: `{len(data)}`\n\n3. Mean = Sum / Count = `{sum(data)} / {len(data)} \\approx {answer}`."
-        options = {answer, f"{np.median(data):.1f}", str(max(data)-min(data))}
-
-    elif q_type == 'median':
-        k = random.choice([5, 6, 7]) # Odd or even number of items
-        data = sorted(random.sample(range(5, 100), k=k))
-        median_val = np.median(data)
-        question = f"Find the median of the following dataset: `{data}`"
-        answer = str(median_val)
-        hint = "First, sort the data. The median is the middle value. If there are two middle values, it's their average."
-        explanation = f"1. The data must be sorted: `{data}`.\n\n2. Since there are {k} values, the median is the middle value. The calculated median is **{answer}**."
-        options = {answer, f"{sum(data)/len(data):.1f}", str(data[0])}
-
-    # --- Hard Questions ---
-    elif q_type == 'frequency_tables':
-        scores = [1, 2, 3, 4, 5]
-        freqs = [random.randint(2, 10) for _ in range(5)]
-        table_md = "| Score (x) | Frequency (f) |\n|---|---|\n"
-        fx_calcs = []
-        for s, f in zip(scores, freqs):
-            table_md += f"| {s} | {f} |\n"
-            fx_calcs.append(f"{s}x{f}={s*f}")
-
-        total_items = sum(freqs)
-        total_sum = sum(s * f for s, f in zip(scores, freqs))
-        mean_val = total_sum / total_items
-
-        question = f"The table below shows the results of a quiz. What is the mean score?\n\n{table_md}"
-        answer = f"{mean_val:.2f}"
-        hint = "To find the mean from a frequency table, calculate the sum of (score × frequency) for each row, then divide by the total frequency."
-        explanation = f"1. Calculate `fx` for each row and sum them: `{', '.join(fx_calcs)}`. The sum is $\\sum fx = {total_sum}$.\n\n2. Sum the frequencies: $\\sum f = {total_items}$.\n\n3. Mean = $\\frac{{\\sum fx}}{{\\sum f}} = \\frac{{{total_sum}}}{{{total_items}}} \\approx {answer}$."
-        options = {answer, f"{total_items/len(scores):.2f}", f"{total_sum / 5:.2f}"}
-
-    elif q_type == 'std_dev':
-        k = random.randint(4, 5)
-        data = random.sample(range(10, 30), k=k)
-        std_dev_val = np.std(data)
-        question = f"Calculate the population standard deviation of the dataset: `{data}`. Round to two decimal places."
-        answer = f"{std_dev_val:.2f}"
-        hint = "1. Find the mean. 2. For each number, subtract the mean and square the result. 3. Find the average of those squared differences (the variance). 4. Take the square root of the variance."
-        mean_val = np.mean(data)
-        explanation = f"1. Mean (`μ`) = `{mean_val:.2f}`.\n\n2. Variance (`σ²`) = Average of squared differences from the mean ≈ `{np.var(data):.2f}`.\n\n3. Standard Deviation (`σ`) = `√Variance` ≈ `{answer}`."
-        options = {answer, f"{np.var(data):.2f}", f"{max(data)-min(data):.2f}"}
-
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
-
-
-def _generate_coordinate_geometry_question(difficulty="Medium"):
-    """Generates a Coordinate Geometry question based on difficulty, preserving all original sub-types."""
-
-    if difficulty == "Easy":
-        # Foundational formulas for midpoint and gradient.
-        q_type = random.choice(['midpoint', 'gradient'])
-    elif difficulty == "Medium":
-        # More complex formulas and initial equation-finding.
-        q_type = random.choice(['distance', 'equation_point_slope'])
-    else: # Hard
-        # Multi-step problems combining formulas or analyzing relationships.
-        q_type = random.choice(['equation_two_points', 'parallel_perpendicular'])
-
-    question, answer, hint, explanation = "", "", "", ""
-    options = set()
-    x1, y1, x2, y2 = [random.randint(-10, 10) for _ in range(4)]
-    while x1 == x2 and y1 == y2: # Ensure points are distinct
-        x2, y2 = random.randint(-10, 10), random.randint(-10, 10)
-
-    # --- Easy Questions ---
-    if q_type == 'midpoint':
-        mid_x = (x1 + x2) / 2
-        mid_y = (y1 + y2) / 2
-        question = f"Find the midpoint of the line segment connecting A$({x1}, {y1})$ and B$({x2}, {y2})$."
-        answer = f"({mid_x:.1f}, {mid_y:.1f})".replace(".0", "")
-        hint = "The midpoint is the average of the x-coordinates and the average of the y-coordinates."
-        explanation = f"Midpoint = $(\\frac{{x_1+x_2}}{{2}}, \\frac{{y_1+y_2}}{{2}}) = (\\frac{{{x1}+{x2}}}{{2}}, \\frac{{{y1}+{y2}}}{{2}}) = ({answer})$."
-        options = {answer, f"({(x2-x1)/2}, {(y2-y1)/2})", f"({x1+x2}, {y1+y2})"}
-
-    elif q_type == 'gradient':
-        question = f"Find the gradient (slope) of the line passing through A$({x1}, {y1})$ and B$({x2}, {y2})$."
-        if x1 == x2: # Vertical line
-            answer = "Undefined"
-            hint = "The gradient of a vertical line is undefined."
-            explanation = "Since the x-coordinates are the same ($x_1 = x_2$), this is a vertical line. The gradient of a vertical line is undefined because the change in x is zero, leading to division by zero in the formula."
-            options = {answer, "0", "1"}
-        else:
-            grad = Fraction(y2 - y1, x2 - x1)
-            answer = _format_fraction_text(grad)
-            hint = "Use the gradient formula: $m = \\frac{{y_2-y_1}}{{x_2-x_1}}$."
-            explanation = f"Gradient $m = \\frac{{y_2-y_1}}{{x_2-x_1}} = \\frac{{{y2}-({y1})}}{{{x2}-({x1})}} = \\frac{{{y2-y1}}}{{{x2-x1}}} = {_get_fraction_latex_code(grad)}$."
-            options = {answer, _format_fraction_text(Fraction(x2-x1, y2-y1)), str(y2-y1)}
-
-    # --- Medium Questions ---
-    elif q_type == 'distance':
-        dist_sq = (x2 - x1)**2 + (y2 - y1)**2
-        dist = math.sqrt(dist_sq)
-        question = f"Find the distance between point A$({x1}, {y1})$ and point B$({x2}, {y2})$."
-        if dist == int(dist): answer = str(int(dist))
-        else: answer = f"$\\sqrt{{{dist_sq}}}$" # Leave as a simplified surd
-        hint = "Use the distance formula: $d = \\sqrt{{(x_2 - x_1)^2 + (y_2 - y_1)^2}}$."
-        explanation = f"Using the distance formula:\n$d = \\sqrt{{({x2} - ({x1}))^2 + ({y2} - ({y1}))^2}} = \\sqrt{{({x2-x1})^2 + ({y2-y1})^2}} = \\sqrt{{{dist_sq}}}$."
-        if dist != int(dist): explanation += f" This is the exact distance in simplified surd form."
-        else: explanation += f" = {int(dist)}"
-        options = {answer, str(round(dist, 2)), str(dist_sq)}
-
-    elif q_type == 'equation_point_slope':
-        m_num, m_den = random.randint(-5, 5), random.randint(1, 3)
-        while m_num == 0: m_num = random.randint(-5, 5)
-        m = Fraction(m_num, m_den)
-        c = y1 - m*x1
-        question = f"Find the equation of the line that passes through the point $({x1}, {y1})$ and has a gradient of ${_get_fraction_latex_code(m)}$."
-        answer = f"$y = {_get_fraction_latex_code(m)}x {'+' if c >= 0 else '-'} {_get_fraction_latex_code(abs(c))}$"
-        hint = "Use the formula $y - y_1 = m(x - x_1)$ and rearrange it into the form $y = mx + c$."
-        explanation = f"1. Start with $y - y_1 = m(x - x_1)$.\n\n2. Substitute values: $y - ({y1}) = {_get_fraction_latex_code(m)}(x - ({x1}))$.\n\n3. Simplify to find the y-intercept 'c': $c = y_1 - m \\times x_1 = {_get_fraction_latex_code(y1)} - {_get_fraction_latex_code(m)} \\times {_get_fraction_latex_code(Fraction(x1))} = {_get_fraction_latex_code(c)}$.\n\n4. The final equation is: {answer}."
-        options = {answer, f"$y = {-1/m}x + {c}$", f"$y - {y1} = {_get_fraction_latex_code(m)}(x + {x1})$"}
-
-    # --- Hard Questions ---
-    elif q_type == 'equation_two_points':
-        question = f"Find the equation of the line that passes through the points A$({x1}, {y1})$ and B$({x2}, {y2})$."
-        if x1 == x2: # Vertical line
-            answer = f"$x = {x1}$"
-            hint = "First, find the gradient. If the x-coordinates are the same, it's a special case."
-            explanation = "Since the x-coordinates are the same, this is a vertical line. All points on this line have an x-coordinate of {x1}, so the equation is $x = {x1}$."
-            options = {answer, f"y = {y1}", f"y = x + {y1-x1}"}
-        else:
-            m = Fraction(y2 - y1, x2 - x1)
-            c = y1 - m*x1
-            answer = f"$y = {_get_fraction_latex_code(m)}x {'+' if c >= 0 else '-'} {_get_fraction_latex_code(abs(c))}$"
-            hint = "First, calculate the gradient between the two points, then use the point-slope formula $y - y_1 = m(x - x_1)$ with one of the points."
-            explanation = f"1. First, find the gradient: $m = \\frac{{{y2-y1}}}{{{x2-x1}}} = {_get_fraction_latex_code(m)}$.\n\n2. Use $y - y_1 = m(x - x_1)$: $y - ({y1}) = {_get_fraction_latex_code(m)}(x - ({x1}))$.\n\n3. Simplify to $y=mx+c$ form: {answer}."
-            options = {answer, f"$y = {_get_fraction_latex_code(-1/m)}x {'+' if c >= 0 else '-'} {_get_fraction_latex_code(abs(c))}$"}
-
-    elif q_type == 'parallel_perpendicular':
-        m1 = Fraction(random.randint(-3, 3), random.randint(1, 2))
-        while m1 == 0: m1 = Fraction(random.randint(-3, 3), random.randint(1, 2))
-        c1 = random.randint(-5, 5)
-        line1_eq = f"$y = {_get_fraction_latex_code(m1)}x {'+' if c1 >= 0 else '-'} {_get_fraction_latex_code(abs(c1))}$"
-        relationship, m2 = random.choice([("Parallel", m1), ("Perpendicular", -1/m1), ("Neither", m1+1)])
-        line2_eq = f"$y = {_get_fraction_latex_code(m2)}x + {c1+2}$"
-        question = f"What is the relationship between the lines {line1_eq} and {line2_eq}?"
-        answer = relationship
-        hint = "Compare the gradients (m values) of the two lines. Parallel lines have equal gradients. For perpendicular lines, the product of their gradients is -1 (or one is the negative reciprocal of the other)."
-        explanation = f"The gradient of the first line is $m_1 = {_get_fraction_latex_code(m1)}$. The gradient of the second line is $m_2 = {_get_fraction_latex_code(m2)}$. Since $m_1$ and $m_2$ meet the condition for being **{answer}**, that is the correct relationship."
-        options = {"Parallel", "Perpendicular", "Neither"}
-
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
-
-
-def _generate_calculus_question(difficulty="Medium"):
+def _generate_calculus_question(difficulty="Medium", rng=random, q_type=None):
     """Generates an Introduction to Calculus question based on difficulty, preserving all original sub-types."""
     
-    if difficulty == "Easy":
-        # Foundational concepts of limits and the power rule for differentiation.
-        q_type = random.choice(['limits_substitution', 'diff_power_rule'])
-    elif difficulty == "Medium":
-        # Applying differentiation and introducing basic integration.
-        q_type = random.choice(['gradient_of_curve', 'indefinite_integration'])
-    else: # Hard
-        # Multi-step integration problems.
-        q_type = random.choice(['find_constant_c', 'definite_integration'])
+    if q_type is None:
+        q_type = _pick_q_type("Introduction to Calculus", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- Easy Questions ---
     if q_type == 'limits_substitution':
-        coeffs = [random.randint(1, 5), random.randint(-5, 5), random.randint(-5, 5)]
+        coeffs = [rng.randint(1, 5), rng.randint(-5, 5), rng.randint(-5, 5)]
         poly_str = _poly_to_str(coeffs)
-        x_val = random.randint(-3, 3)
+        x_val = rng.randint(-3, 3)
         limit_val = coeffs[0]*x_val**2 + coeffs[1]*x_val + coeffs[2]
+        params = (coeffs, x_val)
         question = f"Evaluate the limit: $\\lim_{{x \\to {x_val}}} ({poly_str})$"
         answer = str(limit_val)
         hint = "Since this is a polynomial function, you can find the limit by direct substitution of the value x is approaching."
@@ -5638,22 +6773,24 @@ def _generate_calculus_question(difficulty="Medium"):
         options = {answer, str(limit_val+1), str(limit_val-1)}
 
     elif q_type == 'diff_power_rule':
-        coeffs = [random.randint(2, 6), random.randint(-5, 5), random.randint(2, 10)]
+        coeffs = [rng.randint(2, 6), rng.randint(-5, 5), rng.randint(2, 10)]
         poly_str = _poly_to_str(coeffs)
         deriv_coeffs = [coeffs[0]*2, coeffs[1]]
         deriv_str = _poly_to_str(deriv_coeffs)
+        params = (coeffs,)
         question = f"Find the derivative of $f(x) = {poly_str}$ with respect to x."
         answer = f"${deriv_str}$"
         hint = "Apply the power rule, $\\frac{{d}}{{dx}}(ax^n) = anx^{{n-1}}$, to each term of the polynomial. The derivative of a constant is zero."
         explanation = f"Differentiating term by term:\n\n$\\frac{{d}}{{dx}}({coeffs[0]}x^2) = {coeffs[0]*2}x$\n\n$\\frac{{d}}{{dx}}({coeffs[1]}x) = {coeffs[1]}$\n\n$\\frac{{d}}{{dx}}({coeffs[2]}) = 0$\n\nAdding these together, the derivative is ${answer}$."
-        options = {answer, f"${poly_to_str(coeffs)}$", f"${poly_to_str([coeffs[0]*2, coeffs[1], coeffs[2]])}$"}
+        options = {answer, f"${_poly_to_str(coeffs)}$", f"${_poly_to_str([coeffs[0]*2, coeffs[1], coeffs[2]])}$"}
 
     # --- Medium Questions ---
     elif q_type == 'gradient_of_curve':
-        coeffs = [random.randint(2, 5), random.randint(-5, 5)]
-        poly_str = _poly_to_str(coeffs) + f" + {random.randint(1,10)}"
-        x_val = random.randint(1, 4)
+        coeffs = [rng.randint(2, 5), rng.randint(-5, 5)]
+        poly_str = _poly_to_str(coeffs) + f" + {rng.randint(1,10)}"
+        x_val = rng.randint(1, 4)
         gradient_val = coeffs[0]*2*x_val + coeffs[1]
+        params = (poly_str, x_val)
         question = f"Find the gradient of the curve $y = {poly_str}$ at the point where $x={x_val}$."
         answer = str(gradient_val)
         hint = "First, find the derivative of the function (which represents the gradient at any point), then substitute the given x-value into the derivative."
@@ -5661,10 +6798,11 @@ def _generate_calculus_question(difficulty="Medium"):
         options = {answer, str(gradient_val + x_val), str(coeffs[0]*x_val**2 + coeffs[1]*x_val)}
 
     elif q_type == 'indefinite_integration':
-        deriv_coeffs = [random.randint(1, 4) * 2, random.randint(2, 10)]
+        deriv_coeffs = [rng.randint(1, 4) * 2, rng.randint(2, 10)]
         deriv_str = _poly_to_str(deriv_coeffs)
         orig_coeffs = [deriv_coeffs[0]//2, deriv_coeffs[1]]
         orig_str = _poly_to_str(orig_coeffs)
+        params = (deriv_coeffs,)
         question = f"Find the indefinite integral: $\\int ({deriv_str}) \\,dx$."
         answer = f"${orig_str} + C$"
         hint = "Apply the reverse power rule, $\\int ax^n \\,dx = \\frac{{a}}{{n+1}}x^{{n+1}} + C$, to each term. Don't forget the constant of integration, C."
@@ -5673,12 +6811,13 @@ def _generate_calculus_question(difficulty="Medium"):
 
     # --- Hard Questions ---
     elif q_type == 'find_constant_c':
-        deriv_coeffs = [random.randint(1, 4) * 2, random.randint(-5, 5)]
+        deriv_coeffs = [rng.randint(1, 4) * 2, rng.randint(-5, 5)]
         deriv_str = _poly_to_str(deriv_coeffs)
-        px, py = random.randint(1, 3), random.randint(5, 20)
+        px, py = rng.randint(1, 3), rng.randint(5, 20)
         integral_val_at_px = (deriv_coeffs[0]//2)*px**2 + deriv_coeffs[1]*px
         const_c = py - integral_val_at_px
         orig_str = f"{_poly_to_str([deriv_coeffs[0]//2, deriv_coeffs[1]])} {'+' if const_c >= 0 else '-'} {abs(const_c)}"
+        params = (deriv_coeffs, px, py)
         question = f"Given that $\\frac{{dy}}{{dx}} = {deriv_str}$ and the curve passes through the point $({px}, {py})$, find the specific equation of the curve."
         answer = f"$y = {orig_str}$"
         hint = "First, integrate the derivative to get the general form $y = ... + C$. Then, substitute the x and y coordinates of the given point to solve for C."
@@ -5686,43 +6825,38 @@ def _generate_calculus_question(difficulty="Medium"):
         options = {answer, f"$y = {_poly_to_str([deriv_coeffs[0]//2, deriv_coeffs[1]])}$", f"$y = {deriv_str} + {const_c}$"}
 
     elif q_type == 'definite_integration':
-        coeffs = [random.randint(1, 4) * 2, random.randint(2, 8)]
+        coeffs = [rng.randint(1, 4) * 2, rng.randint(2, 8)]
         poly_str = _poly_to_str(coeffs)
-        a, b = random.randint(1, 3), random.randint(4, 5)
+        a, b = rng.randint(1, 3), rng.randint(4, 5)
         integral_coeffs = [coeffs[0]//2, coeffs[1]]
         F_b = integral_coeffs[0]*b**2 + integral_coeffs[1]*b
         F_a = integral_coeffs[0]*a**2 + integral_coeffs[1]*a
         result = F_b - F_a
+        params = (coeffs, a, b)
         question = f"Evaluate the definite integral: $\\int_{{{a}}}^{{{b}}} ({poly_str}) \\,dx$."
         answer = str(result)
         hint = "First find the indefinite integral, F(x). Then calculate F(b) - F(a), where 'b' is the upper limit and 'a' is the lower limit."
         explanation = f"1. The integral is $F(x) = {_poly_to_str(integral_coeffs)}$.\n\n2. Evaluate at the upper limit: $F({b}) = {integral_coeffs[0]}({b})^2 + {integral_coeffs[1]}({b}) = {F_b}$.\n\n3. Evaluate at the lower limit: $F({a}) = {integral_coeffs[0]}({a})^2 + {integral_coeffs[1]}({a}) = {F_a}$.\n\n4. The result is $F({b}) - F({a}) = {F_b} - {F_a} = {result}$."
         options = {answer, str(F_b+F_a), str(F_b)}
 
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
 
-def _generate_number_bases_question(difficulty="Medium"):
+def _generate_number_bases_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Number Bases question based on difficulty, preserving all original sub-types."""
 
-    if difficulty == "Easy":
-        # Foundational conversion skills.
-        q_type = random.choice(['to_base_10', 'from_base_10'])
-    elif difficulty == "Medium":
-        # Basic arithmetic in other bases.
-        q_type = random.choice(['addition', 'subtraction'])
-    else: # Hard
-        # More complex arithmetic.
-        q_type = 'multiplication'
+    if q_type is None:
+        q_type = _pick_q_type("Number Bases", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
-    base = random.choice([2, 3, 4, 5, 8])
+    base = rng.choice([2, 3, 4, 5, 8])
 
     # --- Easy Questions ---
     if q_type == 'to_base_10':
-        num_base10 = random.randint(10, 100)
-        num_other_base = np.base_repr(num_base10, base)
+        num_base10 = rng.randint(10, 100)
+        num_other_base = _to_base(num_base10, base)
+        params = (base, num_base10)
         question = f"Convert the number ${num_other_base}_{{{base}}}$ to base 10."
         answer = str(num_base10)
         hint = f"Multiply each digit by the base raised to the power of its position (starting from 0 on the right)."
@@ -5731,8 +6865,9 @@ def _generate_number_bases_question(difficulty="Medium"):
         options = {answer, str(int(num_other_base, base=16)) if base < 16 else str(num_base10+base), str(sum(int(d) for d in num_other_base)*base)}
 
     elif q_type == 'from_base_10':
-        num_base10 = random.randint(20, 150)
-        num_other_base = np.base_repr(num_base10, base)
+        num_base10 = rng.randint(20, 150)
+        num_other_base = _to_base(num_base10, base)
+        params = (base, num_base10)
         question = f"Convert the number ${num_base10}_{{10}}$ to base {base}."
         answer = str(num_other_base)
         hint = "Use repeated division by the target base. The remainders, read from bottom to top, form the new number."
@@ -5751,64 +6886,61 @@ def _generate_number_bases_question(difficulty="Medium"):
 
     # --- Medium Questions ---
     elif q_type == 'addition':
-        n1 = random.randint(10, 50)
-        n2 = random.randint(10, 50)
-        n1_base = np.base_repr(n1, base)
-        n2_base = np.base_repr(n2, base)
+        n1 = rng.randint(10, 50)
+        n2 = rng.randint(10, 50)
+        n1_base = _to_base(n1, base)
+        n2_base = _to_base(n2, base)
         result_10 = n1 + n2
-        answer = np.base_repr(result_10, base)
+        answer = _to_base(result_10, base)
+        params = (base, n1, n2)
         question = f"Calculate the sum in base {base}: ${n1_base}_{{{base}}} + {n2_base}_{{{base}}}$"
         hint = "The simplest method is to convert both numbers to base 10, add them normally, then convert the result back to the target base."
         explanation = f"1. Convert to base 10: ${n1_base}_{{{base}}} = {n1}_{{10}}$ and ${n2_base}_{{{base}}} = {n2}_{{10}}$.\n\n2. Add in base 10: ${n1} + {n2} = {result_10}$.\n\n3. Convert the result back to base {base}: ${result_10}_{{10}} = {answer}_{{{base}}}$."
-        options = {answer, np.base_repr(result_10 + base, base), np.base_repr(n1,base)+np.base_repr(n2,base)}
+        options = {answer, _to_base(result_10 + base, base), _to_base(n1,base)+_to_base(n2,base)}
 
     elif q_type == 'subtraction':
-        n1 = random.randint(20, 60)
-        n2 = random.randint(10, 50)
+        n1 = rng.randint(20, 60)
+        n2 = rng.randint(10, 50)
         if n1 < n2: n1, n2 = n2, n1 # Ensure result is positive
-        n1_base, n2_base = np.base_repr(n1, base), np.base_repr(n2, base)
+        n1_base, n2_base = _to_base(n1, base), _to_base(n2, base)
         result_10 = n1 - n2
-        answer = np.base_repr(result_10, base)
+        answer = _to_base(result_10, base)
+        params = (base, n1, n2)
         question = f"Calculate the difference in base {base}: ${n1_base}_{{{base}}} - {n2_base}_{{{base}}}$"
         hint = "Convert both numbers to base 10, subtract them, then convert the result back to the target base."
         explanation = f"1. Convert to base 10: ${n1_base}_{{{base}}} = {n1}_{{10}}$ and ${n2_base}_{{{base}}} = {n2}_{{10}}$.\n\n2. Subtract in base 10: ${n1} - {n2} = {result_10}$.\n\n3. Convert the result back to base {base}: ${result_10}_{{10}} = {answer}_{{{base}}}$."
-        options = {answer, np.base_repr(result_10 + base, base)}
+        options = {answer, _to_base(result_10 + base, base)}
 
     # --- Hard Question ---
     elif q_type == 'multiplication':
-        n1, n2 = random.randint(5, 12), random.randint(5, 12)
-        n1_base, n2_base = np.base_repr(n1, base), np.base_repr(n2, base)
+        n1, n2 = rng.randint(5, 12), rng.randint(5, 12)
+        n1_base, n2_base = _to_base(n1, base), _to_base(n2, base)
         result_10 = n1 * n2
-        answer = np.base_repr(result_10, base)
+        answer = _to_base(result_10, base)
+        params = (base, n1, n2)
         question = f"Calculate the product in base {base}: ${n1_base}_{{{base}}} \\times {n2_base}_{{{base}}}$"
         hint = "Convert both numbers to base 10, multiply them, then convert the final result back to the target base."
         explanation = f"1. Convert to base 10: ${n1_base}_{{{base}}} = {n1}_{{10}}$ and ${n2_base}_{{{base}}} = {n2}_{{10}}$.\n\n2. Multiply in base 10: ${n1} \\times {n2} = {result_10}$.\n\n3. Convert the result back to base {base}: ${result_10}_{{10}} = {answer}_{{{base}}}$."
-        options = {answer, np.base_repr(n1+n2, base)}
+        options = {answer, _to_base(n1+n2, base)}
         
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
 
 
-def _generate_modulo_arithmetic_question(difficulty="Medium"):
+def _generate_modulo_arithmetic_question(difficulty="Medium", rng=random, q_type=None):
     """Generates a Modulo Arithmetic question based on difficulty, preserving all original sub-types."""
 
-    if difficulty == "Easy":
-        # Direct calculation and simple application.
-        q_type = random.choice(['find_remainder', 'clock_arithmetic'])
-    elif difficulty == "Medium":
-        # Understanding the concept of congruence and another application.
-        q_type = random.choice(['congruence', 'day_of_week'])
-    else: # Hard
-        # Solving a linear congruence, which requires algebraic thinking.
-        q_type = 'solve_linear'
+    if q_type is None:
+        q_type = _pick_q_type("Modulo Arithmetic", difficulty, rng)
 
     question, answer, hint, explanation = "", "", "", ""
     options = set()
 
     # --- Easy Questions ---
     if q_type == 'find_remainder':
-        n = random.randint(3, 12)
-        a = random.randint(n + 1, n * 10)
+        n = rng.randint(3, 12)
+        a = rng.randint(n + 1, n * 10)
         rem = a % n
+        params = (n, a)
         question = f"Find the remainder when ${a}$ is divided by ${n}$. (i.e., find ${a} \\pmod {n}$)"
         answer = str(rem)
         hint = "This is asking for the value of the 'modulo' operation, which is the remainder after division."
@@ -5816,9 +6948,10 @@ def _generate_modulo_arithmetic_question(difficulty="Medium"):
         options = {answer, str(a//n), str(n-rem)}
 
     elif q_type == 'clock_arithmetic':
-        current_time = random.randint(1, 12)
-        hours_passed = random.randint(15, 100)
+        current_time = rng.randint(1, 12)
+        hours_passed = rng.randint(15, 100)
         final_time = (current_time + hours_passed - 1) % 12 + 1
+        params = (current_time, hours_passed)
         question = f"A student in Accra looks at a 12-hour clock. It is currently {current_time} o'clock. What time will it be in {hours_passed} hours?"
         answer = f"{final_time} o'clock"
         hint = "This problem can be solved using modulo 12. The cycle of a clock repeats every 12 hours."
@@ -5827,19 +6960,20 @@ def _generate_modulo_arithmetic_question(difficulty="Medium"):
 
     # --- Medium Questions ---
     elif q_type == 'congruence':
-        n = random.randint(3, 9)
-        is_true = random.choice([True, False])
+        n = rng.randint(3, 9)
+        is_true = rng.choice([True, False])
         if is_true:
-            rem = random.randint(0, n - 1)
-            a = n * random.randint(2, 5) + rem
-            b = n * random.randint(1, 4) + rem
-            while a == b: b = n * random.randint(1, 4) + rem
+            rem = rng.randint(0, n - 1)
+            a = n * rng.randint(2, 5) + rem
+            b = n * rng.randint(1, 4) + rem
+            while a == b: b = n * rng.randint(1, 4) + rem
             answer = "True"
         else:
-            rem1, rem2 = random.sample(range(n), 2)
-            a = n * random.randint(2, 5) + rem1
-            b = n * random.randint(1, 4) + rem2
+            rem1, rem2 = rng.sample(range(n), 2)
+            a = n * rng.randint(2, 5) + rem1
+            b = n * rng.randint(1, 4) + rem2
             answer = "False"
+        params = (n, a, b)
         question = f"Is the following congruence relation true or false? ${a} \\equiv {b} \\pmod {n}$"
         hint = f"The relation $a \\equiv b \\pmod n$ is true if and only if $a$ and $b$ have the same remainder when divided by $n$. Alternatively, if $(a - b)$ is a multiple of $n$."
         explanation = f"We check if $(a - b)$ is divisible by ${n}$.\n\n${a} - {b} = {a-b}$.\n\nIs {a-b} divisible by {n}? The answer is **{answer.lower()}**."
@@ -5847,9 +6981,10 @@ def _generate_modulo_arithmetic_question(difficulty="Medium"):
     
     elif q_type == 'day_of_week':
         days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        start_day_index = random.randint(0, 6)
-        days_passed = random.randint(20, 200)
+        start_day_index = rng.randint(0, 6)
+        days_passed = rng.randint(20, 200)
         final_day_index = (start_day_index + days_passed) % 7
+        params = (start_day_index, days_passed)
         question = f"Today is {days[start_day_index]}. What day of the week will it be in {days_passed} days?"
         answer = days[final_day_index]
         hint = "Use modulo 7 to solve this problem. The cycle of a week repeats every 7 days."
@@ -5858,127 +6993,1062 @@ def _generate_modulo_arithmetic_question(difficulty="Medium"):
 
     # --- Hard Question ---
     elif q_type == 'solve_linear':
-        n = random.choice([3, 5, 7, 11]) # Prime modulus for simplicity
-        a = random.randint(2, n - 1)
-        x = random.randint(1, n - 1)
+        tables = _math_tables()
+        n = rng.choice(tables.primes[1:5]) # Prime modulus (3, 5, 7 or 11), so every a has an inverse
+        a = rng.randint(2, n - 1)
+        x = rng.randint(1, n - 1)
         b = (a * x) % n
+        a_inverse = tables.mod_inverses[n][a]
+        params = (n, a, b)
         question = f"Find the value of $x$ in the congruence: ${a}x \\equiv {b} \\pmod {n}$, where $x$ is an integer from 1 to {n-1}."
         answer = str(x)
         hint = f"You can test the integer values from 1 to {n-1} for $x$ to see which one satisfies the equation."
-        explanation = f"We are looking for an integer $x$ such that ${a}x$ has the same remainder as ${b}$ when divided by ${n}$. By testing values, we find:\n\n- For $x={x}$, ${a}({x}) = {a*x}$.\n- ${a*x} \\div {n}$ is {a*x//n} with a remainder of {b}.\n\nSo, **$x={answer}$** is the solution."
+        explanation = f"We are looking for an integer $x$ such that ${a}x$ has the same remainder as ${b}$ when divided by ${n}$. By testing values, we find:\n\n- For $x={x}$, ${a}({x}) = {a*x}$.\n- ${a*x} \\div {n}$ is {a*x//n} with a remainder of {b}.\n\nSo, **$x={answer}$** is the solution.\n\nWithout testing, multiply both sides by the inverse of ${a}$ modulo ${n}$, which is ${a_inverse}$ (since ${a} \\times {a_inverse} = {a*a_inverse} \\equiv 1 \\pmod {n}$): $x \\equiv {b} \\times {a_inverse} \\equiv {x} \\pmod {n}$."
         options = {answer, str((b-a)%n), str((b+a)%n)}
 
-    return {"question": question, "options": _finalize_options(options), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty}
+    return {"question": question, "options": _finalize_options(options, rng=rng), "answer": answer, "hint": hint, "explanation": explanation, "difficulty": difficulty, "q_type": q_type, "params": params}
+
+def _batched_topic_generator(topic):
+    """Single-question generator for a BATCH_GENERATORS topic: a batch of one, seeded from rng."""
+    def generate_batch_of_one(difficulty="Medium", rng=random, q_type=None):
+        return generate_batch(topic, difficulty, 1, seeds=[rng.getrandbits(64)], q_type=q_type)[0]
+    return generate_batch_of_one
+
+# This dictionary maps topic strings to their specific generator functions.
+# Statistics, Vectors, Coordinate Geometry and Linear Algebra only exist as vectorized batch builders (see below).
+ADAPTIVE_GENERATORS = {
+    "Sets": _generate_sets_question, 
+    "Percentages": _generate_percentages_question,
+    "Fractions": _generate_fractions_question, 
+    "Indices": _generate_indices_question,
+    "Surds": _generate_surds_question, 
+    "Binary Operations": _generate_binary_ops_question,
+    "Relations and Functions": _generate_relations_functions_question,
+    "Sequence and Series": _generate_sequence_series_question,
+    "Word Problems": _generate_word_problems_question,
+    "Shapes (Geometry)": _generate_shapes_question,
+    "Algebra Basics": _generate_algebra_basics_question,
+    "Linear Algebra": _batched_topic_generator("Linear Algebra"),
+    "Logarithms": _generate_logarithms_question,
+    "Probability": _generate_probability_question,
+    "Binomial Theorem": _generate_binomial_theorem_question,
+    "Polynomial Functions": _generate_polynomial_functions_question,
+    "Rational Functions": _generate_rational_functions_question,
+    "Trigonometry": _generate_trigonometry_question,
+    "Vectors": _batched_topic_generator("Vectors"),
+    "Statistics": _batched_topic_generator("Statistics"),
+    "Coordinate Geometry": _batched_topic_generator("Coordinate Geometry"),
+    "Introduction to Calculus": _generate_calculus_question,
+    "Number Bases": _generate_number_bases_question,
+    "Modulo Arithmetic": _generate_modulo_arithmetic_question,
+}
 
-def get_adaptive_question(topic, username):
+# --- VECTORIZED BATCH GENERATION ---
+# Statistics, Vectors, Coordinate Geometry and Linear Algebra questions can be built many at a time: every
+# parameter is drawn as a NumPy column, answers and distractors are computed column-wise and the strings are
+# formatted at the end. Draws are counter-based (splitmix64 of the row's seed and a draw counter), so row i
+# depends only on seeds[i] and generate_seeded_question rebuilds any one row as a batch of one.
+BATCH_REJECTION_STREAM = 100 # Redraws for rejected rows use their own streams so they never shift later draws
+BATCH_UNTIL_MAX_ROUNDS = 32 # Redraw rounds before _batch_until gives the rows still rejected its fallback value
+
+class _BatchRandom:
+    """Row-wise random draws for a batch: the values for row i depend only on seeds[i] and the stream."""
+
+    def __init__(self, seeds, stream=0):
+        self.seeds = seeds
+        self.counter = stream << 32
+
+    def words(self, width):
+        """An (n, width) array of random 64-bit words, the next `width` draws of each row."""
+        counters = np.arange(self.counter + 1, self.counter + width + 1, dtype=np.uint64)
+        self.counter += width
+        x = self.seeds[:, None] + np.uint64(0x9E3779B97F4A7C15) * counters
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+    def integers(self, low, high, width=None):
+        """Like random.randint(low, high) for every row (low and high may be per-row arrays)."""
+        span = (np.asarray(high, dtype=np.int64) - low + 1).astype(np.uint64)
+        words = self.words(width or 1)
+        values = (words % (span[:, None] if span.ndim else span)).astype(np.int64)
+        values += np.asarray(low, dtype=np.int64)[:, None] if np.ndim(low) else low
+        return values if width else values[:, 0]
+
+    def sample(self, low, high, k):
+        """Like random.sample(range(low, high), k) for every row, as an (n, k) array."""
+        return np.argsort(self.words(high - low), axis=1)[:, :k] + low
+
+    def shuffle_order(self, lengths, width):
+        """Per-row random orderings of range(lengths[i]), padded with -1 up to width columns."""
+        keys = self.words(width)
+        keys[np.arange(width) >= np.asarray(lengths)[:, None]] = np.uint64(2**64 - 1)
+        order = np.argsort(keys, axis=1)
+        order[np.arange(width) >= np.asarray(lengths)[:, None]] = -1
+        return order
+
+def _batch_until(seeds, draw, is_valid, fallback, stream=BATCH_REJECTION_STREAM):
     """
-    The new "brain" of the quiz. It gets a question based on the user's skill level.
+    Runs draw() for every row and redraws the rows failing is_valid(), each retry on a fresh stream. Rows still
+    failing after BATCH_UNTIL_MAX_ROUNDS redraws get the (valid) fallback value, so a batch always terminates.
     """
-    # --- THIS IS THE FIX: Handle 'Advanced Combo' as a special case first ---
-    if topic == "Advanced Combo":
-        # Advanced Combo questions don't have difficulty levels, so we call its generator directly.
-        return _generate_advanced_combo_question()
-    skill_score = get_skill_score(username, topic)
+    values = draw(_BatchRandom(seeds, stream))
+    bad = ~is_valid(values)
+    for _ in range(BATCH_UNTIL_MAX_ROUNDS):
+        if not bad.any():
+            return values
+        stream += 1
+        values[bad] = draw(_BatchRandom(seeds[bad], stream))
+        bad = ~is_valid(values)
+    values[bad] = fallback
+    return values
+
+def _finalize_batch_options(option_rows, brng):
+    """Batch _finalize_options: dedupes each row's options, pads them to 4 with pre-drawn numbers and shuffles."""
+    fillers = brng.integers(1, 100, width=4).tolist()
+    rows = []
+    for options, row_fillers in zip(option_rows, fillers):
+        options = set(map(str, options))
+        if len(options) < 4:
+            for filler in row_fillers + list(range(101, 105)):
+                options.add(str(filler))
+                if len(options) == 4:
+                    break
+        rows.append(sorted(options))
+    orders = brng.shuffle_order([len(options) for options in rows], max(len(options) for options in rows)).tolist()
+    return [[options[i] for i in order if i >= 0] for options, order in zip(rows, orders)]
+
+def _batch_questions(brng, q_type, questions, answers, hints, explanations, option_rows, params):
+    """Assembles the question dicts for one batched sub-type (hints may be one string for every row; params holds each row's parameters)."""
+    if isinstance(hints, str):
+        hints = [hints] * len(questions)
+    options = _finalize_batch_options(option_rows, brng)
+    return [
+        {"question": question, "options": row_options, "answer": answer, "hint": hint, "explanation": explanation, "q_type": q_type, "params": row_params}
+        for question, row_options, answer, hint, explanation, row_params in zip(questions, options, answers, hints, explanations, params)
+    ]
+
+def _masked_rows(values, lengths):
+    """Turns an (n, width) array into per-row lists holding the first lengths[i] values."""
+    return [row[:length] for row, length in zip(values.tolist(), lengths.tolist())]
+
+def _batch_stats_mode(brng):
+    k = brng.integers(4, 5)
+    base_data = brng.sample(10, 50, 5)
+    mode_val = base_data[np.arange(len(k)), brng.integers(0, k - 1)]
+    data = np.column_stack([base_data, mode_val, mode_val])
+    data[k == 4, 4] = mode_val[k == 4] # Four base values: the mode's copies go in columns 4 and 5
+    order = brng.shuffle_order(k + 2, 7)
+    data = np.take_along_axis(data, np.maximum(order, 0), axis=1)
+    lengths = k + 2
+    valid = np.arange(7) < lengths[:, None]
+    sorted_data = np.sort(np.where(valid, data, np.iinfo(np.int64).max), axis=1)
+    rows = np.arange(len(k))
+    medians = (sorted_data[rows, (lengths - 1) // 2] + sorted_data[rows, lengths // 2]) / 2
+    means = np.where(valid, data, 0).sum(axis=1) / lengths
+    questions, answers, explanations, option_rows = [], [], [], []
+    rows = _masked_rows(data, lengths)
+    for row, mode, mean, median in zip(rows, mode_val.tolist(), means.tolist(), medians.tolist()):
+        answer = str(mode)
+        questions.append(f"What is the mode of the following set of numbers representing daily sales at a stall in Kejetia Market? `{row}`")
+        answers.append(answer)
+        explanations.append(f"By counting the occurrences of each number in the sorted list `{sorted(row)}`, we can see that **{answer}** appears most often (3 times).")
+        option_rows.append({answer, str(int(mean)), str(median)})
+    return _batch_questions(brng, 'mode', questions, answers, "The mode is the number that appears most frequently in a data set.", explanations, option_rows, rows)
+
+def _batch_stats_range(brng):
+    k = brng.integers(5, 7)
+    data = brng.sample(10, 150, 7)
+    valid = np.arange(7) < k[:, None]
+    highs = np.where(valid, data, -1).max(axis=1).tolist()
+    lows = np.where(valid, data, 10**9).min(axis=1).tolist()
+    questions, answers, explanations, option_rows = [], [], [], []
+    rows = _masked_rows(data, k)
+    for row, high, low in zip(rows, highs, lows):
+        answer = str(high - low)
+        questions.append(f"Calculate the range of the following daily temperatures recorded in Kumasi: `{row}`")
+        answers.append(answer)
+        explanations.append(f"1. The highest value (Maximum) is `{high}`.\n\n2. The lowest value (Minimum) is `{low}`.\n\n3. Range = Maximum - Minimum = `{high} - {low} = {answer}`.")
+        option_rows.append({answer, str(high + low), str(high)})
+    return _batch_questions(brng, 'range', questions, answers, "The range is the difference between the highest and lowest values in the dataset.", explanations, option_rows, rows)
+
+def _sorted_sample_columns(brng, low, high, k, width):
+    """Sorted per-row samples (padding sorts last) with their sums, medians, maxima and minima."""
+    valid = np.arange(width) < k[:, None]
+    data = np.sort(np.where(valid, brng.sample(low, high, width), np.iinfo(np.int64).max), axis=1)
+    rows = np.arange(len(k))
+    medians = (data[rows, (k - 1) // 2] + data[rows, k // 2]) / 2
+    sums = np.where(valid, data, 0).sum(axis=1)
+    return data, sums, medians, data[rows, k - 1], data[:, 0]
+
+def _batch_stats_mean(brng):
+    k = brng.integers(5, 7)
+    data, sums, medians, highs, lows = _sorted_sample_columns(brng, 5, 100, k, 7)
+    means = sums / k
+    questions, answers, explanations, option_rows = [], [], [], []
+    rows = _masked_rows(data, k)
+    for row, total, count, mean, median, high, low in zip(rows, sums.tolist(), k.tolist(), means.tolist(), medians.tolist(), highs.tolist(), lows.tolist()):
+        answer = f"{mean:.1f}"
+        questions.append(f"A student in Accra recorded the following scores on their quizzes: `{row}`. What is the mean score, rounded to one decimal place?")
+        answers.append(answer)
+        explanations.append(f"1. Sum of values: `{'+'.join(map(str, row))} = {total}`\n\n2. Number of values: `{count}`\n\n3. Mean = Sum / Count = `{total} / {count} \\approx {answer}`.")
+        option_rows.append({answer, f"{median:.1f}", str(high - low)})
+    return _batch_questions(brng, 'mean', questions, answers, "The mean is the sum of all values divided by the number of values.", explanations, option_rows, rows)
+
+def _batch_stats_median(brng):
+    k = brng.integers(5, 7)
+    data, sums, medians, highs, lows = _sorted_sample_columns(brng, 5, 100, k, 7)
+    means = sums / k
+    questions, answers, explanations, option_rows = [], [], [], []
+    rows = _masked_rows(data, k)
+    for row, count, mean, median, low in zip(rows, k.tolist(), means.tolist(), medians.tolist(), lows.tolist()):
+        answer = str(median)
+        questions.append(f"Find the median of the following dataset: `{row}`")
+        answers.append(answer)
+        explanations.append(f"1. The data must be sorted: `{row}`.\n\n2. Since there are {count} values, the median is the middle value. The calculated median is **{answer}**.")
+        option_rows.append({answer, f"{mean:.1f}", str(low)})
+    return _batch_questions(brng, 'median', questions, answers, "First, sort the data. The median is the middle value. If there are two middle values, it's their average.", explanations, option_rows, rows)
+
+def _batch_stats_frequency_tables(brng):
+    scores = np.arange(1, 6)
+    freqs = brng.integers(2, 10, width=5)
+    total_items = freqs.sum(axis=1)
+    total_sums = (freqs * scores).sum(axis=1)
+    means = total_sums / total_items
+    questions, answers, explanations, option_rows = [], [], [], []
+    for row, items, total, mean in zip(freqs.tolist(), total_items.tolist(), total_sums.tolist(), means.tolist()):
+        table_md = "| Score (x) | Frequency (f) |\n|---|---|\n" + "".join(f"| {s} | {f} |\n" for s, f in zip(range(1, 6), row))
+        fx_calcs = [f"{s}x{f}={s*f}" for s, f in zip(range(1, 6), row)]
+        answer = f"{mean:.2f}"
+        questions.append(f"The table below shows the results of a quiz. What is the mean score?\n\n{table_md}")
+        answers.append(answer)
+        explanations.append(f"1. Calculate `fx` for each row and sum them: `{', '.join(fx_calcs)}`. The sum is $\\sum fx = {total}$.\n\n2. Sum the frequencies: $\\sum f = {items}$.\n\n3. Mean = $\\frac{{\\sum fx}}{{\\sum f}} = \\frac{{{total}}}{{{items}}} \\approx {answer}$.")
+        option_rows.append({answer, f"{items/5:.2f}", f"{total / 5:.2f}"})
+    return _batch_questions(brng, 'frequency_tables', questions, answers, "To find the mean from a frequency table, calculate the sum of (score × frequency) for each row, then divide by the total frequency.", explanations, option_rows, freqs.tolist())
+
+def _batch_stats_std_dev(brng):
+    k = brng.integers(4, 5)
+    data = brng.sample(10, 30, 5)
+    valid = np.arange(5) < k[:, None]
+    means = np.where(valid, data, 0).sum(axis=1) / k
+    variances = (np.where(valid, data - means[:, None], 0) ** 2).sum(axis=1) / k
+    std_devs = np.sqrt(variances)
+    highs = np.where(valid, data, -1).max(axis=1)
+    lows = np.where(valid, data, 10**9).min(axis=1)
+    questions, answers, explanations, option_rows = [], [], [], []
+    rows = _masked_rows(data, k)
+    for row, mean, variance, std_dev, spread in zip(rows, means.tolist(), variances.tolist(), std_devs.tolist(), (highs - lows).tolist()):
+        answer = f"{std_dev:.2f}"
+        questions.append(f"Calculate the population standard deviation of the dataset: `{row}`. Round to two decimal places.")
+        answers.append(answer)
+        explanations.append(f"1. Mean (`μ`) = `{mean:.2f}`.\n\n2. Variance (`σ²`) = Average of squared differences from the mean ≈ `{variance:.2f}`.\n\n3. Standard Deviation (`σ`) = `√Variance` ≈ `{answer}`.")
+        option_rows.append({answer, f"{variance:.2f}", f"{spread:.2f}"})
+    return _batch_questions(brng, 'std_dev', questions, answers, "1. Find the mean. 2. For each number, subtract the mean and square the result. 3. Find the average of those squared differences (the variance). 4. Take the square root of the variance.", explanations, option_rows, rows)
+
+def _binom(x, y):
+    return f"\\binom{{{x}}}{{{y}}}"
+
+def _batch_vectors_algebra(brng):
+    ab = brng.integers(-5, 5, width=4)
+    s = brng.integers(2, 4, width=2)
+    a, b, s1, s2 = ab[:, :2], ab[:, 2:], s[:, :1], s[:, 1:]
+    sa, sb = s1 * a, s2 * b
+    columns = [a.tolist(), b.tolist(), s[:, 0].tolist(), s[:, 1].tolist(), sa.tolist(), sb.tolist(), (sa - sb).tolist(), (a - b).tolist(), (sa + sb).tolist()]
+    questions, answers, explanations, option_rows = [], [], [], []
+    for a, b, s1, s2, sa, sb, result, diff, total in zip(*columns):
+        answer = f"${_binom(*result)}$"
+        questions.append(f"Given vectors $\\mathbf{{a}} = {_binom(*a)}$ and $\\mathbf{{b}} = {_binom(*b)}$, find the resulting vector from the operation ${s1}\\mathbf{{a}} - {s2}\\mathbf{{b}}$.")
+        answers.append(answer)
+        explanations.append(f"1. ${s1}\\mathbf{{a}} = {s1}{_binom(*a)} = {_binom(*sa)}$.\n"
+                            f"2. ${s2}\\mathbf{{b}} = {s2}{_binom(*b)} = {_binom(*sb)}$.\n"
+                            f"3. Subtract the results: ${_binom(*sa)} - {_binom(*sb)} = {_binom(*result)} = {answer}$.")
+        option_rows.append({answer, f"${_binom(*diff)}$", f"${_binom(*total)}$"})
+    return _batch_questions(brng, 'algebra', questions, answers, "First, multiply each vector by its scalar. Then, subtract the corresponding components of the resulting vectors.", explanations, option_rows, np.column_stack([ab, s]).tolist())
+
+def _batch_vectors_magnitude(brng):
+    v = brng.integers(2, 12, width=2)
+    squares = v ** 2
+    magnitudes = np.round(np.sqrt(squares.sum(axis=1)), 2)
+    questions, answers, explanations, option_rows = [], [], [], []
+    for (x, y), (xx, yy), magnitude in zip(v.tolist(), squares.tolist(), magnitudes.tolist()):
+        answer = str(magnitude)
+        questions.append(f"Find the magnitude (or length) of the vector $\\mathbf{{v}} = {x}\\mathbf{{i}} + {y}\\mathbf{{j}}$.")
+        answers.append(answer)
+        explanations.append(f"Magnitude $|\\mathbf{{v}}| = \\sqrt{{({x})^2 + ({y})^2}} = \\sqrt{{{xx} + {yy}}} = \\sqrt{{{xx+yy}}} \\approx {answer}$.")
+        option_rows.append({answer, str(x + y), str(xx + yy)})
+    return _batch_questions(brng, 'magnitude', questions, answers, "The magnitude of a vector $x\\mathbf{i} + y\\mathbf{j}$ is found using the formula $|\\mathbf{{v}}| = \\sqrt{x^2 + y^2}$.", explanations, option_rows, v.tolist())
+
+def _batch_vectors_dot_product(brng):
+    # Non-zero vectors only, to prevent division by zero
+    vectors = np.array(_NONZERO_VECTORS)[brng.integers(0, len(_NONZERO_VECTORS) - 1, width=2)]
+    a, b = vectors[:, 0], vectors[:, 1]
+    dots = (a * b).sum(axis=1)
+    mag_a, mag_b = np.sqrt((a ** 2).sum(axis=1)), np.sqrt((b ** 2).sum(axis=1))
+    cos_theta = dots / (mag_a * mag_b)
+    angles = np.rint(np.degrees(np.arccos(np.clip(cos_theta, -1.0, 1.0)))).astype(np.int64)
+    columns = [a.tolist(), b.tolist(), dots.tolist(), np.round(mag_a, 2).tolist(), np.round(mag_b, 2).tolist(), np.round(cos_theta, 3).tolist(), angles.tolist()]
+    questions, answers, explanations, option_rows = [], [], [], []
+    for a, b, dot, mag_a, mag_b, cos_theta, angle in zip(*columns):
+        answer = f"{angle}°"
+        questions.append(f"Find the angle between the vectors $\\mathbf{{a}} = {_binom(*a)}$ and $\\mathbf{{b}} = {_binom(*b)}$ to the nearest degree.")
+        answers.append(answer)
+        explanations.append(f"1. Dot Product: $\\mathbf{{a}} \\cdot \\mathbf{{b}} = ({a[0]})({b[0]}) + ({a[1]})({b[1]}) = {dot}$.\n"
+                            f"2. Magnitudes: $|\\mathbf{{a}}| \\approx {mag_a}$, $|\\mathbf{{b}}| \\approx {mag_b}$.\n"
+                            f"3. $\\cos\\theta = \\frac{{{dot}}}{{{mag_a} \\times {mag_b}}} \\approx {cos_theta}$.\n"
+                            f"4. $\\theta = \\arccos({cos_theta}) \\approx {answer}$.")
+        option_rows.append({answer, f"{dot}°", "90°"})
+    return _batch_questions(brng, 'dot_product', questions, answers, "Use the dot product formula: $\\cos\\theta = \\frac{{\\mathbf{a} \\cdot \\mathbf{b}}}{{|\\mathbf{a}| |\\mathbf{b}|}}$.", explanations, option_rows, vectors.reshape(-1, 4).tolist())
+
+def _batch_points(brng):
+    """Two distinct points per row, as columns x1, y1, x2, y2."""
+    points = _batch_until(brng.seeds, lambda r: r.integers(-10, 10, width=4), lambda p: (p[:, 0] != p[:, 2]) | (p[:, 1] != p[:, 3]), fallback=[0, 0, 1, 1])
+    return points.tolist()
+
+def _line_latex(m, c):
+    return f"$y = {_get_fraction_latex_code(m)}x {'+' if c >= 0 else '-'} {_get_fraction_latex_code(abs(c))}$"
+
+def _batch_coord_midpoint(brng):
+    questions, answers, explanations, option_rows = [], [], [], []
+    points = _batch_points(brng)
+    for x1, y1, x2, y2 in points:
+        answer = f"({(x1 + x2) / 2:.1f}, {(y1 + y2) / 2:.1f})".replace(".0", "")
+        questions.append(f"Find the midpoint of the line segment connecting A$({x1}, {y1})$ and B$({x2}, {y2})$.")
+        answers.append(answer)
+        explanations.append(f"Midpoint = $(\\frac{{x_1+x_2}}{{2}}, \\frac{{y_1+y_2}}{{2}}) = (\\frac{{{x1}+{x2}}}{{2}}, \\frac{{{y1}+{y2}}}{{2}}) = ({answer})$.")
+        option_rows.append({answer, f"({(x2-x1)/2}, {(y2-y1)/2})", f"({x1+x2}, {y1+y2})"})
+    return _batch_questions(brng, 'midpoint', questions, answers, "The midpoint is the average of the x-coordinates and the average of the y-coordinates.", explanations, option_rows, points)
+
+def _batch_coord_gradient(brng):
+    questions, answers, hints, explanations, option_rows = [], [], [], [], []
+    points = _batch_points(brng)
+    for x1, y1, x2, y2 in points:
+        questions.append(f"Find the gradient (slope) of the line passing through A$({x1}, {y1})$ and B$({x2}, {y2})$.")
+        if x1 == x2: # Vertical line
+            answers.append("Undefined")
+            hints.append("The gradient of a vertical line is undefined.")
+            explanations.append("Since the x-coordinates are the same ($x_1 = x_2$), this is a vertical line. The gradient of a vertical line is undefined because the change in x is zero, leading to division by zero in the formula.")
+            option_rows.append({"Undefined", "0", "1"})
+        else:
+            grad = Fraction(y2 - y1, x2 - x1)
+            answer = _format_fraction_text(grad)
+            answers.append(answer)
+            hints.append("Use the gradient formula: $m = \\frac{{y_2-y_1}}{{x_2-x_1}}$.")
+            explanations.append(f"Gradient $m = \\frac{{y_2-y_1}}{{x_2-x_1}} = \\frac{{{y2}-({y1})}}{{{x2}-({x1})}} = \\frac{{{y2-y1}}}{{{x2-x1}}} = {_get_fraction_latex_code(grad)}$.")
+            # The reciprocal distractor is skipped for horizontal lines (it would divide by zero)
+            option_rows.append({answer, str(y2 - y1)} | ({_format_fraction_text(Fraction(x2-x1, y2-y1))} if y1 != y2 else set()))
+    return _batch_questions(brng, 'gradient', questions, answers, hints, explanations, option_rows, points)
+
+def _batch_coord_distance(brng):
+    points = np.array(_batch_points(brng))
+    dx, dy = points[:, 2] - points[:, 0], points[:, 3] - points[:, 1]
+    dist_sq = dx ** 2 + dy ** 2
+    dist = np.sqrt(dist_sq)
+    is_whole = dist == np.floor(dist)
+    questions, answers, explanations, option_rows = [], [], [], []
+    for (x1, y1, x2, y2), square, distance, whole in zip(points.tolist(), dist_sq.tolist(), dist.tolist(), is_whole.tolist()):
+        answer = str(int(distance)) if whole else f"$\\sqrt{{{square}}}$" # Leave as a simplified surd
+        questions.append(f"Find the distance between point A$({x1}, {y1})$ and point B$({x2}, {y2})$.")
+        answers.append(answer)
+        explanation = f"Using the distance formula:\n$d = \\sqrt{{({x2} - ({x1}))^2 + ({y2} - ({y1}))^2}} = \\sqrt{{({x2-x1})^2 + ({y2-y1})^2}} = \\sqrt{{{square}}}$."
+        explanations.append(explanation + (f" = {int(distance)}" if whole else " This is the exact distance in simplified surd form."))
+        option_rows.append({answer, str(round(distance, 2)), str(square)})
+    return _batch_questions(brng, 'distance', questions, answers, "Use the distance formula: $d = \\sqrt{{(x_2 - x_1)^2 + (y_2 - y_1)^2}}$.", explanations, option_rows, points.tolist())
+
+def _batch_coord_equation_point_slope(brng):
+    points = _batch_points(brng)
+    m_nums = _batch_until(brng.seeds, lambda r: r.integers(-5, 5), lambda m: m != 0, fallback=1, stream=2 * BATCH_REJECTION_STREAM)
+    m_dens = brng.integers(1, 3)
+    questions, answers, explanations, option_rows = [], [], [], []
+    for (x1, y1, _, _), m_num, m_den in zip(points, m_nums.tolist(), m_dens.tolist()):
+        m = Fraction(m_num, m_den)
+        c = y1 - m*x1
+        answer = _line_latex(m, c)
+        questions.append(f"Find the equation of the line that passes through the point $({x1}, {y1})$ and has a gradient of ${_get_fraction_latex_code(m)}$.")
+        answers.append(answer)
+        explanations.append(f"1. Start with $y - y_1 = m(x - x_1)$.\n\n2. Substitute values: $y - ({y1}) = {_get_fraction_latex_code(m)}(x - ({x1}))$.\n\n3. Simplify to find the y-intercept 'c': $c = y_1 - m \\times x_1 = {_get_fraction_latex_code(y1)} - {_get_fraction_latex_code(m)} \\times {_get_fraction_latex_code(Fraction(x1))} = {_get_fraction_latex_code(c)}$.\n\n4. The final equation is: {answer}.")
+        option_rows.append({answer, f"$y = {-1/m}x + {c}$", f"$y - {y1} = {_get_fraction_latex_code(m)}(x + {x1})$"})
+    return _batch_questions(brng, 'equation_point_slope', questions, answers, "Use the formula $y - y_1 = m(x - x_1)$ and rearrange it into the form $y = mx + c$.", explanations, option_rows, [[x1, y1, m_num, m_den] for (x1, y1, _, _), m_num, m_den in zip(points, m_nums.tolist(), m_dens.tolist())])
+
+def _batch_coord_equation_two_points(brng):
+    questions, answers, hints, explanations, option_rows = [], [], [], [], []
+    points = _batch_points(brng)
+    for x1, y1, x2, y2 in points:
+        questions.append(f"Find the equation of the line that passes through the points A$({x1}, {y1})$ and B$({x2}, {y2})$.")
+        if x1 == x2: # Vertical line
+            answer = f"$x = {x1}$"
+            hints.append("First, find the gradient. If the x-coordinates are the same, it's a special case.")
+            explanations.append(f"Since the x-coordinates are the same, this is a vertical line. All points on this line have an x-coordinate of {x1}, so the equation is $x = {x1}$.")
+            option_rows.append({answer, f"y = {y1}", f"y = x + {y1-x1}"})
+        else:
+            m = Fraction(y2 - y1, x2 - x1)
+            c = y1 - m*x1
+            answer = _line_latex(m, c)
+            hints.append("First, calculate the gradient between the two points, then use the point-slope formula $y - y_1 = m(x - x_1)$ with one of the points.")
+            explanations.append(f"1. First, find the gradient: $m = \\frac{{{y2-y1}}}{{{x2-x1}}} = {_get_fraction_latex_code(m)}$.\n\n2. Use $y - y_1 = m(x - x_1)$: $y - ({y1}) = {_get_fraction_latex_code(m)}(x - ({x1}))$.\n\n3. Simplify to $y=mx+c$ form: {answer}.")
+            # The perpendicular-gradient distractor is skipped for horizontal lines (it would divide by zero)
+            option_rows.append({answer} | ({_line_latex(-1/m, c)} if m else set()))
+        answers.append(answer)
+    return _batch_questions(brng, 'equation_two_points', questions, answers, hints, explanations, option_rows, points)
+
+def _batch_coord_parallel_perpendicular(brng):
+    gradients = _batch_until(brng.seeds, lambda r: np.column_stack([r.integers(-3, 3), r.integers(1, 2)]), lambda m: m[:, 0] != 0, fallback=[1, 1], stream=2 * BATCH_REJECTION_STREAM)
+    c1s = brng.integers(-5, 5)
+    relationships = brng.integers(0, 2)
+    questions, answers, explanations = [], [], []
+    for (m_num, m_den), c1, relationship_index in zip(gradients.tolist(), c1s.tolist(), relationships.tolist()):
+        m1 = Fraction(m_num, m_den)
+        relationship, m2 = [("Parallel", m1), ("Perpendicular", -1/m1), ("Neither", m1+1)][relationship_index]
+        line1_eq = _line_latex(m1, c1)
+        line2_eq = f"$y = {_get_fraction_latex_code(m2)}x + {c1+2}$"
+        questions.append(f"What is the relationship between the lines {line1_eq} and {line2_eq}?")
+        answers.append(relationship)
+        explanations.append(f"The gradient of the first line is $m_1 = {_get_fraction_latex_code(m1)}$. The gradient of the second line is $m_2 = {_get_fraction_latex_code(m2)}$. Since $m_1$ and $m_2$ meet the condition for being **{relationship}**, that is the correct relationship.")
+    option_rows = [{"Parallel", "Perpendicular", "Neither"}] * len(questions)
+    return _batch_questions(brng, 'parallel_perpendicular', questions, answers, "Compare the gradients (m values) of the two lines. Parallel lines have equal gradients. For perpendicular lines, the product of their gradients is -1 (or one is the negative reciprocal of the other).", explanations, option_rows, np.column_stack([gradients, c1s, relationships]).tolist())
+
+def _mat_latex(m):
+    return f"\\begin{{pmatrix}} {m[0][0]} & {m[0][1]} \\\\ {m[1][0]} & {m[1][1]} \\end{{pmatrix}}"
+
+def _batch_matrices(brng):
+    """Two random 2x2 matrices per row, as (n, 2, 2) arrays."""
+    return brng.integers(-5, 9, width=4).reshape(-1, 2, 2), brng.integers(-5, 9, width=4).reshape(-1, 2, 2)
+
+def _determinants(m):
+    return m[:, 0, 0] * m[:, 1, 1] - m[:, 0, 1] * m[:, 1, 0]
+
+def _batch_linalg_add_sub(brng):
+    mat_a, mat_b = _batch_matrices(brng)
+    subtract = brng.integers(0, 1).astype(bool)
+    results = np.where(subtract[:, None, None], mat_a - mat_b, mat_a + mat_b)
+    columns = [mat_a.tolist(), mat_b.tolist(), subtract.tolist(), results.tolist(), (mat_a @ mat_b).tolist(), (mat_a * mat_b).tolist()]
+    questions, answers, hints, explanations, option_rows = [], [], [], [], []
+    for a, b, is_subtract, result, product, elementwise in zip(*columns):
+        op, sym = ('subtract', '-') if is_subtract else ('add', '+')
+        answer = f"${_mat_latex(result)}$"
+        questions.append(f"Given matrices $A = {_mat_latex(a)}$ and $B = {_mat_latex(b)}$, find $A {sym} B$.")
+        answers.append(answer)
+        hints.append(f"To {op} matrices, simply {op} their corresponding elements in each position.")
+        explanations.append(f"You perform the operation on the element in each position. For example, the top-left element is calculated as: ${a[0][0]} {sym} {b[0][0]} = {result[0][0]}$.")
+        option_rows.append({answer, f"${_mat_latex(product)}$", f"${_mat_latex(elementwise)}$"})
+    return _batch_questions(brng, 'add_sub', questions, answers, hints, explanations, option_rows, np.column_stack([mat_a.reshape(-1, 4), mat_b.reshape(-1, 4), subtract]).tolist())
+
+def _batch_linalg_determinant(brng):
+    mat_a, _ = _batch_matrices(brng)
+    questions, answers, explanations, option_rows = [], [], [], []
+    for a, det in zip(mat_a.tolist(), _determinants(mat_a).tolist()):
+        answer = str(det)
+        questions.append(f"Find the determinant of matrix $A = {_mat_latex(a)}$.")
+        answers.append(answer)
+        explanations.append(f"Determinant = $(a \\times d) - (b \\times c) = ({a[0][0]} \\times {a[1][1]}) - ({a[0][1]} \\times {a[1][0]}) = {answer}$.")
+        option_rows.append({answer, str(a[0][0]+a[1][1]), str(a[0][0]*a[0][1] - a[1][0]*a[1][1])})
+    return _batch_questions(brng, 'determinant', questions, answers, r"For a 2x2 matrix $\begin{pmatrix} a & b \\ c & d \end{pmatrix}$, the determinant is calculated as $ad - bc$.", explanations, option_rows, mat_a.reshape(-1, 4).tolist())
+
+def _batch_linalg_multiply(brng):
+    mat_a, mat_b = _batch_matrices(brng)
+    columns = [mat_a.tolist(), mat_b.tolist(), (mat_a @ mat_b).tolist(), (mat_a + mat_b).tolist(), (mat_b @ mat_a).tolist()]
+    questions, answers, explanations, option_rows = [], [], [], []
+    for a, b, result, total, reverse in zip(*columns):
+        answer = f"${_mat_latex(result)}$"
+        questions.append(f"Find the product $AB$ for the matrices $A = {_mat_latex(a)}$ and $B = {_mat_latex(b)}$.")
+        answers.append(answer)
+        explanations.append(f"The top-left element of the result is (row 1 of A) ⋅ (col 1 of B) = $({a[0][0]} \\times {b[0][0]}) + ({a[0][1]} \\times {b[1][0]}) = {result[0][0]}$.")
+        option_rows.append({answer, f"${_mat_latex(total)}$", f"${_mat_latex(reverse)}$"})
+    return _batch_questions(brng, 'multiply', questions, answers, "Matrix multiplication is 'row-by-column'. Multiply the elements of each row of the first matrix by the elements of each column of the second matrix and sum the results.", explanations, option_rows, np.column_stack([mat_a.reshape(-1, 4), mat_b.reshape(-1, 4)]).tolist())
+
+def _batch_linalg_inverse(brng):
+    # Build an invertible matrix directly: pick a, b, c, then a d with ad - bc != 0
+    # (when a is 0 that needs b and c non-zero, since ad - bc is then -bc for every d).
+    a = brng.integers(-5, 9)
+    nonzero = np.array([v for v in range(-5, 10) if v != 0])
+    bc = np.where((a != 0)[:, None], brng.integers(-5, 9, width=2), nonzero[brng.integers(0, len(nonzero) - 1, width=2)])
+    d_values = np.arange(-5, 10)
+    allowed = a[:, None] * d_values != (bc[:, 0] * bc[:, 1])[:, None]
+    k = brng.integers(0, allowed.sum(axis=1) - 1)
+    d = d_values[np.argmax(np.cumsum(allowed, axis=1) > k[:, None], axis=1)] # The k-th allowed d
+    mat_a = np.column_stack([a, bc, d]).reshape(-1, 2, 2)
+    adjugates = np.stack([np.stack([mat_a[:, 1, 1], -mat_a[:, 0, 1]], axis=1), np.stack([-mat_a[:, 1, 0], mat_a[:, 0, 0]], axis=1)], axis=1)
+    questions, answers, explanations, option_rows = [], [], [], []
+    for a, adj, det in zip(mat_a.tolist(), adjugates.tolist(), _determinants(mat_a).tolist()):
+        answer = f"$\\frac{{1}}{{{det}}}{_mat_latex(adj)}$"
+        questions.append(f"Find the inverse of the matrix $A = {_mat_latex(a)}$.")
+        answers.append(answer)
+        explanations.append(f"1. First, find the determinant: $\\det(A) = {det}$.\n\n2. Next, find the adjugate matrix: swap the main diagonal elements and negate the others to get ${_mat_latex(adj)}$.\n\n3. The inverse is $\\frac{{1}}{{\\text{{determinant}}}} \\times \\text{{adjugate}}$, which is {answer}.")
+        option_rows.append({answer, f"${_mat_latex(adj)}$", f"$\\frac{{1}}{{{-det}}}{_mat_latex(adj)}$"})
+    return _batch_questions(brng, 'inverse', questions, answers, r"The inverse is $\frac{1}{\det(A)} \times \text{adj}(A)$, where the adjugate matrix is found by swapping a and d, and negating b and c.", explanations, option_rows, mat_a.reshape(-1, 4).tolist())
+
+# Sub-type builders per topic and difficulty, in the order of the topic's QUESTION_TYPES entry. These are the only
+# generators for these topics: ADAPTIVE_GENERATORS serves single questions from them as batches of one.
+BATCH_GENERATORS = {
+    "Statistics": {
+        "Easy": [_batch_stats_mode, _batch_stats_range],
+        "Medium": [_batch_stats_mean, _batch_stats_median],
+        "Hard": [_batch_stats_frequency_tables, _batch_stats_std_dev],
+    },
+    "Vectors": {
+        "Easy": [_batch_vectors_algebra],
+        "Medium": [_batch_vectors_magnitude],
+        "Hard": [_batch_vectors_dot_product],
+    },
+    "Coordinate Geometry": {
+        "Easy": [_batch_coord_midpoint, _batch_coord_gradient],
+        "Medium": [_batch_coord_distance, _batch_coord_equation_point_slope],
+        "Hard": [_batch_coord_equation_two_points, _batch_coord_parallel_perpendicular],
+    },
+    "Linear Algebra": {
+        "Easy": [_batch_linalg_add_sub, _batch_linalg_determinant],
+        "Medium": [_batch_linalg_multiply],
+        "Hard": [_batch_linalg_inverse],
+    },
+}
+BATCH_Q_TYPE_BUILDERS = {
+    (topic, q_type): builder
+    for topic, cells in BATCH_GENERATORS.items()
+    for difficulty, builders in cells.items()
+    for q_type, builder in zip(QUESTION_TYPES[topic][difficulty], builders)
+}
+
+def generate_batch(topic, difficulty, n, seeds=None, q_type=None):
+    """
+    Generates n questions for a BATCH_GENERATORS topic in one vectorized pass, all of one q_type if given.
+    Question i depends only on seeds[i] (fresh random seeds by default) and carries its seeded reference.
+    """
+    seeds = np.random.default_rng().integers(0, 2**64, size=n, dtype=np.uint64) if seeds is None else np.asarray(seeds, dtype=np.uint64)
+    if q_type is None:
+        builders = BATCH_GENERATORS[topic][difficulty]
+        choice = _BatchRandom(seeds).integers(0, len(builders) - 1)
+    else:
+        # A targeted batch skips the sub-type draw and sends every row to that q_type's builder.
+        builders = [BATCH_Q_TYPE_BUILDERS[(topic, q_type)]]
+        choice = np.zeros(len(seeds), dtype=np.int64)
+    questions = [None] * len(seeds)
+    for index, builder in enumerate(builders):
+        rows = np.flatnonzero(choice == index)
+        if rows.size:
+            for row, question in zip(rows.tolist(), builder(_BatchRandom(seeds[rows], stream=1))):
+                question["difficulty"] = difficulty
+                question["params"] = _canonical_params(question["params"])
+                questions[row] = question
+    prefix = _question_ref(topic, difficulty, 0, q_type)[:-16] # Only the seed (the last 8 bytes) differs between rows
+    for question, seed in zip(questions, seeds.tolist()):
+        question["ref"] = f"{prefix}{seed:016x}"
+    return questions
+
+# --- SEEDED QUESTION REFERENCES ---
+# Every generator draws only from the rng it is given, so (generator, difficulty, seed) rebuilds exactly the
+# same question, identified by this 16-byte reference (32 hex characters). A reference only rebuilds under the
+# QUESTION_REF_VERSION that made it, so anything a student may come back to (duels, quiz sessions) also stores
+# the question's JSON; bare references are only kept where losing one is harmless (the question bank).
+# A reference stores the topic's index in QUESTION_REF_TOPICS, so new topics must only ever be appended.
+# A targeted question also stores its q_type's position in the topic's QUESTION_TYPES entry (0 means drawn).
+QUESTION_REF_TOPICS = list(ADAPTIVE_GENERATORS) + ["Advanced Combo"]
+QUESTION_REF_DIFFICULTIES = [None, "Easy", "Medium", "Hard"]
+QUESTION_REF_Q_TYPES = {topic: [q_type for q_types in QUESTION_TYPES[topic].values() for q_type in q_types] for topic in QUESTION_REF_TOPICS}
+QUESTION_REF_VERSION = 5 # Bump when a generator changes what it draws or its params, so old references and bank fingerprints are rebuilt
+_QUESTION_REF = struct.Struct(">BHBH2xQ") # version, topic index, difficulty index, q_type index, padding, 64-bit seed
+
+def new_question_seed():
+    """A fresh random 64-bit seed for a generator."""
+    return random.getrandbits(64)
+
+def _question_ref(topic, difficulty, seed, q_type=None):
+    """Packs a question's reference as a hex string."""
+    q_type_index = 0 if q_type is None else QUESTION_REF_Q_TYPES[topic].index(q_type) + 1
+    return _QUESTION_REF.pack(
+        QUESTION_REF_VERSION, QUESTION_REF_TOPICS.index(topic), QUESTION_REF_DIFFICULTIES.index(difficulty), q_type_index, seed
+    ).hex()
+
+def generate_seeded_question(topic, difficulty, seed, q_type=None):
+    """Runs the topic's generator on its own random.Random(seed) and tags the question with its reference."""
+    if topic in BATCH_GENERATORS:
+        # Batched topics are seeded row-wise, so a single question is a batch of one.
+        return generate_batch(topic, difficulty, 1, seeds=[seed], q_type=q_type)[0]
+    question = GENERATOR_REGISTRY[topic]["generator"](difficulty=difficulty, rng=random.Random(seed), q_type=q_type)
+    question["params"] = _canonical_params(question["params"]) # JSON-safe, since questions are stored as JSON
+    question["ref"] = _question_ref(topic, difficulty, seed, q_type)
+    return question
+
+def question_from_ref(ref):
+    """Rebuilds a question from its reference. Returns None for a reference from another generator version."""
+    version, topic_index, difficulty_index, q_type_index, seed = _QUESTION_REF.unpack(bytes.fromhex(ref))
+    if version != QUESTION_REF_VERSION:
+        return None
+    topic = QUESTION_REF_TOPICS[topic_index]
+    q_type = QUESTION_REF_Q_TYPES[topic][q_type_index - 1] if q_type_index else None
+    return generate_seeded_question(topic, QUESTION_REF_DIFFICULTIES[difficulty_index], seed, q_type)
+
+def _expand_question(stored):
+    """
+    Rebuilds a question that older versions of the session store saved as just {"ref", "topic"}; a full question
+    is returned unchanged. Returns None if the reference is from another generator version.
+    """
+    if not isinstance(stored, dict) or "ref" not in stored or not set(stored) <= {"ref", "topic"}:
+        return stored
+    question = question_from_ref(stored["ref"])
+    if question is None:
+        return None
+    if "topic" in stored:
+        question["topic"] = stored["topic"]
+    return question
+
+# --- GENERATOR WATCHDOG ---
+# Question generation on the request path runs on its own watchdog thread, joined with a timeout. A call that
+# raises or runs past the latency budget is logged and abandoned (an overrunning thread finishes in the
+# background), and a recently generated question for the same cell, else a banked one, is served instead.
+# Each call gets a fresh thread rather than a pool worker, so an abandoned call never delays the next one.
+GENERATOR_LATENCY_BUDGET_SECONDS = 0.25
+GENERATOR_FALLBACK_CACHE_SIZE = 50 # Recent question references kept per (topic, difficulty, q_type)
+
+@st.cache_resource
+def _get_generator_fallback_cache():
+    """Process-wide recent question references per (topic, difficulty, q_type), served when a generator call fails."""
+    return {"lock": threading.Lock(), "refs": collections.defaultdict(lambda: collections.deque(maxlen=GENERATOR_FALLBACK_CACHE_SIZE))}
+
+def _fallback_question(topic, difficulty, q_type, fallback_cache, bank_cell_size=None):
+    """A recent question for the cell, else a banked one (untargeted cells only); None if there is neither."""
+    with fallback_cache["lock"]:
+        recent_refs = list(fallback_cache["refs"][(topic, difficulty, q_type)])
+    if recent_refs:
+        question = question_from_ref(random.choice(recent_refs))
+        if question is not None:
+            return question
+    if q_type is not None or topic not in ADAPTIVE_GENERATORS:
+        return None
+    try:
+        banked = sample_bank_question(topic, difficulty, (), bank_cell_size)
+    except Exception as e:
+        print(f"Generator watchdog: question bank fallback failed: {e}")
+        return None
+    return banked[1] if banked else None
+
+def generate_within_budget(topic, difficulty, q_type=None, fallback_cache=None, bank_cell_size=None):
+    """
+    generate() bounded by GENERATOR_LATENCY_BUDGET_SECONDS (see above). Returns None only if the call failed and
+    there was no fallback question. Worker threads pass in the fallback cache and bank cell size.
+    """
+    if fallback_cache is None:
+        fallback_cache = _get_generator_fallback_cache()
+    _math_tables() # Built on the calling thread; the watchdog thread has no script run context
+    result = {}
+    def run():
+        try:
+            question = generate(topic, difficulty, q_type)
+        except Exception as e:
+            result["error"] = e
+            return
+        # Recorded even when the call overran, so an abandoned call still leaves a fallback for the next one.
+        with fallback_cache["lock"]:
+            fallback_cache["refs"][(topic, difficulty, q_type)].append(question["ref"])
+        result["question"] = question
+    thread = threading.Thread(target=run, name="generator-watchdog", daemon=True)
+    thread.start()
+    thread.join(GENERATOR_LATENCY_BUDGET_SECONDS)
+    if "question" in result:
+        return result["question"]
+    if "error" in result:
+        e = result["error"]
+        print(f"Generator error: {topic} ({difficulty}, {q_type}) raised {type(e).__name__}: {e}")
+    else:
+        print(f"Generator overrun: {topic} ({difficulty}, {q_type}) gave no question within {GENERATOR_LATENCY_BUDGET_SECONDS * 1000:.0f} ms")
+    return _fallback_question(topic, difficulty, q_type, fallback_cache, bank_cell_size)
+
+# --- OFFLINE QUESTION BANK ---
+# build_question_bank() runs every adaptive generator ahead of time and stores the references of the unique
+# results per (topic, difficulty). Each cell is numbered densely by slot, so a random question is one index lookup.
+QUESTION_BANK_DIFFICULTIES = ["Easy", "Medium", "Hard"]
+QUESTION_BANK_INSERT_BATCH = 1000
+QUESTION_BANK_SAMPLE_TRIES = 10
+
+@app_cached(lambda topic, difficulty: ("question_bank", topic))
+def get_question_bank_cell_size(topic, difficulty):
+    """Number of banked questions for a topic and difficulty (slots run from 0 to size - 1)."""
+    with engine.connect() as conn:
+        query = text("SELECT COALESCE(MAX(slot) + 1, 0) FROM question_bank WHERE topic = :topic AND difficulty = :difficulty")
+        return conn.execute(query, {"topic": topic, "difficulty": difficulty}).scalar_one()
+
+def sample_bank_question(topic, difficulty, seen_ids, cell_size=None):
+    """
+    Picks random banked questions for the cell in one query and returns (question_id, question) for
+    the first one not in seen_ids, or None if the cell is empty or every pick was already seen.
+    cell_size defaults to the cached get_question_bank_cell_size(); worker threads pass it in.
+    """
+    if cell_size is None:
+        cell_size = get_question_bank_cell_size(topic, difficulty)
+    if not cell_size:
+        return None
+    slots = random.sample(range(cell_size), min(QUESTION_BANK_SAMPLE_TRIES, cell_size))
+    with engine.connect() as conn:
+        query = text("""
+            SELECT question_fingerprint, question_ref FROM question_bank
+            WHERE topic = :topic AND difficulty = :difficulty AND slot = ANY(:slots)
+        """)
+        rows = conn.execute(query, {"topic": topic, "difficulty": difficulty, "slots": slots}).mappings().fetchall()
+    for row in rows:
+        if row['question_fingerprint'] not in seen_ids:
+            question = question_from_ref(row['question_ref'])
+            if question is not None:
+                return row['question_fingerprint'], question
+    return None
+
+def _bank_candidates(topic, difficulty):
+    """
+    Endless stream of seeded candidates for a bank cell, taking the cell's q_types in turn so each is banked
+    evenly (a batch at a time for batched topics). None marks a failed draw.
+    """
+    for q_type in itertools.cycle(QUESTION_TYPES[topic][difficulty]):
+        try:
+            if topic in BATCH_GENERATORS:
+                yield from generate_batch(topic, difficulty, QUESTION_BANK_INSERT_BATCH, q_type=q_type)
+            else:
+                yield generate(topic, difficulty, q_type)
+        except Exception as e:
+            print(f"Question bank: {topic} ({difficulty}, {q_type}) generator failed: {e}")
+            yield None
+
+def _fill_question_bank_cell(topic, difficulty, target_per_cell, max_duplicate_streak):
+    """
+    Tops up one (topic, difficulty) cell and returns how many questions it added, or None if another builder
+    holds the cell. The cell is filled under a Postgres advisory lock, so two builders never number the same slots.
+    """
+    params = {"topic": topic, "difficulty": difficulty}
+    insert_query = text("""
+        INSERT INTO question_bank (topic, difficulty, slot, question_fingerprint, question_ref)
+        VALUES (:topic, :difficulty, :slot, :question_fingerprint, :question_ref)
+    """)
+    lock_args = "hashtext('question_bank'), hashtext(:topic || '|' || :difficulty)"
+    with engine.connect() as conn:
+        # A session-level lock, so it is held across the batch commits below until it is released.
+        if not conn.execute(text(f"SELECT pg_try_advisory_lock({lock_args})"), params).scalar_one():
+            return None
+        try:
+            # References only rebuild under the version that made them, so a cell from an older version is refilled.
+            conn.execute(text("""
+                DELETE FROM question_bank WHERE topic = :topic AND difficulty = :difficulty
+                  AND EXISTS (SELECT 1 FROM question_bank WHERE topic = :topic AND difficulty = :difficulty AND left(question_ref, 2) <> :ref_version)
+            """), {**params, "ref_version": f"{QUESTION_REF_VERSION:02x}"})
+            known_ids = set(conn.execute(
+                text("SELECT question_fingerprint FROM question_bank WHERE topic = :topic AND difficulty = :difficulty"), params
+            ).scalars())
+            conn.commit()
+            next_slot, rows, duplicate_streak, added = len(known_ids), [], 0, 0
+            candidates = _bank_candidates(topic, difficulty)
+            while next_slot < target_per_cell and duplicate_streak < max_duplicate_streak:
+                question = next(candidates)
+                if question is None:
+                    # A failed draw counts towards the streak so a broken generator cannot loop forever.
+                    duplicate_streak += 1
+                    continue
+                q_id = get_question_id(question, topic)
+                if q_id in known_ids:
+                    duplicate_streak += 1
+                    continue
+                duplicate_streak = 0
+                known_ids.add(q_id)
+                rows.append({**params, "slot": next_slot, "question_fingerprint": q_id, "question_ref": question["ref"]})
+                next_slot += 1
+                if len(rows) >= QUESTION_BANK_INSERT_BATCH or next_slot >= target_per_cell:
+                    conn.execute(insert_query, rows)
+                    conn.commit()
+                    added += len(rows)
+                    rows = []
+            if rows:
+                conn.execute(insert_query, rows)
+                conn.commit()
+                added += len(rows)
+            return added
+        finally:
+            conn.rollback()
+            conn.execute(text(f"SELECT pg_advisory_unlock({lock_args})"), params)
+            conn.commit()
+
+def build_question_bank(target_per_cell, max_duplicate_streak=2000, topics=None, on_progress=None, app_cache=None):
+    """
+    Fills question_bank up to target_per_cell questions for every (topic, difficulty) cell.
+    A cell stops early once its generator returns max_duplicate_streak duplicates in a row, and is skipped if
+    another builder is filling it. on_progress(cells_done, cells_total, added_so_far) is called after every cell.
+    Returns {(topic, difficulty): questions added, or None for a skipped cell}.
+    """
+    cells = [(topic, difficulty) for topic in topics or ADAPTIVE_GENERATORS for difficulty in QUESTION_BANK_DIFFICULTIES]
+    added = {}
+    for topic, difficulty in cells:
+        added[(topic, difficulty)] = _fill_question_bank_cell(topic, difficulty, target_per_cell, max_duplicate_streak)
+        # Cell sizes are cached, so new slots are only sampled once the cell's namespace is dropped.
+        invalidate_app_cache("question_bank", topic, cache=app_cache)
+        if on_progress:
+            on_progress(len(added), len(cells), sum(count or 0 for count in added.values()))
+    return added
+
+# --- QUESTION BANK BUILD JOB ---
+# A full build is millions of generator calls, so the admin button starts it on a background thread and the
+# admin page polls its progress. One build runs per process at a time; the advisory locks above keep builds in
+# other processes off the same cells.
+
+@st.cache_resource
+def _get_question_bank_job():
+    """Process-wide state of the background bank build."""
+    return {"lock": threading.Lock(), "thread": None, "status": None}
+
+def start_question_bank_build(target_per_cell):
+    """Starts a bank build on a background thread. Returns False if one is already running in this process."""
+    job = _get_question_bank_job()
+    app_cache = _get_app_cache()
+    _math_tables() # Built here, on the script thread; the build thread has no script run context
+    with job["lock"]:
+        if job["thread"] is not None and job["thread"].is_alive():
+            return False
+        status = {
+            "target_per_cell": target_per_cell, "started_at": datetime.now().isoformat(timespec="seconds"),
+            "finished_at": None, "cells_done": 0, "cells_total": None, "added": 0, "result": None, "error": None,
+        }
+        def show_progress(cells_done, cells_total, added):
+            status.update(cells_done=cells_done, cells_total=cells_total, added=added)
+        def run_build():
+            try:
+                status["result"] = build_question_bank(target_per_cell, on_progress=show_progress, app_cache=app_cache)
+            except Exception as e:
+                print(f"Question bank build failed: {e}")
+                status["error"] = str(e)
+            status["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        job["status"] = status
+        job["thread"] = threading.Thread(target=run_build, name="question-bank-build", daemon=True)
+        job["thread"].start()
+    return True
 
+def get_question_bank_build_status():
+    """The running or last finished build's status dict (see start_question_bank_build), or None."""
+    return _get_question_bank_job()["status"]
+
+def _difficulty_for_skill(skill_score):
+    """Maps a 0-100 topic skill score to the question difficulty served to the student."""
     if skill_score < 40:
-        difficulty = "Easy"
+        return "Easy"
     elif skill_score < 75:
-        difficulty = "Medium"
-    else:
-        difficulty = "Hard"
-
-    # This dictionary maps topic strings to their specific generator functions.
-    generators = {
-        "Sets": _generate_sets_question, 
-        "Percentages": _generate_percentages_question,
-        "Fractions": _generate_fractions_question, 
-        "Indices": _generate_indices_question,
-        "Surds": _generate_surds_question, 
-        "Binary Operations": _generate_binary_ops_question,
-        "Relations and Functions": _generate_relations_functions_question,
-        "Sequence and Series": _generate_sequence_series_question,
-        "Word Problems": _generate_word_problems_question,
-        "Shapes (Geometry)": _generate_shapes_question,
-        "Algebra Basics": _generate_algebra_basics_question,
-        "Linear Algebra": _generate_linear_algebra_question,
-        "Logarithms": _generate_logarithms_question,
-        "Probability": _generate_probability_question,
-        "Binomial Theorem": _generate_binomial_theorem_question,
-        "Polynomial Functions": _generate_polynomial_functions_question,
-        "Rational Functions": _generate_rational_functions_question,
-        "Trigonometry": _generate_trigonometry_question,
-        "Vectors": _generate_vectors_question,
-        "Statistics": _generate_statistics_question,
-        "Coordinate Geometry": _generate_coordinate_geometry_question,
-        "Introduction to Calculus": _generate_calculus_question,
-        "Number Bases": _generate_number_bases_question,
-        "Modulo Arithmetic": _generate_modulo_arithmetic_question,
-    }
-    
-    generator_func = generators.get(topic)
-    if not generator_func:
-        return {"question": f"Questions for **{topic}** are coming soon!", "options": ["OK"], "answer": "OK", "hint": "Under development."}
+        return "Medium"
+    return "Hard"
+
+def _served_difficulty(topic, username, q_type):
+    """The difficulty to serve: a targeted q_type's own, otherwise the one matching the user's skill."""
+    if q_type is not None:
+        return QUESTION_TYPE_DIFFICULTY[(topic, q_type)]
+    return _difficulty_for_skill(get_skill_score(username, topic))
+
+def get_adaptive_question(topic, username, q_type=None):
+    """
+    The new "brain" of the quiz. It gets a question based on the user's skill level,
+    or of exactly q_type when one is given (e.g. by a daily challenge).
+    """
+    # --- THIS IS THE FIX: Handle 'Advanced Combo' as a special case first ---
+    if topic == "Advanced Combo":
+        # Advanced Combo questions don't have difficulty levels, so we call its generator directly.
+        return generate_within_budget(topic, None, q_type)
+    difficulty = _served_difficulty(topic, username, q_type)
 
     # --- Logic to prevent repeating questions ---
-    seen_ids = get_seen_questions(username)
+    q_id, question = _pick_unseen_question(topic, difficulty, get_seen_question_filter(username), q_type)
+    if q_id is not None:
+        mark_question_seen(username, q_id)
+    return question
+
+def _pick_unseen_question(topic, difficulty, seen_ids, q_type=None, bank_cell_size=None, fallback_cache=None):
+    """
+    Finds a question the user has not seen, without recording it.
+    Returns (question_id, question); question_id is None when only a repeat or placeholder was found,
+    and question is None too when every generator call failed with nothing to fall back on.
+    bank_cell_size and fallback_cache are passed on to sample_bank_question and generate_within_budget.
+    """
+    if topic not in ADAPTIVE_GENERATORS:
+        return None, {"question": f"Questions for **{topic}** are coming soon!", "options": ["OK"], "answer": "OK", "hint": "Under development."}
+
+    # Serve from the pre-generated bank when it has this topic and difficulty; generate live otherwise.
+    # Bank cells mix their q_types, so a targeted q_type is always generated live.
+    if q_type is None:
+        banked = sample_bank_question(topic, difficulty, seen_ids, bank_cell_size)
+        if banked:
+            return banked
     
-    # Try up to 10 times to find a new, unseen question
+    # Try up to 10 times to find a new, unseen question (failed draws are skipped)
+    repeat = None
     for _ in range(10):
         # Pass the selected difficulty to the generator
-        candidate_question = generator_func(difficulty=difficulty)
-        
-        question_text = candidate_question.get("stem", candidate_question.get("question", ""))
-        q_id = get_question_id(question_text)
+        candidate_question = generate_within_budget(topic, difficulty, q_type, fallback_cache, bank_cell_size)
+        if candidate_question is None:
+            continue
+        q_id = get_question_id(candidate_question, topic)
         
         if q_id not in seen_ids:
-            save_seen_question(username, q_id)
-            return candidate_question
+            return q_id, candidate_question
+        repeat = repeat or candidate_question
     
-    # Fallback if no new question is found after 10 tries
-    return generator_func(difficulty=difficulty)
+    # Fallback if no new question is found after 10 tries: serve a repeat
+    return None, repeat
+
+# --- NEXT-QUESTION PREFETCH ---
+# While a student reads the explanation, the next questions are built on a worker thread,
+# so "Next Question" only has to pop a finished result from the session's queue.
+QUESTION_PREFETCH_DEPTH = 2
+QUESTION_PREFETCH_WORKERS = 8
+
+@st.cache_resource
+def _get_prefetch_executor():
+    """Process-wide thread pool shared by every session's question prefetches."""
+    return ThreadPoolExecutor(max_workers=QUESTION_PREFETCH_WORKERS, thread_name_prefix="question-prefetch")
+
+def _build_prefetched_question(topic, difficulty, seen_ids, q_type, bank_cell_size, fallback_cache):
+    """
+    Worker task: picks the next question for a topic. It runs off the script thread, so it gets everything from
+    its caller (a snapshot of the seen filter, the bank cell size, the generator fallback cache) and makes no
+    session or st.cache_* calls.
+    """
+    if topic == "Advanced Combo":
+        return None, generate_within_budget(topic, None, q_type, fallback_cache, bank_cell_size)
+    return _pick_unseen_question(topic, difficulty, seen_ids, q_type, bank_cell_size, fallback_cache)
+
+def _prefetch_key(topic, username):
+    """What queued questions for the topic were built for: (topic, difficulty, q_type, bank cell size)."""
+    q_type = get_challenge_q_type(topic)
+    if topic == "Advanced Combo":
+        return topic, None, q_type, 0
+    # The difficulty comes from the session's skill vector, so it is looked up here rather than in the worker.
+    difficulty = _served_difficulty(topic, username, q_type)
+    # Targeted questions are always generated live; a bank build that grows the cell changes its size.
+    bank_cell_size = get_question_bank_cell_size(topic, difficulty) if q_type is None and topic in ADAPTIVE_GENERATORS else 0
+    return topic, difficulty, q_type, bank_cell_size
+
+def prefetch_next_questions(topic, username):
+    """Tops up this session's prefetch queue for the topic to QUESTION_PREFETCH_DEPTH pending questions."""
+    key = _prefetch_key(topic, username)
+    queue = st.session_state.get("question_prefetch")
+    if queue is None or queue["key"] != key:
+        queue = st.session_state.question_prefetch = {"key": key, "futures": collections.deque()}
+    _math_tables() # Built here, on the script thread; the workers have no script run context
+    _, difficulty, q_type, bank_cell_size = key
+    seen_ids = get_seen_question_filter(username).snapshot()
+    fallback_cache = _get_generator_fallback_cache()
+    while len(queue["futures"]) < QUESTION_PREFETCH_DEPTH:
+        queue["futures"].append(_get_prefetch_executor().submit(_build_prefetched_question, topic, difficulty, seen_ids, q_type, bank_cell_size, fallback_cache))
+
+def pop_prefetched_question(topic, username):
+    """Returns the next prefetched question for the topic and marks it seen, or None if none is usable."""
+    queue = st.session_state.get("question_prefetch")
+    if queue is None or queue["key"][0] != topic:
+        return None
+    if queue["key"] != _prefetch_key(topic, username):
+        # The challenge q_type, the difficulty or the bank changed since these were queued.
+        del st.session_state["question_prefetch"]
+        return None
+    seen_ids = get_seen_question_filter(username)
+    while queue["futures"]:
+        try:
+            q_id, question = queue["futures"].popleft().result()
+        except Exception as e:
+            print(f"Question prefetch failed: {e}")
+            continue
+        if question is None:
+            continue
+        if q_id is None:
+            return question
+        # Queued questions were picked before the previous one was marked seen, so re-check.
+        if q_id not in seen_ids:
+            mark_question_seen(username, q_id)
+            return question
+    return None
+
+def invalidate_question_prefetch(topic=None):
+    """Drops this session's queued questions (for one topic, or any) so the next one is built fresh."""
+    queue = st.session_state.get("question_prefetch")
+    if queue is not None and (topic is None or queue["key"][0] == topic):
+        del st.session_state["question_prefetch"]
+
+# --- WASSCE PAPER BUILDER ---
+# The whole 40-question WASSCE Prep paper is generated in-process when the exam starts, so each question
+# rerun only pops the next question from the session. The ~120 generator calls take far less time than
+# starting worker processes would, and forking the multi-threaded server is not safe.
+WASSCE_PAPER_CANDIDATES_PER_SLOT = 3 # Spare questions per slot, used when the first one was already seen
+
+def _generate_paper_candidates(topic, difficulty, seed, count):
+    """Generates `count` candidate questions for one slot of the paper, seeded from the slot's seed."""
+    seeds = random.Random(seed)
+    candidates = []
+    for _ in range(count):
+        try:
+            candidates.append(generate_seeded_question(topic, difficulty, seeds.getrandbits(64)))
+        except Exception as e:
+            print(f"WASSCE paper: {topic} ({difficulty}) generator failed: {e}")
+    return candidates
+
+def build_wassce_paper(username, topics, length=WASSCE_QUIZ_LENGTH):
+    """
+    Builds a ready-to-serve WASSCE Prep paper: a random topic for each slot at the user's difficulty for
+    that topic, with repeats of already-seen questions avoided where possible.
+    Every chosen question is added to the user's seen list in a single write.
+    """
+    skill_vector = get_skill_vector(username)
+    plan = [random.choice(topics) for _ in range(length)]
+    difficulties = [_difficulty_for_skill(skill_vector.get(topic)) for topic in plan]
+    seeds = [new_question_seed() for _ in plan]
+    counts = [WASSCE_PAPER_CANDIDATES_PER_SLOT] * length
+    results = [_generate_paper_candidates(*task) for task in zip(plan, difficulties, seeds, counts)]
+
+    seen_filter = get_seen_question_filter(username)
+    paper, paper_ids = [], set()
+    for topic, candidates in zip(plan, results):
+        if not candidates:
+            # Every draw failed; fall back to the normal one-at-a-time path for this slot.
+            question = get_adaptive_question(topic, username)
+            if question is None:
+                continue # The exam tops up a short paper one question at a time
+        else:
+            question, q_id = candidates[0], None
+            for candidate in candidates:
+                candidate_id = get_question_id(candidate, topic)
+                if candidate_id not in seen_filter and candidate_id not in paper_ids:
+                    question, q_id = candidate, candidate_id
+                    break
+            if q_id is not None:
+                paper_ids.add(q_id)
+                seen_filter.add(q_id)
+        question['topic'] = topic
+        paper.append(question)
+    flush_seen_questions()
+    return paper
 
 # --- ADVANCED COMBO HELPER FUNCTIONS ---
 
-def _combo_geometry_algebra():
+def _combo_geometry_algebra(rng=random):
     """ The original combo: Geometry -> Area -> Quadratic Equation """
-    l, w = random.randint(5, 10), random.randint(11, 15)
+    l, w = rng.randint(5, 10), rng.randint(11, 15)
     area = l * w
-    k = random.randint(5, 20)
-    x = math.sqrt(area - k)
-    while x < 1 or x != int(x):
-        l, w = random.randint(5, 10), random.randint(11, 15); area = l * w
-        if area <= 5: continue
-        k = random.randint(5, area - 2)
-        x = math.sqrt(area - k)
-    x = int(x)
+    # Pick the whole-number answer first and derive k from it (x^2 = area - k, with k at least 5)
+    x = rng.randint(2, math.isqrt(area - 5))
+    k = area - x*x
     return {
+        "q_type": "geometry_algebra",
+        "params": (l, w, x),
         "is_multipart": True,
         "stem": f"A rectangular field in the Ashanti Region has a length of **{l} metres** and a width of **{w} metres**.",
         "parts": [
-            {"question": "a) What is the area of the field in square metres?", "options": _finalize_options({str(area), str(2*(l+w))}), "answer": str(area), "hint": "Area = length × width.", "explanation": f"Area = $l \\times w = {l} \\times {w} = {area}\\ m^2$."},
-            {"question": f"b) The square of a positive number, $x$, when increased by {k}, is equal to the area. Find $x$.", "options": _finalize_options({str(x), str(area-k)}), "answer": str(x), "hint": "Set up the equation $x^2 + {k} = Area$ and solve for $x$.", "explanation": f"1. $x^2 + {k} = {area}$.\n\n2. $x^2 = {area} - {k} = {area-k}$.\n\n3. $x = \sqrt{{{area-k}}} = {x}$."}
+            {"question": "a) What is the area of the field in square metres?", "options": _finalize_options({str(area), str(2*(l+w))}, rng=rng), "answer": str(area), "hint": "Area = length × width.", "explanation": f"Area = $l \\times w = {l} \\times {w} = {area}\\ m^2$."},
+            {"question": f"b) The square of a positive number, $x$, when increased by {k}, is equal to the area. Find $x$.", "options": _finalize_options({str(x), str(area-k)}, rng=rng), "answer": str(x), "hint": "Set up the equation $x^2 + {k} = Area$ and solve for $x$.", "explanation": f"1. $x^2 + {k} = {area}$.\n\n2. $x^2 = {area} - {k} = {area-k}$.\n\n3. $x = \sqrt{{{area-k}}} = {x}$."}
         ]
     }
 
-def _combo_surds_geometry():
+def _combo_surds_geometry(rng=random):
     """ Combo: Surds -> Pythagoras """
-    a_val, b_val = random.choice([(5,11), (7,18), (3,13), (6,10)])
+    a_val, b_val = rng.choice([(5,11), (7,18), (3,13), (6,10)])
     question = f"A right-angled triangle has shorter sides of length $\sqrt{{{a_val}}}$ cm and $\sqrt{{{b_val}}}$ cm. Find the **square** of the length of the hypotenuse."
     answer = str(a_val + b_val)
     hint = "Use Pythagoras' theorem: $a^2 + b^2 = c^2$. Remember that $(\sqrt{x})^2 = x$."
     explanation = f"Let the sides be $a = \sqrt{{{a_val}}}$ and $b = \sqrt{{{b_val}}}$.\n\n1. By Pythagoras' theorem, the square of the hypotenuse, $c^2$, is $a^2 + b^2$.\n\n2. $c^2 = (\sqrt{{{a_val}}})^2 + (\sqrt{{{b_val}}})^2$.\n\n3. $c^2 = {a_val} + {b_val} = {answer}$.\nThe square of the hypotenuse is {answer} $cm^2$."
     return {
+        "q_type": "surds_geometry",
+        "params": (a_val, b_val),
         "is_multipart": False, # This is a single question
-        "question": question, "options": _finalize_options({answer, str(a_val*b_val), str(int(math.sqrt(a_val+b_val)))}),
+        "question": question, "options": _finalize_options({answer, str(a_val*b_val), str(int(math.sqrt(a_val+b_val)))}, rng=rng),
         "answer": answer, "hint": hint, "explanation": explanation
     }
 
-def _combo_trig_vectors():
+def _combo_trig_vectors(rng=random):
     """ Combo: Vectors -> Dot Product -> Trigonometry """
-    a = np.array([random.randint(-5, 5), random.randint(-5, 5)])
-    b = np.array([random.randint(-5, 5), random.randint(-5, 5)])
-    while np.linalg.norm(a) == 0 or np.linalg.norm(b) == 0:
-         a, b = np.array([random.randint(-5, 5), random.randint(-5, 5)]), np.array([random.randint(-5, 5), random.randint(-5, 5)])
+    a, b = np.array(rng.choice(_NONZERO_VECTORS)), np.array(rng.choice(_NONZERO_VECTORS))
     question = f"Find the angle between the vectors $\\mathbf{{a}} = \\binom{{{a[0]}}}{{{a[1]}}}$ and $\\mathbf{{b}} = \\binom{{{b[0]}}}{{{b[1]}}}$ to the nearest degree."
     dot_product = np.dot(a, b)
     mag_a, mag_b = np.linalg.norm(a), np.linalg.norm(b)
@@ -5989,15 +8059,17 @@ def _combo_trig_vectors():
     hint = "Use the dot product formula: $\mathbf{a} \cdot \mathbf{b} = |\mathbf{a}| |\mathbf{b}| \cos\theta$."
     explanation = f"1. Dot Product: $\mathbf{{a}} \cdot \mathbf{{b}} = ({a[0]})({b[0]}) + ({a[1]})({b[1]}) = {dot_product}$.\n2. Magnitudes: $|\mathbf{{a}}| \\approx {round(mag_a, 2)}$, $|\mathbf{{b}}| \\approx {round(mag_b, 2)}$.\n3. $\cos\\theta = \\frac{{{dot_product}}}{{{round(mag_a,2)} \\times {round(mag_b,2)}}} \\approx {round(cos_theta, 2)}$.\n4. $\\theta = \cos^{{-1}}({round(cos_theta, 2)}) \\approx {answer}$."
     return {
+        "q_type": "trig_vectors",
+        "params": (a.tolist(), b.tolist()),
         "is_multipart": False,
-        "question": question, "options": _finalize_options({answer, f"{round(dot_product)}°"}),
+        "question": question, "options": _finalize_options({answer, f"{round(dot_product)}°"}, rng=rng),
         "answer": answer, "hint": hint, "explanation": explanation
     }
 
-def _combo_prob_binomial():
+def _combo_prob_binomial(rng=random):
     """ Combo: Binomial Theorem (Combinations) -> Probability """
-    men = random.randint(5, 7)
-    women = random.randint(4, 6)
+    men = rng.randint(5, 7)
+    women = rng.randint(4, 6)
     total_people = men + women
     committee_size = 5
     men_in_committee = 3
@@ -6016,18 +8088,20 @@ def _combo_prob_binomial():
                    f"3. Probability = $\\frac{{{favorable_outcomes}}}{{{total_outcomes}}} = {_get_fraction_latex_code(prob)}$")
 
     return {
+        "q_type": "prob_binomial",
+        "params": (men, women),
         "is_multipart": False,
-        "question": question, "options": _finalize_options({answer}, "fraction"),
+        "question": question, "options": _finalize_options({answer}, "fraction", rng=rng),
         "answer": answer, "hint": hint, "explanation": explanation
     }
 
-def _combo_polynomial_functions():
+def _combo_polynomial_functions(rng=random):
     """ Combo: Polynomials (Remainder Theorem) -> Functions (Evaluate) """
-    a, b, c, d = [random.randint(-5, 5) for _ in range(4)]
-    divisor_root = random.randint(-3, 3)
+    a, b, c, d = [rng.randint(-5, 5) for _ in range(4)]
+    divisor_root = rng.randint(-3, 3)
     remainder = a*(divisor_root**3) + b*(divisor_root**2) + c*divisor_root + d
     
-    f_a, f_b = random.randint(2, 5), random.randint(1, 10)
+    f_a, f_b = rng.randint(2, 5), rng.randint(1, 10)
     f_of_r = f_a * remainder + f_b
 
     stem = f"The polynomial $P(x) = {a}x^3 + {b}x^2 + {c}x + {d}$ is divided by $(x - {divisor_root})$ to give a remainder, $R$."
@@ -6035,19 +8109,21 @@ def _combo_polynomial_functions():
     part_b = f"b) Given that $f(y) = {f_a}y + {f_b}$, find the value of $f(R)$."
 
     return {
+        "q_type": "polynomial_functions",
+        "params": (a, b, c, d, divisor_root, f_a, f_b),
         "is_multipart": True,
         "stem": stem,
         "parts": [
             {
                 "question": part_a,
-                "options": _finalize_options({str(remainder), str(d), str(a+b+c+d)}),
+                "options": _finalize_options({str(remainder), str(d), str(a+b+c+d)}, rng=rng),
                 "answer": str(remainder),
                 "hint": f"By the Remainder Theorem, the remainder is $P({divisor_root})$." ,
                 "explanation": f"To find the remainder, evaluate the polynomial at $x={divisor_root}$.\n$P({divisor_root}) = {a}({divisor_root})^3 + {b}({divisor_root})^2 + {c}({divisor_root}) + {d} = {remainder}$."
             },
             {
                 "question": part_b,
-                "options": _finalize_options({str(f_of_r), str(f_a*remainder), str(remainder+f_b)}),
+                "options": _finalize_options({str(f_of_r), str(f_a*remainder), str(remainder+f_b)}, rng=rng),
                 "answer": str(f_of_r),
                 "hint": "Substitute the value of R you found in Part (a) into the function f(y).",
                 "explanation": f"From Part (a), we know $R={remainder}$.\nWe need to find $f(R) = f({remainder})$.\n$f({remainder}) = {f_a}({remainder}) + {f_b} = {f_of_r}$."
@@ -6055,10 +8131,10 @@ def _combo_polynomial_functions():
         ]
     }
 
-def _combo_stats_probability():
+def _combo_stats_probability(rng=random):
     """ Combo: Statistics (Mean) -> Probability """
     k = 5
-    data = sorted(random.sample(range(10, 50), k=k))
+    data = sorted(rng.sample(range(10, 50), k=k))
     mean_val = sum(data) / len(data)
     
     # Count how many numbers are greater than the mean
@@ -6068,19 +8144,21 @@ def _combo_stats_probability():
     stem = f"A student in Kumasi has the following scores in a test: `{data}`."
     
     return {
+        "q_type": "stats_probability",
+        "params": (data,),
         "is_multipart": True,
         "stem": stem,
         "parts": [
             {
                 "question": "a) What is the mean of the scores?",
-                "options": _finalize_options({f"{mean_val:.2f}", str(np.median(data))}),
+                "options": _finalize_options({f"{mean_val:.2f}", str(np.median(data))}, rng=rng),
                 "answer": f"{mean_val:.2f}",
                 "hint": "The mean is the sum of the values divided by the count of the values.",
                 "explanation": f"Sum = `{sum(data)}`. Count = `{len(data)}`. Mean = `{sum(data)} / {len(data)} = {mean_val:.2f}`."
             },
             {
                 "question": "b) If a score is picked at random, what is the probability that it is greater than the mean calculated in part (a)?",
-                "options": _finalize_options({_format_fraction_text(prob_frac)}, "fraction"),
+                "options": _finalize_options({_format_fraction_text(prob_frac)}, "fraction", rng=rng),
                 "answer": _format_fraction_text(prob_frac),
                 "hint": "Count how many scores in the original list are greater than the mean, then divide by the total number of scores.",
                 "explanation": f"The scores greater than {mean_val:.2f} are `{[x for x in data if x > mean_val]}`. There are {count_greater} such scores out of a total of {len(data)}. Probability = {_get_fraction_latex_code(prob_frac)}."
@@ -6088,10 +8166,10 @@ def _combo_stats_probability():
         ]
     }
 
-def _combo_calculus_coord_geometry():
+def _combo_calculus_coord_geometry(rng=random):
     """ Combo: Calculus (Differentiation) -> Coordinate Geometry (Equation of a line) """
-    a, c = random.randint(2, 5), random.randint(1, 10)
-    x_val = random.randint(1, 4)
+    a, c = rng.randint(2, 5), rng.randint(1, 10)
+    x_val = rng.randint(1, 4)
     
     poly_str = f"{a}x^2 + {c}"
     deriv_str = f"{2*a}x"
@@ -6106,19 +8184,21 @@ def _combo_calculus_coord_geometry():
     stem = f"Consider the curve defined by the equation $y = {poly_str}$."
 
     return {
+        "q_type": "calculus_coord_geometry",
+        "params": (a, c, x_val),
         "is_multipart": True,
         "stem": stem,
         "parts": [
             {
                 "question": f"a) Find the gradient of the curve at the point where $x = {x_val}$.",
-                "options": _finalize_options({str(gradient), str(y_val)}),
+                "options": _finalize_options({str(gradient), str(y_val)}, rng=rng),
                 "answer": str(gradient),
                 "hint": "Find the derivative of the function, then substitute the x-value into the derivative.",
                 "explanation": f"1. The derivative is $\\frac{{dy}}{{dx}} = {deriv_str}$.\n\n2. At $x={x_val}$, the gradient is ${2*a}({x_val}) = {gradient}$."
             },
             {
                 "question": "b) Using your answer from part (a), find the equation of the tangent line to the curve at this point.",
-                "options": _finalize_options({f"$y = {gradient}x {'+' if c_tangent >= 0 else '-'} {abs(c_tangent)}$"}),
+                "options": _finalize_options({f"$y = {gradient}x {'+' if c_tangent >= 0 else '-'} {abs(c_tangent)}$"}, rng=rng),
                 "answer": f"$y = {gradient}x {'+' if c_tangent >= 0 else '-'} {abs(c_tangent)}$",
                 "hint": "First, find the y-coordinate of the point. Then use the formula $y - y_1 = m(x - x_1)$.",
                 "explanation": f"1. The gradient $m = {gradient}$.\n\n2. The point is $({x_val}, {y_val})$.\n\n3. The equation is $y - {y_val} = {gradient}(x - {x_val})$, which simplifies to $y = {gradient}x - {gradient*x_val} + {y_val}$, or $y = {gradient}x {'+' if c_tangent >= 0 else '-'} {abs(c_tangent)}$."
@@ -6126,30 +8206,32 @@ def _combo_calculus_coord_geometry():
         ]
     }
 
-def _combo_number_bases_modulo():
+def _combo_number_bases_modulo(rng=random):
     """ Combo: Number Bases (Conversion) -> Modulo Arithmetic """
-    base = random.choice([2, 3, 4, 5])
-    num_base10 = random.randint(20, 100)
+    base = rng.choice([2, 3, 4, 5])
+    num_base10 = rng.randint(20, 100)
     num_other_base = np.base_repr(num_base10, base=base)
-    mod_n = random.randint(3, 9)
+    mod_n = rng.randint(3, 9)
     result_mod = num_base10 % mod_n
 
     stem = f"Consider the number ${num_other_base}_{{{base}}}$."
     
     return {
+        "q_type": "number_bases_modulo",
+        "params": (base, num_base10, mod_n),
         "is_multipart": True,
         "stem": stem,
         "parts": [
             {
                 "question": f"a) Convert the number from base {base} to base 10.",
-                "options": _finalize_options({str(num_base10)}),
+                "options": _finalize_options({str(num_base10)}, rng=rng),
                 "answer": str(num_base10),
                 "hint": "Multiply each digit by the base raised to the power of its position, starting from 0 on the right.",
                 "explanation": f"Converting ${num_other_base}_{{{base}}}$ to base 10 results in the number **{num_base10}**."
             },
             {
                 "question": f"b) Using your base 10 answer from part (a), calculate its value modulo {mod_n}.",
-                "options": _finalize_options({str(result_mod)}),
+                "options": _finalize_options({str(result_mod)}, rng=rng),
                 "answer": str(result_mod),
                 "hint": f"Find the remainder when {num_base10} is divided by {mod_n}.",
                 "explanation": f"We need to calculate ${num_base10} \\pmod{{{mod_n}}}$.\n\n${num_base10} \\div {mod_n} = {num_base10 // mod_n}$ with a remainder of **{result_mod}**."
@@ -6157,7 +8239,7 @@ def _combo_number_bases_modulo():
         ]
     }
 
-def _combo_coord_geometry_algebra():
+def _combo_coord_geometry_algebra(rng=random):
     """ Combo: Coordinate Geometry (Distance) -> Algebra (Area) """
     x1, y1, x2, y2 = 1, 2, 4, 6 # Use a pythagorean triple base (3,4,5) for a clean integer distance
     dist = 5
@@ -6166,19 +8248,21 @@ def _combo_coord_geometry_algebra():
     stem = f"Two points on a grid are A$({x1}, {y1})$ and B$({x2}, {y2})$."
     
     return {
+        "q_type": "coord_geometry_algebra",
+        "params": (), # A fixed question
         "is_multipart": True,
         "stem": stem,
         "parts": [
             {
                 "question": "a) Find the distance between points A and B.",
-                "options": _finalize_options({str(dist)}),
+                "options": _finalize_options({str(dist)}, rng=rng),
                 "answer": str(dist),
                 "hint": "Use the distance formula: $d = \\sqrt{{(x_2 - x_1)^2 + (y_2 - y_1)^2}}$." ,
                 "explanation": f"$d = \\sqrt{{({x2} - {x1})^2 + ({y2} - {y1})^2}} = \\sqrt{{3^2 + 4^2}} = \\sqrt{{25}} = 5$."
             },
             {
                 "question": "b) If the distance calculated in part (a) represents the side length of a square, what is the area of the square?",
-                "options": _finalize_options({str(area)}),
+                "options": _finalize_options({str(area)}, rng=rng),
                 "answer": str(area),
                 "hint": "The area of a square is the side length squared.",
                 "explanation": f"The side length is {dist}. Area = $side^2 = {dist}^2 = {area}$."
@@ -6187,80 +8271,280 @@ def _combo_coord_geometry_algebra():
     }
 
 
-def _generate_advanced_combo_question():
-    """Randomly selects and runs one of the curated advanced combo generators."""
-    
-    # List of all the special combo generator functions we just created
-    possible_combos = [
-        _combo_geometry_algebra,
-        _combo_surds_geometry,
-        _combo_trig_vectors,
-        _combo_prob_binomial,
-        _combo_polynomial_functions,
-        _combo_stats_probability,
-        _combo_calculus_coord_geometry,
-        _combo_number_bases_modulo,
-        _combo_coord_geometry_algebra,
-    ]
-    
-    # Pick one of the functions from the list and execute it
-    selected_combo_func = random.choice(possible_combos)
-    return selected_combo_func()
-def generate_question(topic):
-    # This dictionary of all 18 generators remains the same
-    generators = {
-        "Sets": _generate_sets_question, "Percentages": _generate_percentages_question,
-        "Fractions": _generate_fractions_question, "Indices": _generate_indices_question,
-        "Surds": _generate_surds_question, "Binary Operations": _generate_binary_ops_question,
-        "Relations and Functions": _generate_relations_functions_question,
-        "Sequence and Series": _generate_sequence_series_question,
-        "Word Problems": _generate_word_problems_question,
-        "Shapes (Geometry)": _generate_shapes_question,
-        "Algebra Basics": _generate_algebra_basics_question,
-        "Linear Algebra": _generate_linear_algebra_question,
-        "Logarithms": _generate_logarithms_question,
-        "Probability": _generate_probability_question,
-        "Binomial Theorem": _generate_binomial_theorem_question,
-        "Polynomial Functions": _generate_polynomial_functions_question,
-        "Rational Functions": _generate_rational_functions_question,
-        "Trigonometry": _generate_trigonometry_question,
-        "Vectors": _generate_vectors_question,
-        "Advanced Combo": _generate_advanced_combo_question,
-        # --- ADD THE NEW TOPICS HERE ---
-        "Statistics": _generate_statistics_question,
-        "Coordinate Geometry": _generate_coordinate_geometry_question,
-        "Introduction to Calculus": _generate_calculus_question,
-        "Number Bases": _generate_number_bases_question,
-        "Modulo Arithmetic": _generate_modulo_arithmetic_question,
+# List of all the special combo generator functions we just created
+ADVANCED_COMBO_GENERATORS = [
+    _combo_geometry_algebra,
+    _combo_surds_geometry,
+    _combo_trig_vectors,
+    _combo_prob_binomial,
+    _combo_polynomial_functions,
+    _combo_stats_probability,
+    _combo_calculus_coord_geometry,
+    _combo_number_bases_modulo,
+    _combo_coord_geometry_algebra,
+]
+
+_ADVANCED_COMBO_BY_Q_TYPE = {combo_func.__name__.removeprefix("_combo_"): combo_func for combo_func in ADVANCED_COMBO_GENERATORS}
+
+def _generate_advanced_combo_question(difficulty=None, rng=random, q_type=None):
+    """Runs one of the curated advanced combo generators, picked at random unless q_type names one (they have no difficulty levels)."""
+    if q_type is None:
+        q_type = _pick_q_type("Advanced Combo", None, rng)
+    return _ADVANCED_COMBO_BY_Q_TYPE[q_type](rng=rng)
+
+# --- GENERATOR REGISTRY ---
+# Built once at import: every topic's generator, its q_types per difficulty and whether it has a batch path.
+# generate() builds a question for an exact (topic, difficulty, q_type) cell, so callers that need one sub-type
+# (daily challenges, the bank builder, benchmarks) never retry draws; get_generator_profile() adds each cell's
+# measured cost and parameter-space size.
+GENERATOR_REGISTRY = {
+    topic: {
+        "generator": ADAPTIVE_GENERATORS.get(topic, _generate_advanced_combo_question),
+        "q_types": QUESTION_TYPES[topic],
+        "batched": topic in BATCH_GENERATORS,
     }
-    
-    generator_func = generators.get(topic)
-    if not generator_func:
+    for topic in QUESTION_REF_TOPICS
+}
+# The difficulty each q_type is listed under, for callers that target a q_type rather than a skill level.
+QUESTION_TYPE_DIFFICULTY = {
+    (topic, q_type): difficulty
+    for topic, entry in GENERATOR_REGISTRY.items()
+    for difficulty, q_types in entry["q_types"].items()
+    for q_type in q_types
+}
+GENERATOR_PROFILE_SAMPLES = 200
+
+def generate(topic, difficulty, q_type=None):
+    """Generates one question for a registry cell with a fresh seed. A q_type pins the sub-type instead of drawing it."""
+    return generate_seeded_question(topic, difficulty, new_question_seed(), q_type)
+
+@st.cache_resource
+def get_generator_profile(samples=GENERATOR_PROFILE_SAMPLES):
+    """
+    Measures every (topic, q_type) cell once per process. expected_ms is the median generate() latency and
+    parameter_space an estimate of how many distinct questions the cell can produce (see _benchmark_generator).
+    """
+    profile = {}
+    for (topic, q_type), difficulty in QUESTION_TYPE_DIFFICULTY.items():
+        stats = _benchmark_cell(topic, difficulty, q_type, samples)
+        profile[(topic, q_type)] = {"difficulty": difficulty, "expected_ms": stats["p50_ms"], "parameter_space": stats["parameter_space"]}
+    return profile
+
+def generate_question(topic):
+    # Every topic generator (plus Advanced Combo) is addressable by a seeded reference
+    if topic not in QUESTION_REF_TOPICS:
         return {"question": f"Questions for **{topic}** are coming soon!", "options": ["OK"], "answer": "OK", "hint": "Under development."}
 
     # --- NEW LOGIC TO PREVENT REPEATS ---
-    seen_ids = get_seen_questions(st.session_state.username)
+    seen_ids = get_seen_question_filter(st.session_state.username)
     
-    # Try up to 10 times to find a new question to avoid an infinite loop
-    for _ in range(10):
-        # 1. Generate a candidate question
-        candidate_question = generator_func()
-        
-        # For multi-part, the stem is the unique identifier
-        question_text = candidate_question.get("stem", candidate_question.get("question", ""))
-        
-        # 2. Create its unique ID
-        q_id = get_question_id(question_text)
-        
-        # 3. Check if it has been seen
+    # Try up to 10 candidates to find a new question to avoid an infinite loop
+    # (duels use the generators' default Medium difficulty; batched topics draw all 10 in one pass)
+    difficulty = None if topic == "Advanced Combo" else "Medium"
+    if topic in BATCH_GENERATORS:
+        candidates = generate_batch(topic, difficulty, 10)
+    else:
+        candidates = (generate_within_budget(topic, difficulty) for _ in range(10))
+    repeat = None
+    for candidate_question in candidates:
+        if candidate_question is None:
+            continue # The generator failed with no fallback (already logged); skip the draw
+        repeat = repeat or candidate_question
+        # 1. Create its unique ID from the question's parameters
+        q_id = get_question_id(candidate_question, topic)
+        
+        # 2. Check if it has been seen
         if q_id not in seen_ids:
-            # 4. If not seen, save it and return it
-            save_seen_question(st.session_state.username, q_id)
+            # 3. If not seen, save it and return it
+            mark_question_seen(st.session_state.username, q_id)
             return candidate_question
     
-    # If we fail to find a new question after 10 tries, return a fallback message
-    return {"question": "Wow! You've seen a lot of questions. We're digging deep for a new one...", "options": ["OK"], "answer": "OK", "hint": "Generating a fresh challenge!"}
-        
+    # If we fail to find a new question after 10 tries, serve a repeat (None if every draw failed)
+    return repeat
+        
+# --- GENERATOR BENCHMARK ---
+# Times every generator at every difficulty and measures how varied its output is, so slow or
+# repetitive generators can be found and compared between releases (the report downloads as JSON).
+BENCHMARK_SEEN_TRIES = 10 # Same number of tries as the unseen-question loop in _pick_unseen_question
+
+def _benchmark_generator(generator_func, topic, iterations, **kwargs):
+    """Runs one generator `iterations` times and returns its throughput, latency and variety metrics."""
+    latencies, fingerprints, errors = [], [], 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        try:
+            question = generator_func(**kwargs)
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - call_started)
+        fingerprints.append(get_question_id(question, topic))
+    elapsed = time.perf_counter() - started
+
+    # Simulate a student who has already seen the first half of the draws, then serve the second half:
+    # p_seen is the chance one draw is a repeat, so the retry loop needs a geometric number of tries.
+    half = len(fingerprints) // 2
+    seen = set(fingerprints[:half])
+    later = fingerprints[half:]
+    p_seen = sum(fp in seen for fp in later) / len(later) if later else 0.0
+    expected_tries = BENCHMARK_SEEN_TRIES if p_seen >= 1 else (1 - p_seen ** BENCHMARK_SEEN_TRIES) / (1 - p_seen)
+
+    # Chao1 estimate of the number of distinct questions the generator can produce, from how many fingerprints
+    # were drawn exactly once (f1) or twice (f2). With no repeats at all it is only a lower bound.
+    frequencies = collections.Counter(collections.Counter(fingerprints).values())
+    f1, f2 = frequencies[1], frequencies[2]
+    parameter_space = len(set(fingerprints)) + (f1 * f1 / (2 * f2) if f2 else f1 * (f1 - 1) / 2)
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "errors": errors,
+        "questions_per_sec": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None,
+        "p99_ms": round(latencies[math.ceil(len(latencies) * 0.99) - 1] * 1000, 3) if latencies else None,
+        "distinct_ratio": round(len(set(fingerprints)) / len(fingerprints), 4) if fingerprints else None,
+        "expected_tries": round(expected_tries, 3),
+        "repeat_probability": round(p_seen ** BENCHMARK_SEEN_TRIES, 4),
+        "parameter_space": round(parameter_space),
+    }
+
+def _benchmark_cell(topic, difficulty, q_type, iterations):
+    """_benchmark_generator for one registry cell, through generate()."""
+    return _benchmark_generator(functools.partial(generate, topic), topic, iterations, difficulty=difficulty, q_type=q_type)
+
+def _benchmark_batch(topic, iterations, difficulty):
+    """Times one generate_batch call of `iterations` questions; latencies are per question."""
+    started = time.perf_counter()
+    questions = generate_batch(topic, difficulty, iterations)
+    elapsed = time.perf_counter() - started
+    fingerprints = [get_question_id(question, topic) for question in questions]
+    per_question_ms = round(elapsed / iterations * 1000, 3)
+    return {
+        "iterations": iterations,
+        "errors": 0,
+        "questions_per_sec": round(iterations / elapsed, 1) if elapsed > 0 else None,
+        "p50_ms": per_question_ms,
+        "p99_ms": per_question_ms,
+        "distinct_ratio": round(len(set(fingerprints)) / len(fingerprints), 4),
+    }
+
+def run_generator_benchmark(iterations=200):
+    """
+    Benchmarks every registry cell (each q_type of each topic, Advanced Combo included) and the batch API.
+    Returns a JSON-serialisable report.
+    """
+    results = []
+    for (topic, q_type), difficulty in QUESTION_TYPE_DIFFICULTY.items():
+        results.append({"generator": GENERATOR_REGISTRY[topic]["generator"].__name__, "topic": topic, "difficulty": difficulty,
+                        "q_type": q_type, **_benchmark_cell(topic, difficulty, q_type, iterations)})
+    for topic in BATCH_GENERATORS:
+        for difficulty in QUESTION_BANK_DIFFICULTIES:
+            results.append({"generator": "generate_batch", "topic": topic, "difficulty": difficulty,
+                            "q_type": None, **_benchmark_batch(topic, iterations, difficulty)})
+    return {"generated_at": datetime.now().isoformat(timespec="seconds"), "iterations": iterations, "results": results}
+
+def _time_per_call_us(func, iterations):
+    """Mean wall time of one func() call, in microseconds."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+def run_math_tables_benchmark(iterations=20000):
+    """
+    Times each shared math lookup table against the inline computation it replaced, scaled by how often one
+    question of the q_type that reads it needs the value, and compares the saving with that q_type's own
+    generation time. Returns a JSON-serialisable report.
+    """
+    def pascal_inline():
+        rows = _pascal_rows(5)
+        return _format_pascal_triangle(rows), list(rows[-1])
+
+    # (table, topic, q_type, lookups per question, inline computation, table lookup)
+    cases = [
+        ("pascal_displays", "Binomial Theorem", "pascal_read", 1, pascal_inline, lambda: _generate_pascal_data(5)),
+        ("base_digits", "Number Bases", "addition", 6, lambda: np.base_repr(83, 5), lambda: _to_base(83, 5)),
+        ("integer_roots", "Indices", "fractional", 3, lambda: int(round(64 ** (1 / 3))), lambda: _math_tables().integer_roots[(64, 3)]),
+        ("integer_roots", "Surds", "ops_unlike_surds", 2, lambda: int(math.sqrt(25)), lambda: _math_tables().integer_roots[(25, 2)]),
+        ("mod_inverses", "Modulo Arithmetic", "solve_linear", 1, lambda: pow(4, -1, 11), lambda: _math_tables().mod_inverses[11][4]),
+    ]
+    _math_tables() # Build outside the timings
+    results = []
+    for table, topic, q_type, lookups, inline_func, table_func in cases:
+        inline_us = _time_per_call_us(inline_func, iterations)
+        table_us = _time_per_call_us(table_func, iterations)
+        saved_us = (inline_us - table_us) * lookups
+        question_us = _benchmark_cell(topic, QUESTION_TYPE_DIFFICULTY[(topic, q_type)], q_type, min(iterations, 1000))["p50_ms"] * 1000
+        results.append({
+            "table": table, "topic": topic, "q_type": q_type, "lookups_per_question": lookups,
+            "inline_us": round(inline_us, 3), "table_us": round(table_us, 3),
+            "saved_per_question_us": round(saved_us, 3), "question_us": round(question_us, 3),
+            "saved_pct": round(100 * saved_us / (question_us + saved_us), 1),
+        })
+    return {"generated_at": datetime.now().isoformat(timespec="seconds"), "iterations": iterations, "results": results}
+
+def _sample_wassce_session_snapshots(limit):
+    """Saved WASSCE Prep snapshots from quiz_sessions, topped up with simulated mid-exam sessions if there are too few."""
+    snapshots = []
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT session_data, session_blob FROM public.quiz_sessions")).mappings().fetchall()
+        for row in rows:
+            if row["session_blob"] is not None:
+                state = decode_session_state(row["session_blob"])
+            else:
+                state = json.loads(row["session_data"]) if isinstance(row["session_data"], str) else row["session_data"]
+            if state and state.get("is_wassce_mode"):
+                snapshots.append(state)
+    except Exception as e:
+        print(f"Session codec benchmark: could not read saved sessions: {e}")
+    snapshots = snapshots[:limit]
+    saved = len(snapshots)
+
+    rng = random.Random(0)
+    topics = [t for t in QUESTION_REF_TOPICS if t != "Advanced Combo"]
+    while len(snapshots) < limit:
+        paper = []
+        while len(paper) < WASSCE_QUIZ_LENGTH:
+            topic = rng.choice(topics)
+            for question in _generate_paper_candidates(topic, rng.choice(QUESTION_BANK_DIFFICULTIES), rng.getrandbits(64), 1):
+                question["topic"] = topic
+                paper.append(question)
+        answered = rng.randrange(1, WASSCE_QUIZ_LENGTH)
+        # Snapshot of a student part-way through, mid-question after using a 50/50.
+        snapshots.append(_quiz_state_snapshot({
+            "quiz_active": True, "quiz_topic": "WASSCE Prep", "is_wassce_mode": True,
+            "questions_answered": answered, "questions_attempted": answered, "quiz_score": answered // 2,
+            "incorrect_questions": rng.sample(paper[:answered], (answered + 1) // 2),
+            "all_wassce_questions": paper[:answered + 1], "wassce_paper": paper[answered + 1:],
+            "current_q_data": paper[answered], "fifty_fifty_used": True,
+        }))
+    return snapshots, saved
+
+def run_session_codec_benchmark(sessions=20, iterations=200):
+    """
+    Compares the session codecs with the plain JSON that session_data used to hold, on saved WASSCE Prep
+    snapshots (or simulated ones): mean payload size and encode/decode time per snapshot.
+    Returns a JSON-serialisable report.
+    """
+    snapshots, saved = _sample_wassce_session_snapshots(sessions)
+    codecs = [("legacy json (session_data)", lambda s: json.dumps(s, default=str), json.loads)]
+    codecs += [(f"v{version} {codec.name}", functools.partial(encode_session_state, version=version), decode_session_state)
+               for version, codec in SESSION_CODECS.items()]
+    legacy_bytes = sum(len(json.dumps(s, default=str).encode("utf-8")) for s in snapshots) / len(snapshots)
+    results = []
+    for name, encode, decode in codecs:
+        payloads = [encode(s) for s in snapshots]
+        mean_bytes = sum(len(p.encode("utf-8") if isinstance(p, str) else p) for p in payloads) / len(payloads)
+        results.append({
+            "codec": name, "mean_bytes": round(mean_bytes), "size_vs_legacy": round(mean_bytes / legacy_bytes, 3),
+            "encode_us": round(sum(_time_per_call_us(lambda s=s: encode(s), iterations) for s in snapshots) / len(snapshots), 1),
+            "decode_us": round(sum(_time_per_call_us(lambda p=p: decode(p), iterations) for p in payloads) / len(payloads), 1),
+        })
+    return {"generated_at": datetime.now().isoformat(timespec="seconds"), "sessions": len(snapshots),
+            "saved_sessions": saved, "iterations": iterations, "results": results}
+
 # --- UI DISPLAY FUNCTIONS ---
 def confetti_animation():
     html("""<script src="https://cdn.jsdelivr.net/npm/canvas-confetti@1.5.1/dist/confetti.browser.min.js"></script><script>confetti();</script>""")
@@ -6974,18 +9258,12 @@ def display_quiz_page(topic_options):
                 # --- END: THIS IS THE FIX ---
                 selected_topic = st.selectbox("Select a topic to begin:", topic_options)
                 if st.button("Start Solo Quiz", type="secondary", use_container_width=True, key="start_quiz_main"):
-                    st.session_state.is_wassce_mode = False
-                    st.session_state.quiz_active = True
-                    st.session_state.quiz_topic = selected_topic
-                    st.session_state.on_summary_page = False
-                    st.session_state.quiz_score = 0
-                    st.session_state.questions_answered = 0
-                    st.session_state.questions_attempted = 0
-                    st.session_state.current_streak = 0
-                    st.session_state.incorrect_questions = []
-                    keys_to_clear = ['current_q_data', 'result_saved', 'checked_personal_best', 'previous_best_accuracy', 'all_wassce_questions']
+                    st.session_state.challenge_cell = get_challenge_cell(st.session_state.username, selected_topic)
+                    load_seen_question_filter(st.session_state.username)
+                    keys_to_clear = ['result_saved', 'checked_personal_best', 'previous_best_accuracy']
                     for key in keys_to_clear:
                         if key in st.session_state: del st.session_state[key]
+                    record_quiz_event(st.session_state.username, "quiz_started", quiz_topic=selected_topic, is_wassce_mode=False)
                     st.rerun()
 
         with col2:
@@ -7001,20 +9279,14 @@ def display_quiz_page(topic_options):
                 *Ready to see where you stand?*
                 """)
                 if st.button("Start Exam Prep", key="start_wassce", type="primary", use_container_width=True):
-                    st.session_state.is_wassce_mode = True
-                    st.session_state.quiz_active = True
-                    st.session_state.quiz_topic = "WASSCE Prep"
-                    # The 'quiz_start_time' line has been removed
-                    st.session_state.on_summary_page = False
-                    st.session_state.quiz_score = 0
-                    st.session_state.questions_answered = 0
-                    st.session_state.questions_attempted = 0
-                    st.session_state.current_streak = 0
-                    st.session_state.incorrect_questions = []
-                    st.session_state.all_wassce_questions = []
-                    keys_to_clear = ['current_q_data', 'result_saved', 'checked_personal_best', 'previous_best_accuracy']
+                    load_seen_question_filter(st.session_state.username)
+                    with st.spinner("Preparing your exam paper..."):
+                        available_topics = [t for t in topic_options if t != "Advanced Combo"]
+                        wassce_paper = build_wassce_paper(st.session_state.username, available_topics)
+                    keys_to_clear = ['result_saved', 'checked_personal_best', 'previous_best_accuracy']
                     for key in keys_to_clear:
                         if key in st.session_state: del st.session_state[key]
+                    record_quiz_event(st.session_state.username, "quiz_started", quiz_topic="WASSCE Prep", is_wassce_mode=True, wassce_paper=wassce_paper)
                     st.rerun()
         return
 
@@ -7043,24 +9315,31 @@ def display_quiz_page(topic_options):
     st.markdown("<hr class='styled-hr'>", unsafe_allow_html=True)
     
     if 'current_q_data' not in st.session_state:
+        from_paper = False
         if st.session_state.is_wassce_mode:
-            available_topics = [t for t in topic_options if t != "Advanced Combo"]
-            random_topic = random.choice(available_topics)
-            question_data = get_adaptive_question(random_topic, st.session_state.username)
-            question_data['topic'] = random_topic
-            st.session_state.current_q_data = question_data
-            if 'all_wassce_questions' not in st.session_state: st.session_state.all_wassce_questions = []
-            st.session_state.all_wassce_questions.append(question_data)
+            if st.session_state.get('wassce_paper'):
+                # The paper was generated when the exam started, so just take its next question.
+                question_data = st.session_state.wassce_paper[0]
+                from_paper = True
+            else:
+                available_topics = [t for t in topic_options if t != "Advanced Combo"]
+                random_topic = random.choice(available_topics)
+                question_data = get_adaptive_question(random_topic, st.session_state.username)
+                if question_data is not None:
+                    question_data['topic'] = random_topic
         else:
-            st.session_state.current_q_data = get_adaptive_question(st.session_state.quiz_topic, st.session_state.username)
-        
-        # --- START: THIS IS THE FIX ---
-        # Initialize/reset the part index and score tracker for the new question
-        st.session_state.current_part_index = 0
-        st.session_state.multi_part_correct = True
-        # --- END: THIS IS THE FIX ---
-
-        save_quiz_state(st.session_state.username)
+            question_data = (
+                pop_prefetched_question(st.session_state.quiz_topic, st.session_state.username)
+                or get_adaptive_question(st.session_state.quiz_topic, st.session_state.username, get_challenge_q_type(st.session_state.quiz_topic))
+            )
+        if question_data is None:
+            # Every generator call failed with nothing to fall back on (logged); nothing is served or scored.
+            st.warning("We couldn't prepare the next question. Please try again.")
+            if st.button("Try Again", key="retry_question", type="primary"):
+                st.rerun()
+            return
+        # Also resets the part index and score tracker for the new question.
+        record_quiz_event(st.session_state.username, "question_served", question=question_data, from_paper=from_paper)
     
     q_data = st.session_state.current_q_data
     display_topic = q_data.get('topic', st.session_state.quiz_topic)
@@ -7081,39 +9360,29 @@ def display_quiz_page(topic_options):
                 else:
                     if st.button(f"💡 Hint ({hint_tokens})", disabled=(hint_tokens <= 0), key="use_hint", use_container_width=True):
                         if use_hint_token(st.session_state.username):
-                            st.session_state.hint_revealed = True
+                            record_quiz_event(st.session_state.username, "lifeline_used", lifeline="hint")
                             st.rerun()
             with help_cols[1]:
                 if st.button(f"🔀 50/50 ({fifty_fifty_tokens})", disabled=(fifty_fifty_tokens <= 0 or st.session_state.get('fifty_fifty_used', False)), key="use_5050", use_container_width=True):
                     if use_fifty_fifty_token(st.session_state.username):
-                        st.session_state.fifty_fifty_used = True
                         correct_answer = part_data["answer"]
                         incorrect_options = [opt for opt in part_data["options"] if str(opt) != str(correct_answer)]
                         option_to_keep = random.choice(incorrect_options)
                         new_options = [correct_answer, option_to_keep]
                         random.shuffle(new_options)
-                        if q_data.get("is_multipart"):
-                            st.session_state.current_q_data['parts'][st.session_state.get('current_part_index', 0)]['options'] = new_options
-                        else:
-                            st.session_state.current_q_data['options'] = new_options
+                        record_quiz_event(st.session_state.username, "lifeline_used", lifeline="fifty_fifty", options=new_options)
                         st.rerun()
             with help_cols[2]:
                 if st.button(f"↪️ Skip ({skip_tokens})", disabled=(skip_tokens <= 0), key="use_skip", use_container_width=True):
                     if use_skip_question_token(st.session_state.username):
                         st.toast("Question skipped!", icon="↪️")
-                        st.session_state.questions_answered += 1
-                        keys_to_reset = ['hint_revealed', 'fifty_fifty_used', 'current_q_data', 'user_choice', 'answer_submitted']
-                        for key in keys_to_reset:
-                            if key in st.session_state: del st.session_state[key]
+                        record_quiz_event(st.session_state.username, "lifeline_used", lifeline="skip")
                         st.rerun()
 
         with st.form(key=f"quiz_form_{st.session_state.questions_answered}"):
             user_choice = st.radio("Select your answer:", part_data["options"], index=None)
             if st.form_submit_button("Submit Answer", type="primary"):
                 if user_choice is not None:
-                    st.session_state.user_choice = user_choice
-                    st.session_state.answer_submitted = True
-
                     # --- START: THIS IS THE FIX ---
                     # We must re-define these variables here so this code block knows about them
                     is_multi_part = q_data.get("is_multipart", False)
@@ -7123,21 +9392,13 @@ def display_quiz_page(topic_options):
                     # --- END: THIS IS THE FIX ---
                     
                     is_correct = str(user_choice) == str(part_data["answer"])
-                    
-                    # Logic for scoring multi-part questions
-                    if not is_correct:
-                        st.session_state.multi_part_correct = False # Mark the whole question as wrong
-                    
-                    # This line will no longer cause an error
-                    if not is_multi_part or (part_index == len(q_data["parts"]) - 1):
-                        # This is the last part of the question (or a single question)
-                        st.session_state.questions_attempted += 1
-                        if st.session_state.multi_part_correct:
-                            st.session_state.quiz_score += 1
-                            st.session_state.current_streak += 1
-                        else:
-                            st.session_state.current_streak = 0
-                            st.session_state.incorrect_questions.append(q_data)
+                    # A wrong part marks the whole question as wrong; the question is scored on its last part.
+                    is_final_part = not is_multi_part or (part_index == len(q_data["parts"]) - 1)
+                    record_quiz_event(st.session_state.username, "answer_submitted", choice=user_choice, correct=is_correct, final=is_final_part)
+
+                    # Build the next questions in the background while the student reads the explanation.
+                    if not st.session_state.is_wassce_mode:
+                        prefetch_next_questions(st.session_state.quiz_topic, st.session_state.username)
 
                     st.rerun()
                 else:
@@ -7185,15 +9446,10 @@ def display_quiz_page(topic_options):
         if st.button(button_text, type="primary", use_container_width=True):
             if is_last_part:
                 # This is the end of the question, so advance the main counter
-                st.session_state.questions_answered += 1
-                keys_to_reset = ['hint_revealed', 'fifty_fifty_used', 'current_q_data', 'user_choice', 'answer_submitted', 'current_part_index', 'multi_part_correct']
+                record_quiz_event(st.session_state.username, "question_advanced")
             else:
-                # This is a multi-part question, advance to the next part
-                st.session_state.current_part_index += 1
-                keys_to_reset = ['hint_revealed', 'fifty_fifty_used', 'user_choice', 'answer_submitted'] # Keep 'current_q_data'
-            
-            for key in keys_to_reset:
-                if key in st.session_state: del st.session_state[key]
+                # This is a multi-part question, advance to the next part (keeps 'current_q_data')
+                record_quiz_event(st.session_state.username, "part_advanced")
             st.rerun()
         # --- END FIX ---
     if st.button("Stop Round & Save Score"):
@@ -7209,6 +9465,8 @@ def display_quiz_summary():
     # It clears the saved session from the database, marking the quiz as officially done.
     clear_quiz_state(st.session_state.username)
     # --- END: NEW CODE TO ADD ---
+    if st.session_state.questions_attempted == 0:
+        flush_seen_questions() # No result will be recorded, so persist this round's seen questions now
 
     final_score = st.session_state.quiz_score
     total_questions = st.session_state.questions_attempted
@@ -7232,7 +9490,7 @@ def display_quiz_summary():
 
         # Save the result once per session
         if total_questions > 0 and 'result_saved' not in st.session_state:
-            save_quiz_result(st.session_state.username, "WASSCE Prep", final_score, total_questions, coins_earned, description)
+            record_quiz_completion(st.session_state.username, "WASSCE Prep", final_score, total_questions, coins_earned, description)
             st.session_state.result_saved = True
         # --- END: NEW LOGIC FOR WASSCE SAVING & REWARDS ---
     # --- WASSCE MODE SUMMARY ---
@@ -7283,6 +9541,7 @@ def display_quiz_summary():
             st.session_state.quiz_active = False
             if 'result_saved' in st.session_state: del st.session_state['result_saved']
             if 'all_wassce_questions' in st.session_state: del st.session_state['all_wassce_questions']
+            if 'wassce_paper' in st.session_state: del st.session_state['wassce_paper']
             st.rerun()
 
     # --- REGULAR QUIZ SUMMARY ---
@@ -7292,22 +9551,13 @@ def display_quiz_summary():
         if total_questions > 0:
             coins_earned = final_score * 5
             description = f"Completed Quiz on {st.session_state.quiz_topic}"
-            # --- START: NEW ONE-TIME BONUS LOGIC ---
-            # Check for a perfect score
-            if final_score == total_questions and total_questions > 0:
-                # Check if the user is eligible for the one-time bonus for this topic
-                is_bonus_eligible = _check_and_award_perfect_score_bonus(st.session_state.username, st.session_state.quiz_topic)
-                if is_bonus_eligible:
-                    coins_earned += 25
-                    description += " (First-Time Perfect Score Bonus!)"
-                    st.toast(f"🎯 New Achievement! You perfected '{st.session_state.quiz_topic}'!", icon="🎉")
-            # --- END: NEW ONE-TIME BONUS LOGIC ---
+            # A first perfect score on the topic is the "Perfect Score" achievement, awarded with the result.
         if is_double_coins_active(st.session_state.username):
             st.success(f"🚀 Double Coins booster was active! Your earnings are doubled: {coins_earned} -> {coins_earned * 2}", icon="🎉")
             coins_earned *= 2
 
         if total_questions > 0 and 'result_saved' not in st.session_state:
-            save_quiz_result(st.session_state.username, st.session_state.quiz_topic, final_score, total_questions, coins_earned, description)
+            record_quiz_completion(st.session_state.username, st.session_state.quiz_topic, final_score, total_questions, coins_earned, description)
             st.session_state.result_saved = True
             
         col1, col2, col3 = st.columns(3)
@@ -7398,16 +9648,14 @@ def display_leaderboard(topic_options):
                 st.info(f"Take a quiz to get on the leaderboard!")
     
     if leaderboard_topic == "🏆 Overall Performance":
-        total_players = get_total_overall_players(time_filter)
-        rival_data = get_overall_rival_snapshot(st.session_state.username, time_filter)
-        display_rival_card(rival_data, total_players, "Your Overall Rank")
+        view = get_leaderboard_view(OVERALL_LEADERBOARD, time_filter, st.session_state.username)
+        display_rival_card(view, view['total_players'], "Your Overall Rank")
 
         st.subheader(f"Top 10 Overall Performers ({time_filter_option})")
         st.caption("Ranked by total number of correct answers across all topics.")
-        top_scores = get_overall_top_scores(time_filter)
+        top_scores = [(row['username'], row['total_score']) for row in view['top_rows']]
         if top_scores:
-            top_usernames = [score[0] for score in top_scores]
-            display_infos = get_user_display_info(top_usernames)
+            display_infos = {row['username']: row for row in view['top_rows']}
             titles = [ "🥇 Math Legend", "🥈 Prime Mathematician", "🥉 Grand Prodigy", "The Destroyer", "Merlin", "The Genius", "Math Ninja", "The Professor", "The Oracle", "Last Baby" ]
             
             # This is your existing header, which we can keep.
@@ -7469,17 +9717,15 @@ def display_leaderboard(topic_options):
     else: # Topic-specific leaderboard
         # This section can be updated with the same flexbox logic if needed.
         # For now, focusing on the main "Overall" leaderboard as requested.
-        total_players = get_total_players(leaderboard_topic, time_filter)
-        rival_data = get_rival_snapshot(st.session_state.username, leaderboard_topic, time_filter)
-        display_rival_card(rival_data, total_players, f"Your Rank in {leaderboard_topic}")
+        view = get_leaderboard_view(leaderboard_topic, time_filter, st.session_state.username)
+        display_rival_card(view, view['total_players'], f"Your Rank in {leaderboard_topic}")
 
         st.subheader(f"Top 10 for {leaderboard_topic} ({time_filter_option})")
         st.caption("Ranked by highest accuracy score.")
         
-        top_scores = get_top_scores(leaderboard_topic, time_filter)
+        top_scores = [(row['username'], row['score'], row['questions_answered']) for row in view['top_rows']]
         if top_scores:
-            top_usernames = [score[0] for score in top_scores]
-            display_infos = get_user_display_info(top_usernames)
+            display_infos = {row['username']: row for row in view['top_rows']}
             
             st.markdown("""
                 <div style="display: flex; justify-content: space-between; padding: 10px 0; border-bottom: 2px solid #dee2e6; font-weight: bold;">
@@ -8604,9 +10850,12 @@ def display_admin_panel(topic_options):
                             # Replaced st.text_input with st.selectbox
                             new_topic = st.selectbox("Topic", options=challenge_topic_options)
                             new_target = st.number_input("Target Count", min_value=1, value=3)
+                            new_q_type = st.text_input("Question Type (optional)", placeholder="e.g., remainder_theorem", help="Serves only this kind of question for the topic until the challenge is met.").strip() or None
                             if st.form_submit_button("Add Challenge", type="primary"):
-                                if new_desc and new_topic and new_target:
-                                    add_new_challenge(new_desc, new_topic, new_target)
+                                if new_q_type and (new_topic, new_q_type) not in QUESTION_TYPE_DIFFICULTY:
+                                    st.error(f"'{new_q_type}' is not a question type of {new_topic}. Options: {', '.join(QUESTION_REF_Q_TYPES.get(new_topic, [])) or 'none'}.")
+                                elif new_desc and new_topic and new_target:
+                                    add_new_challenge(new_desc, new_topic, new_target, new_q_type)
                                     st.success("New challenge added!")
                                     st.rerun()
                                 else:
@@ -8622,7 +10871,7 @@ def display_admin_panel(topic_options):
                                 with st.container(border=True):
                                     st.markdown(f"**ID: {challenge['id']}** | **Topic:** `{challenge['topic']}`")
                                     st.markdown(challenge['description'])
-                                    st.markdown(f"**Target:** {challenge['target_count']}")
+                                    st.markdown(f"**Target:** {challenge['target_count']}" + (f" | **Question Type:** `{challenge['q_type']}`" if challenge['q_type'] else ""))
                                     with st.expander("Edit this challenge"):
                                         with st.form(key=f"edit_form_{challenge['id']}"):
                                             edit_desc = st.text_input("Description", value=challenge['description'], key=f"desc_{challenge['id']}")
@@ -8635,11 +10884,15 @@ def display_admin_panel(topic_options):
                                             edit_topic = st.selectbox("Topic", options=challenge_topic_options, index=current_topic_index, key=f"topic_{challenge['id']}")
                                             
                                             edit_target = st.number_input("Target", value=challenge['target_count'], min_value=1, key=f"target_{challenge['id']}")
+                                            edit_q_type = st.text_input("Question Type (optional)", value=challenge['q_type'] or "", key=f"q_type_{challenge['id']}").strip() or None
                                             c1, c2 = st.columns([3, 1])
                                             if c1.form_submit_button("Save Changes"):
-                                                update_challenge(challenge['id'], edit_desc, edit_topic, edit_target)
-                                                st.success(f"Challenge {challenge['id']} updated!")
-                                                st.rerun()
+                                                if edit_q_type and (edit_topic, edit_q_type) not in QUESTION_TYPE_DIFFICULTY:
+                                                    st.error(f"'{edit_q_type}' is not a question type of {edit_topic}. Options: {', '.join(QUESTION_REF_Q_TYPES.get(edit_topic, [])) or 'none'}.")
+                                                else:
+                                                    update_challenge(challenge['id'], edit_desc, edit_topic, edit_target, edit_q_type)
+                                                    st.success(f"Challenge {challenge['id']} updated!")
+                                                    st.rerun()
                                             if c2.form_submit_button("Delete", type="secondary"):
                                                 delete_challenge(challenge['id'])
                                                 st.success(f"Challenge {challenge['id']} deleted!")
@@ -8843,6 +11096,99 @@ def display_admin_panel(topic_options):
             set_config_value("last_digest_sent_date_v2", "reset")
             st.success("Digest timer has been reset. Log out and log back in to trigger a new email.")
             st.rerun()
+
+        if st.button("Rebuild Leaderboard Tables", use_container_width=True):
+            # Backfills leaderboard_best_scores and quiz_daily_aggregates from quiz_results,
+            # and duel_player_stats from the duels table.
+            with st.spinner("Rebuilding leaderboards from quiz and duel history..."):
+                rows_written = rebuild_leaderboard_best_scores()
+                rows_written += rebuild_quiz_daily_aggregates()
+                rows_written += rebuild_duel_player_stats()
+            invalidate_app_cache("leaderboard")
+            invalidate_app_cache("duel_leaderboard")
+            _get_rank_index_registry.clear() # Rank indexes reload from the rebuilt table on next use
+            st.success(f"Leaderboards rebuilt ({rows_written} rows written).")
+
+        if st.button("Run Daily Challenge Rollover", use_container_width=True):
+            # Assigns today's and tomorrow's challenges to every active user who has none yet.
+            assigned = run_daily_challenge_rollover(force=True)
+            st.success(f"Daily challenges assigned to {assigned} users.")
+
+        backfill_rules = st.multiselect("Achievements to backfill (leave empty for all)", get_all_achievements())
+        if st.button("Backfill Achievements", use_container_width=True):
+            # Awards the chosen rules to every user who already meets them, coins included.
+            progress_bar = st.progress(0.0, text="Backfilling achievements...")
+            def show_backfill_progress(chunks_done, chunks_total, awarded):
+                progress_bar.progress(chunks_done / chunks_total, text=f"Chunk {chunks_done}/{chunks_total}: {awarded} achievements awarded")
+            result = backfill_achievements(backfill_rules or None, on_progress=show_backfill_progress)
+            invalidate_app_cache("user_stats")
+            st.success(f"Awarded {result['awarded']} achievements ({result['coins']} coins) across {result['chunks']} chunks of users.")
+
+        repair_score_totals = st.checkbox("Repair any mismatched score totals", value=False)
+        if st.button("Check Score Totals", use_container_width=True):
+            # Recomputes user_score_totals (used by the achievement checks) from quiz_results.
+            with st.spinner("Recomputing score totals from quiz history..."):
+                mismatches = check_user_score_totals(repair=repair_score_totals)
+            if not mismatches:
+                st.success("Score totals match quiz history.")
+            else:
+                action = "repaired" if repair_score_totals else "found"
+                st.warning(f"{len(mismatches)} mismatched score total rows {action}.")
+                st.dataframe(pd.DataFrame(mismatches), use_container_width=True)
+
+        bank_target = st.number_input("Question bank size per topic and difficulty", min_value=100, max_value=500000, value=100000, step=1000)
+        if st.button("Build Question Bank", use_container_width=True):
+            # Tops up every (topic, difficulty) cell in the background; cells whose generator runs out of new questions stop early.
+            if not start_question_bank_build(int(bank_target)):
+                st.warning("A question bank build is already running.")
+        bank_status = get_question_bank_build_status()
+        if bank_status:
+            if bank_status["finished_at"] is None:
+                st_autorefresh(interval=3000, key="question_bank_build_refresh")
+                done, total = bank_status["cells_done"], bank_status["cells_total"]
+                st.progress(done / total if total else 0.0, text=f"Building question bank: {done}/{total or '?'} cells, {bank_status['added']} new questions")
+            elif bank_status["error"]:
+                st.error(f"Question bank build failed: {bank_status['error']}")
+            else:
+                added = bank_status["result"]
+                st.success(f"Question bank updated at {bank_status['finished_at']} ({bank_status['added']} new questions).")
+                st.dataframe(pd.DataFrame([
+                    {"Topic": t, "Difficulty": d, "Added": "Skipped (another build holds it)" if n is None else n} for (t, d), n in added.items()
+                ]), use_container_width=True)
+
+        benchmark_iterations = st.number_input("Generator benchmark iterations", min_value=10, max_value=5000, value=200, step=10)
+        if st.button("Run Generator Benchmark", use_container_width=True):
+            with st.spinner("Benchmarking every question generator..."):
+                st.session_state.generator_benchmark = run_generator_benchmark(int(benchmark_iterations))
+        if st.session_state.get("generator_benchmark"):
+            report = st.session_state.generator_benchmark
+            st.dataframe(pd.DataFrame(report["results"]), use_container_width=True)
+            st.download_button(
+                "Download Benchmark JSON", json.dumps(report, indent=2),
+                file_name=f"generator_benchmark_{report['generated_at']}.json", mime="application/json", use_container_width=True
+            )
+
+        if st.button("Run Lookup Table Benchmark", use_container_width=True):
+            with st.spinner("Timing the shared math lookup tables..."):
+                st.session_state.math_tables_benchmark = run_math_tables_benchmark()
+        if st.session_state.get("math_tables_benchmark"):
+            st.dataframe(pd.DataFrame(st.session_state.math_tables_benchmark["results"]), use_container_width=True)
+
+        if st.button("Run Session Codec Benchmark", use_container_width=True):
+            with st.spinner("Encoding WASSCE sessions with each session codec..."):
+                st.session_state.session_codec_benchmark = run_session_codec_benchmark()
+        if st.session_state.get("session_codec_benchmark"):
+            report = st.session_state.session_codec_benchmark
+            st.caption(f"{report['sessions']} WASSCE Prep sessions ({report['saved_sessions']} saved, the rest simulated).")
+            st.dataframe(pd.DataFrame(report["results"]), use_container_width=True)
+
+        if st.button("Run Quiz Completion Benchmark", use_container_width=True):
+            with st.spinner("Replaying quiz completions (rolled back)..."):
+                st.session_state.quiz_completion_benchmark = run_quiz_completion_benchmark(st.session_state.username)
+        if st.session_state.get("quiz_completion_benchmark"):
+            report = st.session_state.quiz_completion_benchmark
+            st.caption(f"{report['runs']} rolled-back completions per pipeline for {report['username']}.")
+            st.dataframe(pd.DataFrame(report["results"]), use_container_width=True)
     
     # --- TAB 6: ANALYTICS ---
     with tabs[6]:
@@ -8930,7 +11276,7 @@ def display_admin_panel(topic_options):
                 if st.form_submit_button("Save Changes", type="primary"):
                     update_learning_content(selected_topic_to_edit, new_content)
                     st.success(f"Content for '{selected_topic_to_edit}' has been updated successfully!")
-                    # No rerun needed, as st.cache_data.clear() handles the update.
+                    # No rerun needed, as update_learning_content drops the cached copy of this topic.
 
         # In display_admin_panel(), at the end of the "Content Management" tab
     
@@ -8987,6 +11333,12 @@ def show_main_app(cookies):
     except Exception as e:
         print(f"Daily digest check failed: {e}")
     # --- END: NEW DAILY DIGEST TRIGGER ---
+    if st.session_state.get("challenge_rollover_checked") != date.today():
+        try:
+            run_daily_challenge_rollover()
+            st.session_state.challenge_rollover_checked = date.today()
+        except Exception as e:
+            print(f"Daily challenge rollover failed: {e}")
     load_css()
     if 'daily_reward_checked' not in st.session_state:
         reward_message = check_and_grant_daily_reward(st.session_state.username)
@@ -9038,6 +11390,8 @@ def show_main_app(cookies):
                 delete_remember_me_token(token_to_delete)
                 cookies.remove('remember_me_token') # Use remove() instead of delete()
             
+            flush_skill_vector()
+            st.session_state.pop("skill_vector", None)
             st.session_state.logged_in = False
             if 'challenge_completed_toast' in st.session_state: del st.session_state.challenge_completed_toast
             if 'achievement_unlocked_toast' in st.session_state: del st.session_state.achievement_unlocked_toast
@@ -9145,6 +11499,7 @@ if not st.session_state.get("logged_in", False) and remember_me_token:
     if username:
         st.session_state.logged_in = True
         st.session_state.username = username
+        load_skill_vector(username)
 
 if st.session_state.get("show_splash", True):
     load_css()